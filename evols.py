@@ -0,0 +1,598 @@
+"""
+evols - консольный доступ к хранилищу без графического интерфейса.
+
+Вывод - NDJSON (один JSON-объект на строку), ошибки - JSON в stderr.
+Модули Tk/customtkinter не импортируются; криптография и база
+подключаются только нужной команде, поэтому запуск без вывода ключа
+занимает десятки миллисекунд.
+
+Мастер-пароль берётся (по порядку) из --password-stdin, переменной
+EVOLS_MASTER_PASSWORD или запрашивается в терминале. Вместо пароля
+можно указать --keyfile.
+
+Если запущен агент (python -m main.agent), команды list, search, match и get
+обслуживаются им без повторного ввода пароля; --no-agent отключает это.
+
+Команды работают с основным хранилищем; другое из реестра (evols vaults)
+выбирается параметром --vault или переменной EVOLS_VAULT.
+
+Примеры:
+    python evols.py list --folder Работа
+    python evols.py get 12 --field password
+    python evols.py match https://mail.google.com/
+    python evols.py add --title GitHub --username me --generate
+    python evols.py export --include-passwords > vault.ndjson
+    python evols.py import bitwarden.json --dry-run
+    python evols.py sync /mnt/laptop/passwords.db
+    python evols.py pack vault.evolsv
+    python evols.py list --container vault.evolsv
+    python evols.py vaults --add Работа
+    python evols.py --vault Работа list
+    python evols.py search github --all-vaults
+    python evols.py audit
+"""
+import os
+import sys
+import json
+import argparse
+
+import paths
+
+
+EXIT_ERROR = 1
+EXIT_BAD_PASSWORD = 2
+
+HIDDEN = "***HIDDEN***"
+
+
+class CliError(Exception):
+    """Ошибка команды (печатается в stderr, код выхода 1)"""
+    pass
+
+
+# === ВЫВОД ===
+
+def emit(obj, stream=None):
+    stream = stream or sys.stdout
+    stream.write(json.dumps(obj, ensure_ascii=False) + "\n")
+    stream.flush()
+
+
+def emit_error(message, code=EXIT_ERROR):
+    emit({"error": message}, sys.stderr)
+    return code
+
+
+# === ВХОД В ХРАНИЛИЩЕ ===
+
+class _Secrets:
+    """Строки секретов из stdin (мастер-пароль, затем пароль записи)."""
+
+    def __init__(self, use_stdin):
+        self.use_stdin = use_stdin
+
+    def read(self, prompt, env=None):
+        if self.use_stdin:
+            line = sys.stdin.readline()
+            if not line:
+                raise CliError("stdin закончился раньше, чем ожидалось")
+            return line.rstrip("\r\n")
+        if env and os.environ.get(env):
+            return os.environ[env]
+        import getpass
+        return getpass.getpass(prompt, stream=sys.stderr)
+
+
+def open_vault(args, secrets, need_key=True):
+    """
+    Открывает базу; при need_key также выводит и проверяет ключ.
+
+    Returns:
+        (db, encryptor) - encryptor равен None, если ключ не нужен
+    """
+    from contextlib import redirect_stdout
+    from main.database import PasswordDatabase
+
+    db_path = paths.db_path()
+    if not os.path.exists(db_path):
+        raise CliError(f"Хранилище не найдено: {db_path}")
+
+    # Сообщения миграций печатаются через print - уводим их из NDJSON в stderr
+    with redirect_stdout(sys.stderr):
+        if not need_key:
+            return PasswordDatabase(db_path, None), None
+
+        from main import vault
+
+        if args.keyfile:
+            encryptor = vault.unlock_keyfile(args.keyfile, db_path)
+        else:
+            master_password = secrets.read("Мастер-пароль: ", env="EVOLS_MASTER_PASSWORD")
+            encryptor = vault.unlock_encryptor(master_password, db_path)
+        return PasswordDatabase(db_path, encryptor), encryptor
+
+
+def select_vault(args):
+    """Делает текущим хранилище из --vault (выбор в интерфейсе не меняется)."""
+    if not args.vault:
+        return
+    from main.vaults import VaultError, get_registry
+    try:
+        info = get_registry().get(args.vault)
+    except VaultError as e:
+        raise CliError(str(e))
+    paths.set_active_vault(None if info.is_default else info.path)
+
+
+def connect_agent(args):
+    """Клиент запущенного агента или None."""
+    if args.no_agent or args.keyfile or args.password_stdin:
+        return None
+    # Без сокета не загружаем даже клиент (запуск CLI должен быть быстрым)
+    if not os.path.exists(paths.agent_socket_path()):
+        return None
+    from main.agent_client import AgentClient
+    return AgentClient.connect()
+
+
+# === КОМАНДЫ ===
+
+def cmd_list(args, secrets):
+    agent = None if args.container else connect_agent(args)
+    if agent:
+        with agent:
+            for entry in agent.iter_request("list", folder=args.folder, category=args.category):
+                emit(entry)
+        return
+
+    if args.container:
+        from main.container import ContainerError, VaultContainer
+        try:
+            with VaultContainer(args.container) as container:
+                for entry in container.iter_entries(folder=args.folder, category=args.category):
+                    emit(entry)
+        except BrokenPipeError:
+            # Оборванный вывод (| head) обрабатывает main(), это не ошибка чтения
+            raise
+        except (OSError, ContainerError) as e:
+            raise CliError(f"Контейнер не прочитан: {e}")
+        return
+
+    db, _ = open_vault(args, secrets, need_key=False)
+    try:
+        for entry in db.iter_entries(folder=args.folder, category=args.category):
+            emit(entry)
+    finally:
+        db.close()
+
+
+def cmd_search(args, secrets):
+    if args.all_vaults:
+        return _search_all_vaults(args, secrets)
+
+    agent = connect_agent(args)
+    if agent:
+        with agent:
+            for entry in agent.iter_request("search", query=args.query):
+                emit(entry)
+        return
+
+    db, _ = open_vault(args, secrets, need_key=False)
+    try:
+        for row in db.search_passwords(args.query):
+            emit(dict(zip(("id", "title", "category", "url", "folder"), row)))
+    finally:
+        db.close()
+
+
+def _search_all_vaults(args, secrets):
+    """Поиск сразу во всех созданных хранилищах реестра (каждое - своим паролем)."""
+    from contextlib import redirect_stdout
+    from main.vaults import VaultManager
+
+    manager = VaultManager()
+    try:
+        with redirect_stdout(sys.stderr):
+            for info in manager.registry.list():
+                if not info.exists():
+                    continue
+                password = None
+                if not args.keyfile:
+                    password = secrets.read(f"Мастер-пароль ({info.name}): ", env="EVOLS_MASTER_PASSWORD")
+                manager.unlock(info.id, password, args.keyfile)
+        for match in manager.search(args.query, args.limit):
+            emit(match)
+    finally:
+        manager.lock_all()
+
+
+def cmd_match(args, secrets):
+    agent = connect_agent(args)
+    if agent:
+        with agent:
+            for entry in agent.iter_request("match", url=args.url, limit=args.limit):
+                emit(entry)
+        return
+
+    db, _ = open_vault(args, secrets, need_key=False)
+    try:
+        for entry in db.find_by_url(args.url, args.limit):
+            emit(entry)
+    finally:
+        db.close()
+
+
+def cmd_get(args, secrets):
+    agent = connect_agent(args)
+    if agent:
+        with agent:
+            emit(agent.request("get", id=args.id, fields=args.field))
+        return
+
+    db, _ = open_vault(args, secrets)
+    try:
+        entry = db.get_entry(args.id, cache=False)
+        if entry is None:
+            raise CliError(f"Запись {args.id} не найдена")
+        fields = args.field or entry.keys()
+        # Расшифровываются только запрошенные поля
+        emit({field: entry[field] for field in fields if field in entry})
+    finally:
+        db.close()
+
+
+def cmd_add(args, secrets):
+    db, _ = open_vault(args, secrets)
+    try:
+        if args.generate:
+            from utils.password_generator import PasswordPolicy, get_generator
+            password = get_generator().generate(PasswordPolicy(length=args.length))
+        else:
+            password = secrets.read("Пароль записи: ", env="EVOLS_ENTRY_PASSWORD")
+        if not password:
+            raise CliError("Пустой пароль записи")
+
+        entry_id = db.add_password(
+            title=args.title,
+            username=args.username,
+            password=password,
+            url=args.url,
+            category=args.category,
+            notes=args.notes,
+            folder=args.folder
+        )
+        result = {"id": entry_id, "title": args.title}
+        if args.generate and args.show:
+            result["password"] = password
+        emit(result)
+    finally:
+        db.close()
+
+
+def cmd_export(args, secrets):
+    db, _ = open_vault(args, secrets)
+    stream = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    count = 0
+    try:
+        ids = [entry["id"] for entry in db.iter_entries()]
+        for entry_id in ids:
+            entry = db.get_entry(entry_id, cache=False)
+            if entry is None:
+                continue
+            record = {key: entry[key] for key in entry.keys() if key != "password"}
+            record["password"] = entry["password"] if args.include_passwords else HIDDEN
+            emit(record, stream)
+            count += 1
+    finally:
+        db.close()
+        if args.output:
+            stream.close()
+    if args.output:
+        emit({"exported": count, "output": args.output})
+
+
+def cmd_import(args, secrets):
+    from main import importers
+
+    if not os.path.exists(args.file):
+        raise CliError(f"Файл не найден: {args.file}")
+    try:
+        importer = (importers.get_importer(args.format, args.file) if args.format
+                    else importers.detect_importer(args.file))
+    except importers.ImportFormatError as e:
+        raise CliError(str(e))
+
+    def report(stats):
+        if args.progress:
+            emit({"imported": stats.imported, "updated": stats.updated, "skipped": stats.skipped,
+                  "bytes": importer.bytes_read, "total": importer.total_bytes}, sys.stderr)
+
+    # Ключ нужен и для пробного прогона: записи сравниваются с хранилищем
+    db, _ = open_vault(args, secrets)
+    try:
+        stats = importers.import_records(db, importer.records(), dry_run=args.dry_run,
+                                         progress=report, policy=args.policy)
+    except importers.ImportFormatError as e:
+        raise CliError(f"Импорт отменён, ничего не добавлено: {e}")
+    finally:
+        db.close()
+    emit(dict(stats.to_dict(), format=importer.name))
+
+
+def cmd_backup(args, secrets):
+    """Копия базы (SQLite backup API) вместе с файлами ключей."""
+    import shutil
+    from datetime import datetime
+    from main.settings_store import get_settings
+
+    db, _ = open_vault(args, secrets, need_key=False)
+    target = args.output or os.path.join(
+        get_settings().get("backup_directory"),
+        f"evols-{datetime.now():%Y%m%d-%H%M%S}"
+    )
+    os.makedirs(target, exist_ok=True)
+    try:
+        if not db.backup_database(os.path.join(target, os.path.basename(paths.db_path()))):
+            raise CliError("Не удалось скопировать базу")
+    finally:
+        db.close()
+
+    files = [os.path.basename(paths.db_path())]
+    for path in (paths.keyslots_path(), paths.salt_path(), paths.verification_path()):
+        if os.path.exists(path):
+            shutil.copy2(path, target)
+            files.append(os.path.basename(path))
+    emit({"backup": target, "files": files})
+
+
+def cmd_pack(args, secrets):
+    """Хранилище одним файлом (main.container); ключ не нужен."""
+    from main.container import ContainerError, pack_vault
+
+    try:
+        stats = pack_vault(args.output)
+    except ContainerError as e:
+        raise CliError(str(e))
+    emit(dict(stats, container=args.output))
+
+
+def cmd_unpack(args, secrets):
+    """Каталог хранилища из контейнера (каталог должен быть пустым)."""
+    from main.container import ContainerError, unpack_vault
+
+    target = args.into or paths.get_data_dir()
+    try:
+        count = unpack_vault(args.container, target)
+    except (OSError, ContainerError) as e:
+        raise CliError(f"Контейнер не распакован: {e}")
+    emit({"unpacked": target, "entries": count})
+
+
+def cmd_sync(args, secrets):
+    """Синхронизация с другой копией хранилища (тот же ключ данных)."""
+    from main.sync import SyncError
+
+    if not os.path.exists(args.other):
+        raise CliError(f"Копия не найдена: {args.other}")
+    db, _ = open_vault(args, secrets)
+    try:
+        stats = db.merge_vault(args.other)
+    except SyncError as e:
+        raise CliError(str(e))
+    finally:
+        db.close()
+    emit(dict(stats.to_dict(), other=os.path.abspath(args.other)))
+
+
+def cmd_vaults(args, secrets):
+    """Реестр хранилищ: список, добавление и удаление из списка."""
+    from contextlib import redirect_stdout
+    from main.vaults import VaultError, get_registry, initialize_vault
+
+    registry = get_registry()
+    try:
+        if args.add:
+            info = registry.add(args.add, args.path)
+            if not info.exists():
+                password = secrets.read(f"Мастер-пароль хранилища «{info.name}»: ", env="EVOLS_MASTER_PASSWORD")
+                paths.pin_vault_dir(info.path)
+                try:
+                    with redirect_stdout(sys.stderr):
+                        initialize_vault(password).clear()
+                finally:
+                    paths.pin_vault_dir(None)
+        elif args.remove:
+            registry.remove(args.remove)
+    except VaultError as e:
+        raise CliError(str(e))
+
+    for info in registry.list():
+        emit(dict(info.to_dict(), exists=info.exists(), active=info.id == registry.active_id))
+
+
+def cmd_audit(args, secrets):
+    from utils.password_audit import get_engine, BREACHED
+
+    db, encryptor = open_vault(args, secrets)
+    try:
+        rows = db.get_all_passwords()
+        plaintexts = [encryptor.decrypt(row[4]) for row in rows]
+        audit = get_engine().audit(plaintexts)
+        plaintexts.clear()
+
+        summary = {"total": len(rows), "weak": 0, "medium": 0, "strong": 0, "breached": 0}
+        for i, row in enumerate(rows):
+            score = audit.scores[i]
+            if score >= 60:
+                summary["strong"] += 1
+            elif score >= 40:
+                summary["medium"] += 1
+            else:
+                summary["weak"] += 1
+            breached = bool(audit.flags[i] & BREACHED)
+            summary["breached"] += breached
+            if args.all or score < 60 or breached:
+                emit({
+                    "id": row[0],
+                    "title": row[1],
+                    "score": score,
+                    "breached": breached,
+                    "feedback": audit.feedback(i)
+                })
+
+        clusters = db.get_reused_passwords()
+        for cluster in clusters:
+            emit({"reused": [{"id": id, "title": title} for id, title, _category in cluster]})
+        summary["reused_clusters"] = len(clusters)
+        emit({"summary": summary})
+    finally:
+        db.close()
+
+
+def cmd_rekey(args, secrets):
+    from main.rekey import RekeyJob
+
+    db, encryptor = open_vault(args, secrets)
+    db.close()
+
+    new_password = secrets.read("Новый мастер-пароль: ")
+    if not args.password_stdin and new_password != secrets.read("Повторите: "):
+        raise CliError("Пароли не совпадают")
+    if len(new_password) < 8:
+        raise CliError("Пароль должен содержать минимум 8 символов")
+
+    job = RekeyJob(paths.db_path(), encryptor, new_password).start()
+    while not job.wait(0.5):
+        done, total = job.progress
+        if args.progress and total:
+            emit({"stage": job.stage, "done": done, "total": total}, sys.stderr)
+    if job.error:
+        raise CliError(f"Пароль не изменён: {job.error}")
+    emit({"rekeyed": True, "slot_only": job.slot_only, "resumed": job.resumed})
+
+
+# === РАЗБОР АРГУМЕНТОВ ===
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="evols", description="EVOLS: работа с хранилищем из консоли")
+    parser.add_argument("--password-stdin", action="store_true",
+                        help="читать мастер-пароль (и другие секреты) построчно из stdin")
+    parser.add_argument("--keyfile", help="войти по ключевому файлу вместо пароля")
+    parser.add_argument("--no-agent", action="store_true", help="не обращаться к запущенному агенту")
+    parser.add_argument("--vault", default=os.environ.get("EVOLS_VAULT"),
+                        help="хранилище из реестра (имя или id), по умолчанию - основное")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("list", help="список записей (без расшифровки)")
+    p.add_argument("--folder")
+    p.add_argument("--category")
+    p.add_argument("--container", metavar="FILE", help="читать из контейнера (evols pack) без распаковки")
+    p.set_defaults(handler=cmd_list)
+
+    p = commands.add_parser("search", help="поиск по названию, URL и категории")
+    p.add_argument("query")
+    p.add_argument("--all-vaults", action="store_true",
+                   help="во всех хранилищах реестра, общий список по убыванию соответствия")
+    p.add_argument("--limit", type=int)
+    p.set_defaults(handler=cmd_search)
+
+    p = commands.add_parser("match", help="записи для адреса сайта (по убыванию соответствия)")
+    p.add_argument("url")
+    p.add_argument("--limit", type=int)
+    p.set_defaults(handler=cmd_match)
+
+    p = commands.add_parser("get", help="запись по ID")
+    p.add_argument("id", type=int)
+    p.add_argument("--field", action="append",
+                   help="только это поле (можно несколько раз), например password")
+    p.set_defaults(handler=cmd_get)
+
+    p = commands.add_parser("add", help="добавить запись")
+    p.add_argument("--title", required=True)
+    p.add_argument("--username", default="")
+    p.add_argument("--url", default="")
+    p.add_argument("--category", default="")
+    p.add_argument("--notes", default="")
+    p.add_argument("--folder")
+    p.add_argument("--generate", action="store_true", help="сгенерировать пароль")
+    p.add_argument("--length", type=int, default=20)
+    p.add_argument("--show", action="store_true", help="вывести сгенерированный пароль")
+    p.set_defaults(handler=cmd_add)
+
+    p = commands.add_parser("export", help="выгрузка записей в NDJSON")
+    p.add_argument("--output", "-o")
+    p.add_argument("--include-passwords", action="store_true")
+    p.set_defaults(handler=cmd_export)
+
+    p = commands.add_parser("import", help="импорт: CSV, KeePass XML, Bitwarden, 1Password, EVOLS")
+    p.add_argument("file")
+    p.add_argument("--format", help="формат (по умолчанию определяется по файлу): "
+                                    "csv, keepass, bitwarden, 1password, evols")
+    p.add_argument("--dry-run", action="store_true", help="только разобрать и сравнить с хранилищем")
+    p.add_argument("--policy", choices=("keep", "update", "overwrite", "duplicate"), default="update",
+                   help="изменённые записи: keep - не трогать, update - обновлять более новыми, "
+                        "overwrite - обновлять всегда, duplicate - добавлять копией")
+    p.add_argument("--progress", action="store_true", help="прогресс в stderr")
+    p.set_defaults(handler=cmd_import)
+
+    p = commands.add_parser("backup", help="резервная копия базы и файлов ключей")
+    p.add_argument("--output", "-o", help="каталог копии")
+    p.set_defaults(handler=cmd_backup)
+
+    p = commands.add_parser("pack", help="хранилище одним файлом-контейнером")
+    p.add_argument("output", help="файл контейнера (.evolsv)")
+    p.set_defaults(handler=cmd_pack)
+
+    p = commands.add_parser("unpack", help="восстановить хранилище из контейнера")
+    p.add_argument("container")
+    p.add_argument("--into", help="каталог хранилища (по умолчанию - текущее хранилище)")
+    p.set_defaults(handler=cmd_unpack)
+
+    p = commands.add_parser("sync", help="синхронизация с копией хранилища на другой машине")
+    p.add_argument("other", help="файл базы другой копии")
+    p.set_defaults(handler=cmd_sync)
+
+    p = commands.add_parser("vaults", help="список хранилищ; --add / --remove")
+    p.add_argument("--add", metavar="NAME", help="создать хранилище (или зарегистрировать каталог --path)")
+    p.add_argument("--path", help="каталог хранилища для --add")
+    p.add_argument("--remove", metavar="NAME", help="убрать из списка (файлы не удаляются)")
+    p.set_defaults(handler=cmd_vaults)
+
+    p = commands.add_parser("audit", help="проверка надёжности, утечек и повторов")
+    p.add_argument("--all", action="store_true", help="выводить и надёжные пароли")
+    p.set_defaults(handler=cmd_audit)
+
+    p = commands.add_parser("rekey", help="смена мастер-пароля")
+    p.add_argument("--progress", action="store_true", help="прогресс в stderr")
+    p.set_defaults(handler=cmd_rekey)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    secrets = _Secrets(args.password_stdin)
+    try:
+        select_vault(args)
+        args.handler(args, secrets)
+    except CliError as e:
+        return emit_error(str(e))
+    except KeyboardInterrupt:
+        return emit_error("Прервано")
+    except BrokenPipeError:
+        # Вывод оборван (например, | head) - это не ошибка
+        sys.stderr.close()
+        return 0
+    except Exception as e:
+        from main.encryption import InvalidToken
+        if isinstance(e, InvalidToken):
+            return emit_error("Неверный мастер-пароль", EXIT_BAD_PASSWORD)
+        from main.agent_client import AgentError
+        if isinstance(e, AgentError):
+            return emit_error(str(e))
+        return emit_error(f"{type(e).__name__}: {e}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,9 @@
 import customtkinter as ctk
 from tkinter import messagebox
-import random
-import string
-import re
 
+from utils.password_audit import get_engine as get_audit_engine, BREACHED
+from utils.strength_estimator import get_estimator
+from utils.password_generator import get_generator, PasswordPolicy
 
 
 class GlobalHotkeys:
@@ -144,58 +144,54 @@ class PasswordStrengthIndicator:
 
     @staticmethod
     def check_strength(password):
-        """Возвращает оценку и цвет"""
+        """Возвращает оценку и цвет (модель оценки - utils.password_audit)"""
         if not password:
             return 0, ModernDesign.TEXT_MUTED, "Введите пароль"
 
-        score = 0
-        feedback = []
-
-        # Длина
-        if len(password) >= 8:
-            score += 25
-        else:
-            feedback.append("минимум 8 символов")
-
-        if len(password) >= 12:
-            score += 15
-
-        # Разнообразие символов
-        if re.search(r'[a-z]', password):
-            score += 15
-        else:
-            feedback.append("строчные буквы")
-
-        if re.search(r'[A-Z]', password):
-            score += 15
-        else:
-            feedback.append("заглавные буквы")
-
-        if re.search(r'\d', password):
-            score += 15
-        else:
-            feedback.append("цифры")
-
-        if re.search(r'[!@#$%^&*()_+\-=\[\]{};:\',.<>?]', password):
-            score += 15
-        else:
-            feedback.append("спецсимволы")
+        result = get_audit_engine().audit((password,))
+        score = result.scores[0]
+        feedback = result.feedback(0)
 
-        # Определяем уровень
+        # Уровень по границам оценщика: 0-1 слабый, 2 средний, 3-4 сильный
         if score < 40:
             color = ModernDesign.DANGER
             level = "Слабый"
-        elif score < 70:
+        elif score < 60:
             color = ModernDesign.WARNING
             level = "Средний"
         else:
             color = ModernDesign.SUCCESS
             level = "Сильный"
 
-        hint = f"{level} • Добавьте: {', '.join(feedback[:2])}" if feedback else level
+        if result.flags[0] & BREACHED:
+            hint = f"{level} • Найден в базе утечек"
+        else:
+            hint = f"{level} • {feedback[0]}" if feedback else level
 
         return score, color, hint
 
+    # Цвет и значок для оценок 0-4 оценщика стойкости
+    ESTIMATE_STYLES = (
+        (ModernDesign.DANGER, "🔴"),
+        (ModernDesign.DANGER, "🔴"),
+        (ModernDesign.WARNING, "🟡"),
+        (ModernDesign.SUCCESS, "🟢"),
+        (ModernDesign.SUCCESS, "🟢"),
+    )
+    # 10^14 попыток - полная шкала
+    FULL_BAR_LOG10 = 14
+
+    @staticmethod
+    def estimate(password, user_inputs=()):
+        """Оценка числа попыток подбора (utils.strength_estimator)"""
+        return get_estimator().estimate(password, user_inputs)
+
+    @staticmethod
+    def is_breached(password):
+        """Проверка по офлайн-индексу утечек (если он построен)"""
+        breach_index = get_audit_engine().breach_index
+        return breach_index is not None and breach_index.contains(password)
+
 
 class ToastNotification:
     """Красивые toast-уведомления"""
@@ -289,6 +285,9 @@ class AddPasswordWindow:
         # Создаем интерфейс
         self.setup_ui()
 
+        # Словари оценщика загружаются заранее, до первого нажатия клавиши
+        self.window.after_idle(get_estimator)
+
     def center_window(self):
         """Центрирует окно относительно родительского окна."""
         self.window.update_idletasks()
@@ -577,41 +576,28 @@ class AddPasswordWindow:
                 strength_container.pack(fill="x", pady=(8, 0))
                 self.strength_visible = True
 
-            score, color, hint = PasswordStrengthIndicator.check_strength(password)
-            
-            self.strength_bar.set(score / 100)
+            # Оценка по шаблонам (словари, ряды клавиш, даты, повторы)
+            estimate = PasswordStrengthIndicator.estimate(
+                password, (self.title_var.get(), self.username_var.get())
+            )
+            color, emoji = PasswordStrengthIndicator.ESTIMATE_STYLES[estimate.score]
+
+            self.strength_bar.set(min(estimate.guesses_log10 / PasswordStrengthIndicator.FULL_BAR_LOG10, 1))
             self.strength_bar.configure(progress_color=color)
-            
-            if score < 40:
-                level = "Слабый"
-                emoji = "🔴"
-            elif score < 70:
-                level = "Средний"
-                emoji = "🟡"
-            else:
-                level = "Сильный"
-                emoji = "🟢"
-            
-            length = len(password)
-            has_lower = bool(re.search(r'[a-z]', password))
-            has_upper = bool(re.search(r'[A-Z]', password))
-            has_digit = bool(re.search(r'\d', password))
-            has_special = bool(re.search(r'[!@#$%^&*()_+\-=\[\]{};:\',.<>?]', password))
-            
-            missing = []
-            if length < 12: missing.append("длина")
-            if not has_lower: missing.append("a-z")
-            if not has_upper: missing.append("A-Z")
-            if not has_digit: missing.append("0-9")
-            if not has_special: missing.append("!@#")
-            
-            if missing:
-                hint_text = f"Добавьте: {', '.join(missing)}"
+
+            if PasswordStrengthIndicator.is_breached(password):
+                emoji = "⛔"
+                color = ModernDesign.DANGER
+                hint_text = "Найден в базе утечек, выберите другой"
+            elif estimate.warning:
+                hint_text = estimate.warning
+            elif estimate.score >= 3:
+                hint_text = f"Подбор займёт {estimate.crack_time_display()}"
             else:
-                hint_text = "Отличный пароль!"
-            
+                hint_text = estimate.suggestions[0]
+
             self.strength_label.configure(
-                text=f"{emoji} {level} • {hint_text}",
+                text=f"{emoji} {estimate.level} • {hint_text}",
                 text_color=color
             )
 
@@ -708,14 +694,16 @@ class AddPasswordWindow:
         return field_card
 
     def generate_password(self):
-        """Генерирует случайный пароль"""
-        length = 16
-        chars = string.ascii_letters + string.digits + "!@#$%^&*()_+-="
-
-        password = ''.join(random.choice(chars) for _ in range(length))
+        """Генерирует случайный пароль (криптостойкий ГСЧ, utils.password_generator)"""
+        policy = PasswordPolicy(length=16)
+        password = get_generator().generate(policy)
         self.password_var.set(password)
 
-        ToastNotification.show(self.window, f"Сгенерирован пароль ({length} символов)", "success")
+        ToastNotification.show(
+            self.window,
+            f"Сгенерирован пароль ({policy.length} символов, {policy.entropy_bits():.0f} бит)",
+            "success"
+        )
 
     def test_password_strength(self):
         """Проверяет надежность пароля"""
@@ -725,24 +713,23 @@ class AddPasswordWindow:
             ToastNotification.show(self.window, "Сначала введите пароль", "warning")
             return
 
-        score, color, hint = PasswordStrengthIndicator.check_strength(password)
+        estimate = PasswordStrengthIndicator.estimate(
+            password, (self.title_var.get(), self.username_var.get())
+        )
 
         # Детальное сообщение
         feedback = []
-        if len(password) < 8:
-            feedback.append("• Увеличьте длину до 8+ символов")
-        if not re.search(r'[a-z]', password):
-            feedback.append("• Добавьте строчные буквы (a-z)")
-        if not re.search(r'[A-Z]', password):
-            feedback.append("• Добавьте заглавные буквы (A-Z)")
-        if not re.search(r'\d', password):
-            feedback.append("• Добавьте цифры (0-9)")
-        if not re.search(r'[!@#$%^&*()_+\-=\[\]{};:\',.<>?]', password):
-            feedback.append("• Добавьте спецсимволы (!@#$%...)")
-
-        level = "Отличный" if score >= 80 else "Хороший" if score >= 60 else "Средний" if score >= 40 else "Слабый"
-
-        message = f"Уровень: {level} ({score}/100)\n"
+        if PasswordStrengthIndicator.is_breached(password):
+            feedback.append("• Пароль найден в базе утечек - смените его")
+        if estimate.warning:
+            feedback.append(f"• {estimate.warning}")
+        feedback.extend(f"• {suggestion}" for suggestion in estimate.suggestions)
+
+        message = (
+            f"Уровень: {estimate.level} ({estimate.score}/4)\n"
+            f"Попыток для подбора: ~10^{estimate.guesses_log10:.0f}\n"
+            f"Время офлайн-подбора: {estimate.crack_time_display()}\n"
+        )
         if feedback:
             message += "\nРекомендации:\n" + "\n".join(feedback)
         else:
@@ -1,8 +1,10 @@
 import customtkinter as ctk
-from tkinter import messagebox
+from tkinter import messagebox, filedialog, simpledialog
 import os
 import re
 
+from utils.password_audit import get_engine as get_audit_engine
+
 
 # === СОВРЕМЕННАЯ СИСТЕМА ДИЗАЙНА (единая с main_window) ===
 class ModernDesign:
@@ -53,55 +55,26 @@ class PasswordStrengthIndicator:
 
     @staticmethod
     def check_strength(password):
-        """Возвращает оценку и цвет"""
+        """Возвращает оценку и цвет (модель оценки - utils.password_audit)"""
         if not password:
             return 0, ModernDesign.TEXT_MUTED, "Введите пароль"
 
-        score = 0
-        feedback = []
-
-        # Длина
-        if len(password) >= 8:
-            score += 25
-        else:
-            feedback.append("минимум 8 символов")
+        result = get_audit_engine().audit((password,))
+        score = result.scores[0]
+        feedback = result.feedback(0)
 
-        if len(password) >= 12:
-            score += 15
-
-        # Разнообразие символов
-        if re.search(r'[a-z]', password):
-            score += 15
-        else:
-            feedback.append("строчные буквы")
-
-        if re.search(r'[A-Z]', password):
-            score += 15
-        else:
-            feedback.append("заглавные буквы")
-
-        if re.search(r'\d', password):
-            score += 15
-        else:
-            feedback.append("цифры")
-
-        if re.search(r'[!@#$%^&*()_+\-=\[\]{};:\',.<>?]', password):
-            score += 15
-        else:
-            feedback.append("спецсимволы")
-
-        # Определяем уровень
+        # Уровень по границам оценщика: 0-1 слабый, 2 средний, 3-4 сильный
         if score < 40:
             color = ModernDesign.DANGER
             level = "Слабый"
-        elif score < 70:
+        elif score < 60:
             color = ModernDesign.WARNING
             level = "Средний"
         else:
             color = ModernDesign.SUCCESS
             level = "Сильный"
 
-        hint = f"{level} • Добавьте: {', '.join(feedback[:2])}" if feedback else level
+        hint = f"{level} • {feedback[0]}" if feedback else level
 
         return score, color, hint
 
@@ -254,6 +227,8 @@ class LoginFrame:
             wraplength=400
         ).pack(pady=(0, 15), padx=30)
 
+        self._create_vault_selector(content)
+
         # Кнопка создания
         ctk.CTkButton(
             content,
@@ -646,6 +621,55 @@ class LoginFrame:
 
         confirm_input.bind("<Return>", lambda e: create_vault())
 
+    def _create_vault_selector(self, parent):
+        """Выбор хранилища из реестра и создание нового"""
+        from main.vaults import get_registry
+
+        new_vault_label = "➕ Новое хранилище..."
+        current = self.app.vault_info.name
+        names = [info.name for info in get_registry().list()]
+
+        def on_select(choice):
+            if choice != new_vault_label:
+                if choice != current:
+                    self.app.switch_vault(choice)
+                return
+
+            selector.set(current)
+            name = simpledialog.askstring("Новое хранилище", "Название хранилища:", parent=self.root)
+            if not name:
+                return
+            try:
+                self.app.add_vault(name)
+            except Exception as e:
+                ToastNotification.show(self.root, str(e), "error")
+
+        selector = ctk.CTkOptionMenu(
+            parent,
+            values=names + [new_vault_label],
+            command=on_select,
+            font=ModernDesign.get_body_font(),
+            fg_color=ModernDesign.BG_HOVER,
+            button_color=ModernDesign.PRIMARY,
+            button_hover_color=ModernDesign.PRIMARY_DARK,
+            dropdown_fg_color=ModernDesign.BG_CARD,
+            corner_radius=8,
+            width=400,
+            height=38
+        )
+        selector.set(current)
+        selector.pack(pady=(0, 20))
+
+    @staticmethod
+    def _has_keyfile_slot():
+        from main.keyslots import KeySlots, SLOT_KEYFILE, has_keyslots
+
+        try:
+            return has_keyslots() and KeySlots.load().has(SLOT_KEYFILE)
+        except Exception as e:
+            print(f"Не удалось прочитать слоты ключей: {e}")
+            return False
+
     def show_login_screen(self):
         """Экран входа в существующий vault"""
         self.clear_frame()
@@ -685,6 +709,8 @@ class LoginFrame:
             text_color=ModernDesign.TEXT_SECONDARY
         ).pack(pady=(5, 40))
 
+        self._create_vault_selector(content)
+
         # Поле пароля с кнопкой показа
         password_section = ctk.CTkFrame(content, fg_color=ModernDesign.BG_HOVER, corner_radius=12)
         password_section.pack(fill="x", pady=(0, 30))
@@ -719,6 +745,26 @@ class LoginFrame:
             corner_radius=12
         ).pack()
 
+        # Вход по ключевому файлу, если он включён в настройках
+        if self._has_keyfile_slot():
+            def do_keyfile_login():
+                keyfile_path = filedialog.askopenfilename(title="Ключевой файл")
+                if keyfile_path:
+                    self.app.login_with_password(None, keyfile_path)
+
+            ctk.CTkButton(
+                content,
+                text="📄 Войти с ключевым файлом",
+                command=do_keyfile_login,
+                font=ModernDesign.get_body_font(),
+                height=36,
+                width=400,
+                fg_color="transparent",
+                hover_color=ModernDesign.BG_HOVER,
+                text_color=ModernDesign.TEXT_SECONDARY,
+                corner_radius=12
+            ).pack(pady=(10, 0))
+
         # Информация внизу
         info_frame = ctk.CTkFrame(content, fg_color="transparent")
         info_frame.pack(pady=(30, 0))
@@ -1,9 +1,13 @@
 import customtkinter as ctk
-from tkinter import messagebox, simpledialog
+from tkinter import messagebox, simpledialog, filedialog
 import os
 import json
 from functools import partial
 
+from main import url_index
+from main.settings_store import get_settings
+from main.snapshot import FirstScreenSnapshot, load_snapshot, save_snapshot
+
 
 # ==================== ГЛОБАЛЬНЫЕ ГОРЯЧИЕ КЛАВИШИ ====================
 
@@ -257,62 +261,85 @@ class ToastNotification:
 class FolderManager:
     """Управление папками для организации паролей"""
 
-    def __init__(self):
+    DEFAULT_FOLDERS = ["Все пароли", "Работа", "Личное", "Финансы"]
+
+    def __init__(self, db):
+        self.db = db
+        # Файл прежних версий (в текущем каталоге) - переносится в базу
         self.folders_file = "folders.json"
         self.folders = self.load_folders()
 
     def load_folders(self):
-        """Загружает список папок из файла"""
+        """Загружает список папок из базы (при первом запуске - из старого файла)"""
+        folders = self.db.get_folder_list()
+        if folders is None:
+            legacy = self._load_legacy_folders()
+
+            def migrate(stored):
+                # Другой процесс мог успеть перенести список
+                if stored:
+                    return False
+                stored.extend(legacy)
+                return True
+            self.db.change_folder_list(migrate)
+            folders = self.db.get_folder_list() or legacy
+
+        # Гарантируем наличие папки "Все пароли"
+        if "Все пароли" not in folders:
+            folders.insert(0, "Все пароли")
+        return folders
+
+    def _load_legacy_folders(self):
         try:
             if os.path.exists(self.folders_file):
                 with open(self.folders_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    # Гарантируем наличие папки "Все пароли"
-                    if "Все пароли" not in data:
-                        data.insert(0, "Все пароли")
-                    return data
-            else:
-                return ["Все пароли", "Работа", "Личное", "Финансы"]
+                    return json.load(f)
         except Exception as e:
             print(f"Ошибка загрузки папок: {e}")
-            return ["Все пароли", "Работа", "Личное", "Финансы"]
+        return self.DEFAULT_FOLDERS[:]
 
-    def save_folders(self):
-        """Сохраняет список папок в файл"""
-        try:
-            with open(self.folders_file, 'w', encoding='utf-8') as f:
-                json.dump(self.folders, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"Ошибка сохранения папок: {e}")
+    def _modify(self, change, move=None):
+        """
+        Изменяет список папок в базе: change(folders) получает свежий список
+        (его мог изменить другой процесс) и возвращает True, если есть что
+        сохранить; move=(old, new) переносит записи в той же транзакции.
+        """
+        saved = self.db.change_folder_list(change, move)
+        self.folders = self.load_folders()
+        return saved
 
     def add_folder(self, folder_name):
         """Добавляет новую папку"""
-        if folder_name and folder_name not in self.folders:
-            self.folders.append(folder_name)
-            self.save_folders()
-            return True
-        return False
+        def change(folders):
+            if folder_name and folder_name not in folders:
+                folders.append(folder_name)
+                return True
+            return False
+        return self._modify(change)
 
     def rename_folder(self, old_name, new_name):
-        """Переименовывает папку"""
+        """Переименовывает папку вместе с папкой у её паролей"""
         if old_name == "Все пароли":
             return False
-        if old_name in self.folders and new_name not in self.folders:
-            idx = self.folders.index(old_name)
-            self.folders[idx] = new_name
-            self.save_folders()
-            return True
-        return False
+
+        def change(folders):
+            if old_name in folders and new_name not in folders:
+                folders[folders.index(old_name)] = new_name
+                return True
+            return False
+        return self._modify(change, move=(old_name, new_name))
 
     def delete_folder(self, folder_name):
-        """Удаляет папку"""
+        """Удаляет папку; её пароли переходят в "Все пароли" """
         if folder_name == "Все пароли":
             return False
-        if folder_name in self.folders:
-            self.folders.remove(folder_name)
-            self.save_folders()
-            return True
-        return False
+
+        def change(folders):
+            if folder_name in folders:
+                folders.remove(folder_name)
+                return True
+            return False
+        return self._modify(change, move=(folder_name, None))
 
     def get_folders(self):
         """Возвращает список папок"""
@@ -344,7 +371,10 @@ class AutoHideScrollableFrame(ctk.CTkScrollableFrame):
 class MainWindow:
     """Главное окно менеджера паролей с системой папок"""
 
-    def __init__(self, root, db, encryptor):
+    # Размер первой страницы: рисуется сразу и сохраняется в снимок
+    FIRST_PAGE_SIZE = 20
+
+    def __init__(self, root, db, encryptor, initial_rows=None):
         """
         Инициализация главного окна
 
@@ -352,6 +382,8 @@ class MainWindow:
             root: Корневое окно приложения
             db: Объект базы данных
             encryptor: Объект для шифрования/дешифрования
+            initial_rows: Строки get_all_passwords(), прочитанные заранее
+                во время вывода ключа (необязательно)
         """
         self.root = root
         self.db = db
@@ -363,7 +395,9 @@ class MainWindow:
 
         # Таймер автоблокировки
         self.idle_timer_id = None
-        self.idle_timeout = 5 * 60 * 1000
+        self.idle_timeout = 0
+        self.cache_purge_id = None
+        self._unsubscribe_auto_lock = None
 
         # Оптимизация: debounce для поиска
         self.search_debounce_timer = None
@@ -371,9 +405,12 @@ class MainWindow:
         # Оптимизация: кэширование паролей
         self.passwords_cache = []
         self.cache_valid = False
+        if initial_rows is not None:
+            self.passwords_cache = list(initial_rows)
+            self.cache_valid = True
 
         # Виртуализация списка
-        self.visible_passwords_count = 20
+        self.visible_passwords_count = self.FIRST_PAGE_SIZE
         self.current_passwords = []
 
         # Поиск
@@ -384,10 +421,18 @@ class MainWindow:
         self.bound_events = []
 
         # ✨ Менеджер папок
-        self.folder_manager = FolderManager()
+        self.folder_manager = FolderManager(self.db)
         self.current_folder = "Все пароли"
         self.folder_buttons = {}
 
+        # Снимок первого экрана с прошлого запуска (последняя папка + первая страница)
+        self.snapshot = load_snapshot(self.encryptor)
+        if self.snapshot and self.snapshot.folder in self.folder_manager.get_folders():
+            self.current_folder = self.snapshot.folder
+        else:
+            self.snapshot = None
+        self._saved_snapshot = self.snapshot
+
         # Настройка темной темы
         ctk.set_appearance_mode("dark")
 
@@ -413,6 +458,8 @@ class MainWindow:
         # Настройка горячих клавиш
         GlobalHotkeys.setup(self.root)
 
+        self.start_cache_purge()
+
     # ==================== УПРАВЛЕНИЕ ЖИЗНЕННЫМ ЦИКЛОМ ====================
 
     def on_closing(self):
@@ -421,9 +468,12 @@ class MainWindow:
             self.root.after_cancel(self.idle_timer_id)
         if self.search_debounce_timer:
             self.root.after_cancel(self.search_debounce_timer)
+        self.stop_cache_purge()
 
         self.cleanup_bound_events()
         ToastNotification.cleanup_all()
+        self.release_settings()
+        self.settings.flush()
 
         if self.add_password_window:
             try:
@@ -439,28 +489,21 @@ class MainWindow:
         self.root.destroy()
 
     def load_settings(self):
-        """Загружает настройки приложения из файла"""
-        try:
-            import json
-            if os.path.exists("app_settings.json"):
-                with open("app_settings.json", "r", encoding="utf-8") as f:
-                    settings = json.load(f)
-                    auto_lock_time = settings.get("auto_lock_time", 5)
-
-                    if isinstance(auto_lock_time, str):
-                        try:
-                            auto_lock_time = int(auto_lock_time) if auto_lock_time.isdigit() else 5
-                        except (ValueError, AttributeError):
-                            auto_lock_time = 5
-                    elif not isinstance(auto_lock_time, (int, float)):
-                        auto_lock_time = 5
-
-                    self.idle_timeout = auto_lock_time * 60 * 1000
-            else:
-                self.idle_timeout = 5 * 60 * 1000
-        except Exception as e:
-            print(f"Ошибка при загрузке настроек: {e}")
-            self.idle_timeout = 5 * 60 * 1000
+        """Берёт настройки из общего хранилища и подписывается на изменения"""
+        self.settings = get_settings()
+        self.idle_timeout = self.settings.auto_lock_ms
+        self._unsubscribe_auto_lock = self.settings.subscribe("auto_lock_time", self.on_auto_lock_changed)
+
+    def on_auto_lock_changed(self, key, value):
+        """Применяет новый таймаут автоблокировки сразу после сохранения настроек"""
+        self.idle_timeout = self.settings.auto_lock_ms
+        self.setup_idle_timer()
+
+    def release_settings(self):
+        """Отписывает окно от изменений настроек"""
+        if self._unsubscribe_auto_lock:
+            self._unsubscribe_auto_lock()
+            self._unsubscribe_auto_lock = None
 
     # ==================== АВТОБЛОКИРОВКА ====================
 
@@ -475,13 +518,38 @@ class MainWindow:
         """Сбрасывает таймер при активности пользователя"""
         self.setup_idle_timer()
 
+    def start_cache_purge(self):
+        """Периодически затирает просроченные расшифрованные значения, пока окно открыто"""
+        from main.entry_cache import PURGE_INTERVAL_SECONDS, purge_expired_plaintext
+
+        def tick():
+            purge_expired_plaintext()
+            self.cache_purge_id = self.root.after(PURGE_INTERVAL_SECONDS * 1000, tick)
+
+        self.stop_cache_purge()
+        self.cache_purge_id = self.root.after(PURGE_INTERVAL_SECONDS * 1000, tick)
+
+    def stop_cache_purge(self):
+        """Останавливает очистку кэша (блокировка, закрытие)"""
+        if self.cache_purge_id:
+            try:
+                self.root.after_cancel(self.cache_purge_id)
+            except Exception:
+                pass
+            self.cache_purge_id = None
+
     def lock_application(self):
         """Блокирует приложение и показывает окно разблокировки"""
+        from main.entry_cache import clear_plaintext_cache
+        clear_plaintext_cache()
+        self.stop_cache_purge()
+
         self.root.withdraw()
 
         def on_unlock_success():
             self.root.deiconify()
             self.setup_idle_timer()
+            self.start_cache_purge()
 
         def on_unlock_cancel():
             self.on_closing()
@@ -763,6 +831,19 @@ class MainWindow:
                     )
                     rename_btn.grid(row=0, column=2, padx=5, pady=10)
 
+                    # Кнопка смены всех паролей папки
+                    rotate_btn = ctk.CTkButton(
+                        folder_card,
+                        text="🔄",
+                        command=partial(self.rotate_folder_passwords, folder, manage_window),
+                        width=35,
+                        height=35,
+                        fg_color=ModernDesign.WARNING,
+                        hover_color=ModernDesign.BG_HOVER,
+                        corner_radius=8
+                    )
+                    rotate_btn.grid(row=0, column=3, padx=5, pady=10)
+
                     # Кнопка удаления
                     delete_btn = ctk.CTkButton(
                         folder_card,
@@ -774,7 +855,7 @@ class MainWindow:
                         hover_color="#C62828",
                         corner_radius=8
                     )
-                    delete_btn.grid(row=0, column=3, padx=5, pady=10)
+                    delete_btn.grid(row=0, column=4, padx=5, pady=10)
 
         def add_new_folder():
             folder_name = simpledialog.askstring(
@@ -805,9 +886,6 @@ class MainWindow:
                     if self.current_folder == old_name:
                         self.current_folder = new_name
 
-                    # Обновляем папки у всех паролей в БД
-                    self.db.rename_password_folder(old_name, new_name)
-
                     refresh_folder_list()
                     self.load_folder_buttons()
                     self.invalidate_cache()
@@ -825,9 +903,6 @@ class MainWindow:
 
             if result:
                 if self.folder_manager.delete_folder(folder_name):
-                    # Перемещаем пароли в "Все пароли"
-                    self.db.move_passwords_from_folder(folder_name, None)
-
                     # Если удалена текущая папка, переключаемся на "Все пароли"
                     if self.current_folder != "Все пароли":
                         passwords = [
@@ -856,6 +931,69 @@ class MainWindow:
         )
         add_btn.grid(row=2, column=0, sticky="ew", padx=20, pady=(10, 20))
 
+    def rotate_folder_passwords(self, folder_name, parent):
+        """Генерирует новые пароли для всех записей папки (в фоновом потоке)"""
+        from main.rotation import RotationJob
+
+        count = len(self.db.select_for_rotation(folder=folder_name))
+        if not count:
+            ToastNotification.show(parent, f"В папке '{folder_name}' нет паролей", "warning")
+            return
+
+        confirmed = messagebox.askyesno(
+            "Сменить пароли?",
+            f"Сгенерировать новые пароли для {count} записей папки '{folder_name}'?\n\n"
+            "Прежние пароли сохранятся в истории, будет создан зашифрованный отчёт.",
+            parent=parent
+        )
+        if not confirmed:
+            return
+
+        progress_window = ctk.CTkToplevel(parent)
+        progress_window.title("Смена паролей")
+        progress_window.geometry("380x140")
+        progress_window.configure(fg_color=ModernDesign.BG_DARK)
+        progress_window.transient(parent)
+
+        status_label = ctk.CTkLabel(
+            progress_window,
+            text=f"🔄 Смена паролей: 0 / {count}",
+            font=("Segoe UI", 13),
+            text_color=ModernDesign.TEXT_PRIMARY
+        )
+        status_label.pack(padx=20, pady=(25, 10))
+
+        progress_bar = ctk.CTkProgressBar(progress_window, progress_color=ModernDesign.PRIMARY)
+        progress_bar.pack(fill="x", padx=20)
+        progress_bar.set(0)
+
+        job = RotationJob(self.db.db_path, self.encryptor, folder=folder_name).start()
+
+        def poll():
+            done, total = job.progress
+            if total:
+                progress_bar.set(done / total)
+                status_label.configure(text=f"🔄 Смена паролей: {done} / {total}")
+
+            if not job.done():
+                progress_window.after(100, poll)
+                return
+
+            progress_window.destroy()
+            if job.error:
+                messagebox.showerror("Ошибка", f"Пароли не изменены: {job.error}", parent=parent)
+                return
+
+            self.invalidate_cache()
+            self.load_passwords()
+            ToastNotification.show(
+                parent,
+                f"Обновлено паролей: {len(job.rotated)}. Отчёт сохранён",
+                "success"
+            )
+
+        progress_window.after(100, poll)
+
     def _create_main_panel(self, parent):
         """Создает основную панель с паролями"""
         main_panel = ctk.CTkFrame(parent, fg_color=ModernDesign.BG_DARK)
@@ -880,7 +1018,15 @@ class MainWindow:
         self.password_container.grid(row=2, column=0, sticky="nsew")
         self.password_container.grid_columnconfigure(0, weight=1)
 
-        self.load_passwords()
+        if self.snapshot:
+            # Первый экран из снимка рисуется сразу, живой список сверяется в фоне
+            self._render_snapshot()
+            self.root.after_idle(self._reconcile_snapshot)
+        elif self.cache_valid:
+            # Строки уже прочитаны при входе - рисуем без индикатора загрузки
+            self._load_passwords_async()
+        else:
+            self.load_passwords()
 
     def _create_search_bar(self, parent):
         """Создает строку поиска"""
@@ -1004,7 +1150,7 @@ class MainWindow:
     def invalidate_cache(self):
         """Сбрасывает кеш паролей"""
         self.cache_valid = False
-        self.visible_passwords_count = 20
+        self.visible_passwords_count = self.FIRST_PAGE_SIZE
 
     # ==================== ЗАГРУЗКА ПАРОЛЕЙ ====================
 
@@ -1041,28 +1187,40 @@ class MainWindow:
 
         self.root.update_idletasks()
 
+    def _filter_passwords(self, search_term=""):
+        """Фильтрует кеш по текущей папке и поисковому запросу"""
+        if not self.cache_valid:
+            self.passwords_cache = self.db.get_all_passwords()
+            self.cache_valid = True
+
+        passwords = self.passwords_cache[:]
+
+        # ✨ Фильтрация по папке
+        if self.current_folder != "Все пароли":
+            passwords = [p for p in passwords if p[6] == self.current_folder]
+
+        # Фильтрация по поисковому запросу
+        if search_term:
+            # Запрос-адрес: сначала записи этого сайта по индексу адресов
+            url_rank = {}
+            if url_index.looks_like_url(search_term):
+                url_rank = {match['id']: i for i, match in enumerate(self.db.find_by_url(search_term))}
+            passwords = [
+                p for p in passwords
+                if p[0] in url_rank or search_term in p[1].lower() or (p[2] and search_term in p[2].lower())
+            ]
+            if url_rank:
+                passwords.sort(key=lambda p: url_rank.get(p[0], len(url_rank)))
+
+        return passwords
+
     def _load_passwords_async(self):
         """Асинхронная загрузка паролей"""
         try:
             self.cleanup_bound_events()
 
-            if not self.cache_valid:
-                self.passwords_cache = self.db.get_all_passwords()
-                self.cache_valid = True
-
-            passwords = self.passwords_cache[:]
-
-            # ✨ Фильтрация по папке
-            if self.current_folder != "Все пароли":
-                passwords = [p for p in passwords if p[6] == self.current_folder]
-
-            # Фильтрация по поисковому запросу
             search_term = self.search_var.get().lower()
-            if search_term:
-                passwords = [
-                    p for p in passwords 
-                    if search_term in p[1].lower() or (p[2] and search_term in p[2].lower())
-                ]
+            passwords = self._filter_passwords(search_term)
 
             self.current_passwords = passwords
 
@@ -1072,6 +1230,9 @@ class MainWindow:
             for widget in self.password_container.winfo_children():
                 widget.destroy()
 
+            if not search_term:
+                self._remember_first_page(passwords)
+
             if not passwords:
                 self._show_empty_state(search_term)
                 return
@@ -1090,11 +1251,11 @@ class MainWindow:
             ToastNotification.show(self.root, f"Ошибка: {e}", "error")
 
     def _create_password_cards_progressive(self, passwords, index):
-        """Создает карточки паролей постепенно (по 5 штук)"""
+        """Создает карточки паролей: первый экран сразу, остальные - по 5 штук"""
         if index >= len(passwords):
             return
 
-        batch_size = 5
+        batch_size = self.FIRST_PAGE_SIZE if index == 0 else 5
         end_index = min(index + batch_size, len(passwords))
 
         for i in range(index, end_index):
@@ -1104,6 +1265,61 @@ class MainWindow:
         if end_index < len(passwords):
             self.root.after(10, lambda: self._create_password_cards_progressive(passwords, end_index))
 
+    # ==================== СНИМОК ПЕРВОГО ЭКРАНА ====================
+
+    def _render_snapshot(self):
+        """Синхронно рисует первую страницу из снимка (без запроса к БД)"""
+        if self.cache_valid:
+            # Без кеша статистику дорисует сверка
+            self.update_header_stats()
+
+        for widget in self.password_container.winfo_children():
+            widget.destroy()
+
+        self.password_ids = []
+        if not self.snapshot.rows:
+            self._show_empty_state("")
+            return
+
+        for i, (id, title, category) in enumerate(self.snapshot.rows):
+            self._create_password_card(i, id, title, category)
+
+    def _reconcile_snapshot(self):
+        """Сверяет снимок с живым запросом и перерисовывает только при расхождении"""
+        snapshot, self.snapshot = self.snapshot, None
+        try:
+            if not self.password_container.winfo_exists():
+                return
+            if self.search_var.get():
+                # Пользователь уже начал поиск - список обновит debounce
+                return
+
+            passwords = self._filter_passwords()
+            first_page = [tuple(p[:3]) for p in passwords[:self.FIRST_PAGE_SIZE]]
+
+            if snapshot.rows != first_page:
+                self._load_passwords_async()
+                return
+
+            self.current_passwords = passwords
+            self.update_header_stats()
+            if len(passwords) > self.visible_passwords_count:
+                self._show_load_more_button(len(passwords) - self.visible_passwords_count)
+        except Exception as e:
+            print(f"Ошибка сверки снимка: {e}")
+            self.load_passwords()
+
+    def _remember_first_page(self, passwords):
+        """Обновляет снимок, если первая страница текущей папки изменилась"""
+        first_page = [tuple(p[:3]) for p in passwords[:self.FIRST_PAGE_SIZE]]
+        last = self._saved_snapshot
+        if last and last.matches(self.current_folder, first_page):
+            return
+
+        snapshot = FirstScreenSnapshot(self.current_folder, first_page)
+        if save_snapshot(self.encryptor, snapshot):
+            self._saved_snapshot = snapshot
+
     def _create_password_card(self, row_index, id, title, category):
         """Создает одну карточку пароля"""
         card = ctk.CTkFrame(
@@ -1306,7 +1522,8 @@ class MainWindow:
     def quick_copy_password(self, password_id):
         """Быстрое копирование пароля в буфер обмена"""
         try:
-            password_data = self.db.get_password(password_id)
+            # Расшифровывается только пароль (повторно - из кэша)
+            password_data = self.db.get_entry(password_id)
             self.root.clipboard_clear()
             self.root.clipboard_append(password_data['password'])
             ToastNotification.show(self.root, f"Пароль '{password_data['title']}' скопирован!", "success")
@@ -1320,7 +1537,7 @@ class MainWindow:
     def _open_view_window(self, password_id):
         """Внутренний метод открытия окна просмотра"""
         try:
-            password_data = self.db.get_password(password_id)
+            password_data = self.db.get_entry(password_id)
             self.view_password_details_direct(password_id, password_data)
         except Exception as e:
             ToastNotification.show(self.root, f"Ошибка: {e}", "error")
@@ -1402,7 +1619,8 @@ class MainWindow:
             row=3,
             icon="🔑",
             label="Пароль",
-            value=password_data['password'],
+            # Пароль расшифровывается только при показе или копировании
+            value=lambda: password_data['password'],
             field_type="password",
             window=view_window
         )
@@ -1458,6 +1676,12 @@ class MainWindow:
             text_box.insert("1.0", password_data['notes'])
             text_box.configure(state="disabled")
 
+        # ============= ИСТОРИЯ (загружается только по запросу) =============
+        self._create_history_card(scroll_frame, row=6, password_id=password_id, window=view_window)
+
+        # ============= ВЛОЖЕНИЯ (только метаданные, содержимое - потоком при сохранении) =============
+        self._create_attachments_card(scroll_frame, row=7, password_id=password_id, window=view_window)
+
         # ============= КНОПКА УДАЛЕНИЯ =============
         delete_btn = ctk.CTkButton(
             scroll_frame,
@@ -1472,6 +1696,224 @@ class MainWindow:
         delete_btn.grid(row=10, column=0, sticky="ew", pady=(20, 0))
 
 
+    def _create_history_card(self, parent, row, password_id, window):
+        """Карточка истории изменений: версии читаются и расшифровываются по кнопке"""
+        history_card = ctk.CTkFrame(parent, fg_color=ModernDesign.BG_CARD, corner_radius=12)
+        history_card.grid(row=row, column=0, sticky="ew", pady=(0, 10))
+
+        history_inner = ctk.CTkFrame(history_card, fg_color="transparent")
+        history_inner.pack(padx=20, pady=15, fill="both", expand=True)
+        history_inner.grid_columnconfigure(1, weight=1)
+
+        ctk.CTkLabel(
+            history_inner,
+            text="🕘",
+            font=("Segoe UI", 18),
+            width=30
+        ).grid(row=0, column=0, padx=(0, 10), sticky="w")
+
+        ctk.CTkLabel(
+            history_inner,
+            text="История изменений",
+            font=("Segoe UI", 12, "bold"),
+            text_color=ModernDesign.TEXT_SECONDARY,
+            anchor="w"
+        ).grid(row=0, column=1, sticky="w")
+
+        versions_frame = ctk.CTkFrame(history_inner, fg_color="transparent")
+        versions_frame.grid(row=1, column=0, columnspan=3, sticky="ew")
+        versions_frame.grid_columnconfigure(0, weight=1)
+
+        field_names = {
+            'title': "название", 'username': "логин", 'password': "пароль",
+            'url': "URL", 'category': "категория", 'notes': "заметки"
+        }
+        reasons = {'edit': "изменение", 'rotation': "смена паролей"}
+
+        def show_history():
+            show_btn.grid_forget()
+            try:
+                versions = self.db.get_history_versions(password_id)
+            except Exception as e:
+                print(f"Ошибка загрузки истории: {e}")
+                ToastNotification.show(window, "Не удалось загрузить историю", "error")
+                return
+
+            if not versions:
+                ctk.CTkLabel(
+                    versions_frame,
+                    text="Прежних версий нет",
+                    font=("Segoe UI", 11),
+                    text_color=ModernDesign.TEXT_MUTED,
+                    anchor="w"
+                ).grid(row=0, column=0, sticky="w", pady=(8, 0))
+                return
+
+            for idx, version in enumerate(versions):
+                version_row = ctk.CTkFrame(versions_frame, fg_color=ModernDesign.BG_HOVER, corner_radius=8)
+                version_row.grid(row=idx, column=0, sticky="ew", pady=(8, 0))
+                version_row.grid_columnconfigure(0, weight=1)
+
+                changed = ", ".join(field_names.get(field, field) for field in version['changed'])
+                ctk.CTkLabel(
+                    version_row,
+                    text=f"{version['changed_at']} • {reasons.get(version['reason'], version['reason'])}: {changed}",
+                    font=("Segoe UI", 11),
+                    text_color=ModernDesign.TEXT_SECONDARY,
+                    anchor="w"
+                ).grid(row=0, column=0, sticky="w", padx=10, pady=8)
+
+                if 'password' in version['changed']:
+                    ctk.CTkButton(
+                        version_row,
+                        text="📋",
+                        command=partial(self._copy_field_to_clipboard, window, version['fields']['password'], "Прежний пароль"),
+                        width=32,
+                        height=28,
+                        fg_color=ModernDesign.PRIMARY,
+                        hover_color=ModernDesign.PRIMARY_DARK,
+                        corner_radius=6
+                    ).grid(row=0, column=1, padx=(0, 8), pady=6)
+
+        show_btn = ctk.CTkButton(
+            history_inner,
+            text="Показать",
+            command=show_history,
+            width=90,
+            height=30,
+            fg_color=ModernDesign.BG_HOVER,
+            hover_color=ModernDesign.PRIMARY,
+            corner_radius=8
+        )
+        show_btn.grid(row=0, column=2, sticky="e")
+
+    def _create_attachments_card(self, parent, row, password_id, window):
+        """Карточка вложений: список, добавление, сохранение на диск и удаление"""
+        from main.attachments import format_size
+
+        attachments_card = ctk.CTkFrame(parent, fg_color=ModernDesign.BG_CARD, corner_radius=12)
+        attachments_card.grid(row=row, column=0, sticky="ew", pady=(0, 10))
+
+        attachments_inner = ctk.CTkFrame(attachments_card, fg_color="transparent")
+        attachments_inner.pack(padx=20, pady=15, fill="both", expand=True)
+        attachments_inner.grid_columnconfigure(1, weight=1)
+
+        ctk.CTkLabel(
+            attachments_inner,
+            text="📎",
+            font=("Segoe UI", 18),
+            width=30
+        ).grid(row=0, column=0, padx=(0, 10), sticky="w")
+
+        ctk.CTkLabel(
+            attachments_inner,
+            text="Вложения",
+            font=("Segoe UI", 12, "bold"),
+            text_color=ModernDesign.TEXT_SECONDARY,
+            anchor="w"
+        ).grid(row=0, column=1, sticky="w")
+
+        files_frame = ctk.CTkFrame(attachments_inner, fg_color="transparent")
+        files_frame.grid(row=1, column=0, columnspan=3, sticky="ew")
+        files_frame.grid_columnconfigure(0, weight=1)
+
+        def save_attachment(attachment):
+            path = filedialog.asksaveasfilename(parent=window, initialfile=attachment['name'])
+            if not path:
+                return
+            try:
+                self.db.attachments.save(attachment['id'], path)
+                ToastNotification.show(window, f"Файл '{attachment['name']}' сохранён", "success")
+            except Exception as e:
+                print(f"Ошибка сохранения вложения: {e}")
+                ToastNotification.show(window, f"Ошибка: {e}", "error")
+
+        def delete_attachment(attachment):
+            if not messagebox.askyesno("Подтверждение", f"Удалить вложение '{attachment['name']}'?", parent=window):
+                return
+            self.db.attachments.delete(attachment['id'])
+            refresh()
+
+        def add_attachment():
+            path = filedialog.askopenfilename(parent=window, title="Добавить вложение")
+            if not path:
+                return
+            try:
+                self.db.attachments.add(password_id, os.path.basename(path), path)
+                refresh()
+                ToastNotification.show(window, "Вложение добавлено", "success")
+            except Exception as e:
+                print(f"Ошибка добавления вложения: {e}")
+                ToastNotification.show(window, f"Ошибка: {e}", "error")
+
+        def refresh():
+            for widget in files_frame.winfo_children():
+                widget.destroy()
+
+            try:
+                attachments = self.db.attachments.list(password_id)
+            except Exception as e:
+                print(f"Ошибка загрузки вложений: {e}")
+                attachments = []
+
+            if not attachments:
+                ctk.CTkLabel(
+                    files_frame,
+                    text="Нет вложений",
+                    font=("Segoe UI", 11),
+                    text_color=ModernDesign.TEXT_MUTED,
+                    anchor="w"
+                ).grid(row=0, column=0, sticky="w", pady=(8, 0))
+                return
+
+            for idx, attachment in enumerate(attachments):
+                file_row = ctk.CTkFrame(files_frame, fg_color=ModernDesign.BG_HOVER, corner_radius=8)
+                file_row.grid(row=idx, column=0, sticky="ew", pady=(8, 0))
+                file_row.grid_columnconfigure(0, weight=1)
+
+                ctk.CTkLabel(
+                    file_row,
+                    text=f"{attachment['name']} • {format_size(attachment['size'])}",
+                    font=("Segoe UI", 11),
+                    text_color=ModernDesign.TEXT_SECONDARY,
+                    anchor="w"
+                ).grid(row=0, column=0, sticky="w", padx=10, pady=8)
+
+                ctk.CTkButton(
+                    file_row,
+                    text="💾",
+                    command=partial(save_attachment, attachment),
+                    width=32,
+                    height=28,
+                    fg_color=ModernDesign.PRIMARY,
+                    hover_color=ModernDesign.PRIMARY_DARK,
+                    corner_radius=6
+                ).grid(row=0, column=1, padx=(0, 4), pady=6)
+
+                ctk.CTkButton(
+                    file_row,
+                    text="🗑️",
+                    command=partial(delete_attachment, attachment),
+                    width=32,
+                    height=28,
+                    fg_color=ModernDesign.DANGER,
+                    hover_color="#C62828",
+                    corner_radius=6
+                ).grid(row=0, column=2, padx=(0, 8), pady=6)
+
+        ctk.CTkButton(
+            attachments_inner,
+            text="➕ Добавить",
+            command=add_attachment,
+            width=90,
+            height=30,
+            fg_color=ModernDesign.BG_HOVER,
+            hover_color=ModernDesign.PRIMARY,
+            corner_radius=8
+        ).grid(row=0, column=2, sticky="e")
+
+        refresh()
+
     def _create_compact_field(self, parent, row, icon, label, value, field_type, window, password_id=None):
         """Создаёт компактное поле в едином стиле"""
 
@@ -1595,7 +2037,8 @@ class MainWindow:
             )
             label_text.grid(row=0, column=1, sticky="w", padx=(0, 8))
 
-            # Значение (скрытое/открытое)
+            # Значение (скрытое/открытое); value может быть функцией для ленивой расшифровки
+            reveal = value if callable(value) else (lambda: value)
             password_var = ctk.StringVar(value="●" * 12)
             password_visible = [False]
 
@@ -1615,7 +2058,7 @@ class MainWindow:
             def toggle_password():
                 password_visible[0] = not password_visible[0]
                 if password_visible[0]:
-                    password_var.set(value)
+                    password_var.set(reveal())
                     toggle_btn.configure(text="🙈")
                 else:
                     password_var.set("●" * 12)
@@ -1637,7 +2080,7 @@ class MainWindow:
             copy_btn = ctk.CTkButton(
                 buttons_container,
                 text="📋",
-                command=partial(self._copy_field_to_clipboard, window, value, label),
+                command=lambda: self._copy_field_to_clipboard(window, reveal(), label),
                 width=40,
                 height=38,
                 fg_color=ModernDesign.SUCCESS,
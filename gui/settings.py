@@ -3,16 +3,17 @@ from tkinter import messagebox, filedialog
 import os
 import shutil
 import json
+import importlib.util
 
-# Условный импорт для 2FA
-try:
-    import pyotp
-    import qrcode
-    from PIL import Image
-    import io
-    HAS_2FA_SUPPORT = True
-except ImportError:
-    HAS_2FA_SUPPORT = False
+from main.settings_store import get_settings, DEFAULT_AUTO_LOCK_MINUTES
+from utils.password_audit import get_engine as get_audit_engine, BREACHED
+
+# Проверка наличия зависимостей 2FA без их импорта:
+# pyotp/qrcode/PIL загружаются только в момент использования
+HAS_2FA_SUPPORT = all(
+    importlib.util.find_spec(name) is not None
+    for name in ("pyotp", "qrcode", "PIL")
+)
 
 
 # === СОВРЕМЕННАЯ СИСТЕМА ДИЗАЙНА ===
@@ -118,9 +119,13 @@ class SettingsWindow:
         self.main_window = main_window
 
         # Переменные настроек
-        self.auto_lock_var = ctk.StringVar(value="5")
-        self.backup_dir_var = ctk.StringVar(value=os.path.join(os.path.dirname(os.path.dirname(__file__)), "backups"))
-        self.auto_backup_var = ctk.BooleanVar(value=True)
+        self.settings = get_settings()
+        self.auto_lock_var = ctk.StringVar()
+        self.backup_dir_var = ctk.StringVar()
+        self.history_versions_var = ctk.StringVar()
+        self.history_days_var = ctk.StringVar()
+        self.plaintext_cache_var = ctk.StringVar()
+        self.auto_backup_var = ctk.BooleanVar()
 
         # Загрузка текущих настроек
         self.load_current_settings()
@@ -162,16 +167,13 @@ class SettingsWindow:
         self.window.geometry(f'{width}x{height}+{x}+{y}')
 
     def load_current_settings(self):
-        """Загружает текущие настройки"""
-        try:
-            if os.path.exists("app_settings.json"):
-                with open("app_settings.json", "r", encoding="utf-8") as f:
-                    settings = json.load(f)
-                    self.auto_lock_var.set(str(settings.get("auto_lock_time", 5)))
-                    self.backup_dir_var.set(settings.get("backup_directory", self.backup_dir_var.get()))
-                    self.auto_backup_var.set(settings.get("auto_backup", True))
-        except Exception as e:
-            print(f"Ошибка загрузки настроек: {e}")
+        """Заполняет поля текущими значениями из хранилища настроек"""
+        self.auto_lock_var.set(str(self.settings.get("auto_lock_time")))
+        self.backup_dir_var.set(self.settings.get("backup_directory"))
+        self.history_versions_var.set(str(self.settings.get("history_keep_versions")))
+        self.history_days_var.set(str(self.settings.get("history_keep_days")))
+        self.plaintext_cache_var.set(str(self.settings.get("plaintext_cache_seconds")))
+        self.auto_backup_var.set(self.settings.get("auto_backup"))
 
     def setup_ui(self):
         """Создает интерфейс"""
@@ -308,6 +310,83 @@ class SettingsWindow:
             text_color=ModernDesign.TEXT_SECONDARY
         ).grid(row=1, column=2, sticky="w")
 
+        # Сколько расшифрованные значения живут в памяти (затираются и при блокировке)
+        ctk.CTkLabel(
+            lock_content,
+            text="Кэш расшифровки:",
+            font=ModernDesign.get_body_font(),
+            text_color=ModernDesign.TEXT_SECONDARY
+        ).grid(row=2, column=0, sticky="w", padx=(0, 10), pady=(8, 0))
+
+        ctk.CTkEntry(
+            lock_content,
+            textvariable=self.plaintext_cache_var,
+            width=80,
+            height=40,
+            font=("Segoe UI", 13),
+            justify="center",
+            validate='key',
+            validatecommand=vcmd,
+            border_width=0,
+            fg_color=ModernDesign.BG_CARD,
+            corner_radius=8
+        ).grid(row=2, column=1, padx=10, pady=(8, 0))
+
+        ctk.CTkLabel(
+            lock_content,
+            text="секунд (0 - не кэшировать)",
+            font=ModernDesign.get_body_font(),
+            text_color=ModernDesign.TEXT_SECONDARY
+        ).grid(row=2, column=2, sticky="w", pady=(8, 0))
+
+        # История изменений
+        history_card = ctk.CTkFrame(tab, fg_color=ModernDesign.BG_HOVER, corner_radius=12)
+        history_card.grid(row=1, column=0, sticky="ew", padx=15, pady=(0, 15))
+
+        history_content = ctk.CTkFrame(history_card, fg_color="transparent")
+        history_content.pack(fill="x", padx=20, pady=20)
+        history_content.grid_columnconfigure(1, weight=1)
+
+        ctk.CTkLabel(
+            history_content,
+            text="🕘 История изменений паролей",
+            font=("Segoe UI", 14, "bold"),
+            text_color=ModernDesign.TEXT_PRIMARY,
+            anchor="w"
+        ).grid(row=0, column=0, columnspan=3, sticky="w", pady=(0, 10))
+
+        for row, (label, variable, suffix) in enumerate((
+            ("Хранить версий:", self.history_versions_var, "на запись"),
+            ("Не дольше:", self.history_days_var, "дней (0 - без ограничения)"),
+        ), start=1):
+            ctk.CTkLabel(
+                history_content,
+                text=label,
+                font=ModernDesign.get_body_font(),
+                text_color=ModernDesign.TEXT_SECONDARY
+            ).grid(row=row, column=0, sticky="w", padx=(0, 10), pady=(0, 8))
+
+            ctk.CTkEntry(
+                history_content,
+                textvariable=variable,
+                width=80,
+                height=40,
+                font=("Segoe UI", 13),
+                justify="center",
+                validate='key',
+                validatecommand=vcmd,
+                border_width=0,
+                fg_color=ModernDesign.BG_CARD,
+                corner_radius=8
+            ).grid(row=row, column=1, padx=10, pady=(0, 8))
+
+            ctk.CTkLabel(
+                history_content,
+                text=suffix,
+                font=ModernDesign.get_body_font(),
+                text_color=ModernDesign.TEXT_SECONDARY
+            ).grid(row=row, column=2, sticky="w", pady=(0, 8))
+
     def setup_security_tab(self, tab):
         """Настраивает вкладку безопасности"""
         # Смена мастер-пароля
@@ -320,10 +399,29 @@ class SettingsWindow:
             ModernDesign.PRIMARY
         )
 
+        # Дополнительные способы входа (слоты ключа данных)
+        recovery_card = self._create_action_card(
+            tab, 1,
+            "🗝️ Ключ восстановления",
+            "Одноразово показываемый ключ для входа, если мастер-пароль забыт",
+            "Создать ключ",
+            self.create_recovery_key,
+            ModernDesign.PRIMARY
+        )
+
+        keyfile_card = self._create_action_card(
+            tab, 2,
+            "📄 Ключевой файл",
+            "Вход по файлу-ключу, например на USB-накопителе",
+            "Выбрать файл",
+            self.enable_keyfile,
+            ModernDesign.PRIMARY
+        )
+
         # 2FA
         if os.path.exists("2fa_secret.key"):
             twofa_card = self._create_action_card(
-                tab, 1,
+                tab, 3,
                 "🔐 Двухфакторная аутентификация",
                 "2FA включена. Вы можете отключить её для упрощения входа",
                 "Отключить 2FA",
@@ -333,7 +431,7 @@ class SettingsWindow:
         else:
             if HAS_2FA_SUPPORT:
                 twofa_card = self._create_action_card(
-                    tab, 1,
+                    tab, 3,
                     "🔐 Двухфакторная аутентификация",
                     "Добавьте дополнительный уровень защиты с помощью кодов",
                     "Настроить 2FA",
@@ -342,7 +440,7 @@ class SettingsWindow:
                 )
             else:
                 info_card = ctk.CTkFrame(tab, fg_color=ModernDesign.BG_HOVER, corner_radius=12)
-                info_card.grid(row=1, column=0, sticky="ew", padx=15, pady=15)
+                info_card.grid(row=3, column=0, sticky="ew", padx=15, pady=15)
 
                 ctk.CTkLabel(
                     info_card,
@@ -354,7 +452,7 @@ class SettingsWindow:
 
         # Проверка паролей
         check_card = self._create_action_card(
-            tab, 2,
+            tab, 4,
             "🔍 Проверка надёжности",
             "Проанализируйте силу всех сохранённых паролей",
             "Проверить все пароли",
@@ -429,6 +527,112 @@ class SettingsWindow:
             corner_radius=6
         ).pack()
 
+        # Импорт из других менеджеров паролей
+        import_card = self._create_action_card(
+            tab, 1,
+            "📥 Импорт паролей",
+            "CSV, KeePass XML, Bitwarden JSON, 1Password 1PUX или экспорт EVOLS",
+            "Выбрать файл",
+            self.import_passwords,
+            ModernDesign.PRIMARY
+        )
+
+    def import_passwords(self):
+        """Импорт: пробный разбор, подтверждение и фоновая вставка"""
+        from main.importers import ImportJob
+
+        path = filedialog.askopenfilename(
+            title="Файл для импорта",
+            filetypes=[
+                ("Экспорт менеджера паролей", "*.csv *.xml *.json *.ndjson *.1pux"),
+                ("Все файлы", "*.*")
+            ],
+            parent=self.window
+        )
+        if not path:
+            return
+
+        dialog = ctk.CTkToplevel(self.window)
+        dialog.title("📥 Импорт паролей")
+        dialog.geometry("420x160")
+        dialog.resizable(False, False)
+        dialog.configure(fg_color=ModernDesign.BG_DARK)
+        dialog.transient(self.window)
+        dialog.grab_set()
+        dialog.protocol("WM_DELETE_WINDOW", lambda: None)
+
+        status_label = ctk.CTkLabel(
+            dialog,
+            text="Чтение файла...",
+            font=ModernDesign.get_body_font(),
+            text_color=ModernDesign.TEXT_SECONDARY
+        )
+        status_label.pack(fill="x", padx=20, pady=(30, 10))
+        progress_bar = ctk.CTkProgressBar(dialog, progress_color=ModernDesign.PRIMARY)
+        progress_bar.set(0)
+        progress_bar.pack(fill="x", padx=20)
+
+        def run(dry_run, on_done):
+            job = ImportJob(self.db.db_path, self.encryptor, path, dry_run=dry_run).start()
+
+            def poll():
+                done, total = job.progress
+                if total:
+                    progress_bar.set(done / total)
+                status_label.configure(text=f"{'Проверка' if dry_run else 'Импорт'}: {job.stats.imported} записей")
+                if not job.done():
+                    dialog.after(100, poll)
+                    return
+                if job.error:
+                    dialog.destroy()
+                    messagebox.showerror(
+                        "Ошибка", f"Импорт не выполнен, хранилище не изменено:\n{job.error}", parent=self.window
+                    )
+                    return
+                on_done(job)
+
+            dialog.after(100, poll)
+
+        def confirm(job):
+            stats = job.stats
+            if not stats.imported and not stats.updated:
+                dialog.destroy()
+                ToastNotification.show(self.window, "Новых или изменённых записей нет", "info")
+                return
+            message = (f"Формат: {job.importer.label}\n"
+                       f"Новых записей: {stats.imported}\n"
+                       f"Обновятся более новыми: {stats.updated}\n"
+                       f"Уже есть в хранилище: {stats.matches['identical']}")
+            if stats.kept:
+                message += f"\nОтличаются от существующих (остаются как есть): {stats.kept}"
+            if stats.skipped:
+                message += f"\nБез пароля (пропускаются): {stats.skipped}"
+            if stats.folders:
+                message += f"\nПапок: {len(stats.folders)}"
+            if not messagebox.askyesno("Импорт паролей", message + "\n\nИмпортировать?", parent=dialog):
+                dialog.destroy()
+                return
+            progress_bar.set(0)
+            run(False, finish)
+
+        def finish(job):
+            dialog.destroy()
+            folder_manager = getattr(self.main_window, "folder_manager", None)
+            if folder_manager:
+                for folder in sorted(job.stats.folders):
+                    folder_manager.add_folder(folder)
+                self.main_window.load_folder_buttons()
+            if hasattr(self.main_window, "invalidate_cache"):
+                self.main_window.invalidate_cache()
+                self.main_window.load_passwords()
+            ToastNotification.show(
+                self.window,
+                f"Добавлено: {job.stats.imported}, обновлено: {job.stats.updated}",
+                "success"
+            )
+
+        run(True, confirm)
+
     def _create_action_card(self, parent, row, title, description, button_text, command, color):
         """Создаёт карточку с действием"""
         card = ctk.CTkFrame(parent, fg_color=ModernDesign.BG_HOVER, corner_radius=12)
@@ -474,28 +678,31 @@ class SettingsWindow:
         try:
             auto_lock_value = self.auto_lock_var.get().strip()
             if not auto_lock_value:
-                auto_lock_value = "5"
+                auto_lock_value = str(DEFAULT_AUTO_LOCK_MINUTES)
 
             try:
                 auto_lock_time = int(auto_lock_value)
                 if auto_lock_time < 1:
                     auto_lock_time = 1
             except ValueError:
-                auto_lock_time = 5
-                ToastNotification.show(self.window, "Установлено значение по умолчанию: 5 минут", "warning")
-
-            settings_data = {
-                "auto_lock_time": auto_lock_time,
-                "backup_directory": self.backup_dir_var.get(),
-                "auto_backup": self.auto_backup_var.get()
-            }
+                auto_lock_time = DEFAULT_AUTO_LOCK_MINUTES
+                ToastNotification.show(self.window, f"Установлено значение по умолчанию: {DEFAULT_AUTO_LOCK_MINUTES} минут", "warning")
 
-            backup_dir = settings_data["backup_directory"]
+            backup_dir = self.backup_dir_var.get()
             if backup_dir and not os.path.exists(backup_dir):
                 os.makedirs(backup_dir, exist_ok=True)
 
-            with open("app_settings.json", "w", encoding="utf-8") as f:
-                json.dump(settings_data, f, indent=4, ensure_ascii=False)
+            # Подписчики (таймер автоблокировки и т.п.) получат новые значения сразу
+            self.settings.update(
+                auto_lock_time=auto_lock_time,
+                backup_directory=backup_dir,
+                auto_backup=self.auto_backup_var.get(),
+                history_keep_versions=self.history_versions_var.get(),
+                history_keep_days=self.history_days_var.get(),
+                plaintext_cache_seconds=self.plaintext_cache_var.get()
+            )
+            # Новые лимиты применяются к уже сохранённой истории сразу
+            self.db.prune_history()
 
             ToastNotification.show(self.window, "Настройки сохранены!", "success")
             self.window.after(800, self.window.destroy)
@@ -504,9 +711,257 @@ class SettingsWindow:
             ToastNotification.show(self.window, f"Ошибка: {e}", "error")
 
     def change_master_password(self):
-        """Изменение мастер-пароля"""
-        # TODO: Реализовать в стиле add_password
-        ToastNotification.show(self.window, "Функция в разработке", "info")
+        """Изменение мастер-пароля с перешифрованием хранилища"""
+        from utils.strength_estimator import get_estimator
+
+        dialog = ctk.CTkToplevel(self.window)
+        dialog.title("🔑 Смена мастер-пароля")
+        dialog.geometry("440x470")
+        dialog.resizable(False, False)
+        dialog.configure(fg_color=ModernDesign.BG_DARK)
+        dialog.transient(self.window)
+        dialog.grab_set()
+
+        content = ctk.CTkFrame(dialog, fg_color=ModernDesign.BG_CARD, corner_radius=12)
+        content.pack(fill="both", expand=True, padx=20, pady=20)
+
+        fields = {}
+        for key, label in (("current", "Текущий пароль или ключ восстановления"),
+                           ("new", "Новый пароль"),
+                           ("confirm", "Повторите новый пароль")):
+            ctk.CTkLabel(
+                content,
+                text=label,
+                font=ModernDesign.get_body_font(),
+                text_color=ModernDesign.TEXT_SECONDARY,
+                anchor="w"
+            ).pack(fill="x", padx=20, pady=(12, 4))
+
+            entry = ctk.CTkEntry(
+                content,
+                show="•",
+                height=40,
+                font=("Segoe UI", 13),
+                border_width=0,
+                fg_color=ModernDesign.BG_HOVER,
+                corner_radius=8
+            )
+            entry.pack(fill="x", padx=20)
+            fields[key] = entry
+
+        hint_label = ctk.CTkLabel(
+            content,
+            text="",
+            font=ModernDesign.get_caption_font(),
+            text_color=ModernDesign.TEXT_MUTED,
+            anchor="w",
+            wraplength=360,
+            justify="left"
+        )
+        hint_label.pack(fill="x", padx=20, pady=(8, 0))
+
+        def on_new_password_change(event=None):
+            password = fields["new"].get()
+            if not password:
+                hint_label.configure(text="")
+                return
+            estimate = get_estimator().estimate(password)
+            hint_label.configure(
+                text=f"Надёжность: {estimate.level} · взлом: {estimate.crack_time_display()}"
+                     + (f"\n{estimate.warning}" if estimate.warning else "")
+            )
+
+        fields["new"].bind("<KeyRelease>", on_new_password_change)
+
+        status_label = ctk.CTkLabel(
+            content,
+            text="",
+            font=ModernDesign.get_caption_font(),
+            text_color=ModernDesign.TEXT_SECONDARY,
+            anchor="w"
+        )
+        status_label.pack(fill="x", padx=20, pady=(12, 4))
+
+        progress_bar = ctk.CTkProgressBar(content, progress_color=ModernDesign.PRIMARY)
+        progress_bar.set(0)
+
+        change_btn = ctk.CTkButton(
+            content,
+            text="🔑 Сменить пароль",
+            font=("Segoe UI", 13, "bold"),
+            height=44,
+            fg_color=ModernDesign.PRIMARY,
+            hover_color=ModernDesign.PRIMARY_DARK,
+            corner_radius=8
+        )
+        change_btn.pack(fill="x", padx=20, pady=(8, 20))
+
+        def start_change():
+            current = fields["current"].get()
+            new_password = fields["new"].get()
+
+            # По слотам ключей: после входа ключом восстановления или
+            # ключевым файлом пароль в Encryptor не хранится
+            from main.keyslots import verify_password
+
+            if not verify_password(self.encryptor, current):
+                ToastNotification.show(dialog, "Неверный текущий пароль или ключ восстановления", "error")
+                return
+            if len(new_password) < 8:
+                ToastNotification.show(dialog, "Пароль должен содержать минимум 8 символов", "error")
+                return
+            if new_password != fields["confirm"].get():
+                ToastNotification.show(dialog, "Пароли не совпадают", "error")
+                return
+            if new_password == current:
+                ToastNotification.show(dialog, "Новый пароль совпадает с текущим", "warning")
+                return
+
+            from main.rekey import RekeyJob
+
+            for entry in fields.values():
+                entry.configure(state="disabled")
+            change_btn.configure(state="disabled")
+            progress_bar.pack(fill="x", padx=20, before=change_btn)
+            dialog.protocol("WM_DELETE_WINDOW", lambda: None)
+
+            job = RekeyJob(self.db.db_path, self.encryptor, new_password).start()
+
+            def poll():
+                done, total = job.progress
+                if total:
+                    progress_bar.set(done / total)
+                status_label.configure(text=f"{job.stage}: {done} / {total}")
+
+                if not job.done():
+                    dialog.after(100, poll)
+                    return
+
+                if job.error:
+                    dialog.protocol("WM_DELETE_WINDOW", dialog.destroy)
+                    messagebox.showerror(
+                        "Ошибка",
+                        f"Пароль не изменён: {job.error}\n\n"
+                        "Старый пароль действует. Повторный запуск продолжит с места остановки.",
+                        parent=dialog
+                    )
+                    dialog.destroy()
+                    return
+
+                # Все окна держат ссылку на этот объект - переключаем его на новый ключ
+                self.encryptor.adopt(job.new_encryptor)
+                if hasattr(self.main_window, "invalidate_cache"):
+                    self.main_window.invalidate_cache()
+                dialog.destroy()
+                ToastNotification.show(self.window, "Мастер-пароль изменён", "success")
+
+            dialog.after(100, poll)
+
+        change_btn.configure(command=start_change)
+        fields["current"].focus_set()
+
+    def create_recovery_key(self):
+        """Создаёт ключ восстановления и показывает его один раз"""
+        from main.keyslots import has_keyslots, add_recovery_key
+
+        if not has_keyslots():
+            ToastNotification.show(self.window, "Сначала смените мастер-пароль", "warning")
+            return
+
+        confirmed = messagebox.askyesno(
+            "Ключ восстановления",
+            "Создать новый ключ восстановления?\n\nПрежний ключ (если был) перестанет действовать.",
+            parent=self.window
+        )
+        if not confirmed:
+            return
+
+        try:
+            recovery_key = add_recovery_key(self.encryptor)
+        except Exception as e:
+            ToastNotification.show(self.window, f"Ошибка: {e}", "error")
+            return
+
+        dialog = ctk.CTkToplevel(self.window)
+        dialog.title("🗝️ Ключ восстановления")
+        dialog.geometry("480x300")
+        dialog.configure(fg_color=ModernDesign.BG_DARK)
+        dialog.transient(self.window)
+        dialog.grab_set()
+
+        ctk.CTkLabel(
+            dialog,
+            text="Сохраните ключ в надёжном месте.\nОн показывается только сейчас и вводится вместо мастер-пароля.",
+            font=ModernDesign.get_body_font(),
+            text_color=ModernDesign.TEXT_SECONDARY,
+            justify="left"
+        ).pack(padx=20, pady=(20, 10), anchor="w")
+
+        key_box = ctk.CTkTextbox(
+            dialog,
+            height=80,
+            font=("Consolas", 14),
+            fg_color=ModernDesign.BG_CARD,
+            corner_radius=8,
+            wrap="word"
+        )
+        key_box.pack(fill="x", padx=20)
+        key_box.insert("1.0", recovery_key)
+        key_box.configure(state="disabled")
+
+        def copy_key():
+            dialog.clipboard_clear()
+            dialog.clipboard_append(recovery_key)
+            ToastNotification.show(dialog, "Ключ скопирован", "success")
+
+        buttons = ctk.CTkFrame(dialog, fg_color="transparent")
+        buttons.pack(fill="x", padx=20, pady=20)
+        buttons.grid_columnconfigure((0, 1), weight=1)
+
+        ctk.CTkButton(
+            buttons,
+            text="📋 Копировать",
+            command=copy_key,
+            height=40,
+            fg_color=ModernDesign.PRIMARY,
+            hover_color=ModernDesign.PRIMARY_DARK,
+            corner_radius=8
+        ).grid(row=0, column=0, padx=5, sticky="ew")
+
+        ctk.CTkButton(
+            buttons,
+            text="✓ Я сохранил ключ",
+            command=dialog.destroy,
+            height=40,
+            fg_color=ModernDesign.SUCCESS,
+            hover_color="#00C853",
+            corner_radius=8
+        ).grid(row=0, column=1, padx=5, sticky="ew")
+
+    def enable_keyfile(self):
+        """Добавляет вход по ключевому файлу"""
+        from main.keyslots import has_keyslots, enable_keyfile
+
+        if not has_keyslots():
+            ToastNotification.show(self.window, "Сначала смените мастер-пароль", "warning")
+            return
+
+        # Существующий файл используется как есть, новый создаётся со случайным содержимым
+        keyfile_path = filedialog.asksaveasfilename(
+            title="Ключевой файл",
+            defaultextension=".key",
+            initialfile="evols.key",
+            confirmoverwrite=False,
+            parent=self.window
+        )
+        if not keyfile_path:
+            return
+
+        try:
+            enable_keyfile(self.encryptor, keyfile_path)
+            ToastNotification.show(self.window, "Вход по ключевому файлу включён", "success")
+        except Exception as e:
+            ToastNotification.show(self.window, f"Ошибка: {e}", "error")
 
     def setup_2fa(self):
         """Настройка 2FA"""
@@ -593,81 +1048,59 @@ class SettingsWindow:
         medium_count = 0
         strong_count = 0
 
-        # Собираем статистику
-        password_results = []
-
-        for password_id, title, category in passwords:
+        # Расшифровываем пароли прямо из строк списка (без запроса на каждую запись)
+        audited = []
+        plaintexts = []
+        for password_id, title, category, _username, encrypted_password, _url, _folder in passwords:
             try:
-                password_data = self.db.get_password(password_id)
-                password = password_data['password']
-
-                # Оценка надёжности
-                score = 0
-                feedback = []
-
-                if len(password) >= 8:
-                    score += 25
-                else:
-                    feedback.append("минимум 8 символов")
-
-                if len(password) >= 12:
-                    score += 15
-
-                if any(c.islower() for c in password):
-                    score += 15
-                else:
-                    feedback.append("строчные буквы")
-
-                if any(c.isupper() for c in password):
-                    score += 15
-                else:
-                    feedback.append("заглавные буквы")
-
-                if any(c.isdigit() for c in password):
-                    score += 15
-                else:
-                    feedback.append("цифры")
-
-                if any(c in "!@#$%^&*()_+-=[]{}|;:,.<>?" for c in password):
-                    score += 15
-                else:
-                    feedback.append("спецсимволы")
-
-                # Определяем уровень
-                if score >= 80:
-                    level = "Отличный"
-                    color = ModernDesign.SUCCESS
-                    icon = "✓"
-                    strong_count += 1
-                elif score >= 60:
-                    level = "Хороший"
-                    color = ModernDesign.PRIMARY
-                    icon = "○"
-                    strong_count += 1
-                elif score >= 40:
-                    level = "Средний"
-                    color = ModernDesign.WARNING
-                    icon = "⚠"
-                    medium_count += 1
-                else:
-                    level = "Слабый"
-                    color = ModernDesign.DANGER
-                    icon = "✕"
-                    weak_count += 1
-
-                password_results.append({
-                    'title': title,
-                    'category': category,
-                    'score': score,
-                    'level': level,
-                    'color': color,
-                    'icon': icon,
-                    'feedback': feedback
-                })
-
+                plaintexts.append(self.encryptor.decrypt(encrypted_password))
+                audited.append((title, category))
             except Exception as e:
                 print(f"Ошибка анализа пароля {title}: {e}")
 
+        # Оценка всего пакета единой моделью
+        audit = get_audit_engine().audit(plaintexts)
+        plaintexts.clear()
+
+        password_results = []
+        breached_count = 0
+        for i, (title, category) in enumerate(audited):
+            score = audit.scores[i]
+            if audit.flags[i] & BREACHED:
+                breached_count += 1
+
+            # Определяем уровень
+            if score >= 80:
+                level = "Отличный"
+                color = ModernDesign.SUCCESS
+                icon = "✓"
+                strong_count += 1
+            elif score >= 60:
+                level = "Хороший"
+                color = ModernDesign.PRIMARY
+                icon = "○"
+                strong_count += 1
+            elif score >= 40:
+                level = "Средний"
+                color = ModernDesign.WARNING
+                icon = "⚠"
+                medium_count += 1
+            else:
+                level = "Слабый"
+                color = ModernDesign.DANGER
+                icon = "✕"
+                weak_count += 1
+
+            password_results.append({
+                'title': title,
+                'category': category,
+                'score': score,
+                'level': level,
+                'color': color,
+                'icon': icon,
+                'feedback': audit.feedback(i)
+            })
+
         # Карточка статистики
         stats_card = ctk.CTkFrame(main_container, fg_color=ModernDesign.BG_CARD, corner_radius=12)
         stats_card.grid(row=1, column=0, sticky="ew", pady=(0, 15))
@@ -758,10 +1191,53 @@ class SettingsWindow:
         scroll_frame.grid(row=2, column=0, sticky="nsew", pady=(0, 15))
         scroll_frame.grid_columnconfigure(0, weight=1)
 
+        # === ПОВТОРЯЮЩИЕСЯ ПАРОЛИ ===
+        # Группы находятся по отпечаткам в БД, без сравнения расшифрованных паролей
+        try:
+            reused_clusters = self.db.get_reused_passwords()
+        except Exception as e:
+            print(f"Ошибка поиска повторяющихся паролей: {e}")
+            reused_clusters = []
+
+        for i, cluster in enumerate(reused_clusters):
+            card = ctk.CTkFrame(scroll_frame, fg_color=ModernDesign.BG_CARD, corner_radius=12,
+                               border_width=2, border_color=ModernDesign.DANGER)
+            card.grid(row=i, column=0, sticky="ew", pady=5)
+            card.grid_columnconfigure(1, weight=1)
+
+            ctk.CTkLabel(
+                card,
+                text="♻️",
+                font=("Segoe UI", 24),
+                width=40
+            ).grid(row=0, column=0, padx=(15, 10), pady=15)
+
+            info_frame = ctk.CTkFrame(card, fg_color="transparent")
+            info_frame.grid(row=0, column=1, sticky="ew", padx=(0, 15), pady=15)
+
+            ctk.CTkLabel(
+                info_frame,
+                text=f"Один пароль в {len(cluster)} записях",
+                font=("Segoe UI", 13, "bold"),
+                text_color=ModernDesign.DANGER,
+                anchor="w"
+            ).pack(anchor="w")
+
+            ctk.CTkLabel(
+                info_frame,
+                text=", ".join(title for _id, title, _category in cluster),
+                font=("Segoe UI", 11),
+                text_color=ModernDesign.TEXT_SECONDARY,
+                anchor="w",
+                justify="left",
+                wraplength=560
+            ).pack(anchor="w", pady=(3, 0))
+
         # Сортируем: сначала слабые, потом средние, потом сильные
         password_results.sort(key=lambda x: x['score'])
 
-        for i, result in enumerate(password_results):
+        first_row = len(reused_clusters)
+        for i, result in enumerate(password_results, start=first_row):
             card = ctk.CTkFrame(scroll_frame, fg_color=ModernDesign.BG_CARD, corner_radius=12,
                                border_width=2, border_color=result['color'])
             card.grid(row=i, column=0, sticky="ew", pady=5)
@@ -831,13 +1307,20 @@ class SettingsWindow:
                     anchor="w"
                 ).grid(row=2, column=0, sticky="w", pady=(3, 0))
 
-        if weak_count > 0 or medium_count > 0:
+        reused_count = sum(len(cluster) for cluster in reused_clusters)
+        if weak_count > 0 or medium_count > 0 or reused_count > 0 or breached_count > 0:
             recommend_frame = ctk.CTkFrame(main_container, fg_color=ModernDesign.BG_HOVER, corner_radius=10)
             recommend_frame.grid(row=3, column=0, sticky="ew", pady=(0, 15))
 
+            recommend_text = f"💡 Рекомендуется обновить {weak_count + medium_count} пароль(ей) для повышения безопасности"
+            if reused_count:
+                recommend_text += f". Повторно используются пароли в {reused_count} записях"
+            if breached_count:
+                recommend_text += f". Найдены в базе утечек: {breached_count}"
+
             ctk.CTkLabel(
                 recommend_frame,
-                text=f"💡 Рекомендуется обновить {weak_count + medium_count} пароль(ей) для повышения безопасности",
+                text=recommend_text,
                 font=ModernDesign.get_caption_font(),
                 text_color=ModernDesign.TEXT_SECONDARY,
                 wraplength=650
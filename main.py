@@ -1,19 +1,24 @@
+from utils import startup_timing
+
 import os
 import customtkinter as ctk
 from tkinter import messagebox
 
 import paths
-from main.encryption import Encryptor, InvalidToken
-from main.database import PasswordDatabase
-from gui.main_window import MainWindow
-from gui.login_frame import LoginFrame
+from main.locking import COMMAND_FOCUS, SingleInstance
+from main.settings_store import get_settings
+
+# Окна после входа (gui.main_window) и криптография (main.encryption,
+# main.database) импортируются при первом использовании, чтобы не
+# задерживать появление экрана входа.
 
 
 class PasswordVaultApp:
     """Главный класс приложения - только логика, без UI"""
 
-    def __init__(self, root):
+    def __init__(self, root, instance=None):
         self.root = root
+        self.instance = instance
         self.root.title("EVOLS Password Manager")
         self.root.geometry("1000x700")
         self.root.minsize(900, 650)
@@ -26,15 +31,46 @@ class PasswordVaultApp:
 
         self.encryptor = None
         self.db = None
+        self.pending_login = None
+
+        # Хранилище, выбранное при прошлом входе (реестр main.vaults)
+        from main.vaults import restore_active_vault
+        self.vault_info = restore_active_vault()
 
-        # Таймер автоблокировки
-        self.idle_timeout_ms = 10 * 60 * 1000
+        # Таймер автоблокировки (значение берётся из общего хранилища настроек)
+        self.settings = get_settings()
+        self.idle_timeout_ms = self.settings.auto_lock_ms
         self.idle_after_id = None
         self.is_locked = True
+        self.settings.subscribe("auto_lock_time", self.on_auto_lock_changed)
 
         # Показываем экран входа/создания
         self.show_login_frame()
 
+        if self.instance:
+            self.root.after(200, self.poll_instance_requests)
+
+    # === ЕДИНСТВЕННЫЙ ЭКЗЕМПЛЯР ===
+
+    def poll_instance_requests(self):
+        """Выполняет команды повторных запусков (из потока Tk)."""
+        while True:
+            try:
+                request = self.instance.requests.get_nowait()
+            except Exception:
+                break
+            if request.get("command") == COMMAND_FOCUS:
+                self.focus_window()
+        self.root.after(200, self.poll_instance_requests)
+
+    def focus_window(self):
+        """Разворачивает окно и выводит его поверх остальных."""
+        self.root.deiconify()
+        self.root.lift()
+        self.root.attributes("-topmost", True)
+        self.root.after(300, lambda: self.root.attributes("-topmost", False))
+        self.root.focus_force()
+
     # === ПУТИ К ФАЙЛАМ ===
 
     def get_data_dir(self):
@@ -62,7 +98,29 @@ class PasswordVaultApp:
             widget.destroy()
 
         # Создаём LoginFrame
+        from gui.login_frame import LoginFrame
+        startup_timing.mark("login frame import")
+
         self.login_frame = LoginFrame(self.root, self)
+        startup_timing.report_login_screen(self.root)
+
+    # === НЕСКОЛЬКО ХРАНИЛИЩ ===
+
+    def switch_vault(self, key):
+        """Выбирает другое хранилище и показывает для него экран входа"""
+        from main.vaults import get_registry
+
+        if not self.is_locked:
+            return
+        self.vault_info = get_registry().set_active(key)
+        self.show_login_frame()
+
+    def add_vault(self, name):
+        """Регистрирует новое хранилище и переходит к его созданию"""
+        from main.vaults import get_registry
+
+        info = get_registry().add(name)
+        self.switch_vault(info.id)
 
     # === СОЗДАНИЕ VAULT ===
 
@@ -71,18 +129,18 @@ class PasswordVaultApp:
         Создаёт новое хранилище с мастер-паролем
         Вызывается из LoginFrame
         """
-        try:
-            # Создаём encryptor
-            self.encryptor = Encryptor(master_password)
+        from main.keyslots import create_keyslots
+        from main.database import PasswordDatabase
+        from main.durable import write_durable
 
-            # Сохраняем соль
-            with open(self.get_salt_path(), "wb") as f:
-                f.write(self.encryptor.salt)
+        try:
+            # Случайный ключ данных, обёрнутый ключом из мастер-пароля
+            self.encryptor, keyslots = create_keyslots(master_password)
+            keyslots.save()
 
             # 🔒 БЕЗОПАСНОСТЬ: Сохраняем контрольный токен для проверки пароля
             verification_token = self.encryptor.encrypt("EVOLS_VERIFICATION_TOKEN_2024")
-            with open(self.get_verification_path(), "w", encoding="utf-8") as f:
-                f.write(verification_token)
+            write_durable(self.get_verification_path(), verification_token.encode("utf-8"))
 
             # Создаём базу данных
             self.db = PasswordDatabase(self.get_db_path(), self.encryptor)
@@ -99,57 +157,83 @@ class PasswordVaultApp:
 
     # === ВХОД В VAULT ===
 
-    def login_with_password(self, master_password):
+    def login_with_password(self, master_password, keyfile_path=None):
         """
         Вход в существующее хранилище
         Вызывается из LoginFrame
+
+        Ключ выводится в фоне, а база открывается и читается параллельно,
+        так что главное окно рисуется сразу после проверки пароля.
         """
+        from main.vault import StagedLogin
+
+        if self.pending_login:
+            return
+
+        login = StagedLogin(master_password, self.get_db_path(), keyfile_path)
+        self.pending_login = login
+
         try:
-            # Загружаем соль
-            with open(self.get_salt_path(), "rb") as f:
-                salt = f.read()
+            # Открываем БД, миграции и первый запрос списка - без ключа
+            login.prepare_database()
+        except Exception as e:
+            # Ошибку покажем после проверки пароля, finish() попробует ещё раз
+            print(f"Не удалось заранее открыть БД: {e}")
+            login.cancel()
 
-            # Создаём encryptor
-            self.encryptor = Encryptor(master_password, salt)
+        # Модуль главного окна тоже не зависит от ключа - прогреваем импорт
+        import gui.main_window  # noqa: F401
 
-            # 🔒 БЕЗОПАСНОСТЬ: ОБЯЗАТЕЛЬНАЯ проверка пароля через контрольный токен
-            # Работает даже если база данных пустая!
-            with open(self.get_verification_path(), "r", encoding="utf-8") as f:
-                verification_token = f.read()
+        self._wait_for_login(login)
 
-            # Попытка расшифровать контрольный токен
-            # Если пароль неверный - будет InvalidToken
-            decrypted = self.encryptor.decrypt(verification_token)
-            if decrypted != "EVOLS_VERIFICATION_TOKEN_2024":
-                raise InvalidToken()
+    def _wait_for_login(self, login):
+        """Ждёт завершения вывода ключа, не блокируя интерфейс"""
+        from main.encryption import InvalidToken
 
-            # Открываем базу данных
-            self.db = PasswordDatabase(self.get_db_path(), self.encryptor)
+        if not login.key_ready():
+            self.root.after(15, lambda: self._wait_for_login(login))
+            return
+
+        self.pending_login = None
+
+        try:
+            # 🔒 БЕЗОПАСНОСТЬ: ОБЯЗАТЕЛЬНАЯ проверка пароля через контрольный токен
+            # (выполняется в unlock_encryptor, при неверном пароле - InvalidToken)
+            self.encryptor, self.db, initial_rows = login.finish()
 
             # Разблокируем приложение
             self.is_locked = False
             self.setup_idle_timer()
 
             # Показываем главное окно
-            self.show_main_window()
+            self.show_main_window(initial_rows)
 
         except InvalidToken:
+            login.cancel()
             messagebox.showerror("Ошибка", "Неверный мастер-пароль")
         except FileNotFoundError:
+            login.cancel()
             messagebox.showerror("Ошибка", "Файл проверки не найден. Возможно база повреждена.")
         except Exception as e:
+            login.cancel()
             messagebox.showerror("Ошибка", f"Ошибка при входе: {e}")
 
     # === ГЛАВНОЕ ОКНО ===
 
-    def show_main_window(self):
+    def show_main_window(self, initial_rows=None):
         """Показывает главное окно после успешного входа"""
+        # Предыдущее главное окно больше не должно реагировать на настройки
+        if getattr(self, "main_window", None):
+            self.main_window.release_settings()
+            self.main_window.stop_cache_purge()
+
         # Очищаем окно
         for widget in self.root.winfo_children():
             widget.destroy()
 
         # Создаём главное окно
-        self.main_window = MainWindow(self.root, self.db, self.encryptor)
+        from gui.main_window import MainWindow
+        self.main_window = MainWindow(self.root, self.db, self.encryptor, initial_rows)
 
     # === АВТОБЛОКИРОВКА ===
 
@@ -159,6 +243,11 @@ class PasswordVaultApp:
         self.root.bind_all("<Any-Button>", self.reset_idle_timer)
         self.reset_idle_timer()
 
+    def on_auto_lock_changed(self, key, value):
+        """Применяет новый таймаут автоблокировки без перезапуска"""
+        self.idle_timeout_ms = self.settings.auto_lock_ms
+        self.reset_idle_timer()
+
     def reset_idle_timer(self, event=None):
         """Сбрасывает таймер при активности"""
         if self.is_locked:
@@ -180,7 +269,12 @@ class PasswordVaultApp:
                 pass
             self.db = None
 
-        # Очищаем encryptor
+        # Затираем кэш расшифрованных значений и очищаем encryptor
+        from main.entry_cache import clear_plaintext_cache
+        clear_plaintext_cache()
+        if getattr(self, "main_window", None):
+            self.main_window.stop_cache_purge()
+
         if self.encryptor:
             try:
                 self.encryptor.clear()
@@ -217,6 +311,9 @@ class PasswordVaultApp:
             except Exception as e:
                 print(f"Ошибка при закрытии БД: {e}")
 
+        from main.entry_cache import clear_plaintext_cache
+        clear_plaintext_cache()
+
         if self.encryptor:
             try:
                 self.encryptor.clear()
@@ -226,20 +323,39 @@ class PasswordVaultApp:
         if self.idle_after_id:
             self.root.after_cancel(self.idle_after_id)
 
+        self.settings.flush()
+
+        if self.instance:
+            self.instance.close()
+
         self.root.destroy()
 
 
 def main():
     """Точка входа в приложение"""
+    # Второй запуск только показывает окно уже работающего экземпляра
+    instance = SingleInstance()
+    if not instance.acquire():
+        if instance.notify(COMMAND_FOCUS):
+            print("EVOLS уже запущен - окно переведено на передний план")
+        else:
+            print("EVOLS уже запущен, но не отвечает")
+        return
+    try:
+        instance.listen()
+    except Exception as e:
+        print(f"Ошибка канала экземпляра: {e}")
+
     # Настройка темы
     ctk.set_appearance_mode("dark")
     ctk.set_default_color_theme("blue")
 
     # Создаём главное окно
     root = ctk.CTk()
+    startup_timing.mark("root window")
 
     # Запускаем приложение
-    PasswordVaultApp(root)
+    PasswordVaultApp(root, instance)
 
     # Главный цикл
     root.mainloop()
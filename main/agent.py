@@ -0,0 +1,434 @@
+"""
+Агент хранилища (по образцу ssh-agent).
+
+Процесс один раз выводит ключ и держит открытую сессию (Encryptor и
+соединение с базой), а консольные утилиты обращаются к нему через
+Unix-сокет - повторные запросы занимают микросекунды вместо секунд
+PBKDF2.
+
+Протокол: кадр = 4 байта длины (big-endian) + JSON в UTF-8.
+    запрос:  {"op": "get", "id": 12, "fields": ["password"]}
+    ответ:   {"ok": true, "result": {...}} или {"ok": false, "error": "..."}
+Списки (list, search, match) передаются частями не больше
+STREAM_CHUNK_BYTES, последним идёт {"ok": true, "end": true, "count": n}.
+Кадры и клиент - в main.agent_client (CLI не загружает asyncio).
+
+Операции: ping, list, search, match (по адресу сайта), get, copy, lock.
+
+Безопасность: сокет создаётся с правами 0600, у каждого подключения
+проверяется uid собеседника (SO_PEERCRED / LOCAL_PEERCRED) - чужие
+процессы отклоняются. Агент блокируется сам (затирает ключ и кэш и
+удаляет сокет) после простоя дольше auto_lock_time из настроек.
+
+Запуск:      python -m main.agent
+Остановка:   python -m main.agent stop
+Бенчмарк:    python -m main.agent bench
+"""
+import os
+import sys
+import json
+import time
+import socket
+import struct
+import asyncio
+
+import paths
+from main.agent_client import (
+    FRAME_HEADER, MAX_FRAME_SIZE, AgentClient, AgentError, decode_payload, encode_frame
+)
+from main.settings_store import get_settings
+
+
+CLIPBOARD_CLEAR_SECONDS = 30
+
+# Операции, чей результат - список: он уходит несколькими кадрами
+STREAMED_OPS = ("list", "search", "match")
+STREAM_CHUNK_BYTES = 256 * 1024
+
+
+# === КАДРЫ ===
+
+async def read_frame(reader):
+    """Читает кадр; None - собеседник закрыл соединение."""
+    try:
+        header = await reader.readexactly(FRAME_HEADER.size)
+    except asyncio.IncompleteReadError:
+        return None
+    (size,) = FRAME_HEADER.unpack(header)
+    if size > MAX_FRAME_SIZE:
+        raise AgentError("Слишком большой кадр")
+    return decode_payload(await reader.readexactly(size))
+
+
+# === ПРОВЕРКА СОБЕСЕДНИКА ===
+
+def peer_uid(sock):
+    """
+    uid процесса на другом конце Unix-сокета или None, если ОС
+    не позволяет его узнать.
+    """
+    if hasattr(socket, "SO_PEERCRED"):
+        # Linux: struct ucred {pid_t pid; uid_t uid; gid_t gid;}
+        creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+        _pid, uid, _gid = struct.unpack("3i", creds)
+        return uid
+    if sys.platform == "darwin":
+        # macOS: LOCAL_PEERCRED -> struct xucred {u_int version; uid_t uid; ...}
+        SOL_LOCAL, LOCAL_PEERCRED = 0, 1
+        creds = sock.getsockopt(SOL_LOCAL, LOCAL_PEERCRED, struct.calcsize("2I") + 2 + 16 * 4)
+        _version, uid = struct.unpack_from("2I", creds)
+        return uid
+    return None
+
+
+# === БУФЕР ОБМЕНА ===
+
+_CLIPBOARD_COMMANDS = (
+    ("wl-copy",),
+    ("xclip", "-selection", "clipboard"),
+    ("xsel", "--clipboard", "--input"),
+    ("pbcopy",),
+    ("clip",),
+)
+
+
+def copy_to_clipboard(text):
+    """Копирует текст системной утилитой (Tk в агенте не загружается)."""
+    import shutil
+    import subprocess
+
+    for command in _CLIPBOARD_COMMANDS:
+        if shutil.which(command[0]):
+            subprocess.run(command, input=text.encode("utf-8"), check=True, timeout=5)
+            return command[0]
+    raise AgentError("Не найдена утилита буфера обмена (wl-copy, xclip, xsel, pbcopy)")
+
+
+# === СЕРВЕР ===
+
+class VaultAgent:
+    """Сессия хранилища, обслуживающая запросы через Unix-сокет."""
+
+    def __init__(self, db, socket_path=None, idle_timeout=None):
+        self.db = db
+        self.socket_path = socket_path or paths.agent_socket_path()
+        self._fixed_timeout = idle_timeout
+        self.settings = get_settings()
+        self.last_activity = time.monotonic()
+        self.requests = 0
+        self._server = None
+        self._stopped = None
+        self._handlers = {
+            "ping": self._op_ping,
+            "list": self._op_list,
+            "search": self._op_search,
+            "match": self._op_match,
+            "get": self._op_get,
+            "copy": self._op_copy,
+            "lock": self._op_lock,
+        }
+
+    @property
+    def idle_timeout(self):
+        """Секунды простоя до блокировки (из auto_lock_time, минуты)."""
+        if self._fixed_timeout is not None:
+            return self._fixed_timeout
+        return self.settings.get("auto_lock_time") * 60
+
+    # === ЖИЗНЕННЫЙ ЦИКЛ ===
+
+    async def serve(self, ready=None):
+        """Работает до блокировки (по простою или запросу lock)."""
+        self._stopped = asyncio.Event()
+        self._remove_stale_socket()
+
+        old_umask = os.umask(0o177)
+        try:
+            self._server = await asyncio.start_unix_server(self._handle_client, path=self.socket_path)
+        finally:
+            os.umask(old_umask)
+
+        watchdog = asyncio.ensure_future(self._watch_idle())
+        purger = asyncio.ensure_future(self._purge_plaintext())
+        if ready:
+            ready()
+        try:
+            await self._stopped.wait()
+        finally:
+            watchdog.cancel()
+            purger.cancel()
+            self._server.close()
+            await self._server.wait_closed()
+            self._lock_session()
+
+    def _remove_stale_socket(self):
+        if not os.path.exists(self.socket_path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except OSError:
+            os.remove(self.socket_path)
+            return
+        finally:
+            probe.close()
+        raise AgentError(f"Агент уже запущен: {self.socket_path}")
+
+    async def _watch_idle(self):
+        while True:
+            await asyncio.sleep(min(5, max(0.05, self.idle_timeout / 4)))
+            # Время блокировки могли изменить в окне настроек другого процесса
+            self.settings.reload()
+            if time.monotonic() - self.last_activity >= self.idle_timeout:
+                print("🔒 Агент заблокирован по простою")
+                self._stopped.set()
+                return
+
+    async def _purge_plaintext(self):
+        """Затирает просроченные значения кэша, пока агент не заблокирован."""
+        from main.entry_cache import PURGE_INTERVAL_SECONDS, purge_expired_plaintext
+
+        while True:
+            await asyncio.sleep(PURGE_INTERVAL_SECONDS)
+            purge_expired_plaintext()
+
+    def stop(self):
+        if self._stopped:
+            self._stopped.set()
+
+    def _lock_session(self):
+        """Затирает кэш и ключ, закрывает базу и удаляет сокет."""
+        from main.entry_cache import clear_plaintext_cache
+
+        clear_plaintext_cache()
+        if self.db.encryptor:
+            self.db.encryptor.clear()
+        self.db.close()
+        try:
+            os.remove(self.socket_path)
+        except OSError:
+            pass
+
+    # === СОЕДИНЕНИЯ ===
+
+    async def _handle_client(self, reader, writer):
+        sock = writer.get_extra_info("socket")
+        try:
+            uid = peer_uid(sock)
+        except OSError as e:
+            print(f"Не удалось проверить собеседника агента: {e}")
+            uid = None
+        if uid != os.getuid():
+            # Нельзя проверить или чужой пользователь - закрываем без ответа
+            writer.close()
+            return
+
+        try:
+            while not self._stopped.is_set():
+                try:
+                    request = await read_frame(reader)
+                except (AgentError, ValueError) as e:
+                    writer.write(encode_frame({"ok": False, "error": str(e)}))
+                    break
+                if request is None:
+                    break
+                for frame in self._reply_frames(request, self.dispatch(request)):
+                    writer.write(frame)
+                    await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def dispatch(self, request):
+        """Выполняет запрос и возвращает объект ответа."""
+        self.last_activity = time.monotonic()
+        self.requests += 1
+        handler = self._handlers.get(request.get("op"))
+        if handler is None:
+            return {"ok": False, "error": f"Неизвестная операция: {request.get('op')}"}
+        try:
+            return {"ok": True, "result": handler(request)}
+        except Exception as e:
+            return {"ok": False, "error": str(e)}
+
+    def _reply_frames(self, request, response):
+        """
+        Кадры ответа. Ошибка кодирования (или чтения списка посреди
+        передачи) становится ответом {"ok": false}, а не обрывом связи.
+        """
+        try:
+            if not (response.get("ok") and request.get("op") in STREAMED_OPS):
+                yield encode_frame(response)
+                return
+
+            chunk, size, count = [], 0, 0
+            for item in response["result"]:
+                item_size = len(json.dumps(item, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+                if chunk and size + item_size > STREAM_CHUNK_BYTES:
+                    yield encode_frame({"ok": True, "chunk": chunk})
+                    chunk, size = [], 0
+                chunk.append(item)
+                size += item_size
+                count += 1
+            if chunk:
+                yield encode_frame({"ok": True, "chunk": chunk})
+            yield encode_frame({"ok": True, "end": True, "count": count})
+        except Exception as e:
+            yield encode_frame({"ok": False, "error": str(e)})
+
+    # === ОПЕРАЦИИ ===
+
+    def _op_ping(self, request):
+        return {"pid": os.getpid(), "requests": self.requests, "idle_timeout": self.idle_timeout}
+
+    def _op_list(self, request):
+        # Перебирается при отправке частями (_reply_frames)
+        return self.db.iter_entries(folder=request.get("folder"), category=request.get("category"))
+
+    def _op_search(self, request):
+        rows = self.db.search_passwords(str(request.get("query", "")))
+        return [dict(zip(("id", "title", "category", "url", "folder"), row)) for row in rows]
+
+    def _op_match(self, request):
+        return self.db.find_by_url(str(request.get("url", "")), request.get("limit"))
+
+    def _entry(self, request):
+        entry = self.db.get_entry(int(request["id"]))
+        if entry is None:
+            raise AgentError(f"Запись {request['id']} не найдена")
+        return entry
+
+    def _op_get(self, request):
+        entry = self._entry(request)
+        fields = request.get("fields") or entry.keys()
+        return {field: entry[field] for field in fields if field in entry}
+
+    def _op_copy(self, request):
+        entry = self._entry(request)
+        field = request.get("field", "password")
+        tool = copy_to_clipboard(entry[field])
+
+        clear_after = request.get("clear_after", CLIPBOARD_CLEAR_SECONDS)
+        if clear_after:
+            asyncio.get_event_loop().call_later(clear_after, self._clear_clipboard)
+        return {"copied": field, "title": entry["title"], "tool": tool}
+
+    @staticmethod
+    def _clear_clipboard():
+        try:
+            copy_to_clipboard("")
+        except Exception as e:
+            print(f"Не удалось очистить буфер обмена: {e}")
+
+    def _op_lock(self, request):
+        self.stop()
+        return {"locked": True}
+
+
+# === ЗАПУСК ===
+
+def run_agent(master_password=None, keyfile_path=None, socket_path=None):
+    """Открывает хранилище и обслуживает запросы до блокировки."""
+    from main import vault
+    from main.database import PasswordDatabase
+
+    if keyfile_path:
+        encryptor = vault.unlock_keyfile(keyfile_path)
+    else:
+        encryptor = vault.unlock_encryptor(master_password)
+    agent = VaultAgent(PasswordDatabase(paths.db_path(), encryptor), socket_path)
+
+    def announce():
+        print(f"EVOLS_AGENT_SOCK={agent.socket_path}; export EVOLS_AGENT_SOCK;")
+        print(f"echo Agent pid {os.getpid()};", flush=True)
+
+    try:
+        asyncio.run(agent.serve(ready=announce))
+    except KeyboardInterrupt:
+        agent._lock_session()
+
+
+def _benchmark(count):
+    import threading
+    import tempfile
+
+    from main.database import PasswordDatabase
+    from main.encryption import Encryptor
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        encryptor = Encryptor.from_data_key(os.urandom(32))
+        db_path = os.path.join(data_dir, "bench.db")
+        socket_path = os.path.join(data_dir, "agent.sock")
+        setup = PasswordDatabase(db_path, encryptor)
+        for i in range(100):
+            setup.add_password(f"entry {i}", f"user{i}", f"password-{i}")
+        setup.close()
+
+        ready = threading.Event()
+        holder = {}
+
+        def serve():
+            # Соединение SQLite создаётся в потоке агента
+            agent = VaultAgent(PasswordDatabase(db_path, encryptor), socket_path, idle_timeout=60)
+            holder["agent"] = agent
+            asyncio.run(agent.serve(ready=ready.set))
+
+        thread = threading.Thread(target=serve, daemon=True)
+        thread.start()
+        ready.wait()
+
+        with AgentClient(socket_path) as client:
+            start = time.perf_counter()
+            for i in range(count):
+                client.request("get", id=i % 100 + 1, fields=["password"])
+            elapsed = time.perf_counter() - start
+            print(f"get (пароль): {elapsed / count * 1e6:8.1f} мкс на запрос, {count} запросов")
+
+            start = time.perf_counter()
+            for i in range(count // 10):
+                client.request("search", query="entry 4")
+            elapsed = time.perf_counter() - start
+            print(f"search:       {elapsed / (count // 10) * 1e6:8.1f} мкс на запрос")
+
+            start = time.perf_counter()
+            unlock_encryptor = Encryptor("benchmark-password")
+            print(f"Для сравнения, вывод ключа PBKDF2: {(time.perf_counter() - start) * 1000:.0f} ms")
+            unlock_encryptor.clear()
+
+            client.request("lock")
+        thread.join(5)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Агент хранилища EVOLS")
+    parser.add_argument("command", nargs="?", default="start", choices=("start", "stop", "status", "bench"))
+    parser.add_argument("--keyfile")
+    parser.add_argument("--socket")
+    parser.add_argument("--vault", default=os.environ.get("EVOLS_VAULT"),
+                        help="хранилище из реестра (у каждого свой сокет)")
+    parser.add_argument("--count", type=int, default=10000)
+    args = parser.parse_args()
+
+    if args.vault:
+        from main.vaults import get_registry
+        info = get_registry().get(args.vault)
+        paths.set_active_vault(None if info.is_default else info.path)
+
+    if args.command == "bench":
+        _benchmark(args.count)
+    elif args.command in ("stop", "status"):
+        client = AgentClient.connect(args.socket)
+        if client is None:
+            print("Агент не запущен")
+            sys.exit(1)
+        with client:
+            print(json.dumps(client.request("lock" if args.command == "stop" else "ping"), ensure_ascii=False))
+    else:
+        password = None
+        if not args.keyfile:
+            import getpass
+            password = os.environ.get("EVOLS_MASTER_PASSWORD") or getpass.getpass("Мастер-пароль: ", stream=sys.stderr)
+        run_agent(password, args.keyfile, args.socket)
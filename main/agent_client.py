@@ -0,0 +1,127 @@
+"""
+Клиент агента хранилища и формат кадров (без asyncio).
+
+Консольные команды подключаются к агенту при каждом запуске, поэтому
+этот модуль импортирует только стандартные лёгкие модули: asyncio
+нужен лишь серверу (main.agent) и стоил бы CLI десятков миллисекунд.
+
+Кадр = 4 байта длины (big-endian) + JSON в UTF-8, не больше
+MAX_FRAME_SIZE. Ответ-список (list, search, match) приходит частями:
+    {"ok": true, "chunk": [...]} ... {"ok": true, "end": true, "count": n}
+"""
+import json
+import socket
+import struct
+
+import paths
+
+
+FRAME_HEADER = struct.Struct(">I")
+MAX_FRAME_SIZE = 1024 * 1024
+
+
+class AgentError(Exception):
+    """Ошибка протокола или отказ агента"""
+    pass
+
+
+# === КАДРЫ ===
+
+def encode_frame(obj):
+    payload = json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if len(payload) > MAX_FRAME_SIZE:
+        raise AgentError("Слишком большой кадр")
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+def decode_payload(payload):
+    obj = json.loads(payload.decode("utf-8"))
+    if not isinstance(obj, dict):
+        raise AgentError("Кадр должен содержать JSON-объект")
+    return obj
+
+
+# === КЛИЕНТ ===
+
+class AgentClient:
+    """Синхронный клиент агента (для CLI и скриптов)."""
+
+    def __init__(self, socket_path=None, timeout=5):
+        self.socket_path = socket_path or paths.agent_socket_path()
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(self.socket_path)
+
+    @classmethod
+    def connect(cls, socket_path=None):
+        """Клиент или None, если агент не запущен."""
+        if not hasattr(socket, "AF_UNIX"):
+            return None
+        try:
+            return cls(socket_path)
+        except OSError:
+            return None
+
+    def _recv_exactly(self, size):
+        chunks = []
+        while size:
+            chunk = self.sock.recv(size)
+            if not chunk:
+                raise AgentError("Агент закрыл соединение")
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b"".join(chunks)
+
+    def _read_response(self):
+        (size,) = FRAME_HEADER.unpack(self._recv_exactly(FRAME_HEADER.size))
+        if size > MAX_FRAME_SIZE:
+            raise AgentError("Слишком большой кадр")
+        response = decode_payload(self._recv_exactly(size))
+        if not response.get("ok"):
+            raise AgentError(response.get("error", "Ошибка агента"))
+        return response
+
+    def iter_request(self, op, **params):
+        """
+        Отправляет запрос и отдаёт элементы ответа-списка по мере
+        получения частей. Если перебор прерван, соединение закрывается
+        (непрочитанные части иначе попали бы в ответ следующему запросу).
+        """
+        self.sock.sendall(encode_frame(dict(params, op=op)))
+        finished = False
+        try:
+            while True:
+                response = self._read_response()
+                if "chunk" in response:
+                    yield from response["chunk"]
+                    continue
+                if not response.get("end"):
+                    # Ответ одним кадром
+                    yield from response["result"]
+                finished = True
+                return
+        finally:
+            if not finished:
+                self.close()
+
+    def request(self, op, **params):
+        """Отправляет запрос и возвращает result; при отказе - AgentError."""
+        self.sock.sendall(encode_frame(dict(params, op=op)))
+        response = self._read_response()
+        if "chunk" not in response:
+            return response["result"]
+        items = list(response["chunk"])
+        while True:
+            response = self._read_response()
+            if response.get("end"):
+                return items
+            items.extend(response["chunk"])
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
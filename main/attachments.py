@@ -0,0 +1,275 @@
+"""
+Вложения к записям (файлы ключей, документы).
+
+Содержимое не попадает в таблицу passwords: файл режется на блоки
+фиксированного размера, каждый блок шифруется AES-256-GCM под
+отдельным подключом хранилища и хранится строкой в attachment_chunks.
+Запись и чтение идут потоком по одному блоку, поэтому ни список, ни
+поиск, ни открытие вложения не загружают файл в память целиком.
+
+Связанные данные (AAD) каждого блока - идентификатор файла, номер
+блока и признак последнего блока: перестановка, подмена блоков между
+файлами и обрезка файла обнаруживаются при чтении.
+
+Бенчмарк: python -m main.attachments --size-mb 64
+"""
+import os
+import struct
+from datetime import datetime
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from main.durable import atomic_open
+
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+ATTACHMENTS_KEY_PURPOSE = b"EVOLS-attachments-v1"
+
+_NONCE_SIZE = 12
+
+
+class AttachmentError(Exception):
+    """Повреждённое или подменённое вложение"""
+    pass
+
+
+def chunk_aad(file_id, seq, final):
+    return file_id + struct.pack(">I?", seq, final)
+
+
+def create_tables(cursor):
+    """Создаёт таблицы вложений (вызывается из PasswordDatabase._create_tables)."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS attachments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        entry_id INTEGER NOT NULL,
+        file_id BLOB NOT NULL,
+        name TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        chunk_size INTEGER NOT NULL,
+        chunk_count INTEGER NOT NULL,
+        created_at TEXT NOT NULL
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_attachments_entry ON attachments(entry_id)")
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS attachment_chunks (
+        id INTEGER PRIMARY KEY,
+        attachment_id INTEGER NOT NULL,
+        seq INTEGER NOT NULL,
+        nonce BLOB NOT NULL,
+        data BLOB NOT NULL,
+        UNIQUE (attachment_id, seq)
+    )
+    ''')
+
+
+class AttachmentStore:
+    """Чтение и запись вложений через соединение PasswordDatabase."""
+
+    def __init__(self, db):
+        self.db = db
+        self._cipher = None
+        self._cipher_key = None
+
+    def _aead(self):
+        # Ключ меняется после смены ключа данных (adopt) - пересоздаём шифр
+        key = self.db.encryptor.subkey(ATTACHMENTS_KEY_PURPOSE)
+        if key != self._cipher_key:
+            self._cipher = AESGCM(key)
+            self._cipher_key = key
+        return self._cipher
+
+    # === ЗАПИСЬ ===
+
+    def add(self, entry_id, name, source, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+        """
+        Добавляет вложение, читая source блоками.
+
+        Args:
+            entry_id: ID записи
+            name: имя файла (хранится зашифрованным)
+            source: путь к файлу или бинарный файловый объект
+            progress: необязательный callback(записано_байт)
+
+        Returns:
+            ID вложения
+        """
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, "rb") as f:
+                return self.add(entry_id, name, f, chunk_size, progress)
+
+        aead = self._aead()
+        file_id = os.urandom(16)
+        conn = self.db.conn
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "INSERT INTO attachments (entry_id, file_id, name, size, chunk_size, chunk_count, created_at) "
+                "VALUES (?, ?, ?, 0, ?, 0, ?)",
+                (entry_id, file_id, self.db.encryptor.encrypt(name), chunk_size,
+                 datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            )
+            attachment_id = cursor.lastrowid
+
+            # Читаем на блок вперёд, чтобы пометить последний блок
+            size = 0
+            seq = 0
+            chunk = source.read(chunk_size)
+            while True:
+                following = source.read(chunk_size) if chunk else b""
+                final = not following
+                nonce = os.urandom(_NONCE_SIZE)
+                cursor.execute(
+                    "INSERT INTO attachment_chunks (attachment_id, seq, nonce, data) VALUES (?, ?, ?, ?)",
+                    (attachment_id, seq, nonce, aead.encrypt(nonce, chunk, chunk_aad(file_id, seq, final)))
+                )
+                size += len(chunk)
+                seq += 1
+                if progress:
+                    progress(size)
+                if final:
+                    break
+                chunk = following
+
+            cursor.execute(
+                "UPDATE attachments SET size = ?, chunk_count = ? WHERE id = ?",
+                (size, seq, attachment_id)
+            )
+            conn.commit()
+            return attachment_id
+        except Exception:
+            conn.rollback()
+            raise
+
+    # === ЧТЕНИЕ ===
+
+    def list(self, entry_id):
+        """Метаданные вложений записи (без содержимого)."""
+        rows = self.db.conn.execute(
+            "SELECT id, name, size, created_at FROM attachments WHERE entry_id = ? ORDER BY id",
+            (entry_id,)
+        ).fetchall()
+        return [
+            {"id": id, "name": self.db.encryptor.decrypt(name), "size": size, "created_at": created_at}
+            for id, name, size, created_at in rows
+        ]
+
+    def count(self, entry_id):
+        return self.db.conn.execute(
+            "SELECT COUNT(*) FROM attachments WHERE entry_id = ?", (entry_id,)
+        ).fetchone()[0]
+
+    def iter_chunks(self, attachment_id):
+        """
+        Расшифровывает вложение поблочно (генератор bytes).
+
+        Raises:
+            AttachmentError: блок повреждён, переставлен или файл обрезан
+        """
+        meta = self.db.conn.execute(
+            "SELECT file_id, chunk_count FROM attachments WHERE id = ?", (attachment_id,)
+        ).fetchone()
+        if not meta:
+            raise AttachmentError(f"Вложение {attachment_id} не найдено")
+        file_id, chunk_count = meta
+        aead = self._aead()
+
+        # Отдельный курсор: строки читаются по одной, а не fetchall()
+        cursor = self.db.conn.cursor()
+        cursor.execute(
+            "SELECT seq, nonce, data FROM attachment_chunks WHERE attachment_id = ? ORDER BY seq",
+            (attachment_id,)
+        )
+        expected = 0
+        for seq, nonce, data in cursor:
+            if seq != expected:
+                raise AttachmentError("Нарушен порядок блоков вложения")
+            try:
+                yield aead.decrypt(nonce, data, chunk_aad(file_id, seq, seq == chunk_count - 1))
+            except Exception:
+                raise AttachmentError("Блок вложения повреждён или подменён")
+            expected += 1
+        if expected != chunk_count:
+            raise AttachmentError("Вложение обрезано")
+
+    def save(self, attachment_id, path):
+        """Расшифровывает вложение в файл (main.durable: при ошибке файл не появится)."""
+        with atomic_open(path, "wb") as f:
+            for chunk in self.iter_chunks(attachment_id):
+                f.write(chunk)
+        return path
+
+    # === УДАЛЕНИЕ ===
+
+    def delete(self, attachment_id, commit=True):
+        self.db.conn.execute("DELETE FROM attachment_chunks WHERE attachment_id = ?", (attachment_id,))
+        self.db.conn.execute("DELETE FROM attachments WHERE id = ?", (attachment_id,))
+        if commit:
+            self.db.conn.commit()
+
+    def delete_for_entry(self, entry_id, commit=True):
+        self.db.conn.execute(
+            "DELETE FROM attachment_chunks WHERE attachment_id IN "
+            "(SELECT id FROM attachments WHERE entry_id = ?)", (entry_id,)
+        )
+        self.db.conn.execute("DELETE FROM attachments WHERE entry_id = ?", (entry_id,))
+        if commit:
+            self.db.conn.commit()
+
+
+def format_size(size):
+    for unit in ("Б", "КБ", "МБ", "ГБ"):
+        if size < 1024 or unit == "ГБ":
+            return f"{size:.0f} {unit}" if unit == "Б" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def _benchmark(size_mb, chunk_size):
+    import io
+    import time
+    import tempfile
+    import tracemalloc
+
+    from main.database import PasswordDatabase
+    from main.encryption import Encryptor
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        encryptor = Encryptor.from_data_key(os.urandom(32))
+        db = PasswordDatabase(os.path.join(data_dir, "bench.db"), encryptor)
+        entry_id = db.add_password("bench", "", "secret")
+        source_path = os.path.join(data_dir, "source.bin")
+        with open(source_path, "wb") as f:
+            for _ in range(size_mb):
+                f.write(os.urandom(1024 * 1024))
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        attachment_id = db.attachments.add(entry_id, "source.bin", source_path, chunk_size=chunk_size)
+        write_time = time.perf_counter() - start
+        start = time.perf_counter()
+        db.attachments.save(attachment_id, os.path.join(data_dir, "restored.bin"))
+        read_time = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        start = time.perf_counter()
+        for _ in range(100):
+            db.get_all_passwords()
+        list_time = (time.perf_counter() - start) / 100
+
+        print(f"Запись: {size_mb / write_time:8.1f} МБ/с")
+        print(f"Чтение: {size_mb / read_time:8.1f} МБ/с")
+        print(f"Пик памяти Python: {format_size(peak)} (файл {size_mb} МБ)")
+        print(f"Список записей: {list_time * 1000:.2f} ms")
+        db.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Бенчмарк вложений")
+    parser.add_argument("--size-mb", type=int, default=64)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+    _benchmark(args.size_mb, args.chunk_size)
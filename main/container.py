@@ -0,0 +1,654 @@
+"""
+Хранилище одним файлом (контейнер .evolsv).
+
+Обычное хранилище - каталог: passwords.db, vault.keys, verify.token и
+другие файлы. Контейнер собирает их в один файл для резервной копии и
+переноса, а читать его можно без распаковки - через mmap, затрагивая
+только нужные страницы:
+
+    страница 0   заголовок и таблица разделов (имя, смещение, длина,
+                 число элементов, CRC32)
+    files        файлы ключей: vault.keys, verify.token, vault.salt,
+                 2fa_secret.key (как есть, они уже зашифрованы)
+    meta         JSON: схема SQLite (CREATE TABLE / INDEX / TRIGGER) и
+                 колонки таблиц
+    directory    открытые поля записей (id, title, url, category,
+                 folder, date_modified) по названию, блоками по
+                 DIRECTORY_CHUNK - первая страница списка читает один блок
+    index        id записей и смещения их строк (двоичный поиск)
+    table:<имя>  строки таблицы подряд (значения с метками типа)
+
+Каждый раздел начинается с новой страницы PAGE_SIZE. Зашифрованные
+поля остаются зашифрованными: упаковка и список записей не требуют
+ключа, расшифровка - только для get_entry() после unlock().
+
+Преобразование: pack_vault() - каталог хранилища -> контейнер,
+unpack_vault() - контейнер -> каталог (та же схема, те же id, индексы
+и триггеры). Основной формат приложения остаётся SQLite.
+
+Бенчмарк: python -m main.container --count 50000
+"""
+import os
+import sys
+import mmap
+import json
+import zlib
+import sqlite3
+import struct
+from array import array
+from bisect import bisect_left
+
+import paths
+from main.durable import atomic_open, replace_durable, write_durable
+
+
+MAGIC = b"EVOLSVC1"
+FORMAT_VERSION = 1
+PAGE_SIZE = 4096
+DIRECTORY_CHUNK = 256
+CONTAINER_SUFFIX = ".evolsv"
+
+_HEADER = struct.Struct("<8sHHII")      # magic, версия, резерв, размер страницы, число разделов
+_SECTION = struct.Struct("<32sQQQI")    # имя, смещение, длина, число элементов, CRC32
+_MAX_SECTIONS = (PAGE_SIZE - _HEADER.size) // _SECTION.size
+
+_LENGTH = struct.Struct("<I")
+_INT = struct.Struct("<q")
+_FLOAT = struct.Struct("<d")
+_NULL, _INTEGER, _REAL, _TEXT, _BLOB = range(5)
+
+_DIRECTORY_COLUMNS = ("id", "title", "url", "category", "folder", "date_modified")
+_ENCRYPTED_FIELDS = ("username", "password", "notes")
+
+
+class ContainerError(Exception):
+    """Файл не является контейнером EVOLS или повреждён"""
+    pass
+
+
+def _side_files(data_dir):
+    """Файлы ключей каталога хранилища: имя в контейнере -> путь."""
+    names = (paths.keyslots_path(), paths.verification_path(), paths.salt_path(), paths.twofa_path())
+    return {os.path.basename(path): os.path.join(data_dir, os.path.basename(path)) for path in names}
+
+
+# === КОДИРОВАНИЕ СТРОК ===
+
+def _pack_row(values):
+    out = bytearray()
+    for value in values:
+        if value is None:
+            out.append(_NULL)
+        elif isinstance(value, int):
+            out.append(_INTEGER)
+            out += _INT.pack(value)
+        elif isinstance(value, float):
+            out.append(_REAL)
+            out += _FLOAT.pack(value)
+        else:
+            if isinstance(value, str):
+                out.append(_TEXT)
+                value = value.encode("utf-8")
+            else:
+                out.append(_BLOB)
+            out += _LENGTH.pack(len(value))
+            out += value
+    return _LENGTH.pack(len(out)) + out
+
+
+def _unpack_row(buffer, offset, width):
+    """Returns: (значения, смещение следующей строки)"""
+    (length,) = _LENGTH.unpack_from(buffer, offset)
+    position = offset + _LENGTH.size
+    end = position + length
+    values = []
+    for _ in range(width):
+        tag = buffer[position]
+        position += 1
+        if tag == _NULL:
+            values.append(None)
+        elif tag == _INTEGER:
+            values.append(_INT.unpack_from(buffer, position)[0])
+            position += _INT.size
+        elif tag == _REAL:
+            values.append(_FLOAT.unpack_from(buffer, position)[0])
+            position += _FLOAT.size
+        elif tag in (_TEXT, _BLOB):
+            (size,) = _LENGTH.unpack_from(buffer, position)
+            position += _LENGTH.size
+            data = buffer[position:position + size]
+            values.append(data.decode("utf-8") if tag == _TEXT else data)
+            position += size
+        else:
+            raise ContainerError("Неизвестный тип значения в строке")
+    if position != end:
+        raise ContainerError("Строка повреждена")
+    return values, end
+
+
+def _pack_files(files):
+    out = bytearray(_LENGTH.pack(len(files)))
+    for name, data in files.items():
+        name = name.encode("utf-8")
+        out += _LENGTH.pack(len(name)) + name + _LENGTH.pack(len(data)) + data
+    return bytes(out)
+
+
+# === ЗАПИСЬ ===
+
+class _Writer:
+    """Разделы пишутся по очереди с границы страницы, заголовок - последним."""
+
+    def __init__(self, f):
+        self.f = f
+        self.sections = []
+        f.write(bytes(PAGE_SIZE))
+
+    def section(self, name, chunks, count=0):
+        if len(self.sections) >= _MAX_SECTIONS:
+            raise ContainerError("Слишком много разделов")
+        offset = self.f.tell()
+        padding = -offset % PAGE_SIZE
+        if padding:
+            self.f.write(bytes(padding))
+            offset += padding
+
+        length = crc = 0
+        for chunk in chunks:
+            self.f.write(chunk)
+            length += len(chunk)
+            crc = zlib.crc32(chunk, crc)
+        self.sections.append((name, offset, length, count, crc))
+        return offset
+
+    def finish(self):
+        self.f.seek(0)
+        self.f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, 0, PAGE_SIZE, len(self.sections)))
+        for name, offset, length, count, crc in self.sections:
+            self.f.write(_SECTION.pack(name.encode("utf-8"), offset, length, count, crc))
+
+
+def _buffered(rows, size=1 << 20):
+    buffer = bytearray()
+    for row in rows:
+        buffer += row
+        if len(buffer) >= size:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+def pack_vault(output_path, data_dir=None):
+    """
+    Собирает хранилище из каталога в один файл (ключ не нужен).
+
+    Читается согласованный снимок базы (одна транзакция чтения), так
+    что упаковывать можно и открытое в приложении хранилище.
+
+    Returns:
+        {"entries", "tables", "size"}
+    """
+    data_dir = data_dir or paths.get_data_dir()
+    db_path = os.path.join(data_dir, os.path.basename(paths.db_path()))
+    if not os.path.exists(db_path):
+        raise ContainerError(f"Хранилище не найдено: {db_path}")
+
+    files = {}
+    for name, path in _side_files(data_dir).items():
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                files[name] = f.read()
+
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        conn.execute("BEGIN")
+        schema = conn.execute(
+            "SELECT type, name, tbl_name, sql FROM sqlite_master "
+            "WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' ORDER BY rowid"
+        ).fetchall()
+        if any(name == "rekey_state" for _, name, _, _ in schema):
+            raise ContainerError("Смена мастер-пароля не завершена - откройте хранилище и повторите")
+
+        tables = [name for kind, name, _, _ in schema if kind == "table"]
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_sequence'").fetchone():
+            tables.append("sqlite_sequence")
+        columns = {
+            table: [column[1] for column in conn.execute(f'PRAGMA table_info("{table}")')]
+            for table in tables
+        }
+        meta = {
+            "version": FORMAT_VERSION,
+            "schema": [list(item) for item in schema],
+            "columns": columns,
+        }
+
+        with atomic_open(output_path, "wb") as f:
+            writer = _Writer(f)
+            writer.section("files", [_pack_files(files)], len(files))
+            writer.section("meta", [json.dumps(meta, ensure_ascii=False).encode("utf-8")])
+
+            directory = conn.execute(
+                f"SELECT {', '.join(_DIRECTORY_COLUMNS)} FROM passwords ORDER BY title"
+            ).fetchall()
+            writer.section("directory", _directory_chunks(directory), len(directory))
+
+            # Строки записей - с запоминанием смещений для индекса по id
+            ids, offsets = [], []
+            position = [0]
+
+            def password_rows():
+                for row in conn.execute("SELECT * FROM passwords ORDER BY id"):
+                    packed = _pack_row(row)
+                    ids.append(row[0])
+                    offsets.append(position[0])
+                    position[0] += len(packed)
+                    yield packed
+            writer.section("table:passwords", _buffered(password_rows()), len(directory))
+            writer.section("index", [struct.pack(f"<{len(ids)}q", *ids),
+                                     struct.pack(f"<{len(offsets)}Q", *offsets)], len(ids))
+
+            for table in tables:
+                if table == "passwords":
+                    continue
+                count = conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+                rows = (_pack_row(row) for row in conn.execute(f'SELECT * FROM "{table}"'))
+                writer.section(f"table:{table}", _buffered(rows), count)
+            writer.finish()
+    finally:
+        conn.close()
+
+    return {"entries": len(directory), "tables": len(tables), "size": os.path.getsize(output_path)}
+
+
+def _directory_chunks(rows):
+    """Блоки каталога: число блоков, смещения блоков, затем JSON-массивы."""
+    chunks = [
+        json.dumps(rows[start:start + DIRECTORY_CHUNK], ensure_ascii=False).encode("utf-8")
+        for start in range(0, len(rows), DIRECTORY_CHUNK)
+    ]
+    offsets = [0]
+    for chunk in chunks:
+        offsets.append(offsets[-1] + len(chunk))
+    yield _LENGTH.pack(len(chunks)) + struct.pack(f"<{len(offsets)}Q", *offsets)
+    yield from chunks
+
+
+# === ЧТЕНИЕ ===
+
+class VaultContainer:
+    """
+    Контейнер, открытый только для чтения через mmap.
+
+    Открытие читает одну страницу (заголовок); каждый метод касается
+    только своих разделов.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.encryptor = None
+        self._meta = None
+        self._files = None
+        self._index = None
+        with open(path, "rb") as f:
+            try:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ContainerError("Файл пуст")
+
+        if len(self._map) < PAGE_SIZE:
+            raise ContainerError("Файл не является контейнером EVOLS")
+        magic, version, _, page_size, count = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ContainerError("Файл не является контейнером EVOLS")
+        if version != FORMAT_VERSION or page_size != PAGE_SIZE or count > _MAX_SECTIONS:
+            raise ContainerError(f"Неподдерживаемая версия контейнера: {version}")
+
+        self.sections = {}
+        for number in range(count):
+            name, offset, length, items, crc = _SECTION.unpack_from(
+                self._map, _HEADER.size + number * _SECTION.size
+            )
+            if offset + length > len(self._map):
+                raise ContainerError("Контейнер обрезан")
+            self.sections[name.rstrip(b"\0").decode("utf-8")] = (offset, length, items, crc)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self.encryptor:
+            self.encryptor.clear()
+            self.encryptor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _section(self, name):
+        """(смещение, длина) раздела в файле."""
+        try:
+            offset, length, _, _ = self.sections[name]
+        except KeyError:
+            raise ContainerError(f"В контейнере нет раздела {name}")
+        return offset, length
+
+    def verify(self):
+        """Проверяет CRC32 всех разделов (читает файл целиком)."""
+        for name, (offset, length, _, crc) in self.sections.items():
+            if zlib.crc32(self._map[offset:offset + length]) != crc:
+                raise ContainerError(f"Раздел {name} повреждён")
+
+    # === КЛЮЧИ ===
+
+    @property
+    def meta(self):
+        if self._meta is None:
+            offset, length = self._section("meta")
+            self._meta = json.loads(self._map[offset:offset + length].decode("utf-8"))
+        return self._meta
+
+    def files(self):
+        """Файлы ключей: имя -> содержимое."""
+        if self._files is None:
+            data = self._map
+            position, _ = self._section("files")
+            (count,) = _LENGTH.unpack_from(data, position)
+            position += _LENGTH.size
+            files = {}
+            for _ in range(count):
+                (size,) = _LENGTH.unpack_from(data, position)
+                name = data[position + 4:position + 4 + size].decode("utf-8")
+                position += 4 + size
+                (size,) = _LENGTH.unpack_from(data, position)
+                files[name] = data[position + 4:position + 4 + size]
+                position += 4 + size
+            self._files = files
+        return self._files
+
+    def unlock(self, master_password=None, keyfile_path=None):
+        """
+        Открывает ключ хранилища из слотов контейнера.
+
+        Raises:
+            InvalidToken: неверный пароль или ключевой файл
+        """
+        from main.encryption import InvalidToken
+        from main.keyslots import KeySlots
+        from main.vault import VERIFICATION_TEXT
+
+        files = self.files()
+        keyslots_name = os.path.basename(paths.keyslots_path())
+        if keyslots_name not in files:
+            raise ContainerError("В контейнере нет слотов ключа (хранилище старого формата)")
+        keyslots = KeySlots.from_bytes(files[keyslots_name])
+        if keyfile_path:
+            encryptor = keyslots.unlock_keyfile(keyfile_path)
+        else:
+            encryptor = keyslots.unlock_password(master_password)
+
+        token = files.get(os.path.basename(paths.verification_path()))
+        if token is not None and encryptor.decrypt(token.decode("utf-8")) != VERIFICATION_TEXT:
+            raise InvalidToken()
+        self.encryptor = encryptor
+        return encryptor
+
+    # === ЗАПИСИ ===
+
+    def get_password_count(self):
+        return self.sections["directory"][2]
+
+    def iter_entries(self, folder=None, category=None, limit=None):
+        """
+        Открытые поля записей по названию - как PasswordDatabase.iter_entries.
+
+        Блоки каталога разбираются по мере чтения: первая страница
+        списка затрагивает только первый блок.
+        """
+        start, _ = self._section("directory")
+        (chunk_count,) = _LENGTH.unpack_from(self._map, start)
+        offsets = struct.unpack_from(f"<{chunk_count + 1}Q", self._map, start + _LENGTH.size)
+        base = start + _LENGTH.size + 8 * (chunk_count + 1)
+
+        produced = 0
+        for number in range(chunk_count):
+            chunk = self._map[base + offsets[number]:base + offsets[number + 1]]
+            for row in json.loads(chunk.decode("utf-8")):
+                entry = dict(zip(_DIRECTORY_COLUMNS, row))
+                if folder is not None and entry["folder"] != folder:
+                    continue
+                if category is not None and entry["category"] != category:
+                    continue
+                yield entry
+                produced += 1
+                if limit is not None and produced >= limit:
+                    return
+
+    def _row_offset(self, id):
+        # Индекс читается один раз: id и смещения - два массива int64
+        if self._index is None:
+            offset, _, count, _ = self.sections["index"]
+            ids = array("q", self._map[offset:offset + 8 * count])
+            offsets = array("q", self._map[offset + 8 * count:offset + 16 * count])
+            if sys.byteorder == "big":
+                ids.byteswap()
+                offsets.byteswap()
+            self._index = (ids, offsets)
+
+        ids, offsets = self._index
+        position = bisect_left(ids, id)
+        if position == len(ids) or ids[position] != id:
+            return None
+        return offsets[position]
+
+    def get_row(self, id):
+        """Строка passwords по id (поля зашифрованы) или None."""
+        row_offset = self._row_offset(id)
+        if row_offset is None:
+            return None
+        columns = self.meta["columns"]["passwords"]
+        start, _ = self._section("table:passwords")
+        values, _ = _unpack_row(self._map, start + row_offset, len(columns))
+        return dict(zip(columns, values))
+
+    def get_entry(self, id):
+        """Запись с расшифрованными логином, паролем и заметками (после unlock)."""
+        if self.encryptor is None:
+            raise ContainerError("Контейнер не разблокирован")
+        row = self.get_row(id)
+        if row is None:
+            return None
+        for field in _ENCRYPTED_FIELDS:
+            if row.get(field):
+                row[field] = self.encryptor.decrypt(row[field])
+        for field in ("password_fp", "username_fp", "title_key"):
+            row.pop(field, None)
+        return row
+
+    def rows(self, table):
+        """Все строки таблицы (кортежи в порядке колонок meta)."""
+        position, _ = self._section(f"table:{table}")
+        width = len(self.meta["columns"][table])
+        for _ in range(self.sections[f"table:{table}"][2]):
+            values, position = _unpack_row(self._map, position, width)
+            yield tuple(values)
+
+
+# === РАСПАКОВКА ===
+
+def unpack_vault(container_path, data_dir=None):
+    """
+    Восстанавливает каталог хранилища из контейнера.
+
+    Каталог должен быть пустым (без базы и слотов). Файлы ключей
+    пишутся первыми, база - последней: пока её нет, хранилище не
+    считается созданным, и распаковку можно повторить.
+
+    Returns:
+        Число записей
+    """
+    data_dir = data_dir or paths.get_data_dir()
+    os.makedirs(data_dir, exist_ok=True)
+    db_path = os.path.join(data_dir, os.path.basename(paths.db_path()))
+    if os.path.exists(db_path):
+        raise ContainerError(f"Хранилище уже существует: {data_dir}")
+
+    with VaultContainer(container_path) as container:
+        container.verify()
+        meta = container.meta
+        schema = meta["schema"]
+
+        tmp_path = f"{db_path}.unpack"
+        for suffix in ("", "-wal", "-shm", "-journal"):
+            if os.path.exists(tmp_path + suffix):
+                os.remove(tmp_path + suffix)
+
+        conn = sqlite3.connect(tmp_path)
+        try:
+            for kind, _, _, sql in schema:
+                if kind == "table":
+                    conn.execute(sql)
+            for table, columns in meta["columns"].items():
+                if table == "sqlite_sequence":
+                    continue
+                conn.executemany(
+                    f'INSERT INTO "{table}" ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})',
+                    container.rows(table)
+                )
+            if "sqlite_sequence" in meta["columns"]:
+                conn.execute("DELETE FROM sqlite_sequence")
+                conn.executemany("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)",
+                                 container.rows("sqlite_sequence"))
+            # Индексы и триггеры - после данных (триггеры не должны сработать на вставку)
+            for kind, _, _, sql in schema:
+                if kind != "table":
+                    conn.execute(sql)
+            conn.commit()
+        finally:
+            conn.close()
+
+        for name, data in container.files().items():
+            write_durable(os.path.join(data_dir, name), data)
+        replace_durable(tmp_path, db_path)
+        return container.get_password_count()
+
+
+# === БЕНЧМАРК ===
+
+def _benchmark(count):
+    import time
+    import random
+    import tempfile
+
+    from main.database import PasswordDatabase
+    from main.keyslots import create_keyslots
+    from main.vault import VERIFICATION_TEXT
+
+    def timed(action, repeat=5):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = action()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+
+    with tempfile.TemporaryDirectory() as root:
+        source = os.path.join(root, "source")
+        target = os.path.join(root, "target")
+        os.makedirs(source)
+        paths.pin_vault_dir(source)
+        encryptor, keyslots = create_keyslots("benchmark password")
+        keyslots.save()
+        write_durable(paths.verification_path(), encryptor.encrypt(VERIFICATION_TEXT).encode("utf-8"))
+        db = PasswordDatabase(paths.db_path(), encryptor)
+        db.insert_records([
+            {"title": f"entry {i:06d}", "username": f"user{i}", "password": f"password-{i}",
+             "url": f"https://site{i % 500}.example.com/login", "category": "", "notes": f"note {i}",
+             "folder": f"folder {i % 20}"}
+            for i in range(count)
+        ])
+        db.close()
+        db_size = os.path.getsize(paths.db_path())
+
+        container_path = os.path.join(root, "vault" + CONTAINER_SUFFIX)
+        start = time.perf_counter()
+        stats = pack_vault(container_path, source)
+        pack_time = time.perf_counter() - start
+
+        def sqlite_first_page():
+            conn = sqlite3.connect(paths.db_path())
+            rows = conn.execute(
+                f"SELECT {', '.join(_DIRECTORY_COLUMNS)} FROM passwords ORDER BY title LIMIT 50"
+            ).fetchall()
+            conn.close()
+            return len(rows)
+
+        def sqlite_all_titles():
+            db = PasswordDatabase(paths.db_path(), None)
+            rows = sum(1 for _ in db.iter_entries())
+            db.close()
+            return rows
+
+        def container_first_page():
+            with VaultContainer(container_path) as container:
+                return sum(1 for _ in container.iter_entries(limit=50))
+
+        def container_all_titles():
+            with VaultContainer(container_path) as container:
+                return sum(1 for _ in container.iter_entries())
+
+        ids = random.Random(1).sample(range(1, count + 1), min(count, 1000))
+
+        def sqlite_lookups():
+            conn = sqlite3.connect(paths.db_path())
+            for id in ids:
+                conn.execute("SELECT * FROM passwords WHERE id = ?", (id,)).fetchone()
+            conn.close()
+
+        def container_lookups():
+            with VaultContainer(container_path) as container:
+                for id in ids:
+                    container.get_row(id)
+
+        results = {
+            "открытие + первые 50 названий": (timed(sqlite_first_page)[0], timed(container_first_page)[0]),
+            "открытие + все названия": (timed(sqlite_all_titles, 3)[0], timed(container_all_titles, 3)[0]),
+            f"{len(ids)} записей по id": (timed(sqlite_lookups)[0], timed(container_lookups)[0]),
+        }
+        assert timed(container_all_titles, 1)[1] == count
+
+        start = time.perf_counter()
+        unpacked = unpack_vault(container_path, target)
+        unpack_time = time.perf_counter() - start
+        assert unpacked == count
+
+        original = sqlite3.connect(os.path.join(source, "passwords.db"))
+        restored = sqlite3.connect(os.path.join(target, "passwords.db"))
+        for table in ("passwords", "entry_urls", "vault_meta", "sqlite_sequence"):
+            assert original.execute(f"SELECT * FROM {table} ORDER BY 1").fetchall() == \
+                restored.execute(f"SELECT * FROM {table} ORDER BY 1").fetchall(), table
+        original.close()
+        restored.close()
+
+        with VaultContainer(container_path) as container:
+            container.unlock("benchmark password")
+            assert container.get_entry(ids[0])["password"] == f"password-{ids[0] - 1}"
+        paths.pin_vault_dir(None)
+
+        print(f"{count} записей: база {db_size / 1e6:.1f} MB, контейнер {stats['size'] / 1e6:.1f} MB; "
+              f"упаковка {pack_time:.2f} s, распаковка {unpack_time:.2f} s")
+        print(f"{'':32} {'SQLite':>10} {'контейнер':>10}")
+        for name, (sqlite_time, container_time) in results.items():
+            print(f"{name:32} {sqlite_time * 1000:8.1f} ms {container_time * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Бенчмарк контейнера хранилища")
+    parser.add_argument("--count", type=int, default=50000)
+    args = parser.parse_args()
+    _benchmark(args.count)
@@ -1,18 +1,66 @@
 import sqlite3
 import json
+import zlib
 from datetime import datetime
 
+from main import sync, url_index
+from main.locking import BUSY_TIMEOUT
+from main.merge import title_key, username_fingerprint
+from main.settings_store import get_settings
+
+
+# Поля записи, изменения которых сохраняются в истории
+HISTORY_FIELDS = ("title", "username", "password", "url", "category", "notes")
+
+# Список папок хранится в vault_meta и меняется в одной транзакции с записями
+FOLDERS_META_KEY = "folders"
+
+# Отпечаток записи, которую не удалось расшифровать: уникален для строки
+# (не совпадает ни с одним HMAC и ни с другой записью) и не даёт выбирать
+# её снова при каждом пересчёте
+UNREADABLE_FINGERPRINT = "unreadable:{}"
+
 
 class PasswordDatabase:
     def __init__(self, db_path, encryptor):
         """Инициализация базы данных."""
-        self.conn = sqlite3.connect(db_path)
+        self.db_path = db_path
+        # Писатель ждёт чужую транзакцию до BUSY_TIMEOUT, а не падает сразу
+        self.conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT)
         self.cursor = self.conn.cursor()
         self.encryptor = encryptor
+        self._enable_wal()
         self._create_tables()
         self._upgrade_database()  # Автоматическое обновление структуры
 
 
+    def _enable_wal(self):
+        """
+        Журнал WAL: чтение из другого процесса (агент, CLI) видит
+        согласованный снимок и не блокирует запись.
+        """
+        try:
+            mode = self.conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+            if mode.lower() != "wal":
+                print(f"Журнал WAL недоступен, используется {mode}")
+        except sqlite3.Error as e:
+            print(f"Ошибка включения WAL: {e}")
+
+
+    @property
+    def attachments(self):
+        """Вложения записей (main.attachments.AttachmentStore)."""
+        if getattr(self, "_attachments", None) is None:
+            from main.attachments import AttachmentStore
+            self._attachments = AttachmentStore(self)
+        return self._attachments
+
+
+    def attach_encryptor(self, encryptor):
+        """Подключает ключ к уже открытой базе (используется при поэтапном входе)."""
+        self.encryptor = encryptor
+
+
     def _create_tables(self):
         """Создает таблицы в базе данных, если они не существуют."""
         self.cursor.execute('''
@@ -29,6 +77,30 @@ class PasswordDatabase:
             folder TEXT DEFAULT NULL
         )
         ''')
+
+        # Прежние версии записей: в data - сжатые и зашифрованные прежние
+        # значения изменившихся полей (password - формат первых версий)
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS password_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            entry_id INTEGER NOT NULL,
+            password TEXT NOT NULL,
+            changed_at TEXT NOT NULL,
+            reason TEXT,
+            data BLOB
+        )
+        ''')
+        self.cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_password_history_entry ON password_history(entry_id, changed_at)"
+        )
+
+        # Вложения - отдельные таблицы, содержимое блоками AES-GCM
+        from main.attachments import create_tables as create_attachment_tables
+        create_attachment_tables(self.cursor)
+
+        # Индекс адресов сайтов; новая таблица сразу заполняется по полю url
+        if url_index.create_tables(self.cursor):
+            url_index.rebuild(self.cursor)
         self.conn.commit()
 
 
@@ -44,6 +116,44 @@ class PasswordDatabase:
                 self.cursor.execute("ALTER TABLE passwords ADD COLUMN folder TEXT DEFAULT NULL")
                 self.conn.commit()
                 print("✅ Колонка 'folder' успешно добавлена!")
+
+            # Ключевой отпечаток пароля (HMAC) для поиска повторов без расшифровки
+            if 'password_fp' not in columns:
+                self.cursor.execute("ALTER TABLE passwords ADD COLUMN password_fp TEXT DEFAULT NULL")
+            self.cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_passwords_password_fp ON passwords(password_fp)"
+            )
+
+            # Ключи сопоставления при импорте: отпечаток логина и нормализованное название
+            if 'username_fp' not in columns:
+                self.cursor.execute("ALTER TABLE passwords ADD COLUMN username_fp TEXT DEFAULT NULL")
+            if 'title_key' not in columns:
+                self.cursor.execute("ALTER TABLE passwords ADD COLUMN title_key TEXT DEFAULT NULL")
+                self.cursor.execute("SELECT id, title FROM passwords")
+                self.cursor.executemany(
+                    "UPDATE passwords SET title_key = ? WHERE id = ?",
+                    [(title_key(title), id) for id, title in self.cursor.fetchall()]
+                )
+            self.cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_passwords_match ON passwords(username_fp, title_key)"
+            )
+            self.cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_passwords_title_key ON passwords(title_key)"
+            )
+
+            # Идентификатор и ревизия записи для синхронизации копий (main.sync)
+            if 'uuid' not in columns:
+                self.cursor.execute("ALTER TABLE passwords ADD COLUMN uuid TEXT DEFAULT NULL")
+            if 'revision' not in columns:
+                self.cursor.execute("ALTER TABLE passwords ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+            sync.create_tables(self.cursor)
+
+            # Версии истории в виде сжатого зашифрованного блоба
+            self.cursor.execute("PRAGMA table_info(password_history)")
+            history_columns = [column[1] for column in self.cursor.fetchall()]
+            if 'data' not in history_columns:
+                self.cursor.execute("ALTER TABLE password_history ADD COLUMN data BLOB")
+            self.conn.commit()
         except Exception as e:
             print(f"⚠️ Ошибка при обновлении структуры БД: {e}")
 
@@ -53,63 +163,64 @@ class PasswordDatabase:
         encrypted_password = self.encryptor.encrypt(password)
         encrypted_username = self.encryptor.encrypt(username) if username else ""
         encrypted_notes = self.encryptor.encrypt(notes) if notes else ""
+        password_fp = self.encryptor.fingerprint(password)
+        username_fp = username_fingerprint(self.encryptor, username)
 
         self.cursor.execute('''
-        INSERT INTO passwords (title, username, password, url, category, notes, folder, date_created, date_modified)
-        VALUES (?, ?, ?, ?, ?, ?, ?, datetime('now'), datetime('now'))
-        ''', (title, encrypted_username, encrypted_password, url, category, encrypted_notes, folder))
+        INSERT INTO passwords (title, username, password, url, category, notes, folder, password_fp, username_fp, title_key, date_created, date_modified)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'), datetime('now'))
+        ''', (title, encrypted_username, encrypted_password, url, category, encrypted_notes, folder, password_fp,
+              username_fp, title_key(title)))
+        entry_id = self.cursor.lastrowid
+        url_index.index_entry(self.cursor, entry_id, url)
         self.conn.commit()
-        return self.cursor.lastrowid
+        return entry_id
+
+
+    def get_entry(self, id, cache=True):
+        """
+        Получает запись по ID без расшифровки.
+
+        Логин, пароль и заметки расшифровываются только при обращении
+        к полю; расшифрованные значения живут в общем кэше с TTL,
+        который очищается при блокировке.
+
+        Returns:
+            LazyEntry или None
+        """
+        from main.entry_cache import LazyEntry, get_plaintext_cache
+
+        self.cursor.execute(
+            "SELECT id, title, username, password, url, category, notes, "
+            "date_created, date_modified, folder FROM passwords WHERE id=?",
+            (id,)
+        )
+        row = self.cursor.fetchone()
+        if not row:
+            return None
+
+        fields = {
+            'id': row[0],
+            'title': row[1],
+            'url': row[4],
+            'category': row[5],
+            'date_created': row[7],
+            'date_modified': row[8],
+            'folder': row[9]
+        }
+        tokens = {'username': row[2], 'password': row[3], 'notes': row[6]}
+        return LazyEntry(fields, tokens, self.encryptor, get_plaintext_cache() if cache else None)
 
 
     def get_password(self, id):
-        """Получает пароль по ID с расшифровкой и поддержкой папок."""
+        """Получает пароль по ID с расшифровкой всех полей."""
         try:
-            # Проверяем наличие колонки folder
-            self.cursor.execute("PRAGMA table_info(passwords)")
-            columns = [column[1] for column in self.cursor.fetchall()]
-
-            if 'folder' in columns:
-                self.cursor.execute("SELECT * FROM passwords WHERE id=?", (id,))
-                row = self.cursor.fetchone()
-
-                if row:
-                    return {
-                        'id': row[0],
-                        'title': row[1],
-                        'username': self.encryptor.decrypt(row[2]) if row[2] else "",
-                        'password': self.encryptor.decrypt(row[3]),
-                        'url': row[4],
-                        'category': row[5],
-                        'notes': self.encryptor.decrypt(row[6]) if row[6] else "",
-                        'date_created': row[7],
-                        'date_modified': row[8],
-                        'folder': row[9] if len(row) > 9 else None
-                    }
-            else:
-                # Старая структура без folder
-                self.cursor.execute("SELECT * FROM passwords WHERE id=?", (id,))
-                row = self.cursor.fetchone()
-
-                if row:
-                    return {
-                        'id': row[0],
-                        'title': row[1],
-                        'username': self.encryptor.decrypt(row[2]) if row[2] else "",
-                        'password': self.encryptor.decrypt(row[3]),
-                        'url': row[4],
-                        'category': row[5],
-                        'notes': self.encryptor.decrypt(row[6]) if row[6] else "",
-                        'date_created': row[7],
-                        'date_modified': row[8],
-                        'folder': None
-                    }
+            entry = self.get_entry(id, cache=False)
+            return entry.to_dict() if entry else None
         except Exception as e:
             print(f"Ошибка при получении пароля: {e}")
             raise
 
-        return None
-
 
     def get_all_passwords(self):
         """Получает список всех паролей с поддержкой папок (без расшифровки для производительности)."""
@@ -133,13 +244,58 @@ class PasswordDatabase:
             return self.cursor.fetchall()
 
 
+    def iter_entries(self, folder=None, category=None):
+        """
+        Построчно отдаёт открытые поля записей (без расшифровки).
+
+        Строки читаются курсором по одной, поэтому список любого
+        размера не собирается в памяти (для CLI и агента).
+        """
+        query = "SELECT id, title, url, category, folder, date_modified FROM passwords"
+        conditions = []
+        params = []
+        if folder is not None:
+            conditions.append("folder = ?")
+            params.append(folder)
+        if category is not None:
+            conditions.append("category = ?")
+            params.append(category)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+
+        cursor = self.conn.cursor()
+        cursor.execute(query + " ORDER BY title", params)
+        for id, title, url, category, folder, date_modified in cursor:
+            yield {
+                'id': id,
+                'title': title,
+                'url': url,
+                'category': category,
+                'folder': folder,
+                'date_modified': date_modified
+            }
+
+
     def update_password(self, id, title, username, password, url, category, notes, folder=None):
         """Обновляет существующий пароль с поддержкой папок."""
         encrypted_password = self.encryptor.encrypt(password)
         encrypted_username = self.encryptor.encrypt(username) if username else ""
         encrypted_notes = self.encryptor.encrypt(notes) if notes else ""
+        password_fp = self.encryptor.fingerprint(password)
+        username_fp = username_fingerprint(self.encryptor, username)
 
         try:
+            # Прежние значения изменившихся полей уходят в историю
+            previous = self._read_history_fields(id)
+            if previous:
+                current = {
+                    'title': title, 'username': username or "", 'password': password,
+                    'url': url, 'category': category, 'notes': notes or ""
+                }
+                delta = {k: v for k, v in previous.items() if (v or "") != (current[k] or "")}
+                if delta:
+                    self._add_history(id, delta, "edit")
+
             # Проверяем наличие колонки folder
             self.cursor.execute("PRAGMA table_info(passwords)")
             columns = [column[1] for column in self.cursor.fetchall()]
@@ -147,19 +303,25 @@ class PasswordDatabase:
             if 'folder' in columns:
                 self.cursor.execute('''
                 UPDATE passwords 
-                SET title=?, username=?, password=?, url=?, category=?, notes=?, folder=?, date_modified=datetime('now')
+                SET title=?, username=?, password=?, url=?, category=?, notes=?, folder=?, password_fp=?, username_fp=?, title_key=?, date_modified=datetime('now')
                 WHERE id=?
-                ''', (title, encrypted_username, encrypted_password, url, category, encrypted_notes, folder, id))
+                ''', (title, encrypted_username, encrypted_password, url, category, encrypted_notes, folder, password_fp,
+                      username_fp, title_key(title), id))
             else:
                 # Обновление без folder
                 self.cursor.execute('''
                 UPDATE passwords 
-                SET title=?, username=?, password=?, url=?, category=?, notes=?, date_modified=datetime('now')
+                SET title=?, username=?, password=?, url=?, category=?, notes=?, password_fp=?, username_fp=?, title_key=?, date_modified=datetime('now')
                 WHERE id=?
-                ''', (title, encrypted_username, encrypted_password, url, category, encrypted_notes, id))
+                ''', (title, encrypted_username, encrypted_password, url, category, encrypted_notes, password_fp,
+                      username_fp, title_key(title), id))
+            updated = self.cursor.rowcount > 0
+            if updated:
+                url_index.index_entry(self.cursor, id, url)
 
+            self.prune_history(id, commit=False)
             self.conn.commit()
-            return self.cursor.rowcount > 0
+            return updated
 
         except Exception as e:
             print(f"Ошибка при обновлении пароля: {e}")
@@ -251,6 +413,50 @@ class PasswordDatabase:
             return False
 
 
+    def get_folder_list(self):
+        """Список папок хранилища (None - список ещё не сохранялся)."""
+        self.cursor.execute("SELECT value FROM vault_meta WHERE key = ?", (FOLDERS_META_KEY,))
+        row = self.cursor.fetchone()
+        return json.loads(row[0]) if row else None
+
+
+    def change_folder_list(self, change, move=None):
+        """
+        Изменяет список папок под блокировкой записи базы.
+
+        Args:
+            change: change(folders) меняет список на месте и возвращает
+                True, если есть что сохранить (список перечитывается -
+                его мог изменить другой процесс)
+            move: (old, new) - перенести записи из папки old в new в той же
+                транзакции (new=None - в корень)
+
+        Returns:
+            True, если изменения сохранены
+        """
+        try:
+            started = not self.conn.in_transaction
+            if started:
+                self.conn.execute("BEGIN IMMEDIATE")
+            folders = self.get_folder_list() or []
+            if not change(folders):
+                if started:
+                    self.conn.rollback()
+                return False
+            self.cursor.execute(
+                "INSERT OR REPLACE INTO vault_meta (key, value) VALUES (?, ?)",
+                (FOLDERS_META_KEY, json.dumps(folders, ensure_ascii=False))
+            )
+            if move:
+                self.cursor.execute("UPDATE passwords SET folder = ? WHERE folder = ?", (move[1], move[0]))
+            self.conn.commit()
+            return True
+        except Exception as e:
+            print(f"❌ Ошибка при изменении списка папок: {e}")
+            self.conn.rollback()
+            return False
+
+
     def get_passwords_by_folder(self, folder_name):
         """
         Получает все пароли из конкретной папки.
@@ -300,6 +506,9 @@ class PasswordDatabase:
         try:
             self.cursor.execute("DELETE FROM passwords WHERE id=?", (password_id,))
             rows_affected = self.cursor.rowcount
+            self.cursor.execute("DELETE FROM password_history WHERE entry_id=?", (password_id,))
+            self.attachments.delete_for_entry(password_id, commit=False)
+            url_index.remove_entry(self.cursor, password_id)
             self.conn.commit()
             return rows_affected > 0
         except Exception as e:
@@ -336,6 +545,58 @@ class PasswordDatabase:
             return []
 
 
+    def find_by_url(self, url, limit=None):
+        """
+        Записи, подходящие к адресу сайта, по убыванию соответствия.
+
+        Совпадение хоста важнее совпадения регистрируемого домена,
+        совпадающий префикс пути повышает, другой порт - понижает балл.
+
+        Returns:
+            Список словарей (id, title, category, url, folder, score, matched)
+        """
+        try:
+            ranked = url_index.find(self.cursor, url, limit)
+            if not ranked:
+                return []
+            ids = [entry_id for entry_id, _, _ in ranked]
+            self.cursor.execute(
+                f"SELECT id, title, category, url, folder FROM passwords WHERE id IN ({','.join('?' * len(ids))})",
+                ids
+            )
+            rows = {row[0]: row for row in self.cursor.fetchall()}
+            return [
+                {
+                    'id': entry_id,
+                    'title': rows[entry_id][1],
+                    'category': rows[entry_id][2],
+                    'url': rows[entry_id][3],
+                    'folder': rows[entry_id][4],
+                    'score': points,
+                    'matched': matched
+                }
+                for entry_id, points, matched in ranked if entry_id in rows
+            ]
+        except Exception as e:
+            print(f"Ошибка при поиске по адресу: {e}")
+            return []
+
+
+    def add_entry_url(self, entry_id, url):
+        """Добавляет записи ещё один адрес сайта (помимо поля url)."""
+        added = url_index.add_url(self.cursor, entry_id, url)
+        self.conn.commit()
+        return added
+
+
+    def get_entry_urls(self, entry_id):
+        """Нормализованные адреса записи: список (url, источник)."""
+        self.cursor.execute(
+            "SELECT url, source FROM entry_urls WHERE entry_id = ? ORDER BY id", (entry_id,)
+        )
+        return self.cursor.fetchall()
+
+
     def get_passwords_by_category(self, category):
         """Получает все пароли определенной категории."""
         self.cursor.execute('''
@@ -353,10 +614,330 @@ class PasswordDatabase:
         return [row[0] for row in self.cursor.fetchall()]
 
 
+    def backfill_fingerprints(self, chunk_size=500, workers=4):
+        """
+        Однократно вычисляет отпечатки пароля и логина для записей,
+        созданных до их появления (или после смены ключа данных).
+
+        Расшифровка и HMAC выполняются параллельно пачками, запись -
+        одной транзакцией на пачку.
+
+        Returns:
+            Количество обновлённых записей
+        """
+        # Пул нужен только здесь - не загружаем concurrent.futures при импорте (CLI)
+        from concurrent.futures import ThreadPoolExecutor
+
+        updated = 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                self.cursor.execute(
+                    "SELECT id, password, username FROM passwords "
+                    "WHERE password_fp IS NULL OR username_fp IS NULL LIMIT ?",
+                    (chunk_size,)
+                )
+                rows = self.cursor.fetchall()
+                if not rows:
+                    break
+
+                def fingerprint_row(row):
+                    id, password, username = row
+                    try:
+                        return (
+                            self.encryptor.fingerprint(self.encryptor.decrypt(password)),
+                            username_fingerprint(self.encryptor, self.encryptor.decrypt(username) if username else ""),
+                            id
+                        )
+                    except Exception as e:
+                        # Одна повреждённая запись не должна останавливать остальные
+                        print(f"Запись {id} не расшифровывается, отпечатки пропущены: {type(e).__name__} {e}")
+                        unreadable = UNREADABLE_FINGERPRINT.format(id)
+                        return unreadable, unreadable, id
+
+                fingerprints = list(pool.map(fingerprint_row, rows))
+                try:
+                    self.cursor.executemany(
+                        "UPDATE passwords SET password_fp = ?, username_fp = ? WHERE id = ?",
+                        fingerprints
+                    )
+                    self.conn.commit()
+                except Exception as e:
+                    print(f"Ошибка вычисления отпечатков: {e}")
+                    self.conn.rollback()
+                    break
+                updated += sum(1 for password_fp, _, id in fingerprints
+                               if password_fp != UNREADABLE_FINGERPRINT.format(id))
+        return updated
+
+
+    def get_reused_passwords(self):
+        """
+        Находит группы записей с одинаковым паролем по отпечаткам.
+
+        Returns:
+            Список групп, каждая - список (id, title, category), от больших к меньшим
+        """
+        self.cursor.execute("SELECT 1 FROM passwords WHERE password_fp IS NULL LIMIT 1")
+        if self.cursor.fetchone():
+            self.backfill_fingerprints()
+
+        self.cursor.execute('''
+        SELECT id, title, category, password_fp
+        FROM passwords
+        WHERE password_fp IN (
+            SELECT password_fp FROM passwords
+            WHERE password_fp IS NOT NULL
+            GROUP BY password_fp
+            HAVING COUNT(*) > 1
+        )
+        ORDER BY password_fp, title
+        ''')
+
+        clusters = {}
+        for id, title, category, password_fp in self.cursor.fetchall():
+            clusters.setdefault(password_fp, []).append((id, title, category))
+        return sorted(clusters.values(), key=len, reverse=True)
+
+
+    def select_for_rotation(self, folder=None, category=None, older_than_days=None):
+        """
+        Выбирает записи для смены паролей.
+
+        Args:
+            folder: Только записи этой папки
+            category: Только записи этой категории
+            older_than_days: Только записи, не менявшиеся дольше указанного числа дней
+
+        Returns:
+            Список (id, title, url, password, date_modified)
+        """
+        conditions = []
+        params = []
+        if folder:
+            conditions.append("folder = ?")
+            params.append(folder)
+        if category:
+            conditions.append("category = ?")
+            params.append(category)
+        if older_than_days:
+            conditions.append("(date_modified IS NULL OR date_modified < datetime('now', ?))")
+            params.append(f"-{int(older_than_days)} days")
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        self.cursor.execute(f'''
+        SELECT id, title, url, password, date_modified
+        FROM passwords
+        {where}
+        ORDER BY id
+        ''', params)
+        return self.cursor.fetchall()
+
+
+    def rotate_passwords(self, folder=None, category=None, older_than_days=None,
+                         policy=None, progress=None, chunk_size=200):
+        """
+        Массово заменяет пароли отобранных записей новыми.
+
+        Старые значения переносятся в password_history. Все изменения
+        выполняются одной транзакцией: при ошибке не меняется ничего.
+
+        Args:
+            policy: utils.password_generator.PasswordPolicy (по умолчанию - стандартная)
+            progress: callback(done, total), вызывается после каждой пачки
+
+        Returns:
+            Список (id, title, url, прежняя date_modified) изменённых записей
+        """
+        from utils.password_generator import get_generator
+
+        rows = self.select_for_rotation(folder, category, older_than_days)
+        total = len(rows)
+        if not total:
+            return []
+
+        new_passwords = get_generator().generate_many(total, policy)
+        rotated = []
+        try:
+            for start in range(0, total, chunk_size):
+                history = []
+                updates = []
+                chunk = zip(rows[start:start + chunk_size], new_passwords[start:start + chunk_size])
+                for (id, title, url, old_password, date_modified), new_password in chunk:
+                    history.append((id, self._pack_history({
+                        'password': self.encryptor.decrypt(old_password)
+                    })))
+                    updates.append((
+                        self.encryptor.encrypt(new_password),
+                        self.encryptor.fingerprint(new_password),
+                        id
+                    ))
+                    rotated.append((id, title, url, date_modified))
+
+                self.cursor.executemany('''
+                INSERT INTO password_history (entry_id, password, data, changed_at, reason)
+                VALUES (?, '', ?, datetime('now'), 'rotation')
+                ''', history)
+                self.cursor.executemany('''
+                UPDATE passwords
+                SET password=?, password_fp=?, date_modified=datetime('now')
+                WHERE id=?
+                ''', updates)
+
+                if progress:
+                    progress(min(start + chunk_size, total), total)
+
+            self.prune_history(commit=False)
+            self.conn.commit()
+        except Exception as e:
+            print(f"Ошибка смены паролей: {e}")
+            self.conn.rollback()
+            raise
+        finally:
+            new_passwords.clear()
+
+        return rotated
+
+
+    def _pack_history(self, delta):
+        """Сжимает и шифрует прежние значения полей одной версии."""
+        payload = json.dumps(delta, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return self.encryptor.encrypt_bytes(zlib.compress(payload, 9))
+
+
+    def _unpack_history(self, data, legacy_password):
+        if data is None:
+            # Запись первых версий: только прежний шифротекст пароля
+            return {'password': self.encryptor.decrypt(legacy_password)}
+        return json.loads(zlib.decompress(self.encryptor.decrypt_bytes(data)).decode("utf-8"))
+
+
+    def _read_history_fields(self, entry_id):
+        """Текущие значения полей записи, которые попадают в историю."""
+        self.cursor.execute(
+            "SELECT title, username, password, url, category, notes FROM passwords WHERE id=?",
+            (entry_id,)
+        )
+        row = self.cursor.fetchone()
+        if not row:
+            return None
+        title, username, password, url, category, notes = row
+        return {
+            'title': title,
+            'username': self.encryptor.decrypt(username) if username else "",
+            'password': self.encryptor.decrypt(password),
+            'url': url,
+            'category': category,
+            'notes': self.encryptor.decrypt(notes) if notes else ""
+        }
+
+
+    def _add_history(self, entry_id, delta, reason):
+        """Добавляет версию в историю (без commit - в транзакции вызывающего)."""
+        self.cursor.execute('''
+        INSERT INTO password_history (entry_id, password, data, changed_at, reason)
+        VALUES (?, '', ?, datetime('now'), ?)
+        ''', (entry_id, self._pack_history(delta), reason))
+
+
+    def get_history_entries(self, entry_id):
+        """
+        Список версий записи без расшифровки (для быстрого показа).
+
+        Returns:
+            Список (history_id, changed_at, reason), от новых к старым
+        """
+        self.cursor.execute('''
+        SELECT id, changed_at, reason
+        FROM password_history
+        WHERE entry_id = ?
+        ORDER BY changed_at DESC, id DESC
+        ''', (entry_id,))
+        return self.cursor.fetchall()
+
+
+    def get_history_versions(self, entry_id):
+        """
+        Восстанавливает прежние версии записи.
+
+        В истории хранятся только изменившиеся поля, поэтому версии
+        собираются от текущего состояния назад.
+
+        Returns:
+            Список словарей {id, changed_at, reason, changed, fields}, от новых к старым
+        """
+        state = self._read_history_fields(entry_id)
+        if state is None:
+            return []
+
+        self.cursor.execute('''
+        SELECT id, changed_at, reason, password, data
+        FROM password_history
+        WHERE entry_id = ?
+        ORDER BY changed_at DESC, id DESC
+        ''', (entry_id,))
+
+        versions = []
+        for history_id, changed_at, reason, legacy_password, data in self.cursor.fetchall():
+            delta = self._unpack_history(data, legacy_password)
+            state = dict(state, **delta)
+            versions.append({
+                'id': history_id,
+                'changed_at': changed_at,
+                'reason': reason,
+                'changed': [field for field in HISTORY_FIELDS if field in delta],
+                'fields': state
+            })
+        return versions
+
+
+    def prune_history(self, entry_id=None, commit=True):
+        """
+        Удаляет версии сверх лимитов из настроек (число версий и срок хранения).
+
+        Args:
+            entry_id: Только для этой записи (по умолчанию - для всех)
+        """
+        settings = get_settings()
+        keep_versions = settings.get("history_keep_versions")
+        keep_days = settings.get("history_keep_days")
+
+        entry_filter = "WHERE entry_id = ?" if entry_id is not None else ""
+        params = (entry_id,) if entry_id is not None else ()
+
+        self.cursor.execute(f'''
+        DELETE FROM password_history
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY entry_id ORDER BY changed_at DESC, id DESC
+                ) AS position
+                FROM password_history
+                {entry_filter}
+            )
+            WHERE position > ?
+        )
+        ''', params + (keep_versions,))
+        removed = self.cursor.rowcount
+
+        if keep_days:
+            conditions = "changed_at < datetime('now', ?)"
+            if entry_id is not None:
+                conditions += " AND entry_id = ?"
+            self.cursor.execute(
+                f"DELETE FROM password_history WHERE {conditions}",
+                (f"-{int(keep_days)} days",) + params
+            )
+            removed += self.cursor.rowcount
+
+        if commit:
+            self.conn.commit()
+        return removed
+
+
     def password_exists(self, title):
-        """Проверяет, существует ли пароль с данным названием."""
-        self.cursor.execute("SELECT COUNT(*) FROM passwords WHERE title=?", (title,))
-        return self.cursor.fetchone()[0] > 0
+        """Проверяет, есть ли запись с таким названием (без учёта регистра и пробелов, по индексу)."""
+        self.cursor.execute("SELECT 1 FROM passwords WHERE title_key=? LIMIT 1", (title_key(title),))
+        return self.cursor.fetchone() is not None
 
 
     def get_password_count(self):
@@ -409,31 +990,113 @@ class PasswordDatabase:
 
 
     def import_from_json(self, input_file):
-        """Импортирует пароли из JSON файла с поддержкой папок."""
-        with open(input_file, 'r', encoding='utf-8') as f:
-            import_data = json.load(f)
-
-        imported_count = 0
-        for item in import_data:
-            try:
-                if item.get('password') == '***HIDDEN***':
-                    continue
-
-                self.add_password(
-                    title=item.get('title', 'Без названия'),
-                    username=item.get('username', ''),
-                    password=item.get('password', ''),
-                    url=item.get('url', ''),
-                    category=item.get('category', ''),
-                    notes=item.get('notes', ''),
-                    folder=item.get('folder', None)  # Поддержка папок при импорте
-                )
-                imported_count += 1
-            except Exception as e:
-                print(f"Ошибка импорта записи '{item.get('title', 'Unknown')}': {e}")
+        """Импортирует пароли из JSON файла с поддержкой папок (потоково, см. main.importers)."""
+        from main.importers import import_file
+        return import_file(self, input_file, format="evols").imported
+
+
+    def insert_records(self, records, pool=None, commit=True):
+        """
+        Пакетная вставка записей (импорт).
+
+        Поля шифруются параллельно в пуле потоков, если он передан,
+        строки пишутся одним executemany. Без commit вызывающий сам
+        завершает транзакцию.
+
+        Args:
+            records: словари с полями add_password
+            pool: необязательный concurrent.futures.Executor
+
+        Returns:
+            Количество вставленных записей
+        """
+        encryptor = self.encryptor
+
+        def seal(record):
+            password = record['password']
+            return (
+                record['title'],
+                encryptor.encrypt(record['username']) if record['username'] else "",
+                encryptor.encrypt(password),
+                record['url'],
+                record['category'],
+                encryptor.encrypt(record['notes']) if record['notes'] else "",
+                record['folder'],
+                encryptor.fingerprint(password),
+                username_fingerprint(encryptor, record['username']),
+                title_key(record['title'])
+            )
+
+        rows = list(pool.map(seal, records)) if pool else [seal(record) for record in records]
+
+        # AUTOINCREMENT: новые id гарантированно больше текущего максимума
+        self.cursor.execute("SELECT COALESCE(MAX(id), 0) FROM passwords")
+        last_id = self.cursor.fetchone()[0]
+        self.cursor.executemany('''
+        INSERT INTO passwords (title, username, password, url, category, notes, folder, password_fp, username_fp, title_key, date_created, date_modified)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'), datetime('now'))
+        ''', rows)
+        self.cursor.execute("SELECT id, url FROM passwords WHERE id > ? AND url != ''", (last_id,))
+        for entry_id, url in self.cursor.fetchall():
+            url_index.index_entry(self.cursor, entry_id, url)
+
+        if commit:
+            self.conn.commit()
+        return len(rows)
+
+
+    def update_records(self, updates, reason="import"):
+        """
+        Обновляет записи значениями из импорта (без commit).
+
+        Прежние значения изменившихся полей уходят в историю. Пустые
+        категория и папка во входящей записи не затирают существующие.
+
+        Args:
+            updates: список (ID, словарь с полями add_password)
+        """
+        for id, record in updates:
+            previous = self._read_history_fields(id)
+            if previous is None:
+                continue
+            category = record['category'] or previous['category']
+            current = dict(record, category=category)
+            delta = {k: v for k, v in previous.items() if (v or "") != (current[k] or "")}
+            if not delta:
                 continue
+            self._add_history(id, delta, reason)
+
+            password = record['password']
+            self.cursor.execute('''
+            UPDATE passwords
+            SET title=?, username=?, password=?, url=?, category=?, notes=?, folder=COALESCE(?, folder),
+                password_fp=?, username_fp=?, title_key=?, date_modified=datetime('now')
+            WHERE id=?
+            ''', (
+                record['title'],
+                self.encryptor.encrypt(record['username']) if record['username'] else "",
+                self.encryptor.encrypt(password),
+                record['url'],
+                category,
+                self.encryptor.encrypt(record['notes']) if record['notes'] else "",
+                record['folder'],
+                self.encryptor.fingerprint(password),
+                username_fingerprint(self.encryptor, record['username']),
+                title_key(record['title']),
+                id
+            ))
+            url_index.index_entry(self.cursor, id, record['url'])
+            self.prune_history(id, commit=False)
+
+
+    def merge_vault(self, other_db_path, other_encryptor=None):
+        """
+        Синхронизирует записи с другой копией хранилища (см. main.sync).
 
-        return imported_count
+        Returns:
+            main.sync.SyncStats
+        """
+        return sync.merge_vault(self, other_db_path, other_encryptor)
 
 
     def backup_database(self, backup_path):
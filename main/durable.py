@@ -0,0 +1,73 @@
+"""
+Надёжная запись файлов.
+
+Файл сначала пишется во временный файл в том же каталоге, данные
+сбрасываются на диск (fsync), затем временный файл переименовывается
+поверх старого (os.replace - атомарно), и на диск сбрасывается сам
+каталог, чтобы переименование пережило отключение питания. При сбое
+на любом шаге на месте остаётся либо старая, либо новая версия файла,
+но не обрезанная.
+
+Временные файлы создаются с правами 0600 и уникальным именем, поэтому
+два процесса, записывающие один файл, не портят временные файлы друг
+друга (порядок записи задают блокировки, см. main.locking).
+"""
+import os
+import json
+import tempfile
+from contextlib import contextmanager
+
+
+def fsync_dir(directory):
+    """Сбрасывает на диск запись каталога (на Windows не поддерживается)."""
+    if os.name == "nt":
+        return
+    fd = os.open(directory or ".", os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def atomic_open(path, mode="wb", encoding=None, newline=None):
+    """
+    Открывает временный файл вместо path; при выходе без ошибки он
+    заменяет path, при ошибке удаляется.
+
+        with atomic_open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, mode, encoding=encoding, newline=newline) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    fsync_dir(directory)
+
+
+def write_durable(path, data):
+    """Записывает bytes в path атомарно и надёжно."""
+    with atomic_open(path, "wb") as f:
+        f.write(data)
+
+
+def write_json(path, data, indent=2):
+    """Записывает JSON в path атомарно и надёжно."""
+    with atomic_open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent)
+
+
+def replace_durable(source, target):
+    """os.replace с сохранением переименования на диске."""
+    os.replace(source, target)
+    fsync_dir(os.path.dirname(os.path.abspath(target)))
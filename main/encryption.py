@@ -1,5 +1,7 @@
 import os
+import hmac
 import base64
+import hashlib
 from cryptography.fernet import Fernet, InvalidToken as FernetInvalidToken
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
@@ -38,10 +40,40 @@ class Encryptor:
             iterations=480000,
         )
         
-        key = base64.urlsafe_b64encode(kdf.derive(password.encode('utf-8')))
-        self.fernet = Fernet(key)
+        self._set_key(kdf.derive(password.encode('utf-8')))
         self._password = password
     
+    @classmethod
+    def from_data_key(cls, data_key: bytes, password: str = None) -> "Encryptor":
+        """
+        Создаёт Encryptor из готового ключа данных (без PBKDF2).
+
+        Ключ данных хранилища случайный и лежит в слоте ключей,
+        зашифрованный ключом из мастер-пароля (см. main.keyslots).
+        password нужен только для check_password().
+        """
+        if len(data_key) != 32:
+            raise EncryptionError("Ключ данных должен быть 256-битным")
+        encryptor = cls.__new__(cls)
+        encryptor.salt = None
+        encryptor._set_key(data_key)
+        encryptor._password = password
+        return encryptor
+    
+    def _set_key(self, raw_key: bytes):
+        self._data_key = raw_key
+        self.fernet = Fernet(base64.urlsafe_b64encode(raw_key))
+
+        # Отдельный подключ для отпечатков (HMAC), не совпадает с ключом шифрования
+        self._fingerprint_key = hmac.new(raw_key, b"EVOLS-fingerprint-v1", hashlib.sha256).digest()
+    
+    @property
+    def data_key(self) -> bytes:
+        """Сырой 256-битный ключ шифрования записей."""
+        if not self._data_key:
+            raise EncryptionError("Ключ очищен")
+        return self._data_key
+    
     def encrypt(self, data: str) -> str:
         try:
             encrypted_bytes = self.fernet.encrypt(data.encode('utf-8'))
@@ -72,7 +104,53 @@ class Encryptor:
         except Exception as e:
             raise DecryptionError(f"Ошибка при дешифровании байтов: {e}")
     
+    def fingerprint(self, data: str) -> str:
+        """
+        Ключевой отпечаток значения (HMAC-SHA256 под подключом хранилища).
+
+        Одинаковые значения дают одинаковый отпечаток, поэтому по нему
+        можно искать повторы без расшифровки, а без ключа его нельзя
+        проверить перебором.
+        """
+        if not self._fingerprint_key:
+            raise EncryptionError("Ключ отпечатков очищен")
+        return hmac.new(self._fingerprint_key, data.encode('utf-8'), hashlib.sha256).hexdigest()
+    
+    def subkey(self, purpose: bytes) -> bytes:
+        """
+        Независимый 256-битный подключ для отдельной подсистемы (HKDF).
+
+        Например, вложения шифруются AES-GCM под подключом
+        b"EVOLS-attachments-v1", а не ключом Fernet.
+        """
+        from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+        return HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=purpose).derive(self.data_key)
+    
+    def check_password(self, password: str) -> bool:
+        """Проверяет, что ключ выведен из этого мастер-пароля."""
+        if self._password is None:
+            return False
+        return hmac.compare_digest(self._password.encode('utf-8'), password.encode('utf-8'))
+    
+    def adopt(self, other: "Encryptor"):
+        """
+        Переключает этот объект на ключ другого Encryptor.
+
+        Используется после смены мастер-пароля: все окна и база держат
+        ссылку на один объект, поэтому новый ключ сразу виден везде.
+        """
+        self.salt = other.salt
+        self.fernet = other.fernet
+        self._data_key = other._data_key
+        self._password = other._password
+        self._fingerprint_key = other._fingerprint_key
+    
     def clear(self):
+        if hasattr(self, '_data_key'):
+            self._data_key = None
+        if hasattr(self, '_fingerprint_key'):
+            self._fingerprint_key = None
         if hasattr(self, '_password'):
             self._password = None
         if hasattr(self, 'fernet'):
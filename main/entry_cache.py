@@ -0,0 +1,185 @@
+"""
+Ленивые записи и короткоживущий кэш расшифрованных значений.
+
+LazyEntry хранит шифртексты секретных полей и расшифровывает поле только
+при обращении к нему: быстрому копированию нужен только пароль, логин и
+заметки не трогаются. Повторные обращения обслуживает кэш.
+
+PlaintextCache - ограниченный по размеру LRU с временем жизни. Ключ -
+сам шифртекст, поэтому изменённая запись (новый шифртекст) никогда не
+получит старое значение. Значения лежат в bytearray и при очистке
+(блокировка, закрытие, истечение срока) затираются нулями.
+Строки Python неизменяемы, так что копии, отданные интерфейсу, этим не
+затираются - кэш лишь не держит открытый текст дольше срока жизни.
+"""
+import time
+import threading
+from collections import OrderedDict
+
+from main.settings_store import get_settings
+
+
+SECRET_FIELDS = ("username", "password", "notes")
+
+DEFAULT_MAX_ENTRIES = 128
+
+# Как часто окно и агент затирают значения с истёкшим сроком (секунды)
+PURGE_INTERVAL_SECONDS = 5
+
+
+def _zeroize(buffer):
+    buffer[:] = bytes(len(buffer))
+
+
+class PlaintextCache:
+    """LRU расшифрованных значений с временем жизни (TTL)."""
+
+    def __init__(self, ttl=30, max_entries=DEFAULT_MAX_ENTRIES, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, token):
+        """Расшифрованное значение или None (нет в кэше или срок истёк)."""
+        with self._lock:
+            item = self._items.get(token)
+            if item is None:
+                self.misses += 1
+                return None
+            expires_at, buffer = item
+            if expires_at <= self._clock():
+                del self._items[token]
+                _zeroize(buffer)
+                self.misses += 1
+                return None
+            self._items.move_to_end(token)
+            self.hits += 1
+            return buffer.decode("utf-8")
+
+    def put(self, token, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            old = self._items.pop(token, None)
+            if old:
+                _zeroize(old[1])
+            self._items[token] = (self._clock() + self.ttl, bytearray(value.encode("utf-8")))
+            while len(self._items) > self.max_entries:
+                _, (_, evicted) = self._items.popitem(last=False)
+                _zeroize(evicted)
+
+    def purge_expired(self):
+        """Затирает значения с истёкшим сроком."""
+        now = self._clock()
+        with self._lock:
+            expired = [token for token, (expires_at, _) in self._items.items() if expires_at <= now]
+            for token in expired:
+                _zeroize(self._items.pop(token)[1])
+        return len(expired)
+
+    def clear(self):
+        """Затирает и удаляет все значения (блокировка, закрытие)."""
+        with self._lock:
+            for _, buffer in self._items.values():
+                _zeroize(buffer)
+            self._items.clear()
+
+    def set_ttl(self, ttl):
+        self.ttl = ttl
+        if not self.enabled:
+            self.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+_plaintext_cache = None
+
+
+def get_plaintext_cache():
+    """Общий кэш; срок жизни берётся из настройки plaintext_cache_seconds."""
+    global _plaintext_cache
+    if _plaintext_cache is None:
+        settings = get_settings()
+        _plaintext_cache = PlaintextCache(ttl=settings.get("plaintext_cache_seconds"))
+        settings.subscribe("plaintext_cache_seconds", lambda key, value: _plaintext_cache.set_ttl(value))
+    return _plaintext_cache
+
+
+def purge_expired_plaintext():
+    """
+    Затирает значения с истёкшим сроком. Вызывается по таймеру, пока
+    хранилище открыто: иначе просроченное значение лежало бы в памяти
+    до следующего обращения к тому же шифртексту.
+    """
+    if _plaintext_cache is None:
+        return 0
+    return _plaintext_cache.purge_expired()
+
+
+def clear_plaintext_cache():
+    """Затирает кэш (при блокировке и закрытии приложения)."""
+    if _plaintext_cache is not None:
+        _plaintext_cache.clear()
+
+
+class LazyEntry:
+    """
+    Запись с расшифровкой секретных полей при обращении.
+
+    Поддерживает чтение как словарь (entry['password'], entry.get(...)),
+    поэтому подходит везде, где раньше использовался результат
+    get_password(). to_dict() расшифровывает всё сразу.
+    """
+
+    __slots__ = ("_fields", "_tokens", "_encryptor", "_cache")
+
+    def __init__(self, fields, tokens, encryptor, cache=None):
+        self._fields = fields
+        self._tokens = tokens
+        self._encryptor = encryptor
+        self._cache = cache
+
+    def _decrypt(self, token):
+        if not token:
+            return ""
+        cache = self._cache
+        if cache is not None:
+            value = cache.get(token)
+            if value is not None:
+                return value
+        value = self._encryptor.decrypt(token)
+        if cache is not None:
+            cache.put(token, value)
+        return value
+
+    def __getitem__(self, key):
+        if key in self._fields:
+            return self._fields[key]
+        if key in self._tokens:
+            # Открытый текст в записи не хранится - только в кэше с TTL
+            return self._decrypt(self._tokens[key])
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return key in self._fields or key in self._tokens
+
+    def keys(self):
+        return list(self._fields) + list(self._tokens)
+
+    def to_dict(self):
+        return {key: self[key] for key in self.keys()}
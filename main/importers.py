@@ -0,0 +1,851 @@
+"""
+Импорт из других менеджеров паролей.
+
+Каждый формат - класс-импортёр в реестре (register_importer): он
+потоково читает файл и отдаёт записи словарями в форме add_password
+(title, username, password, url, category, notes, folder). Файл целиком
+в память не загружается:
+
+    csv         - csv.reader (Bitwarden, Chrome, Firefox, KeePassXC,
+                  LastPass, 1Password CSV; колонки по заголовку)
+    keepass     - KeePass 2 XML через ElementTree.iterparse
+    bitwarden   - Bitwarden JSON, потоковый разбор массива items
+    1password   - 1Password 1PUX (zip или распакованный export.data)
+    evols       - собственный экспорт (JSON-массив или NDJSON)
+
+import_records() сливает записи с хранилищем (main.merge: повторный
+импорт того же файла ничего не удваивает) и пишет их пачками: пачка
+шифруется параллельно в пуле потоков и вставляется одним executemany,
+весь импорт - одна транзакция (при ошибке в хранилище не остаётся
+ничего). В режиме dry_run файл только разбирается и классифицируется.
+
+Новый формат: подкласс Importer с name, extensions, sniff() и records().
+
+Бенчмарк: python -m main.importers --count 50000
+"""
+import io
+import os
+import csv
+import json
+import zipfile
+import threading
+
+from main.database import PasswordDatabase
+from main.merge import MergeEngine, MATCH_CLASSES, DEFAULT_POLICY
+
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_WORKERS = 4
+
+HIDDEN = "***HIDDEN***"
+UNTITLED = "Без названия"
+
+_SNIFF_SIZE = 4096
+_READ_SIZE = 64 * 1024
+
+
+class ImportFormatError(Exception):
+    """Файл не подходит импортёру или повреждён"""
+    pass
+
+
+# === РЕЕСТР ===
+
+_IMPORTERS = {}
+
+
+def register_importer(cls):
+    """Декоратор: добавляет импортёр в реестр под именем cls.name."""
+    _IMPORTERS[cls.name] = cls
+    return cls
+
+
+def available_importers():
+    """(имя, описание) всех зарегистрированных форматов."""
+    return [(cls.name, cls.label) for cls in _IMPORTERS.values()]
+
+
+def get_importer(name, path):
+    try:
+        return _IMPORTERS[name](path)
+    except KeyError:
+        raise ImportFormatError(f"Неизвестный формат импорта: {name}")
+
+
+def detect_importer(path):
+    """Импортёр по расширению файла и его началу."""
+    extension = os.path.splitext(path)[1].lower()
+    head = ""
+    if not zipfile.is_zipfile(path):
+        with open(path, "r", encoding="utf-8-sig", errors="replace") as f:
+            head = f.read(_SNIFF_SIZE)
+
+    candidates = [cls for cls in _IMPORTERS.values() if extension in cls.extensions]
+    candidates += [cls for cls in _IMPORTERS.values() if cls not in candidates]
+    for cls in candidates:
+        if cls.sniff(path, head):
+            return cls(path)
+    raise ImportFormatError("Не удалось определить формат файла")
+
+
+# === ОБЩИЕ ЧАСТИ ===
+
+class _CountingReader(io.RawIOBase):
+    """Считает прочитанные байты - по ним идёт прогресс потокового разбора."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        count = self.raw.readinto(buffer)
+        self.bytes_read += count or 0
+        return count
+
+    def close(self):
+        self.raw.close()
+        super().close()
+
+
+class Importer:
+    """Базовый импортёр: потоковое чтение файла и разметка полей."""
+
+    name = ""
+    label = ""
+    extensions = ()
+
+    def __init__(self, path):
+        self.path = path
+        self.total_bytes = 0
+        self._reader = None
+
+    @classmethod
+    def sniff(cls, path, head):
+        """Подходит ли файл этому импортёру (head - первые 4 КБ текста)."""
+        return False
+
+    def records(self):
+        """Генератор словарей записей."""
+        raise NotImplementedError
+
+    @property
+    def bytes_read(self):
+        return self._reader.bytes_read if self._reader else 0
+
+    def open_binary(self):
+        self.total_bytes = os.path.getsize(self.path)
+        self._reader = _CountingReader(open(self.path, "rb", buffering=0))
+        return io.BufferedReader(self._reader, _READ_SIZE)
+
+    def open_text(self):
+        return io.TextIOWrapper(self.open_binary(), encoding="utf-8-sig", newline="")
+
+    def read_head(self, size=_SNIFF_SIZE):
+        """Начало файла отдельным чтением (поток прогресса не перематывается)."""
+        with open(self.path, "r", encoding="utf-8-sig", errors="replace", newline="") as f:
+            return f.read(size)
+
+
+class _JsonStream:
+    """
+    Потоковый разбор JSON без загрузки файла целиком.
+
+    members() и elements() проходят объект/массив по одному члену;
+    после каждого шага вызывающий обязан прочитать значение - value()
+    или вложенным members()/elements().
+    """
+
+    _WHITESPACE = " \t\r\n"
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self):
+        chunk = self.stream.read(_READ_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in self._WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                raise ImportFormatError("Неожиданный конец JSON")
+
+    def _take(self, expected):
+        char = self._peek()
+        if char not in expected:
+            raise ImportFormatError(f"Ожидалось '{expected}', найдено '{char}'")
+        self.pos += 1
+        return char
+
+    def value(self):
+        self._peek()
+        while True:
+            try:
+                obj, end = self._decoder.raw_decode(self.buffer, self.pos)
+                # Число на границе буфера могло быть прочитано не до конца
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return obj
+            except json.JSONDecodeError as e:
+                if self.eof:
+                    raise ImportFormatError(f"Повреждённый JSON: {e}")
+            self._fill()
+
+    def members(self):
+        self._take("{")
+        if self._peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self._take(":")
+            yield key
+            if self._take(",}") == "}":
+                return
+
+    def elements(self):
+        self._take("[")
+        if self._peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield
+            if self._take(",]") == "]":
+                return
+
+    def skip(self):
+        self.value()
+
+
+def _notes_with_extras(notes, extras):
+    """Дополнительные поля (TOTP, свои поля) дописываются в заметки."""
+    lines = [f"{name}: {value}" for name, value in extras if value]
+    if not lines:
+        return notes or ""
+    return "\n".join(filter(None, [notes or ""] + lines))
+
+
+def _timestamp(value):
+    """
+    Время изменения в формате базы ("ГГГГ-ММ-ДД ЧЧ:ММ:СС", UTC).
+
+    Понимает ISO 8601, секунды Unix и base64-формат KeePass (секунды
+    от 0001-01-01); нераспознанное значение - пустая строка.
+    """
+    from datetime import datetime, timedelta, timezone
+
+    if value in (None, ""):
+        return ""
+    try:
+        if isinstance(value, (int, float)):
+            moment = datetime.fromtimestamp(value, timezone.utc)
+        else:
+            try:
+                moment = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+            except ValueError:
+                import base64
+                raw = base64.b64decode(value, validate=True)
+                if len(raw) != 8:
+                    return ""
+                seconds = int.from_bytes(raw, "little")
+                moment = datetime(1, 1, 1, tzinfo=timezone.utc) + timedelta(seconds=seconds)
+        if moment.tzinfo is not None:
+            moment = moment.astimezone(timezone.utc)
+        if moment.year < 1970:
+            return ""
+        return moment.strftime("%Y-%m-%d %H:%M:%S")
+    except (ValueError, OverflowError, OSError):
+        return ""
+
+
+def _record(title="", username="", password="", url="", category="", notes="", folder=None, modified=""):
+    return {
+        "title": title or "",
+        "username": username or "",
+        "password": password or "",
+        "url": url or "",
+        "category": category or "",
+        "notes": notes or "",
+        "folder": folder or None,
+        "modified": _timestamp(modified),
+    }
+
+
+# === ФОРМАТЫ ===
+
+@register_importer
+class CsvImporter(Importer):
+    """CSV с заголовком; колонки сопоставляются по известным названиям."""
+
+    name = "csv"
+    label = "CSV (Bitwarden, Chrome, Firefox, KeePassXC, LastPass, 1Password)"
+    extensions = (".csv",)
+
+    COLUMNS = {
+        "title": ("title", "name", "account", "entry", "название"),
+        "username": ("username", "login_username", "login name", "user name", "user", "login", "email", "логин"),
+        "password": ("password", "login_password", "пароль"),
+        "url": ("url", "login_uri", "website", "web site", "uri", "адрес"),
+        "notes": ("notes", "note", "comments", "extra", "заметки"),
+        "folder": ("folder", "group", "grouping", "vault", "папка"),
+        "category": ("category", "категория"),
+        "totp": ("totp", "login_totp", "otpauth", "one-time password"),
+    }
+
+    @classmethod
+    def sniff(cls, path, head):
+        first_line = head.split("\n", 1)[0].lower()
+        return any(sep in first_line for sep in ",;\t") and any(alias in first_line for alias in cls.COLUMNS["password"])
+
+    def _column_map(self, header):
+        normalized = [column.strip().lower() for column in header]
+        mapping = {}
+        for field, aliases in self.COLUMNS.items():
+            for alias in aliases:
+                if alias in normalized:
+                    mapping[field] = normalized.index(alias)
+                    break
+        if "password" not in mapping:
+            raise ImportFormatError("В CSV нет колонки с паролем")
+        return mapping
+
+    def records(self):
+        # Разделитель - самый частый из ",;\t" в строке заголовка
+        header_line = self.read_head().split("\n", 1)[0]
+        delimiter = max(",;\t", key=header_line.count)
+
+        with self.open_text() as f:
+            reader = csv.reader(f, delimiter=delimiter)
+            mapping = self._column_map(next(reader, []))
+
+            for row in reader:
+                if not row:
+                    continue
+                values = {field: row[index] if index < len(row) else "" for field, index in mapping.items()}
+                folder = values.get("folder", "").strip()
+                # KeePassXC пишет группы от корня: "Root/Работа"
+                if folder.startswith("Root/"):
+                    folder = folder[len("Root/"):]
+                elif folder == "Root":
+                    folder = ""
+                yield _record(
+                    title=values.get("title", "").strip(),
+                    username=values.get("username", "").strip(),
+                    password=values.get("password", ""),
+                    url=values.get("url", "").strip(),
+                    category=values.get("category", "").strip(),
+                    notes=_notes_with_extras(values.get("notes"), [("TOTP", values.get("totp"))]),
+                    folder=folder
+                )
+
+
+@register_importer
+class KeePassXmlImporter(Importer):
+    """KeePass 2.x XML (незашифрованный экспорт), группы - папки."""
+
+    name = "keepass"
+    label = "KeePass 2 XML"
+    extensions = (".xml",)
+
+    STANDARD_FIELDS = {"Title": "title", "UserName": "username", "Password": "password",
+                       "URL": "url", "Notes": "notes"}
+
+    @classmethod
+    def sniff(cls, path, head):
+        return "<KeePassFile" in head
+
+    def records(self):
+        import xml.etree.ElementTree as ElementTree
+
+        groups = []
+        history_depth = 0
+        with self.open_binary() as f:
+            for event, elem in ElementTree.iterparse(f, events=("start", "end")):
+                tag = elem.tag
+                if event == "start":
+                    if tag == "Group":
+                        groups.append(None)
+                    elif tag == "History":
+                        history_depth += 1
+                    continue
+
+                if tag == "Name" and groups and groups[-1] is None:
+                    groups[-1] = elem.text or ""
+                elif tag == "History":
+                    history_depth -= 1
+                    elem.clear()
+                elif tag == "Entry" and not history_depth:
+                    yield self._entry(elem, groups)
+                    elem.clear()
+                elif tag == "Group":
+                    groups.pop()
+                    elem.clear()
+
+    def _entry(self, elem, groups):
+        fields = {}
+        extras = []
+        for string in elem.findall("String"):
+            key = string.findtext("Key") or ""
+            value = string.findtext("Value") or ""
+            if key in self.STANDARD_FIELDS:
+                fields[self.STANDARD_FIELDS[key]] = value
+            elif value:
+                extras.append((key, value))
+        # Корневая группа - это само хранилище, папкой служит путь под ней
+        folder = "/".join(name for name in groups[1:] if name)
+        tags = (elem.findtext("Tags") or "").replace(";", ",").split(",")
+        return _record(
+            title=fields.get("title"),
+            username=fields.get("username"),
+            password=fields.get("password"),
+            url=fields.get("url"),
+            category=tags[0].strip(),
+            notes=_notes_with_extras(fields.get("notes"), extras),
+            folder=folder,
+            modified=elem.findtext("Times/LastModificationTime")
+        )
+
+
+@register_importer
+class BitwardenJsonImporter(Importer):
+    """Bitwarden JSON (личный или организации), без шифрования."""
+
+    name = "bitwarden"
+    label = "Bitwarden JSON"
+    extensions = (".json",)
+
+    @classmethod
+    def sniff(cls, path, head):
+        return '"items"' in head and ('"encrypted"' in head or '"folders"' in head or '"collections"' in head)
+
+    def records(self):
+        folders = {}
+        with self.open_text() as f:
+            stream = _JsonStream(f)
+            for key in stream.members():
+                if key == "encrypted":
+                    if stream.value():
+                        raise ImportFormatError("Зашифрованный экспорт Bitwarden не поддерживается")
+                elif key in ("folders", "collections"):
+                    folders.update({item.get("id"): item.get("name") for item in stream.value()})
+                elif key == "items":
+                    for _ in stream.elements():
+                        yield self._item(stream.value(), folders)
+                else:
+                    stream.skip()
+
+    @staticmethod
+    def _item(item, folders):
+        login = item.get("login") or {}
+        uris = [uri.get("uri") for uri in login.get("uris") or [] if uri.get("uri")]
+        extras = [("TOTP", login.get("totp"))]
+        extras += [(field.get("name") or "", field.get("value")) for field in item.get("fields") or []]
+        folder_id = item.get("folderId") or next(iter(item.get("collectionIds") or []), None)
+        return _record(
+            title=item.get("name"),
+            username=login.get("username"),
+            password=login.get("password"),
+            url=" ".join(uris),
+            notes=_notes_with_extras(item.get("notes"), extras),
+            folder=folders.get(folder_id),
+            modified=item.get("revisionDate")
+        )
+
+
+@register_importer
+class OnePasswordImporter(Importer):
+    """1Password 1PUX: архив с export.data (аккаунты - сейфы - элементы)."""
+
+    name = "1password"
+    label = "1Password 1PUX"
+    extensions = (".1pux", ".data")
+
+    @classmethod
+    def sniff(cls, path, head):
+        if zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as archive:
+                return "export.data" in archive.namelist()
+        return '"accounts"' in head and '"vaults"' in head
+
+    def open_text(self):
+        if not zipfile.is_zipfile(self.path):
+            return super().open_text()
+        archive = zipfile.ZipFile(self.path)
+        self.total_bytes = archive.getinfo("export.data").file_size
+        self._reader = _CountingReader(archive.open("export.data"))
+        return io.TextIOWrapper(io.BufferedReader(self._reader, _READ_SIZE), encoding="utf-8")
+
+    def records(self):
+        with self.open_text() as f:
+            stream = _JsonStream(f)
+            for key in stream.members():
+                if key != "accounts":
+                    stream.skip()
+                    continue
+                for _ in stream.elements():
+                    for account_key in stream.members():
+                        if account_key != "vaults":
+                            stream.skip()
+                            continue
+                        for _ in stream.elements():
+                            yield from self._vault(stream)
+
+    def _vault(self, stream):
+        vault_name = None
+        for key in stream.members():
+            if key == "attrs":
+                vault_name = (stream.value() or {}).get("name")
+            elif key == "items":
+                for _ in stream.elements():
+                    yield self._item(stream.value(), vault_name)
+            else:
+                stream.skip()
+
+    @staticmethod
+    def _item(item, vault_name):
+        overview = item.get("overview") or {}
+        details = item.get("details") or {}
+        fields = {field.get("designation"): field.get("value")
+                  for field in details.get("loginFields") or [] if field.get("designation")}
+        urls = [overview.get("url")] + [u.get("url") for u in overview.get("urls") or []]
+        urls = list(dict.fromkeys(url for url in urls if url))
+        tags = overview.get("tags") or []
+        return _record(
+            title=overview.get("title"),
+            username=fields.get("username"),
+            password=fields.get("password") or details.get("password"),
+            url=" ".join(urls),
+            category=tags[0] if tags else "",
+            notes=details.get("notesPlain"),
+            folder=vault_name,
+            modified=item.get("updatedAt")
+        )
+
+
+@register_importer
+class EvolsImporter(Importer):
+    """Собственный экспорт: JSON-массив (export_to_json) или NDJSON (evols.py)."""
+
+    name = "evols"
+    label = "EVOLS JSON / NDJSON"
+    extensions = (".json", ".ndjson", ".jsonl")
+
+    @classmethod
+    def sniff(cls, path, head):
+        return head.lstrip()[:1] in ("[", "{")
+
+    def records(self):
+        first = self.read_head().lstrip()[:1]
+        with self.open_text() as f:
+            if first == "[":
+                stream = _JsonStream(f)
+                for _ in stream.elements():
+                    yield self._item(stream.value())
+                return
+            for line in f:
+                if line.strip():
+                    yield self._item(json.loads(line))
+
+    @staticmethod
+    def _item(item):
+        fields = {key: item.get(key) for key in
+                  ("title", "username", "password", "url", "category", "notes", "folder")}
+        return _record(modified=item.get("date_modified"), **fields)
+
+
+# === ВСТАВКА ===
+
+class ImportStats:
+    """Итоги импорта (или пробного прогона)."""
+
+    def __init__(self, dry_run=False, policy=DEFAULT_POLICY):
+        self.dry_run = dry_run
+        self.policy = policy
+        self.imported = 0
+        self.updated = 0
+        self.skipped = 0
+        # Изменённые записи (newer/conflict), оставленные как есть по политике
+        self.kept = 0
+        self.matches = dict.fromkeys(MATCH_CLASSES, 0)
+        self.folders = set()
+
+    def to_dict(self):
+        return {
+            "imported": self.imported,
+            "updated": self.updated,
+            "skipped": self.skipped,
+            "kept": self.kept,
+            "matches": dict(self.matches),
+            "policy": self.policy,
+            "folders": sorted(self.folders),
+            "dry_run": self.dry_run,
+        }
+
+
+def clean_record(record):
+    """
+    Готовит запись к вставке.
+
+    Returns:
+        Запись или None, если её нельзя импортировать (нет пароля)
+    """
+    password = record.get("password") or ""
+    if not password or password == HIDDEN:
+        return None
+    if not record.get("title"):
+        from main.url_index import normalize_url
+        normalized = normalize_url(record.get("url", "").split(" ")[0])
+        record["title"] = normalized.host if normalized else (record.get("username") or UNTITLED)
+    return record
+
+
+def import_records(db, records, batch_size=DEFAULT_BATCH_SIZE, workers=DEFAULT_WORKERS,
+                   dry_run=False, progress=None, policy=DEFAULT_POLICY):
+    """
+    Сливает записи с хранилищем пачками в одной транзакции.
+
+    Каждая запись проходит через MergeEngine: новые добавляются,
+    одинаковые пропускаются, изменённые обрабатываются по политике
+    (см. main.merge). При dry_run ничего не пишется; без базы
+    (db=None) записи сравниваются только между собой.
+
+    Args:
+        db: открытая PasswordDatabase с ключом или None
+        records: итерируемые словари записей
+        progress: необязательный callback(stats) после каждой пачки
+        policy: политика для изменённых записей
+
+    Returns:
+        ImportStats
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    stats = ImportStats(dry_run, policy)
+    engine = MergeEngine(db, policy, stats)
+
+    def flush(pool):
+        inserted, updated = engine.flush(pool, dry_run=dry_run or db is None)
+        stats.imported += inserted
+        stats.updated += updated
+        if progress:
+            progress(stats)
+
+    writing = db is not None and not dry_run
+    pool = ThreadPoolExecutor(max_workers=workers) if writing else None
+    try:
+        for record in records:
+            record = clean_record(record)
+            if record is None:
+                stats.skipped += 1
+                continue
+            _, action = engine.add(record)
+            if record["folder"] and action != "skip":
+                stats.folders.add(record["folder"])
+            if engine.pending() >= batch_size:
+                flush(pool)
+        flush(pool)
+        if writing:
+            db.conn.commit()
+    except Exception:
+        if writing:
+            db.conn.rollback()
+        raise
+    finally:
+        if pool:
+            pool.shutdown()
+    return stats
+
+
+def import_file(db, path, format=None, **options):
+    """
+    Импорт файла; формат определяется автоматически, если не указан.
+
+    Остальные аргументы - как у import_records.
+    """
+    importer = get_importer(format, path) if format else detect_importer(path)
+    return import_records(db, importer.records(), **options)
+
+
+class ImportJob:
+    """
+    Фоновый импорт для окна настроек.
+
+    Работает в своём потоке со своим соединением SQLite; прогресс
+    (прочитано байт, всего байт) и число записей читаются из потока
+    интерфейса.
+    """
+
+    def __init__(self, db_path, encryptor, path, format=None, dry_run=False, policy=DEFAULT_POLICY):
+        self.db_path = db_path
+        self.encryptor = encryptor
+        self.path = path
+        self.format = format
+        self.dry_run = dry_run
+        self.policy = policy
+
+        self.importer = None
+        self.stats = ImportStats(dry_run, policy)
+        self.error = None
+        self._finished = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="evols-import", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _on_progress(self, stats):
+        self.stats = stats
+
+    def _run(self):
+        db = None
+        try:
+            self.importer = get_importer(self.format, self.path) if self.format else detect_importer(self.path)
+            db = PasswordDatabase(self.db_path, self.encryptor)
+            self.stats = import_records(
+                db, self.importer.records(), dry_run=self.dry_run,
+                progress=self._on_progress, policy=self.policy
+            )
+        except Exception as e:
+            print(f"Ошибка импорта: {e}")
+            self.error = e
+        finally:
+            if db:
+                db.close()
+            self._finished.set()
+
+    @property
+    def progress(self):
+        """(прочитано байт, всего байт)"""
+        if self.importer is None:
+            return 0, 0
+        return self.importer.bytes_read, self.importer.total_bytes
+
+    def done(self):
+        return self._finished.is_set()
+
+    def wait(self, timeout=None):
+        return self._finished.wait(timeout)
+
+
+# === БЕНЧМАРК ===
+
+def _write_samples(data_dir, count):
+    """Генерирует файлы всех форматов по count записей."""
+    from xml.sax.saxutils import escape
+
+    samples = {}
+
+    path = os.path.join(data_dir, "bitwarden.csv")
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["folder", "favorite", "type", "name", "notes", "fields", "reprompt",
+                         "login_uri", "login_username", "login_password", "login_totp"])
+        for i in range(count):
+            writer.writerow([f"Папка {i % 20}", "", "login", f"Site {i}", "note, with comma" if i % 5 == 0 else "",
+                             "", "0", f"https://site{i}.example.com/login", f"user{i}", f"pass-{i}", ""])
+    samples["csv"] = path
+
+    path = os.path.join(data_dir, "keepass.xml")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="utf-8"?>\n<KeePassFile><Root><Group><Name>Root</Name>\n')
+        for group in range(20):
+            f.write(f"<Group><Name>Группа {group}</Name>\n")
+            for i in range(group, count, 20):
+                f.write(
+                    "<Entry>"
+                    f"<String><Key>Title</Key><Value>Site {i}</Value></String>"
+                    f"<String><Key>UserName</Key><Value>user{i}</Value></String>"
+                    f"<String><Key>Password</Key><Value Protected=\"True\">{escape(f'p<{i}>')}</Value></String>"
+                    f"<String><Key>URL</Key><Value>https://site{i}.example.com</Value></String>"
+                    "<History><Entry><String><Key>Password</Key><Value>old</Value></String></Entry></History>"
+                    "</Entry>\n"
+                )
+            f.write("</Group>\n")
+        f.write("</Group></Root></KeePassFile>\n")
+    samples["keepass"] = path
+
+    path = os.path.join(data_dir, "bitwarden.json")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"encrypted": false, "folders": [')
+        f.write(",".join(json.dumps({"id": f"f{g}", "name": f"Папка {g}"}) for g in range(20)))
+        f.write('], "items": [\n')
+        for i in range(count):
+            f.write(("," if i else "") + json.dumps({
+                "id": f"i{i}", "folderId": f"f{i % 20}", "type": 1, "name": f"Site {i}", "notes": None,
+                "login": {"uris": [{"match": None, "uri": f"https://site{i}.example.com"}],
+                          "username": f"user{i}", "password": f"pass-{i}", "totp": None}
+            }, ensure_ascii=False) + "\n")
+        f.write("]}\n")
+    samples["bitwarden"] = path
+    return samples
+
+
+def _benchmark(count, workers):
+    import time
+    import tempfile
+    import tracemalloc
+
+    from main.encryption import Encryptor
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        samples = _write_samples(data_dir, count)
+        encryptor = Encryptor.from_data_key(os.urandom(32))
+
+        for format, path in samples.items():
+            size_mb = os.path.getsize(path) / 1024 / 1024
+            importer = detect_importer(path)
+            assert importer.name == format, importer.name
+
+            start = time.perf_counter()
+            import_records(None, importer.records(), dry_run=True)
+            parse_time = time.perf_counter() - start
+
+            # Память - отдельным прогоном: tracemalloc замедляет разбор
+            tracemalloc.start()
+            import_records(None, detect_importer(path).records(), dry_run=True)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            db = PasswordDatabase(os.path.join(data_dir, f"{format}.db"), encryptor)
+            start = time.perf_counter()
+            stats = import_file(db, path, workers=workers)
+            import_time = time.perf_counter() - start
+            db.close()
+
+            # Повторный импорт того же файла: все записи совпадают, ничего не добавляется
+            db = PasswordDatabase(os.path.join(data_dir, f"{format}.db"), encryptor)
+            start = time.perf_counter()
+            again = import_file(db, path, workers=workers)
+            merge_time = time.perf_counter() - start
+            db.close()
+            assert again.imported == 0 and again.matches["identical"] == stats.imported
+
+            print(f"{format:>10}: {size_mb:5.1f} МБ, разбор {count / parse_time:9,.0f} записей/с "
+                  f"(пик памяти {peak / 1024 / 1024:.1f} МБ), импорт {import_time:6.2f} s "
+                  f"({stats.imported} записей, {len(stats.folders)} папок), "
+                  f"повторный импорт {merge_time:6.2f} s")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Бенчмарк импорта")
+    parser.add_argument("--count", type=int, default=50000)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    args = parser.parse_args()
+    _benchmark(args.count, args.workers)
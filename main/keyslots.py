@@ -0,0 +1,297 @@
+"""
+Слоты ключей хранилища (конвертное шифрование).
+
+Записи шифруются случайным 256-битным ключом данных. Сам ключ данных
+хранится в небольшом файле vault.keys, зашифрованный отдельно для
+каждого способа входа (слота):
+
+    password  - ключ из мастер-пароля (PBKDF2-SHA256, 480 000 итераций)
+    recovery  - ключ восстановления (256 случайных бит, HKDF)
+    keyfile   - ключевой файл (HKDF от SHA-256 содержимого)
+
+Каждый слот самостоятельный: смена пароля, добавление ключа
+восстановления или ключевого файла переписывают только vault.keys,
+записи в базе не трогаются.
+"""
+import os
+import hmac
+import json
+import base64
+import hashlib
+
+from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+
+import paths
+from main.durable import write_durable
+from main.encryption import Encryptor, InvalidToken
+
+
+KEYSLOTS_VERSION = 1
+
+SLOT_PASSWORD = "password"
+SLOT_RECOVERY = "recovery"
+SLOT_KEYFILE = "keyfile"
+
+PASSWORD_ITERATIONS = 480000
+KEYFILE_SIZE = 64
+
+_RECOVERY_ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
+
+
+def _b64(data):
+    return base64.b64encode(data).decode("ascii")
+
+
+def _unb64(text):
+    return base64.b64decode(text.encode("ascii"))
+
+
+def _hkdf(material, info):
+    return HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=info).derive(material)
+
+
+def _password_kek(password, salt, iterations):
+    kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=iterations)
+    return kdf.derive(password.encode("utf-8"))
+
+
+def _wrap(kek, data_key):
+    return Fernet(base64.urlsafe_b64encode(kek)).encrypt(data_key).decode("ascii")
+
+
+def _unwrap(kek, wrapped):
+    return Fernet(base64.urlsafe_b64encode(kek)).decrypt(wrapped.encode("ascii"))
+
+
+# === КЛЮЧ ВОССТАНОВЛЕНИЯ И КЛЮЧЕВОЙ ФАЙЛ ===
+
+def generate_recovery_key():
+    """
+    Случайный ключ восстановления: 52 символа base32 группами по 4.
+
+    Returns:
+        Строка вида "ABCD-EFGH-..." (256 бит энтропии)
+    """
+    value = int.from_bytes(os.urandom(33), "big")
+    chars = []
+    for _ in range(52):
+        value, index = divmod(value, 32)
+        chars.append(_RECOVERY_ALPHABET[index])
+    text = "".join(chars)
+    return "-".join(text[i:i + 4] for i in range(0, len(text), 4))
+
+
+def normalize_recovery_key(text):
+    """Убирает разделители и пробелы; None, если строка не похожа на ключ."""
+    cleaned = "".join(c for c in text.upper() if c.isalnum())
+    if len(cleaned) != 52 or any(c not in _RECOVERY_ALPHABET for c in cleaned):
+        return None
+    return cleaned
+
+
+def _recovery_kek(recovery_key):
+    normalized = normalize_recovery_key(recovery_key)
+    if normalized is None:
+        raise InvalidToken()
+    return _hkdf(normalized.encode("ascii"), b"EVOLS-recovery-v1")
+
+
+def create_keyfile(path):
+    """Создаёт ключевой файл со случайным содержимым."""
+    write_durable(path, os.urandom(KEYFILE_SIZE))
+    return path
+
+
+def _keyfile_kek(keyfile_path):
+    digest = hashlib.sha256()
+    with open(keyfile_path, "rb") as f:
+        for block in iter(lambda: f.read(65536), b""):
+            digest.update(block)
+    return _hkdf(digest.digest(), b"EVOLS-keyfile-v1")
+
+
+# === ФАЙЛ СЛОТОВ ===
+
+class KeySlots:
+    """Содержимое vault.keys: список слотов с обёрнутым ключом данных."""
+
+    def __init__(self, slots=None):
+        self.slots = list(slots or [])
+
+    # === СЕРИАЛИЗАЦИЯ ===
+
+    def to_bytes(self):
+        return json.dumps({
+            "version": KEYSLOTS_VERSION,
+            "cipher": "fernet-256",
+            "slots": self.slots
+        }, indent=2).encode("utf-8")
+
+    @classmethod
+    def from_bytes(cls, data):
+        payload = json.loads(data.decode("utf-8"))
+        if payload.get("version") != KEYSLOTS_VERSION:
+            raise ValueError(f"Неподдерживаемая версия файла ключей: {payload.get('version')}")
+        return cls(payload.get("slots", []))
+
+    @classmethod
+    def load(cls, path=None):
+        with open(path or paths.keyslots_path(), "rb") as f:
+            return cls.from_bytes(f.read())
+
+    def save(self, path=None):
+        """Атомарно записывает файл слотов."""
+        write_durable(path or paths.keyslots_path(), self.to_bytes())
+
+    # === СЛОТЫ ===
+
+    def has(self, slot_type):
+        return any(slot["type"] == slot_type for slot in self.slots)
+
+    def _replace(self, slot_type, slot):
+        self.slots = [s for s in self.slots if s["type"] != slot_type]
+        self.slots.append(slot)
+
+    def set_password(self, data_key, password, iterations=PASSWORD_ITERATIONS):
+        salt = os.urandom(16)
+        self._replace(SLOT_PASSWORD, {
+            "type": SLOT_PASSWORD,
+            "kdf": "pbkdf2-sha256",
+            "iterations": iterations,
+            "salt": _b64(salt),
+            "wrapped": _wrap(_password_kek(password, salt, iterations), data_key)
+        })
+
+    def set_recovery_key(self, data_key, recovery_key):
+        self._replace(SLOT_RECOVERY, {
+            "type": SLOT_RECOVERY,
+            "kdf": "hkdf-sha256",
+            "wrapped": _wrap(_recovery_kek(recovery_key), data_key)
+        })
+
+    def set_keyfile(self, data_key, keyfile_path):
+        self._replace(SLOT_KEYFILE, {
+            "type": SLOT_KEYFILE,
+            "kdf": "hkdf-sha256",
+            "wrapped": _wrap(_keyfile_kek(keyfile_path), data_key)
+        })
+
+    def remove(self, slot_type):
+        if slot_type == SLOT_PASSWORD:
+            raise ValueError("Слот мастер-пароля удалить нельзя")
+        self.slots = [s for s in self.slots if s["type"] != slot_type]
+
+    # === РАЗБЛОКИРОВКА ===
+
+    def _slot(self, slot_type):
+        for slot in self.slots:
+            if slot["type"] == slot_type:
+                return slot
+        raise InvalidToken()
+
+    def unlock_password(self, password):
+        """
+        Открывает ключ данных мастер-паролем или ключом восстановления.
+
+        Строка в формате ключа восстановления сначала проверяется по
+        слоту восстановления (HKDF быстрый), затем как пароль.
+
+        Raises:
+            InvalidToken: ни один слот не подошёл
+        """
+        if self.has(SLOT_RECOVERY) and normalize_recovery_key(password):
+            try:
+                return self.unlock_recovery_key(password)
+            except InvalidToken:
+                pass
+
+        slot = self._slot(SLOT_PASSWORD)
+        kek = _password_kek(password, _unb64(slot["salt"]), slot["iterations"])
+        return Encryptor.from_data_key(_unwrap(kek, slot["wrapped"]), password)
+
+    def unlock_recovery_key(self, recovery_key):
+        slot = self._slot(SLOT_RECOVERY)
+        return Encryptor.from_data_key(_unwrap(_recovery_kek(recovery_key), slot["wrapped"]))
+
+    def unlock_keyfile(self, keyfile_path):
+        slot = self._slot(SLOT_KEYFILE)
+        return Encryptor.from_data_key(_unwrap(_keyfile_kek(keyfile_path), slot["wrapped"]))
+
+
+def has_keyslots():
+    """Хранилище в формате с ключом данных (есть vault.keys)."""
+    return os.path.exists(paths.keyslots_path())
+
+
+def create_keyslots(password):
+    """
+    Новый случайный ключ данных и слоты для него.
+
+    Returns:
+        (encryptor, keyslots) - файл ещё не записан
+    """
+    data_key = os.urandom(32)
+    keyslots = KeySlots()
+    keyslots.set_password(data_key, password)
+    return Encryptor.from_data_key(data_key, password), keyslots
+
+
+def update_keyslots(change):
+    """Читает vault.keys, применяет change(keyslots) и атомарно сохраняет."""
+    keyslots = KeySlots.load()
+    change(keyslots)
+    keyslots.save()
+    return keyslots
+
+
+def verify_password(encryptor, password):
+    """
+    Проверяет мастер-пароль открытого хранилища.
+
+    Ключ данных из слотов сравнивается с ключом хранилища, поэтому
+    проверка работает и после входа ключом восстановления или ключевым
+    файлом. Как и при входе, вместо пароля принимается ключ
+    восстановления. В старом формате (без vault.keys) ключ выводится из
+    пароля и соли.
+    """
+    try:
+        if has_keyslots():
+            candidate = KeySlots.load().unlock_password(password).data_key
+        else:
+            from main.vault import read_salt
+            candidate = Encryptor(password, read_salt()).data_key
+    except InvalidToken:
+        return False
+    return hmac.compare_digest(candidate, encryptor.data_key)
+
+
+def change_password(encryptor, new_password):
+    """
+    Смена мастер-пароля: переписывается только слот пароля.
+
+    Returns:
+        Encryptor с тем же ключом данных и новым паролем
+    """
+    data_key = encryptor.data_key
+    update_keyslots(lambda keyslots: keyslots.set_password(data_key, new_password))
+    return Encryptor.from_data_key(data_key, new_password)
+
+
+def add_recovery_key(encryptor):
+    """Создаёт ключ восстановления (заменяет прежний). Возвращает его текст."""
+    recovery_key = generate_recovery_key()
+    data_key = encryptor.data_key
+    update_keyslots(lambda keyslots: keyslots.set_recovery_key(data_key, recovery_key))
+    return recovery_key
+
+
+def enable_keyfile(encryptor, keyfile_path):
+    """Добавляет вход по ключевому файлу (создаёт файл, если его нет)."""
+    if not os.path.exists(keyfile_path):
+        create_keyfile(keyfile_path)
+    data_key = encryptor.data_key
+    update_keyslots(lambda keyslots: keyslots.set_keyfile(data_key, keyfile_path))
+    return keyfile_path
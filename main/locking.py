@@ -0,0 +1,445 @@
+"""
+Межпроцессные блокировки и единственный экземпляр приложения.
+
+Правила одновременного доступа:
+    - база - в режиме WAL: читатели работают со снимком и не ждут
+      писателя, писатель один (блокировка SQLite), остальные ждут до
+      BUSY_TIMEOUT вместо мгновенной ошибки "database is locked";
+    - файлы рядом с базой (настройки) меняются по схеме
+      "перечитать - изменить - записать" под FileLock (<файл>.lock),
+      поэтому изменения двух процессов не затирают друг друга;
+    - окно приложения одно на каталог данных: второй запуск находит
+      instance.lock занятым, просит работающий экземпляр показать окно
+      (канал multiprocessing.connection с ключом из instance.json) и
+      завершается.
+
+Блокировки рекомендательные (flock / msvcrt.locking): их соблюдают
+процессы EVOLS, посторонние программы - нет.
+
+Нагрузочный тест: python -m main.locking --writers 4 --count 300
+"""
+import os
+import sys
+import json
+import time
+import queue
+import hashlib
+import threading
+from contextlib import contextmanager
+
+import paths
+from main.durable import write_json
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+    import msvcrt
+
+
+# Сколько писатель ждёт блокировку базы, прежде чем сдаться (секунды)
+BUSY_TIMEOUT = 10.0
+DEFAULT_LOCK_TIMEOUT = 10.0
+_RETRY_DELAY = 0.01
+
+COMMAND_FOCUS = "focus"
+
+
+class LockTimeout(Exception):
+    """Блокировку не удалось получить за отведённое время"""
+    pass
+
+
+# === БЛОКИРОВКА ФАЙЛА ===
+
+class FileLock:
+    """
+    Рекомендательная блокировка файла между процессами.
+
+    Повторный захват тем же потоком допускается (счётчик), другие
+    потоки процесса ждут на обычной блокировке. Используйте file_lock():
+    на один путь в процессе - один объект.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def _try_lock(self):
+        if HAS_FCNTL:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                return False
+        try:
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            msvcrt.locking(self._fd, msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def _unlock(self):
+        if HAS_FCNTL:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        else:
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+
+    def acquire(self, blocking=True, timeout=None):
+        """
+        Args:
+            blocking: False - одна попытка
+            timeout: предел ожидания в секундах (None - без предела)
+
+        Returns:
+            True, если блокировка получена
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if not self._thread_lock.acquire(blocking, -1 if timeout is None else timeout):
+            return False
+        if self._depth:
+            self._depth += 1
+            return True
+
+        try:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            while not self._try_lock():
+                if not blocking or (deadline is not None and time.monotonic() >= deadline):
+                    os.close(self._fd)
+                    self._fd = None
+                    self._thread_lock.release()
+                    return False
+                time.sleep(_RETRY_DELAY)
+        except Exception:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+            self._thread_lock.release()
+            raise
+
+        self._depth = 1
+        return True
+
+    def release(self):
+        self._depth -= 1
+        if not self._depth:
+            try:
+                self._unlock()
+            finally:
+                os.close(self._fd)
+                self._fd = None
+        self._thread_lock.release()
+
+    @property
+    def locked(self):
+        return self._depth > 0
+
+    def __enter__(self):
+        if not self.acquire(timeout=DEFAULT_LOCK_TIMEOUT):
+            raise LockTimeout(f"Файл занят другим процессом: {self.path}")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def file_lock(path):
+    """Общий для процесса FileLock для path."""
+    path = os.path.abspath(path)
+    with _locks_guard:
+        lock = _locks.get(path)
+        if lock is None:
+            lock = _locks[path] = FileLock(path)
+        return lock
+
+
+@contextmanager
+def locked_file(path, timeout=DEFAULT_LOCK_TIMEOUT):
+    """Блокировка рядом лежащего <path>.lock на время изменения файла path."""
+    lock = file_lock(path + ".lock")
+    if not lock.acquire(timeout=timeout):
+        raise LockTimeout(f"Файл занят другим процессом: {path}")
+    try:
+        yield
+    finally:
+        lock.release()
+
+
+def update_json(path, change, default=None, timeout=DEFAULT_LOCK_TIMEOUT):
+    """
+    Перечитывает JSON-файл, применяет change(data) и записывает под
+    блокировкой (main.durable.write_json).
+
+    Returns:
+        Записанные данные
+    """
+    with locked_file(path, timeout):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = default() if callable(default) else default
+        result = change(data)
+        if result is not None:
+            data = result
+        write_json(path, data)
+        return data
+
+
+# === ЕДИНСТВЕННЫЙ ЭКЗЕМПЛЯР ===
+
+def _ipc_address(data_dir):
+    if sys.platform == "win32":
+        digest = hashlib.sha256(os.path.abspath(data_dir).encode("utf-8")).hexdigest()[:16]
+        return rf"\\.\pipe\evols-{digest}", "AF_PIPE"
+    return os.path.join(data_dir, "instance.sock"), "AF_UNIX"
+
+
+class SingleInstance:
+    """
+    Одно окно приложения на каталог данных.
+
+    Первый экземпляр держит instance.lock и принимает команды
+    (показать окно); второй отправляет команду и завершается.
+    Команды складываются в requests - окно забирает их по таймеру,
+    из потока Tk.
+    """
+
+    def __init__(self, data_dir=None):
+        self.data_dir = data_dir or paths.base_dir()
+        self.lock = file_lock(os.path.join(self.data_dir, "instance.lock"))
+        self.info_path = os.path.join(self.data_dir, "instance.json")
+        self.requests = queue.Queue()
+        self._listener = None
+
+    def acquire(self):
+        """True - это первый экземпляр; False - уже запущен другой."""
+        return self.lock.acquire(blocking=False)
+
+    def listen(self):
+        """Открывает канал команд для следующих запусков (после acquire)."""
+        from multiprocessing.connection import Listener
+
+        address, family = _ipc_address(self.data_dir)
+        if family == "AF_UNIX" and os.path.exists(address):
+            # Блокировка наша - сокет остался от аварийно завершённого экземпляра
+            os.remove(address)
+
+        authkey = os.urandom(32)
+        old_umask = os.umask(0o177)
+        try:
+            self._listener = Listener(address, family, authkey=authkey)
+            write_json(self.info_path, {"pid": os.getpid(), "authkey": authkey.hex()})
+        finally:
+            os.umask(old_umask)
+
+        threading.Thread(target=self._serve, name="evols-instance", daemon=True).start()
+
+    def _serve(self):
+        listener = self._listener
+        while listener is self._listener:
+            try:
+                connection = listener.accept()
+            except Exception:
+                if listener is not self._listener:
+                    return
+                continue
+            try:
+                message = connection.recv()
+                if isinstance(message, dict) and message.get("command"):
+                    self.requests.put(message)
+                    connection.send({"ok": True})
+            except Exception as e:
+                print(f"Ошибка канала экземпляра: {e}")
+            finally:
+                connection.close()
+
+    def notify(self, command=COMMAND_FOCUS, timeout=3.0, **params):
+        """
+        Отправляет команду работающему экземпляру.
+
+        Returns:
+            True, если экземпляр ответил
+        """
+        from multiprocessing.connection import Client
+
+        address, family = _ipc_address(self.data_dir)
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                with open(self.info_path, "r", encoding="utf-8") as f:
+                    authkey = bytes.fromhex(json.load(f)["authkey"])
+                connection = Client(address, family, authkey=authkey)
+                try:
+                    connection.send(dict(params, command=command))
+                    return bool(connection.recv().get("ok"))
+                finally:
+                    connection.close()
+            except Exception:
+                # Первый экземпляр мог ещё не открыть канал
+                if time.monotonic() >= deadline:
+                    return False
+                time.sleep(0.1)
+
+    def close(self):
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            try:
+                listener.close()
+            except Exception:
+                pass
+            address, family = _ipc_address(self.data_dir)
+            leftovers = [self.info_path] + ([address] if family == "AF_UNIX" else [])
+            for path in leftovers:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        if self.lock.locked:
+            self.lock.release()
+
+
+# === НАГРУЗОЧНЫЙ ТЕСТ ===
+
+def _stress_writer(number, db_path, side_path, data_key, count, results):
+    from main.database import PasswordDatabase
+    from main.encryption import Encryptor
+
+    db = PasswordDatabase(db_path, Encryptor.from_data_key(data_key))
+    errors = 0
+    worst = 0.0
+    own = []
+    for i in range(count):
+        start = time.perf_counter()
+        try:
+            own.append(db.add_password(f"writer {number} entry {i}", f"user{i}", f"p{i}"))
+            if i % 5 == 4:
+                entry_id = own[i // 2]
+                db.update_password(entry_id, f"writer {number} entry {i // 2}", "edited", f"e{i}", "", "", "")
+            if i % 10 == 9:
+                update_json(side_path, lambda data: data + [f"{number}-{i}"], default=list)
+        except Exception as e:
+            errors += 1
+            print(f"писатель {number}: {e}")
+        worst = max(worst, time.perf_counter() - start)
+    db.close()
+    results.put((number, errors, worst))
+
+
+def _stress_reader(db_path, stop, results):
+    import sqlite3
+
+    reads = errors = 0
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT)
+    while not stop.is_set():
+        try:
+            conn.execute("SELECT COUNT(*), MAX(id) FROM passwords").fetchone()
+            conn.execute("SELECT id, title FROM passwords ORDER BY id DESC LIMIT 50").fetchall()
+            reads += 1
+        except sqlite3.Error:
+            errors += 1
+    conn.close()
+    results.put(("reader", reads, errors))
+
+
+def _unlocked_side_writer(number, side_path, count):
+    # На уровне модуля: при запуске через spawn цель процесса должна сериализоваться
+    for i in range(count):
+        try:
+            with open(side_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            data = []
+        data.append(f"{number}-{i}")
+        tmp_path = f"{side_path}.{number}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, side_path)
+
+
+def _unlocked_side_writes(side_path, writers, count):
+    """Для сравнения: та же запись файла без блокировки (теряются обновления)."""
+    import multiprocessing
+    processes = [multiprocessing.Process(target=_unlocked_side_writer, args=(n, side_path, count))
+                 for n in range(writers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    with open(side_path, "r", encoding="utf-8") as f:
+        return len(json.load(f))
+
+
+def _stress(writers, count):
+    import tempfile
+    import multiprocessing
+
+    from main.database import PasswordDatabase
+    from main.encryption import Encryptor
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        db_path = os.path.join(data_dir, "passwords.db")
+        side_path = os.path.join(data_dir, "side.json")
+        data_key = os.urandom(32)
+        PasswordDatabase(db_path, Encryptor.from_data_key(data_key)).close()
+
+        results = multiprocessing.Queue()
+        stop = multiprocessing.Event()
+        reader = multiprocessing.Process(target=_stress_reader, args=(db_path, stop, results))
+        processes = [
+            multiprocessing.Process(target=_stress_writer,
+                                    args=(number, db_path, side_path, data_key, count, results))
+            for number in range(writers)
+        ]
+
+        start = time.perf_counter()
+        reader.start()
+        for process in processes:
+            process.start()
+        writer_results = [results.get() for _ in processes]
+        elapsed = time.perf_counter() - start
+        stop.set()
+        _, reads, read_errors = results.get()
+        for process in processes + [reader]:
+            process.join()
+
+        db = PasswordDatabase(db_path, Encryptor.from_data_key(data_key))
+        rows = db.get_password_count()
+        mode = db.conn.execute("PRAGMA journal_mode").fetchone()[0]
+        db.close()
+        with open(side_path, "r", encoding="utf-8") as f:
+            side_items = len(json.load(f))
+
+        errors = sum(errors for _, errors, _ in writer_results)
+        worst = max(worst for _, _, worst in writer_results)
+        expected_side = writers * (count // 10)
+        assert rows == writers * count, f"записей {rows}, ожидалось {writers * count}"
+        assert side_items == expected_side, f"в файле {side_items}, ожидалось {expected_side}"
+        assert errors == 0 and read_errors == 0
+
+        os.remove(side_path)
+        unlocked = _unlocked_side_writes(side_path, writers, count // 10)
+
+        print(f"{writers} писателей x {count} записей (журнал {mode}): {elapsed:6.2f} s, "
+              f"{rows / elapsed:,.0f} записей/с, худшая операция {worst * 1000:.0f} ms, ошибок 0; "
+              f"читатель: {reads} чтений без ошибок")
+        print(f"файл рядом с базой: под блокировкой {side_items} из {expected_side}, "
+              f"без блокировки {unlocked} из {expected_side}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Нагрузочный тест одновременной записи")
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--count", type=int, default=300)
+    args = parser.parse_args()
+    _stress(args.writers, args.count)
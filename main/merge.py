@@ -0,0 +1,223 @@
+"""
+Слияние импортируемых записей с уже существующими.
+
+Запись из файла сопоставляется с записями хранилища по ключам:
+    - тот же логин и то же нормализованное название, или
+    - тот же логин и тот же регистрируемый домен адреса.
+Логин сравнивается по ключевому отпечатку (username_fp, HMAC без
+расшифровки), название - по title_key (регистр и пробелы не важны),
+домен - по индексу entry_urls. Каждая проверка - поиск по индексу,
+поэтому импорт n записей в хранилище из m записей стоит O(n log m).
+
+Классы записей:
+    new        - совпадений нет
+    identical  - совпадает пароль, название, адрес и заметки
+    newer      - отличается и изменена позже существующей
+    conflict   - отличается, но не новее (или время изменения неизвестно)
+
+Политика решает, что делать с newer и conflict:
+    keep       - ничего не менять, добавлять только новые
+    update     - newer обновляет существующую запись (по умолчанию)
+    overwrite  - newer и conflict обновляют существующую запись
+    duplicate  - newer и conflict добавляются отдельными записями
+
+Совпадения внутри самого файла (одна запись дважды) учитываются так же:
+первая копия выигрывает, повторы не добавляются (кроме duplicate). Ключи
+встреченных записей хранятся 16-байтными дайджестами BLAKE2b (около
+0,3 МБ на 1000 записей). Изменённые записи, оставленные как есть по
+политике, считаются в ImportStats.kept.
+"""
+import hashlib
+
+from main import url_index
+
+
+NEW = "new"
+IDENTICAL = "identical"
+NEWER = "newer"
+CONFLICT = "conflict"
+MATCH_CLASSES = (NEW, IDENTICAL, NEWER, CONFLICT)
+
+POLICY_KEEP = "keep"
+POLICY_UPDATE = "update"
+POLICY_OVERWRITE = "overwrite"
+POLICY_DUPLICATE = "duplicate"
+POLICIES = (POLICY_KEEP, POLICY_UPDATE, POLICY_OVERWRITE, POLICY_DUPLICATE)
+DEFAULT_POLICY = POLICY_UPDATE
+
+# Что делать с записью каждого класса при каждой политике
+_ACTIONS = {
+    POLICY_KEEP: {NEWER: "skip", CONFLICT: "skip"},
+    POLICY_UPDATE: {NEWER: "update", CONFLICT: "skip"},
+    POLICY_OVERWRITE: {NEWER: "update", CONFLICT: "update"},
+    POLICY_DUPLICATE: {NEWER: "insert", CONFLICT: "insert"},
+}
+
+# Отпечаток логина отделён от отпечатков паролей
+_USERNAME_PREFIX = "\0username\0"
+
+
+def title_key(title):
+    """Название для сравнения: без регистра и лишних пробелов."""
+    return " ".join((title or "").casefold().split())
+
+
+def username_fingerprint(encryptor, username):
+    """Ключевой отпечаток логина (регистр и крайние пробелы не важны)."""
+    return encryptor.fingerprint(_USERNAME_PREFIX + (username or "").strip().casefold())
+
+
+def _seen_key(*parts):
+    """Ключ встреченной в файле записи: 16 байт BLAKE2b вместо кортежа строк."""
+    return hashlib.blake2b("\0".join(parts).encode("utf-8"), digest_size=16).digest()
+
+
+def _normalized_urls(url_text):
+    urls = (url_index.normalize_url(url) for url in url_index.split_urls(url_text))
+    return [url for url in urls if url]
+
+
+class MergeEngine:
+    """
+    Классифицирует входящие записи и применяет политику.
+
+    Работает в транзакции вызывающего (import_records): добавленные и
+    обновлённые записи видны следующим пачкам, commit делает вызывающий.
+    Без базы (db=None) записи сравниваются только между собой.
+    """
+
+    def __init__(self, db, policy=DEFAULT_POLICY, stats=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Неизвестная политика слияния: {policy}")
+        self.db = db
+        self.policy = policy
+        self.stats = stats
+        self.inserts = []
+        self.updates = []
+        # Ключи записей, уже встреченных в файле -> отпечаток пароля
+        # (дайджесты фиксированного размера, см. _seen_key)
+        self._seen = {}
+
+        # Отпечатки старых записей (и всех - после смены ключа данных)
+        if db is not None and db.conn.execute(
+            "SELECT 1 FROM passwords WHERE password_fp IS NULL OR username_fp IS NULL LIMIT 1"
+        ).fetchone():
+            db.backfill_fingerprints()
+
+    def _fingerprint(self, value):
+        if self.db is None:
+            return hashlib.sha256(value.encode("utf-8")).hexdigest()
+        return self.db.encryptor.fingerprint(value)
+
+    # === КЛАССИФИКАЦИЯ ===
+
+    def classify(self, record):
+        """
+        Returns:
+            (класс, ID существующей записи или None)
+        """
+        password_fp = self._fingerprint(record["password"])
+        username_fp = self._fingerprint(_USERNAME_PREFIX + record["username"].strip().casefold())
+        key = title_key(record["title"])
+        urls = _normalized_urls(record["url"])
+        domains = sorted({url.domain for url in urls})
+
+        seen_keys = [_seen_key("title", username_fp, key)]
+        seen_keys += [_seen_key("domain", username_fp, domain) for domain in domains]
+        seen_password = _seen_key(password_fp)
+        for seen_key in seen_keys:
+            if seen_key in self._seen:
+                return (IDENTICAL if self._seen[seen_key] == seen_password else CONFLICT), None
+        for seen_key in seen_keys:
+            self._seen[seen_key] = seen_password
+
+        if self.db is None:
+            return NEW, None
+        candidates = self._candidates(username_fp, key, domains)
+        if not candidates:
+            return NEW, None
+
+        canonical_urls = sorted(url.url for url in urls)
+        notes = record["notes"].strip()
+        for id, title, url_text, notes_token, existing_fp, _ in candidates:
+            if (existing_fp == password_fp and title_key(title) == key
+                    and sorted(url.url for url in _normalized_urls(url_text)) == canonical_urls
+                    and (self.db.encryptor.decrypt(notes_token) if notes_token else "").strip() == notes):
+                return IDENTICAL, id
+
+        id, _, _, _, _, date_modified = candidates[0]
+        modified = record.get("modified") or ""
+        if modified and date_modified and modified > date_modified:
+            return NEWER, id
+        return CONFLICT, id
+
+    def _candidates(self, username_fp, key, domains):
+        """Существующие записи с тем же логином и названием или доменом (по индексам)."""
+        conn = self.db.conn
+        ids = [row[0] for row in conn.execute(
+            "SELECT id FROM passwords WHERE username_fp = ? AND title_key = ? ORDER BY id",
+            (username_fp, key)
+        )]
+        for domain in domains:
+            # Сначала логин, потом домен: у одного домена (example.com, google.com)
+            # бывают тысячи записей, а у одного логина на нём - единицы
+            for (id,) in conn.execute(
+                "SELECT p.id FROM passwords p WHERE p.username_fp = ? AND EXISTS "
+                "(SELECT 1 FROM entry_urls u WHERE u.entry_id = p.id AND u.domain = ?) ORDER BY p.id",
+                (username_fp, domain)
+            ):
+                if id not in ids:
+                    ids.append(id)
+        if not ids:
+            return []
+        rows = {row[0]: row for row in conn.execute(
+            f"SELECT id, title, url, notes, password_fp, date_modified FROM passwords "
+            f"WHERE id IN ({','.join('?' * len(ids))})", ids
+        )}
+        return [rows[id] for id in ids if id in rows]
+
+    # === ПРИМЕНЕНИЕ ===
+
+    def add(self, record):
+        """Классифицирует запись и ставит действие в очередь пачки."""
+        match, existing_id = self.classify(record)
+        if self.stats is not None:
+            self.stats.matches[match] += 1
+
+        if match == NEW:
+            action = "insert"
+        elif match == IDENTICAL:
+            action = "skip"
+        else:
+            action = _ACTIONS[self.policy][match]
+            # Повтор внутри файла обновлять нечем - первая копия выигрывает
+            if action == "update" and existing_id is None:
+                action = "skip"
+            if action == "skip" and self.stats is not None:
+                self.stats.kept += 1
+
+        if action == "insert":
+            self.inserts.append(record)
+        elif action == "update":
+            self.updates.append((existing_id, record))
+        return match, action
+
+    def pending(self):
+        return len(self.inserts) + len(self.updates)
+
+    def flush(self, pool=None, dry_run=False):
+        """
+        Применяет очередь пачки (без commit).
+
+        Returns:
+            (добавлено, обновлено)
+        """
+        inserted, updated = len(self.inserts), len(self.updates)
+        if not dry_run:
+            if self.inserts:
+                self.db.insert_records(self.inserts, pool=pool, commit=False)
+            if self.updates:
+                self.db.update_records(self.updates, reason="import")
+        self.inserts = []
+        self.updates = []
+        return inserted, updated
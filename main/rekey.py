@@ -0,0 +1,556 @@
+"""
+Перешифрование хранилища новым ключом данных.
+
+В хранилище с файлом слотов (main.keyslots) смена мастер-пароля
+переписывает только слот. Полное перешифрование нужно старым
+хранилищам, где ключ выводился прямо из пароля: при первом входе или
+смене пароля они переводятся на случайный ключ данных.
+
+Порядок работы:
+
+1. Создаётся случайный ключ данных и слот для пароля; рядом с файлами
+   слотов и контрольного токена пишутся их новые версии (*.new).
+2. Таблицы проходятся пачками: значения расшифровываются старым
+   ключом и шифруются новым в пуле потоков, результат пишется в
+   промежуточные таблицы rekey_*. Каждая пачка - отдельный commit
+   (контрольная точка), поэтому прерванную смену можно продолжить.
+3. До переключения хранилище открывается старым паролем как обычно.
+   Переключение - одна транзакция: записи, изменённые во время
+   перешифрования, догоняются, затем значения переносятся из rekey_*
+   и состояние помечается как "switched". После этого файлы *.new
+   заменяют старые, а промежуточные таблицы удаляются.
+
+Если процесс оборвался после commit переключения, но до замены файлов,
+complete_pending_rekey() при следующем входе довершает замену.
+
+Бенчмарк: python -m main.rekey --count 10000 --count 100000
+"""
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+import paths
+from main import sync
+from main.durable import replace_durable, write_durable
+from main.attachments import ATTACHMENTS_KEY_PURPOSE, chunk_aad, create_tables as create_attachment_tables
+from main.encryption import InvalidToken
+from main.keyslots import KeySlots, create_keyslots, change_password, has_keyslots
+from main.vault import VERIFICATION_TEXT, verify_encryptor
+
+
+PHASE_STAGING = "staging"
+PHASE_SWITCHED = "switched"
+
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_WORKERS = 4
+
+NEW_SUFFIX = ".new"
+
+# Блоки вложений вместе с тем, что нужно для AAD (без JOIN - к запросу добавляется WHERE id)
+_CHUNKS_SELECT = (
+    "SELECT id, seq, nonce, data, "
+    "(SELECT file_id FROM attachments a WHERE a.id = attachment_chunks.attachment_id), "
+    "(SELECT chunk_count FROM attachments a WHERE a.id = attachment_chunks.attachment_id) "
+    "FROM attachment_chunks"
+)
+
+
+class RekeyError(Exception):
+    """Ошибка смены мастер-пароля."""
+    pass
+
+
+def _side_files():
+    """Зашифрованные ключом хранилища файлы рядом с базой (кроме соли и токена)."""
+    files = [paths.snapshot_path(), paths.twofa_path()]
+    reports_dir = paths.rotation_reports_dir()
+    files.extend(
+        os.path.join(reports_dir, name)
+        for name in sorted(os.listdir(reports_dir)) if name.endswith(".report")
+    )
+    return [path for path in files if os.path.exists(path)]
+
+
+def _create_schema(conn):
+    conn.executescript('''
+    CREATE TABLE IF NOT EXISTS rekey_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        keyslots BLOB NOT NULL,
+        check_token TEXT NOT NULL,
+        phase TEXT NOT NULL,
+        started_at TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS rekey_passwords (
+        id INTEGER PRIMARY KEY,
+        old_username TEXT,
+        old_password TEXT,
+        old_notes TEXT,
+        username TEXT,
+        password TEXT,
+        notes TEXT,
+        password_fp TEXT
+    );
+    CREATE TABLE IF NOT EXISTS rekey_history (
+        id INTEGER PRIMARY KEY,
+        password TEXT,
+        data BLOB
+    );
+    CREATE TABLE IF NOT EXISTS rekey_attachments (
+        id INTEGER PRIMARY KEY,
+        name TEXT
+    );
+    CREATE TABLE IF NOT EXISTS rekey_attachment_chunks (
+        id INTEGER PRIMARY KEY,
+        nonce BLOB,
+        data BLOB
+    );
+    ''')
+
+
+def _drop_schema(conn):
+    conn.executescript('''
+    DROP TABLE IF EXISTS rekey_passwords;
+    DROP TABLE IF EXISTS rekey_history;
+    DROP TABLE IF EXISTS rekey_attachments;
+    DROP TABLE IF EXISTS rekey_attachment_chunks;
+    DROP TABLE IF EXISTS rekey_state;
+    ''')
+
+
+def _table_exists(conn, name):
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (name,)
+    ).fetchone()
+    return row is not None
+
+
+def _promote_new_files():
+    """Заменяет файлы их новыми версиями (*.new), если они есть."""
+    for path in [paths.keyslots_path(), paths.verification_path()] + _side_files_with_new():
+        new_path = path + NEW_SUFFIX
+        if os.path.exists(new_path):
+            replace_durable(new_path, path)
+
+    # Соль старого формата больше не нужна - ключ данных лежит в слотах
+    if has_keyslots() and os.path.exists(paths.salt_path()):
+        os.remove(paths.salt_path())
+
+
+def _side_files_with_new():
+    reports_dir = paths.rotation_reports_dir()
+    candidates = [paths.snapshot_path(), paths.twofa_path()]
+    candidates.extend(
+        os.path.join(reports_dir, name[:-len(NEW_SUFFIX)])
+        for name in os.listdir(reports_dir) if name.endswith(".report" + NEW_SUFFIX)
+    )
+    return candidates
+
+
+def _discard_new_files():
+    for path in [paths.keyslots_path(), paths.verification_path()] + _side_files_with_new():
+        try:
+            os.remove(path + NEW_SUFFIX)
+        except OSError:
+            pass
+
+
+def complete_pending_rekey(db_path=None):
+    """
+    Довершает смену пароля, прерванную после переключения базы.
+
+    Вызывается перед чтением соли при входе. Незавершённое
+    перешифрование (до переключения) не трогает - старый пароль
+    остаётся действительным, а смену можно продолжить.
+
+    Returns:
+        True, если была довершена прерванная смена
+    """
+    db_path = db_path or paths.db_path()
+    if not os.path.exists(db_path):
+        return False
+
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        if not _table_exists(conn, "rekey_state"):
+            return False
+        row = conn.execute("SELECT phase FROM rekey_state WHERE id = 1").fetchone()
+        if not row or row[0] != PHASE_SWITCHED:
+            return False
+        _promote_new_files()
+        _drop_schema(conn)
+        conn.commit()
+        print("🔑 Завершена прерванная смена мастер-пароля")
+        return True
+    finally:
+        conn.close()
+
+
+class RekeyJob:
+    """
+    Фоновая смена мастер-пароля.
+
+    Если у хранилища уже есть файл слотов, переписывается только слот
+    пароля. Иначе хранилище переводится на случайный ключ данных с
+    полным перешифрованием. Работает в своём потоке со своим
+    соединением SQLite; прогресс читается из потока интерфейса
+    (progress, done(), error), после успеха новый ключ доступен в
+    new_encryptor.
+    """
+
+    def __init__(self, db_path, old_encryptor, new_password,
+                 chunk_size=DEFAULT_CHUNK_SIZE, workers=DEFAULT_WORKERS):
+        self.db_path = db_path
+        self.old = old_encryptor
+        self.new_password = new_password
+        self.chunk_size = chunk_size
+        self.workers = workers
+
+        self.new_encryptor = None
+        self.resumed = False
+        self.slot_only = False
+        self.stage = "Подготовка"
+        self.done_count = 0
+        self.total = 0
+        self.error = None
+        self._finished = threading.Event()
+        self._thread = None
+
+    # === ЗАПУСК ===
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run_safely, name="evols-rekey", daemon=True)
+        self._thread.start()
+        return self
+
+    def run(self):
+        """Выполняет смену синхронно (для консольных утилит и бенчмарка)."""
+        self._run_safely()
+        if self.error:
+            raise self.error
+        return self.new_encryptor
+
+    def _run_safely(self):
+        try:
+            self._run()
+        except Exception as e:
+            print(f"Ошибка смены мастер-пароля: {e}")
+            self.error = e
+        finally:
+            self.new_password = None
+            self._finished.set()
+
+    @property
+    def progress(self):
+        """(выполнено, всего)"""
+        return self.done_count, self.total
+
+    def done(self):
+        return self._finished.is_set()
+
+    def wait(self, timeout=None):
+        return self._finished.wait(timeout)
+
+    # === ЭТАПЫ ===
+
+    def _run(self):
+        if has_keyslots():
+            self.stage = "Обновление слота ключа"
+            self.total = 1
+            # Слот должен обернуть действующий ключ данных, а не устаревший
+            verify_encryptor(self.old)
+            self.new_encryptor = change_password(self.old, self.new_password)
+            self.slot_only = True
+            self.done_count = 1
+            return
+
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            create_attachment_tables(conn.cursor())
+            self._prepare(conn)
+            self._old_aead = AESGCM(self.old.subkey(ATTACHMENTS_KEY_PURPOSE))
+            self._new_aead = AESGCM(self.new_encryptor.subkey(ATTACHMENTS_KEY_PURPOSE))
+
+            self.total = sum(
+                conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("passwords", "password_history", "attachments", "attachment_chunks")
+            )
+            self.done_count = sum(
+                conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("rekey_passwords", "rekey_history", "rekey_attachments", "rekey_attachment_chunks")
+            )
+
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="evols-rekey") as pool:
+                self.stage = "Перешифрование записей"
+                self._stage_table(conn, pool, "passwords", self._reencrypt_entry,
+                                  "SELECT id, username, password, notes FROM passwords",
+                                  "rekey_passwords",
+                                  "INSERT OR REPLACE INTO rekey_passwords VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+
+                self.stage = "Перешифрование истории"
+                self._stage_table(conn, pool, "password_history", self._reencrypt_history,
+                                  "SELECT id, password, data FROM password_history",
+                                  "rekey_history",
+                                  "INSERT OR REPLACE INTO rekey_history VALUES (?, ?, ?)")
+
+                self.stage = "Перешифрование вложений"
+                self._stage_table(conn, pool, "attachments", self._reencrypt_attachment,
+                                  "SELECT id, name FROM attachments",
+                                  "rekey_attachments",
+                                  "INSERT OR REPLACE INTO rekey_attachments VALUES (?, ?)")
+                self._stage_table(conn, pool, "attachment_chunks", self._reencrypt_chunk,
+                                  _CHUNKS_SELECT,
+                                  "rekey_attachment_chunks",
+                                  "INSERT OR REPLACE INTO rekey_attachment_chunks VALUES (?, ?, ?)")
+
+            self.stage = "Перешифрование файлов"
+            self._stage_side_files()
+
+            self.stage = "Переключение"
+            self._switch(conn)
+        finally:
+            conn.close()
+
+    def _prepare(self, conn):
+        """Создаёт или продолжает незавершённую смену."""
+        _create_schema(conn)
+        state = conn.execute(
+            "SELECT keyslots, check_token, phase FROM rekey_state WHERE id = 1"
+        ).fetchone()
+
+        if state:
+            keyslots_data, check_token, phase = state
+            if phase == PHASE_SWITCHED:
+                raise RekeyError("Предыдущая смена пароля не довершена - перезапустите приложение")
+            keyslots = KeySlots.from_bytes(keyslots_data)
+            try:
+                candidate = keyslots.unlock_password(self.new_password)
+                if candidate.decrypt(check_token) == VERIFICATION_TEXT:
+                    self.new_encryptor = candidate
+                    self.resumed = True
+            except InvalidToken:
+                pass
+
+            if not self.resumed:
+                # Начата смена на другой пароль - начинаем заново
+                _drop_schema(conn)
+                _discard_new_files()
+                _create_schema(conn)
+
+        if not self.resumed:
+            self.new_encryptor, keyslots = create_keyslots(self.new_password)
+            conn.execute(
+                "INSERT INTO rekey_state VALUES (1, ?, ?, ?, datetime('now'))",
+                (keyslots.to_bytes(), self.new_encryptor.encrypt(VERIFICATION_TEXT), PHASE_STAGING)
+            )
+            conn.commit()
+
+        write_durable(paths.keyslots_path() + NEW_SUFFIX, keyslots.to_bytes())
+        write_durable(paths.verification_path() + NEW_SUFFIX,
+                       self.new_encryptor.encrypt(VERIFICATION_TEXT).encode("utf-8"))
+
+    def _reencrypt_value(self, value):
+        if not value:
+            return value or ""
+        return self.new_encryptor.encrypt(self.old.decrypt(value))
+
+    def _reencrypt_entry(self, row):
+        id, username, password, notes = row
+        plain_password = self.old.decrypt(password)
+        return (
+            id, username, password, notes,
+            self._reencrypt_value(username),
+            self.new_encryptor.encrypt(plain_password),
+            self._reencrypt_value(notes),
+            self.new_encryptor.fingerprint(plain_password)
+        )
+
+    def _reencrypt_history(self, row):
+        id, password, data = row
+        if data is not None:
+            data = self.new_encryptor.encrypt_bytes(self.old.decrypt_bytes(data))
+        return id, self._reencrypt_value(password), data
+
+    def _reencrypt_attachment(self, row):
+        id, name = row
+        return id, self._reencrypt_value(name)
+
+    def _reencrypt_chunk(self, row):
+        id, seq, nonce, data, file_id, chunk_count = row
+        aad = chunk_aad(file_id, seq, seq == chunk_count - 1)
+        new_nonce = os.urandom(len(nonce))
+        plain = self._old_aead.decrypt(nonce, data, aad)
+        return id, new_nonce, self._new_aead.encrypt(new_nonce, plain, aad)
+
+    def _stage_table(self, conn, pool, table, transform, select_sql, staging, insert_sql):
+        """Перешифровывает таблицу пачками; каждая пачка - контрольная точка."""
+        last_id = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {staging}").fetchone()[0]
+        while True:
+            rows = conn.execute(
+                f"{select_sql} WHERE id > ? ORDER BY id LIMIT ?", (last_id, self.chunk_size)
+            ).fetchall()
+            if not rows:
+                break
+
+            chunksize = max(1, len(rows) // (self.workers * 4))
+            staged = list(pool.map(transform, rows, chunksize=chunksize))
+            conn.executemany(insert_sql, staged)
+            conn.commit()
+
+            last_id = rows[-1][0]
+            self.done_count += len(rows)
+
+    def _stage_side_files(self):
+        """Пишет перешифрованные копии файлов рядом с оригиналами (*.new)."""
+        for path in _side_files():
+            with open(path, "rb") as f:
+                content = f.read()
+            try:
+                reencrypted = self.new_encryptor.encrypt_bytes(self.old.decrypt_bytes(content.strip()))
+            except Exception:
+                # Файл не зашифрован ключом хранилища (например, секрет 2FA
+                # в открытом виде) - оставляем как есть
+                continue
+            write_durable(path + NEW_SUFFIX, reencrypted)
+
+    def _switch(self, conn):
+        """Догоняет изменения и атомарно переключает базу на новый ключ."""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Записи, добавленные или изменённые во время перешифрования
+            stale = conn.execute('''
+            SELECT p.id, p.username, p.password, p.notes
+            FROM passwords p
+            LEFT JOIN rekey_passwords s ON s.id = p.id
+            WHERE s.id IS NULL
+               OR p.password IS NOT s.old_password
+               OR IFNULL(p.username, '') IS NOT IFNULL(s.old_username, '')
+               OR IFNULL(p.notes, '') IS NOT IFNULL(s.old_notes, '')
+            ''').fetchall()
+            conn.executemany(
+                "INSERT OR REPLACE INTO rekey_passwords VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [self._reencrypt_entry(row) for row in stale]
+            )
+            stale_history = conn.execute('''
+            SELECT h.id, h.password, h.data
+            FROM password_history h
+            LEFT JOIN rekey_history s ON s.id = h.id
+            WHERE s.id IS NULL
+            ''').fetchall()
+            conn.executemany(
+                "INSERT OR REPLACE INTO rekey_history VALUES (?, ?, ?)",
+                [self._reencrypt_history(row) for row in stale_history]
+            )
+            # Вложения не изменяются после записи - догоняем только новые
+            stale_attachments = conn.execute(
+                "SELECT id, name FROM attachments WHERE id NOT IN (SELECT id FROM rekey_attachments)"
+            ).fetchall()
+            conn.executemany(
+                "INSERT OR REPLACE INTO rekey_attachments VALUES (?, ?)",
+                [self._reencrypt_attachment(row) for row in stale_attachments]
+            )
+            stale_chunks = conn.execute(
+                f"{_CHUNKS_SELECT} WHERE id NOT IN (SELECT id FROM rekey_attachment_chunks)"
+            ).fetchall()
+            conn.executemany(
+                "INSERT OR REPLACE INTO rekey_attachment_chunks VALUES (?, ?, ?)",
+                [self._reencrypt_chunk(row) for row in stale_chunks]
+            )
+
+            # Перешифрование - не изменение записи: ревизии синхронизации не растут
+            tracked = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?", (sync.UPDATE_TRIGGER,)
+            ).fetchone()
+            conn.execute(f"DROP TRIGGER IF EXISTS {sync.UPDATE_TRIGGER}")
+            conn.execute('''
+            UPDATE passwords SET
+                username = (SELECT s.username FROM rekey_passwords s WHERE s.id = passwords.id),
+                password = (SELECT s.password FROM rekey_passwords s WHERE s.id = passwords.id),
+                notes = (SELECT s.notes FROM rekey_passwords s WHERE s.id = passwords.id),
+                password_fp = (SELECT s.password_fp FROM rekey_passwords s WHERE s.id = passwords.id)
+            WHERE id IN (SELECT id FROM rekey_passwords)
+            ''')
+            if tracked:
+                sync.create_triggers(conn)
+            # Отпечатки логинов зависят от ключа - пересчитаются при следующем импорте
+            if "username_fp" in [column[1] for column in conn.execute("PRAGMA table_info(passwords)")]:
+                conn.execute("UPDATE passwords SET username_fp = NULL")
+            conn.execute('''
+            UPDATE password_history SET
+                password = (SELECT s.password FROM rekey_history s WHERE s.id = password_history.id),
+                data = (SELECT s.data FROM rekey_history s WHERE s.id = password_history.id)
+            WHERE id IN (SELECT id FROM rekey_history)
+            ''')
+            conn.execute('''
+            UPDATE attachments SET
+                name = (SELECT s.name FROM rekey_attachments s WHERE s.id = attachments.id)
+            WHERE id IN (SELECT id FROM rekey_attachments)
+            ''')
+            conn.execute('''
+            UPDATE attachment_chunks SET
+                nonce = (SELECT s.nonce FROM rekey_attachment_chunks s WHERE s.id = attachment_chunks.id),
+                data = (SELECT s.data FROM rekey_attachment_chunks s WHERE s.id = attachment_chunks.id)
+            WHERE id IN (SELECT id FROM rekey_attachment_chunks)
+            ''')
+            conn.execute("UPDATE rekey_state SET phase = ? WHERE id = 1", (PHASE_SWITCHED,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        # База уже на новом ключе - заменяем файлы и убираем промежуточные таблицы
+        _promote_new_files()
+        _drop_schema(conn)
+        conn.commit()
+        self.done_count = self.total
+
+
+def _benchmark(counts, workers, chunk_size):
+    import time
+    import tempfile
+
+    from main.database import PasswordDatabase
+    from main.encryption import Encryptor
+
+    for count in counts:
+        with tempfile.TemporaryDirectory() as data_dir:
+            os.environ["EVOLS_DATA_DIR"] = data_dir
+            old = Encryptor("old-master-password")
+            write_durable(paths.salt_path(), old.salt)
+            write_durable(paths.verification_path(), old.encrypt(VERIFICATION_TEXT).encode("utf-8"))
+
+            db = PasswordDatabase(paths.db_path(), old)
+            db.cursor.executemany(
+                "INSERT INTO passwords (title, username, password, url, category, notes, password_fp, "
+                "date_created, date_modified) VALUES (?, ?, ?, '', '', ?, ?, datetime('now'), datetime('now'))",
+                [(f"entry {i}", old.encrypt(f"user{i}"), old.encrypt(f"password-{i}"),
+                  old.encrypt("note") if i % 4 == 0 else "", old.fingerprint(f"password-{i}"))
+                 for i in range(count)]
+            )
+            db.conn.commit()
+            db.close()
+
+            start = time.perf_counter()
+            job = RekeyJob(paths.db_path(), old, "new-master-password",
+                           chunk_size=chunk_size, workers=workers)
+            new = job.run()
+            elapsed = time.perf_counter() - start
+
+            check = PasswordDatabase(paths.db_path(), new)
+            assert check.get_password(count)["password"] == f"password-{count - 1}"
+            check.close()
+            print(f"{count:>8} записей: {elapsed:6.2f} s ({count / elapsed:,.0f} записей/с, "
+                  f"включая вывод нового ключа)")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Бенчмарк смены мастер-пароля")
+    parser.add_argument("--count", type=int, action="append")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+    _benchmark(args.count or [10000, 100000], args.workers, args.chunk_size)
@@ -0,0 +1,114 @@
+import os
+import json
+import threading
+from datetime import datetime
+
+import paths
+from main.durable import write_durable
+from main.database import PasswordDatabase
+
+
+REPORT_VERSION = 1
+
+
+def write_rotation_report(encryptor, criteria, rotated, started_at, report_dir=None):
+    """
+    Шифрует и сохраняет отчёт о смене паролей.
+
+    В отчёт попадают только id, названия и адреса записей - новые
+    пароли доступны в самом хранилище.
+
+    Returns:
+        Путь к файлу отчёта
+    """
+    report_dir = report_dir or paths.rotation_reports_dir()
+    finished_at = datetime.now()
+    payload = json.dumps({
+        "version": REPORT_VERSION,
+        "started_at": started_at.isoformat(timespec="seconds"),
+        "finished_at": finished_at.isoformat(timespec="seconds"),
+        "criteria": criteria,
+        "entries": [
+            {"id": id, "title": title, "url": url, "previous_modified": date_modified}
+            for id, title, url, date_modified in rotated
+        ]
+    }, ensure_ascii=False).encode("utf-8")
+
+    path = os.path.join(report_dir, f"rotation-{finished_at:%Y%m%d-%H%M%S}.report")
+    write_durable(path, encryptor.encrypt_bytes(payload))
+    return path
+
+
+def read_rotation_report(encryptor, path):
+    """Расшифровывает отчёт о смене паролей."""
+    with open(path, "rb") as f:
+        return json.loads(encryptor.decrypt_bytes(f.read()).decode("utf-8"))
+
+
+class RotationJob:
+    """
+    Фоновая смена паролей для группы записей.
+
+    Работает в отдельном потоке со своим соединением SQLite (соединение
+    главного окна в другом потоке использовать нельзя). Состояние
+    читается из потока интерфейса через progress/done()/error, как
+    при поэтапном входе.
+    """
+
+    def __init__(self, db_path, encryptor, folder=None, category=None,
+                 older_than_days=None, policy=None):
+        self.db_path = db_path
+        self.encryptor = encryptor
+        self.criteria = {
+            "folder": folder,
+            "category": category,
+            "older_than_days": older_than_days,
+        }
+        self.policy = policy
+
+        self.done_count = 0
+        self.total = 0
+        self.rotated = []
+        self.report_path = None
+        self.error = None
+        self._finished = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="evols-rotation", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _on_progress(self, done, total):
+        self.done_count = done
+        self.total = total
+
+    def _run(self):
+        started_at = datetime.now()
+        db = None
+        try:
+            db = PasswordDatabase(self.db_path, self.encryptor)
+            self.rotated = db.rotate_passwords(
+                policy=self.policy, progress=self._on_progress, **self.criteria
+            )
+            if self.rotated:
+                self.report_path = write_rotation_report(
+                    self.encryptor, self.criteria, self.rotated, started_at
+                )
+        except Exception as e:
+            print(f"Ошибка фоновой смены паролей: {e}")
+            self.error = e
+        finally:
+            if db:
+                db.close()
+            self._finished.set()
+
+    @property
+    def progress(self):
+        """(выполнено, всего)"""
+        return self.done_count, self.total
+
+    def done(self):
+        return self._finished.is_set()
+
+    def wait(self, timeout=None):
+        return self._finished.wait(timeout)
@@ -0,0 +1,307 @@
+import os
+import json
+import threading
+
+import paths
+from main.durable import write_json
+from main.locking import locked_file
+
+
+DEFAULT_AUTO_LOCK_MINUTES = 5
+DEFAULT_HISTORY_VERSIONS = 10
+DEFAULT_HISTORY_DAYS = 365
+DEFAULT_PLAINTEXT_CACHE_SECONDS = 30
+
+
+def _to_int(value, default, minimum=None):
+    """Приводит значение к int (строки из старых файлов тоже допускаются)."""
+    if isinstance(value, bool):
+        return default
+    if isinstance(value, str):
+        value = value.strip()
+        if not value.isdigit():
+            return default
+        value = int(value)
+    elif isinstance(value, float):
+        value = int(value)
+    elif not isinstance(value, int):
+        return default
+    if minimum is not None and value < minimum:
+        value = minimum
+    return value
+
+
+def _to_bool(value, default):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    if isinstance(value, (int, float)):
+        return bool(value)
+    return default
+
+
+def _to_str(value, default):
+    if isinstance(value, str) and value.strip():
+        return value
+    return default
+
+
+class SettingsStore:
+    """
+    Единое хранилище настроек приложения.
+
+    Файл читается один раз при создании, значения проверяются и
+    приводятся к нужным типам. Изменения сразу видны в памяти и
+    подписчикам, а на диск пишутся атомарно с задержкой (debounce).
+
+    Файл общий для всех процессов (окно, агент, CLI): при записи он
+    перечитывается под блокировкой, и поверх кладутся только ключи,
+    изменённые в этом процессе, - чужие изменения не затираются.
+    """
+
+    SAVE_DELAY = 0.5  # секунды
+
+    def __init__(self, path=None):
+        self.path = path or paths.settings_path()
+        self._lock = threading.RLock()
+        self._save_timer = None
+        self._subscribers = {}
+        self._dirty = set()
+        self._values = self._defaults()
+        self._load()
+
+    # === СХЕМА ===
+
+    def _defaults(self):
+        return {
+            "auto_lock_time": DEFAULT_AUTO_LOCK_MINUTES,
+            "backup_directory": os.path.join(os.path.dirname(self.path), "backups"),
+            "auto_backup": True,
+            "history_keep_versions": DEFAULT_HISTORY_VERSIONS,
+            "history_keep_days": DEFAULT_HISTORY_DAYS,
+            "plaintext_cache_seconds": DEFAULT_PLAINTEXT_CACHE_SECONDS,
+        }
+
+    def _validate(self, key, value):
+        """Возвращает проверенное значение или значение по умолчанию."""
+        default = self._defaults()[key]
+        if key == "auto_lock_time":
+            return _to_int(value, default, minimum=1)
+        if key == "history_keep_versions":
+            return _to_int(value, default, minimum=1)
+        if key == "history_keep_days":
+            # 0 - хранить без ограничения по времени
+            return _to_int(value, default, minimum=0)
+        if key == "plaintext_cache_seconds":
+            # 0 - не кэшировать расшифрованные значения
+            return _to_int(value, default, minimum=0)
+        if key == "auto_backup":
+            return _to_bool(value, default)
+        if key == "backup_directory":
+            return _to_str(value, default)
+        return value
+
+    # === ЗАГРУЗКА И СОХРАНЕНИЕ ===
+
+    def _load(self):
+        """Загружает настройки из каталога данных (или из старого файла в cwd)."""
+        source = self.path
+        if not os.path.exists(source):
+            legacy = os.path.abspath("app_settings.json")
+            if legacy == os.path.abspath(self.path) or not os.path.exists(legacy):
+                return
+            source = legacy
+
+        try:
+            with open(source, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"Ошибка загрузки настроек: {e}")
+            return
+
+        if not isinstance(data, dict):
+            return
+
+        for key in self._values:
+            if key in data:
+                self._values[key] = self._validate(key, data[key])
+
+        if source != self.path:
+            self._dirty.update(key for key in self._values if key in data)
+            self._schedule_save()
+
+    def reload(self):
+        """
+        Перечитывает файл, если его изменил другой процесс.
+
+        Используется долгоживущими процессами без окна (агент):
+        подписчики получают уведомления об изменившихся значениях.
+
+        Returns:
+            Словарь изменившихся значений
+        """
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return {}
+        if mtime == getattr(self, "_loaded_mtime", None):
+            return {}
+        self._loaded_mtime = mtime
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"Ошибка загрузки настроек: {e}")
+            return {}
+        if not isinstance(data, dict):
+            return {}
+
+        changed = {}
+        with self._lock:
+            for key in self._values:
+                if key in data:
+                    value = self._validate(key, data[key])
+                    if self._values[key] != value:
+                        self._values[key] = value
+                        changed[key] = value
+        for key, value in changed.items():
+            self._notify(key, value)
+        return changed
+
+    def _write(self):
+        """
+        Атомарно записывает настройки (main.durable).
+
+        Под блокировкой файл перечитывается: значения, записанные другим
+        процессом, сохраняются, заменяются только изменённые здесь ключи.
+        """
+        with self._lock:
+            dirty = {key: self._values[key] for key in self._dirty}
+            values = dict(self._values)
+            self._dirty.clear()
+            self._save_timer = None
+
+        try:
+            with locked_file(self.path):
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        data = json.load(f)
+                except (FileNotFoundError, ValueError):
+                    data = {}
+                if not isinstance(data, dict):
+                    data = {}
+                for key, value in values.items():
+                    data.setdefault(key, value)
+                data.update(dirty)
+                write_json(self.path, data, indent=4)
+        except Exception as e:
+            with self._lock:
+                self._dirty.update(dirty)
+            print(f"Ошибка сохранения настроек: {e}")
+
+    def _schedule_save(self):
+        with self._lock:
+            if self._save_timer:
+                self._save_timer.cancel()
+            self._save_timer = threading.Timer(self.SAVE_DELAY, self._write)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush(self):
+        """Немедленно записывает отложенные изменения (например, при выходе)."""
+        with self._lock:
+            pending = self._save_timer is not None
+            if self._save_timer:
+                self._save_timer.cancel()
+        if pending:
+            self._write()
+
+    # === ДОСТУП К ЗНАЧЕНИЯМ ===
+
+    def get(self, key):
+        with self._lock:
+            return self._values[key]
+
+    def __getitem__(self, key):
+        return self.get(key)
+
+    def as_dict(self):
+        with self._lock:
+            return dict(self._values)
+
+    def update(self, **values):
+        """
+        Изменяет несколько настроек сразу.
+
+        Неизвестные ключи вызывают KeyError. Подписчики получают
+        уведомление только о реально изменившихся значениях.
+        """
+        changed = {}
+        with self._lock:
+            for key, value in values.items():
+                if key not in self._values:
+                    raise KeyError(key)
+                value = self._validate(key, value)
+                if self._values[key] != value:
+                    self._values[key] = value
+                    changed[key] = value
+            self._dirty.update(changed)
+
+        if changed:
+            self._schedule_save()
+            for key, value in changed.items():
+                self._notify(key, value)
+
+        return changed
+
+    def set(self, key, value):
+        return self.update(**{key: value})
+
+    @property
+    def auto_lock_ms(self):
+        """Таймаут автоблокировки в миллисекундах."""
+        return self.get("auto_lock_time") * 60 * 1000
+
+    # === ПОДПИСКИ ===
+
+    def subscribe(self, key, callback):
+        """
+        Подписывает callback(key, value) на изменения настройки.
+
+        Returns:
+            Функция для отписки
+        """
+        with self._lock:
+            self._subscribers.setdefault(key, []).append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                callbacks = self._subscribers.get(key, [])
+                if callback in callbacks:
+                    callbacks.remove(callback)
+
+        return unsubscribe
+
+    def _notify(self, key, value):
+        with self._lock:
+            callbacks = list(self._subscribers.get(key, []))
+        for callback in callbacks:
+            try:
+                callback(key, value)
+            except Exception as e:
+                print(f"Ошибка обработчика настройки '{key}': {e}")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_settings():
+    """Возвращает общее для всего приложения хранилище настроек."""
+    global _store
+    with _store_lock:
+        if _store is None or _store.path != paths.settings_path():
+            _store = SettingsStore()
+        return _store
@@ -0,0 +1,66 @@
+import os
+import json
+
+import paths
+from main.durable import write_durable
+
+
+SNAPSHOT_VERSION = 1
+
+
+class FirstScreenSnapshot:
+    """
+    Зашифрованный снимок первого экрана списка паролей.
+
+    Хранит последнюю открытую папку и первую страницу строк
+    (id, название, категория), чтобы после разблокировки главное окно
+    рисовалось сразу, до запроса к базе. Секреты в снимок не попадают,
+    но названия тоже считаются приватными, поэтому файл шифруется
+    ключом хранилища.
+    """
+
+    def __init__(self, folder, rows):
+        self.folder = folder
+        self.rows = [tuple(row) for row in rows]
+
+    def matches(self, folder, rows):
+        return self.folder == folder and self.rows == [tuple(row) for row in rows]
+
+    def to_bytes(self):
+        return json.dumps({
+            "version": SNAPSHOT_VERSION,
+            "folder": self.folder,
+            "rows": [list(row) for row in self.rows]
+        }, ensure_ascii=False).encode("utf-8")
+
+    @classmethod
+    def from_bytes(cls, data):
+        payload = json.loads(data.decode("utf-8"))
+        if payload.get("version") != SNAPSHOT_VERSION:
+            return None
+        rows = [(int(row[0]), str(row[1]), row[2]) for row in payload.get("rows", [])]
+        return cls(payload.get("folder"), rows)
+
+
+def load_snapshot(encryptor, path=None):
+    """Читает и расшифровывает снимок. При любой ошибке возвращает None."""
+    path = path or paths.snapshot_path()
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            return FirstScreenSnapshot.from_bytes(encryptor.decrypt_bytes(f.read()))
+    except Exception as e:
+        print(f"Снимок первого экрана не прочитан: {e}")
+        return None
+
+
+def save_snapshot(encryptor, snapshot, path=None):
+    """Шифрует и атомарно записывает снимок."""
+    path = path or paths.snapshot_path()
+    try:
+        write_durable(path, encryptor.encrypt_bytes(snapshot.to_bytes()))
+        return True
+    except Exception as e:
+        print(f"Ошибка сохранения снимка первого экрана: {e}")
+        return False
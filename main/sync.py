@@ -0,0 +1,491 @@
+"""
+Синхронизация двух копий хранилища (два файла SQLite).
+
+Каждая запись получает uuid - общий для всех копий идентификатор - и
+ревизию: номер из счётчика копии (vault_meta.revision), который
+триггеры увеличивают при добавлении, изменении и удалении записи.
+Удаление оставляет "надгробие" (tombstones) с uuid и ревизией, чтобы
+другая копия узнала, что запись удалена, а не просто не пришла.
+
+merge_vault() сравнивает только записи с ревизией выше отметки прошлой
+синхронизации с этой копией (sync_peers), поэтому стоимость зависит от
+числа изменений, а не от размера хранилища. Обе стороны получают
+изменения друг друга, затем отметки сдвигаются на текущие счётчики.
+
+Конфликты решаются одинаково, с какой бы стороны ни запускать:
+    - изменены обе версии - побеждает более поздняя date_modified, при
+      равенстве - копия с большим vault_id; проигравшая версия уходит в
+      историю записи (reason "sync");
+    - изменение против удаления - запись возвращается, если изменена
+      позже удаления, иначе удаляется.
+
+Вложения и история записей не передаются.
+
+Бенчмарк: python -m main.sync --count 100000
+"""
+import uuid
+
+from main import url_index
+from main.merge import title_key
+
+
+REVISION_KEY = "revision"
+VAULT_ID_KEY = "vault_id"
+
+UPDATE_TRIGGER = "passwords_track_update"
+
+HISTORY_REASON = "sync"
+
+# Пространство имён uuid записей, созданных до отслеживания изменений:
+# uuid выводится из id, даты создания и названия, поэтому у копий одного
+# файла, обновлённых по отдельности, uuid совпадают
+_LEGACY_NAMESPACE = uuid.UUID("6f1c2d0e-5b7a-4c39-9a51-3e8d2f4b7c10")
+
+_ROW_COLUMNS = ("id", "uuid", "revision", "title", "username", "password", "url", "category", "notes",
+                "folder", "date_created", "date_modified", "password_fp", "username_fp")
+_SELECT_ROWS = f"SELECT {', '.join(_ROW_COLUMNS)} FROM passwords"
+
+_TEXT_FIELDS = ("title", "url", "category")
+_SECRET_FIELDS = ("username", "password", "notes")
+
+
+class SyncError(Exception):
+    """Копии нельзя синхронизировать (другой ключ, то же хранилище)"""
+    pass
+
+
+# === СХЕМА ===
+
+def create_tables(cursor):
+    """
+    Таблицы и триггеры отслеживания изменений (без commit).
+
+    Колонки uuid и revision в passwords уже должны быть добавлены.
+    Записи без uuid (созданные до отслеживания) получают uuid и ревизии.
+    """
+    cursor.execute("CREATE TABLE IF NOT EXISTS vault_meta (key TEXT PRIMARY KEY, value)")
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS tombstones (
+        uuid TEXT PRIMARY KEY,
+        revision INTEGER NOT NULL,
+        deleted_at TEXT NOT NULL
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS sync_peers (
+        peer_id TEXT PRIMARY KEY,
+        local_revision INTEGER NOT NULL,
+        peer_revision INTEGER NOT NULL,
+        synced_at TEXT NOT NULL,
+        peer_path TEXT
+    )
+    ''')
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_passwords_uuid ON passwords(uuid)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_passwords_revision ON passwords(revision)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tombstones_revision ON tombstones(revision)")
+
+    cursor.execute(
+        "INSERT OR IGNORE INTO vault_meta (key, value) VALUES (?, ?)", (VAULT_ID_KEY, uuid.uuid4().hex)
+    )
+    cursor.execute(
+        "INSERT OR IGNORE INTO vault_meta (key, value) "
+        "SELECT ?, COALESCE(MAX(revision), 0) FROM passwords", (REVISION_KEY,)
+    )
+
+    cursor.execute("SELECT id, date_created, title FROM passwords WHERE uuid IS NULL ORDER BY id")
+    legacy = cursor.fetchall()
+    if legacy:
+        revision = current_revision(cursor)
+        cursor.executemany(
+            "UPDATE passwords SET uuid = ?, revision = ? WHERE id = ?",
+            [(uuid.uuid5(_LEGACY_NAMESPACE, f"{id}\0{date_created}\0{title}").hex, revision + number, id)
+             for number, (id, date_created, title) in enumerate(legacy, 1)]
+        )
+        cursor.execute(
+            "UPDATE vault_meta SET value = ? WHERE key = ?", (revision + len(legacy), REVISION_KEY)
+        )
+
+    create_triggers(cursor)
+
+
+def create_triggers(cursor):
+    """Триггеры ревизий (отдельно - смена ключа временно снимает UPDATE_TRIGGER)."""
+    bump = f"UPDATE vault_meta SET value = value + 1 WHERE key = '{REVISION_KEY}';"
+    revision = f"(SELECT value FROM vault_meta WHERE key = '{REVISION_KEY}')"
+
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS passwords_track_insert AFTER INSERT ON passwords
+    BEGIN
+        {bump}
+        UPDATE passwords SET uuid = COALESCE(NEW.uuid, lower(hex(randomblob(16)))), revision = {revision}
+        WHERE id = NEW.id;
+        DELETE FROM tombstones WHERE uuid = NEW.uuid;
+    END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS {UPDATE_TRIGGER}
+    AFTER UPDATE OF title, username, password, url, category, notes, folder, date_modified ON passwords
+    BEGIN
+        {bump}
+        UPDATE passwords SET revision = {revision} WHERE id = NEW.id;
+    END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS passwords_track_delete AFTER DELETE ON passwords
+    WHEN OLD.uuid IS NOT NULL
+    BEGIN
+        {bump}
+        INSERT OR REPLACE INTO tombstones (uuid, revision, deleted_at)
+        VALUES (OLD.uuid, {revision}, datetime('now'));
+    END
+    ''')
+
+
+def current_revision(cursor):
+    cursor.execute("SELECT value FROM vault_meta WHERE key = ?", (REVISION_KEY,))
+    return cursor.fetchone()[0]
+
+
+def vault_id(cursor):
+    cursor.execute("SELECT value FROM vault_meta WHERE key = ?", (VAULT_ID_KEY,))
+    return cursor.fetchone()[0]
+
+
+# === СТОРОНА СИНХРОНИЗАЦИИ ===
+
+class _Replica:
+    """Одна из двух копий: изменения с отметки и применение чужих версий."""
+
+    def __init__(self, db, side, stats):
+        self.db = db
+        self.side = side
+        self.cursor = db.conn.cursor()
+        self.stats = stats
+        self.vault_id = vault_id(self.cursor)
+
+    def begin(self):
+        self.db.conn.execute("BEGIN IMMEDIATE")
+
+    def peer_state(self, peer_id):
+        """(своя отметка, отметка другой копии) прошлой синхронизации."""
+        self.cursor.execute(
+            "SELECT local_revision, peer_revision FROM sync_peers WHERE peer_id = ?", (peer_id,)
+        )
+        return self.cursor.fetchone() or (0, 0)
+
+    def changes(self, since):
+        """Записи и надгробия с ревизией выше отметки (по индексам ревизий)."""
+        self.cursor.execute(f"{_SELECT_ROWS} WHERE revision > ?", (since,))
+        rows = {row[1]: dict(zip(_ROW_COLUMNS, row)) for row in self.cursor.fetchall()}
+        self.cursor.execute("SELECT uuid, deleted_at FROM tombstones WHERE revision > ?", (since,))
+        return rows, dict(self.cursor.fetchall())
+
+    def row(self, entry_uuid):
+        self.cursor.execute(f"{_SELECT_ROWS} WHERE uuid = ?", (entry_uuid,))
+        row = self.cursor.fetchone()
+        return dict(zip(_ROW_COLUMNS, row)) if row else None
+
+    def tombstone(self, entry_uuid):
+        self.cursor.execute("SELECT deleted_at FROM tombstones WHERE uuid = ?", (entry_uuid,))
+        row = self.cursor.fetchone()
+        return row[0] if row else None
+
+    def reveal(self, row):
+        """Расшифрованные username, password, notes."""
+        decrypt = self.db.encryptor.decrypt
+        return {field: decrypt(row[field]) if row[field] else "" for field in _SECRET_FIELDS}
+
+    def put(self, row, source):
+        """Добавляет или обновляет запись версией другой копии (без commit)."""
+        encryptor = self.db.encryptor
+        same_key = source.db.encryptor is encryptor
+        if same_key:
+            sealed = {field: row[field] for field in _SECRET_FIELDS}
+            password_fp, username_fp = row["password_fp"], row["username_fp"]
+        else:
+            plain = source.reveal(row)
+            sealed = {field: encryptor.encrypt(plain[field]) if plain[field] else ""
+                      for field in _SECRET_FIELDS}
+            password_fp = None
+            username_fp = None
+        key = title_key(row["title"])
+
+        existing = self.row(row["uuid"])
+        if existing is None:
+            self.cursor.execute('''
+            INSERT INTO passwords (uuid, title, username, password, url, category, notes, folder,
+                                   password_fp, username_fp, title_key, date_created, date_modified)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (row["uuid"], row["title"], sealed["username"], sealed["password"], row["url"],
+                  row["category"], sealed["notes"], row["folder"], password_fp, username_fp, key,
+                  row["date_created"], row["date_modified"]))
+            url_index.index_entry(self.cursor, self.cursor.lastrowid, row["url"] or "")
+            self.stats.count(self.side, "inserted")
+            return
+
+        # Заменяемая версия сохраняется в истории, как при правке
+        previous = self.db._read_history_fields(existing["id"])
+        incoming = dict(source.reveal(row), **{field: row[field] for field in _TEXT_FIELDS})
+        delta = {k: v for k, v in previous.items() if (v or "") != (incoming[k] or "")}
+        if delta:
+            self.db._add_history(existing["id"], delta, HISTORY_REASON)
+        self.cursor.execute('''
+        UPDATE passwords
+        SET title=?, username=?, password=?, url=?, category=?, notes=?, folder=?,
+            password_fp=?, username_fp=?, title_key=?, date_modified=?
+        WHERE id=?
+        ''', (row["title"], sealed["username"], sealed["password"], row["url"], row["category"],
+              sealed["notes"], row["folder"], password_fp, username_fp, key, row["date_modified"],
+              existing["id"]))
+        url_index.index_entry(self.cursor, existing["id"], row["url"] or "")
+        self.db.prune_history(existing["id"], commit=False)
+        self.stats.count(self.side, "updated")
+
+    def delete(self, entry_uuid):
+        """Удаляет запись по uuid (триггер оставляет надгробие)."""
+        existing = self.row(entry_uuid)
+        if existing is None:
+            return
+        entry_id = existing["id"]
+        self.cursor.execute("DELETE FROM passwords WHERE id = ?", (entry_id,))
+        self.cursor.execute("DELETE FROM password_history WHERE entry_id = ?", (entry_id,))
+        self.db.attachments.delete_for_entry(entry_id, commit=False)
+        url_index.remove_entry(self.cursor, entry_id)
+        self.stats.count(self.side, "deleted")
+
+    def save_peer_state(self, peer, local_revision, peer_revision, peer_path):
+        self.cursor.execute('''
+        INSERT INTO sync_peers (peer_id, local_revision, peer_revision, synced_at, peer_path)
+        VALUES (?, ?, ?, datetime('now'), ?)
+        ON CONFLICT(peer_id) DO UPDATE SET
+            local_revision = excluded.local_revision,
+            peer_revision = excluded.peer_revision,
+            synced_at = excluded.synced_at,
+            peer_path = excluded.peer_path
+        ''', (peer.vault_id, local_revision, peer_revision, peer_path))
+
+
+class SyncStats:
+    """Итоги синхронизации: что изменилось в каждой копии."""
+
+    def __init__(self):
+        self.local = dict.fromkeys(("inserted", "updated", "deleted"), 0)
+        self.remote = dict.fromkeys(("inserted", "updated", "deleted"), 0)
+        self.conflicts = 0
+        self.folders = set()
+
+    def count(self, side, action):
+        getattr(self, side)[action] += 1
+
+    def to_dict(self):
+        return {
+            "local": dict(self.local),
+            "remote": dict(self.remote),
+            "conflicts": self.conflicts,
+            "folders": sorted(self.folders),
+        }
+
+
+# === СЛИЯНИЕ ===
+
+def _same_content(row, replica, other_row, other):
+    """Совпадают ли версии записи (шифротексты сравниваются без расшифровки, если равны)."""
+    if any((row[field] or "") != (other_row[field] or "") for field in _TEXT_FIELDS + ("folder",)):
+        return False
+    if all(row[field] == other_row[field] for field in _SECRET_FIELDS):
+        return True
+    return replica.reveal(row) == other.reveal(other_row)
+
+
+def _wins(row, replica, other_row, other):
+    """Побеждает ли версия row: позже изменена, при равенстве - больший vault_id."""
+    return ((row["date_modified"] or "", replica.vault_id)
+            > (other_row["date_modified"] or "", other.vault_id))
+
+
+def _reconcile(source, target, changed, target_changed, stats):
+    """Переносит изменения source в target; конфликты решаются одинаково с обеих сторон."""
+    for entry_uuid, row in changed.items():
+        if row["folder"]:
+            stats.folders.add(row["folder"])
+        target_row = target_changed.get(entry_uuid) or target.row(entry_uuid)
+        if target_row is None:
+            deleted_at = target.tombstone(entry_uuid)
+            if deleted_at is None or (row["date_modified"] or "") > deleted_at:
+                target.put(row, source)
+            else:
+                source.delete(entry_uuid)
+            continue
+
+        if entry_uuid in target_changed:
+            # Изменена в обеих копиях: каждую пару разбирает сторона победителя
+            if _same_content(row, source, target_row, target):
+                continue
+            if not _wins(row, source, target_row, target):
+                continue
+            stats.conflicts += 1
+        target.put(row, source)
+
+
+def _apply_deletes(tombstones, target, target_changed):
+    for entry_uuid, deleted_at in tombstones.items():
+        row = target_changed.get(entry_uuid)
+        # Изменённая позже удаления запись не удаляется - её вернёт _reconcile
+        if row is not None and (row["date_modified"] or "") > deleted_at:
+            continue
+        target.delete(entry_uuid)
+
+
+def merge_vault(db, other_db_path, other_encryptor=None):
+    """
+    Синхронизирует хранилище db с другой копией в файле other_db_path.
+
+    Обмен идёт в обе стороны, каждая копия меняется одной транзакцией.
+    Повторный запуск после сбоя безопасен: уже перенесённые версии
+    совпадут и пропустятся.
+
+    Args:
+        other_encryptor: ключ другой копии, если он отличается (после
+            смены мастер-пароля на одной из машин); по умолчанию - ключ db
+
+    Returns:
+        SyncStats
+    """
+    import os
+    from main.database import PasswordDatabase
+    from main.encryption import InvalidToken
+
+    if os.path.abspath(other_db_path) == os.path.abspath(db.db_path):
+        raise SyncError("Нельзя синхронизировать хранилище с самим собой")
+
+    other_db = PasswordDatabase(other_db_path, other_encryptor or db.encryptor)
+    stats = SyncStats()
+    try:
+        local = _Replica(db, "local", stats)
+        remote = _Replica(other_db, "remote", stats)
+        local.begin()
+        remote.begin()
+        try:
+            if remote.vault_id == local.vault_id:
+                # Скопированный файл: копия получает собственный идентификатор
+                remote.vault_id = uuid.uuid4().hex
+                remote.cursor.execute(
+                    "UPDATE vault_meta SET value = ? WHERE key = ?", (remote.vault_id, VAULT_ID_KEY)
+                )
+
+            # Отметки хранятся в обеих копиях; берём меньшие на случай
+            # сбоя между фиксацией одной и другой копии
+            local_since, remote_since = local.peer_state(remote.vault_id)
+            remote_mark, local_mark = remote.peer_state(local.vault_id)
+            local_since = min(local_since, local_mark)
+            remote_since = min(remote_since, remote_mark)
+
+            # Проверка ключа другой копии по любой её записи
+            remote.cursor.execute("SELECT password FROM passwords LIMIT 1")
+            sample = remote.cursor.fetchone()
+            if sample:
+                try:
+                    other_db.encryptor.decrypt(sample[0])
+                except InvalidToken:
+                    raise SyncError(
+                        "Другая копия зашифрована другим ключом (мастер-пароль менялся на одной из машин)"
+                    )
+
+            local_rows, local_tombstones = local.changes(local_since)
+            remote_rows, remote_tombstones = remote.changes(remote_since)
+
+            _apply_deletes(remote_tombstones, local, local_rows)
+            _apply_deletes(local_tombstones, remote, remote_rows)
+            _reconcile(remote, local, remote_rows, local_rows, stats)
+            _reconcile(local, remote, local_rows, remote_rows, stats)
+
+            local_revision = current_revision(local.cursor)
+            remote_revision = current_revision(remote.cursor)
+            local.save_peer_state(remote, local_revision, remote_revision, os.path.abspath(other_db_path))
+            remote.save_peer_state(local, remote_revision, local_revision, os.path.abspath(db.db_path))
+            other_db.conn.commit()
+            db.conn.commit()
+        except Exception:
+            other_db.conn.rollback()
+            db.conn.rollback()
+            raise
+    finally:
+        other_db.close()
+    return stats
+
+
+def _benchmark(count, changes):
+    import os
+    import time
+    import shutil
+    import tempfile
+
+    from main.database import PasswordDatabase
+    from main.encryption import Encryptor
+
+    encryptor = Encryptor.from_data_key(os.urandom(32))
+    with tempfile.TemporaryDirectory() as data_dir:
+        path_a = os.path.join(data_dir, "a.db")
+        path_b = os.path.join(data_dir, "b.db")
+
+        a = PasswordDatabase(path_a, encryptor)
+        a.insert_records([
+            {"title": f"entry {i}", "username": f"user{i}", "password": f"password-{i}",
+             "url": f"https://site{i}.example.com", "category": "", "notes": "", "folder": None}
+            for i in range(count)
+        ])
+        a.close()
+        shutil.copyfile(path_a, path_b)
+
+        # Первая синхронизация копий: все записи сравниваются
+        a = PasswordDatabase(path_a, encryptor)
+        start = time.perf_counter()
+        first = merge_vault(a, path_b)
+        first_time = time.perf_counter() - start
+        assert first.to_dict()["local"] == first.to_dict()["remote"] == dict.fromkeys(first.local, 0)
+
+        # Небольшие изменения с обеих сторон, включая конфликт и удаление
+        b = PasswordDatabase(path_b, encryptor)
+        for i in range(1, changes + 1):
+            a.update_password(i, f"entry {i}", f"user{i}", f"a-{i}", "", "", "")
+            b.update_password(count - i, f"entry b {i}", f"user{i}", f"b-{i}", "", "", "")
+        b.update_password(1, "entry 1", "user1", "conflict", "", "", "")
+        b.delete_password(count)
+        b.close()
+
+        start = time.perf_counter()
+        delta = merge_vault(a, path_b)
+        delta_time = time.perf_counter() - start
+        again = merge_vault(a, path_b)
+        a.close()
+
+        b = PasswordDatabase(path_b, encryptor)
+        assert _same_rows(path_a, b), "копии разошлись"
+        b.close()
+        assert again.to_dict()["local"] == again.to_dict()["remote"] == dict.fromkeys(again.local, 0)
+
+        print(f"{count} записей: первая синхронизация копий {first_time:6.2f} s, "
+              f"{changes} + {changes} изменений {delta_time * 1000:7.1f} ms "
+              f"({delta.to_dict()}), повторная без изменений - пусто")
+
+
+def _same_rows(path_a, b):
+    """Для бенчмарка: совпадают ли записи двух копий (по uuid и шифротекстам)."""
+    b.cursor.execute("ATTACH DATABASE ? AS a", (path_a,))
+    columns = "uuid, title, username, password, url, category, notes, folder, date_modified"
+    b.cursor.execute(f"SELECT {columns} FROM main.passwords EXCEPT SELECT {columns} FROM a.passwords")
+    missing = b.cursor.fetchall()
+    b.cursor.execute(f"SELECT {columns} FROM a.passwords EXCEPT SELECT {columns} FROM main.passwords")
+    extra = b.cursor.fetchall()
+    b.cursor.execute("DETACH DATABASE a")
+    return not missing and not extra
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Бенчмарк синхронизации копий хранилища")
+    parser.add_argument("--count", type=int, default=100000)
+    parser.add_argument("--changes", type=int, default=100)
+    args = parser.parse_args()
+    _benchmark(args.count, args.changes)
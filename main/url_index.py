@@ -0,0 +1,359 @@
+"""
+Индекс адресов сайтов для подбора записей по URL.
+
+Поле url - свободный текст, и вопрос "какие записи подходят к этому
+сайту" раньше решался LIKE по всей таблице. Теперь при записи адреса
+раскладываются на схему, хост, порт, регистрируемый домен и путь и
+хранятся в таблице entry_urls (несколько адресов на запись) с индексом
+по домену. find() - один поиск по индексу и ранжирование кандидатов.
+
+Регистрируемый домен определяется по Public Suffix List (выборка в
+data/public_suffix_list.dat, формат исходного списка): для
+"accounts.google.co.uk" это "google.co.uk", поэтому вход с
+"mail.google.co.uk" найдёт ту же запись, а "evil-google.co.uk" - нет.
+
+Бенчмарк: python -m main.url_index --count 100000
+"""
+import os
+import re
+import ipaddress
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+
+PUBLIC_SUFFIX_LIST = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "data", "public_suffix_list.dat"
+)
+
+# Источники адресов записи: поле url или добавленные отдельно
+SOURCE_FIELD = "field"
+SOURCE_EXTRA = "extra"
+
+# Баллы ранжирования
+SCORE_HOST = 100
+SCORE_DOMAIN = 60
+SCORE_PATH_SEGMENT = 5
+PENALTY_PORT = 30
+PENALTY_SCHEME = 5
+PENALTY_PATH = 10
+
+_URL_SEPARATORS = re.compile(r"[\s,;]+")
+_VALID_HOST = re.compile(r"^[a-z0-9._:-]+$")
+_DEFAULT_PORTS = {"http": 80, "https": 443, "": 443}
+
+NormalizedUrl = namedtuple("NormalizedUrl", "url scheme host port domain path")
+
+
+# === PUBLIC SUFFIX LIST ===
+
+def _to_ascii(label):
+    try:
+        return label.encode("idna").decode("ascii")
+    except UnicodeError:
+        return label
+
+
+class PublicSuffixList:
+    """Правила списка публичных суффиксов (обычные, *.wildcard и !исключения)."""
+
+    def __init__(self, rules=(), wildcards=(), exceptions=()):
+        self.rules = set(rules)
+        self.wildcards = set(wildcards)
+        self.exceptions = set(exceptions)
+
+    @classmethod
+    def load(cls, path=PUBLIC_SUFFIX_LIST):
+        psl = cls()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    rule = line.split()[0] if line.strip() else ""
+                    if not rule or rule.startswith("//"):
+                        continue
+                    if rule.startswith("!"):
+                        psl.exceptions.add(".".join(_to_ascii(l) for l in rule[1:].split(".")))
+                    elif rule.startswith("*."):
+                        psl.wildcards.add(".".join(_to_ascii(l) for l in rule[2:].split(".")))
+                    else:
+                        psl.rules.add(".".join(_to_ascii(l) for l in rule.split(".")))
+        except OSError as e:
+            # Без списка действует правило по умолчанию "*" (последняя метка)
+            print(f"Не удалось загрузить список публичных суффиксов: {e}")
+        return psl
+
+    def public_suffix(self, host):
+        labels = host.split(".")
+        for i in range(len(labels)):
+            candidate = ".".join(labels[i:])
+            if candidate in self.exceptions:
+                return ".".join(labels[i + 1:])
+            if candidate in self.rules or ".".join(labels[i + 1:]) in self.wildcards:
+                return candidate
+        return labels[-1]
+
+    def registrable_domain(self, host):
+        """Суффикс плюс одна метка; сам суффикс (например, "co.uk") - как есть."""
+        suffix = self.public_suffix(host)
+        if host == suffix:
+            return host
+        prefix = host[:-len(suffix) - 1]
+        return f"{prefix.rsplit('.', 1)[-1]}.{suffix}"
+
+
+_psl = None
+
+
+def get_public_suffix_list():
+    global _psl
+    if _psl is None:
+        _psl = PublicSuffixList.load()
+    return _psl
+
+
+# === НОРМАЛИЗАЦИЯ ===
+
+def _is_ip_address(host):
+    # IPv4 кончается цифрой, в IPv6 есть ':' - остальные хосты не разбираются
+    if ":" not in host and not host[-1:].isdigit():
+        return False
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return True
+
+
+def normalize_url(url):
+    """
+    Раскладывает адрес на части.
+
+    "GitHub.com/login" -> ("https://github.com/login", "", "github.com",
+    None, "github.com", "/login"). Схема пустая, если её не указали.
+
+    Returns:
+        NormalizedUrl или None, если хост не выделить
+    """
+    url = (url or "").strip()
+    if not url:
+        return None
+    has_scheme = "://" in url
+    try:
+        parts = urlsplit(url if has_scheme else f"https://{url}")
+        host = parts.hostname
+        port = parts.port
+    except ValueError:
+        return None
+    if not host:
+        return None
+
+    host = _to_ascii(host.rstrip("."))
+    if not _VALID_HOST.match(host):
+        return None
+    scheme = parts.scheme.lower() if has_scheme else ""
+    if port == _DEFAULT_PORTS.get(scheme):
+        port = None
+    path = parts.path.rstrip("/")
+
+    if _is_ip_address(host):
+        domain = host
+    else:
+        domain = host if "." not in host else get_public_suffix_list().registrable_domain(host)
+
+    netloc = f"[{host}]" if ":" in host else host
+    canonical = f"{scheme or 'https'}://{netloc}{f':{port}' if port else ''}{path}"
+    return NormalizedUrl(canonical, scheme, host, port, domain, path)
+
+
+def split_urls(text):
+    """Адреса из поля url (через пробел, запятую, точку с запятой или с новой строки)."""
+    return [part for part in _URL_SEPARATORS.split(text or "") if part]
+
+
+# === ТАБЛИЦА ===
+
+def create_tables(cursor):
+    """
+    Создаёт таблицу индекса (вызывается из PasswordDatabase._create_tables).
+
+    Returns:
+        True, если таблица создана сейчас и её нужно заполнить
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'entry_urls'")
+    exists = cursor.fetchone() is not None
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS entry_urls (
+        id INTEGER PRIMARY KEY,
+        entry_id INTEGER NOT NULL,
+        url TEXT NOT NULL,
+        scheme TEXT NOT NULL,
+        host TEXT NOT NULL,
+        port INTEGER,
+        domain TEXT NOT NULL,
+        path TEXT NOT NULL,
+        source TEXT NOT NULL DEFAULT 'field'
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_entry_urls_domain ON entry_urls(domain)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_entry_urls_entry ON entry_urls(entry_id)")
+    return not exists
+
+
+def _insert(cursor, entry_id, normalized, source):
+    cursor.execute(
+        "INSERT INTO entry_urls (entry_id, url, scheme, host, port, domain, path, source) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (entry_id,) + tuple(normalized) + (source,)
+    )
+
+
+def index_entry(cursor, entry_id, url_text):
+    """Переиндексирует адреса из поля url записи (без commit)."""
+    cursor.execute(
+        "DELETE FROM entry_urls WHERE entry_id = ? AND source = ?", (entry_id, SOURCE_FIELD)
+    )
+    count = 0
+    for url in split_urls(url_text):
+        normalized = normalize_url(url)
+        if normalized:
+            _insert(cursor, entry_id, normalized, SOURCE_FIELD)
+            count += 1
+    return count
+
+
+def add_url(cursor, entry_id, url):
+    """Дополнительный адрес записи; False, если адрес не разобрать."""
+    normalized = normalize_url(url)
+    if not normalized:
+        return False
+    _insert(cursor, entry_id, normalized, SOURCE_EXTRA)
+    return True
+
+
+def remove_entry(cursor, entry_id):
+    cursor.execute("DELETE FROM entry_urls WHERE entry_id = ?", (entry_id,))
+
+
+def rebuild(cursor):
+    """Заполняет индекс по полю url всех записей (новая таблица, импорт)."""
+    cursor.execute("DELETE FROM entry_urls WHERE source = ?", (SOURCE_FIELD,))
+    rows = cursor.execute("SELECT id, url FROM passwords WHERE url IS NOT NULL AND url != ''").fetchall()
+    values = []
+    for entry_id, url_text in rows:
+        for url in split_urls(url_text):
+            normalized = normalize_url(url)
+            if normalized:
+                values.append((entry_id,) + tuple(normalized) + (SOURCE_FIELD,))
+    cursor.executemany(
+        "INSERT INTO entry_urls (entry_id, url, scheme, host, port, domain, path, source) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        values
+    )
+    return len(values)
+
+
+# === ПОИСК ===
+
+def _path_score(indexed_path, query_path):
+    if not indexed_path:
+        return 0
+    if query_path == indexed_path or query_path.startswith(indexed_path + "/"):
+        return SCORE_PATH_SEGMENT * indexed_path.count("/")
+    return -PENALTY_PATH
+
+
+def score(indexed, query):
+    """Насколько адрес из индекса подходит к запрошенному (больше - лучше)."""
+    points = SCORE_HOST if indexed.host == query.host else SCORE_DOMAIN
+    if indexed.port != query.port and (indexed.port or query.port):
+        points -= PENALTY_PORT
+    if indexed.scheme and query.scheme and indexed.scheme != query.scheme:
+        points -= PENALTY_SCHEME
+    return points + _path_score(indexed.path, query.path)
+
+
+def find(cursor, url, limit=None):
+    """
+    Записи, подходящие к адресу, по убыванию соответствия.
+
+    Кандидаты выбираются по индексу регистрируемого домена, поэтому
+    время поиска не зависит от числа записей на других сайтах.
+
+    Returns:
+        Список (entry_id, балл, совпавший адрес)
+    """
+    query = normalize_url(url)
+    if not query:
+        return []
+    cursor.execute(
+        "SELECT entry_id, url, scheme, host, port, domain, path FROM entry_urls WHERE domain = ?",
+        (query.domain,)
+    )
+    best = {}
+    for row in cursor.fetchall():
+        indexed = NormalizedUrl(*row[1:])
+        points = score(indexed, query)
+        if row[0] not in best or points > best[row[0]][0]:
+            best[row[0]] = (points, indexed.url)
+    ranked = sorted(
+        ((entry_id, points, matched) for entry_id, (points, matched) in best.items()),
+        key=lambda item: (-item[1], item[0])
+    )
+    return ranked[:limit] if limit else ranked
+
+
+def looks_like_url(text):
+    """Похож ли поисковый запрос на адрес сайта (для строки поиска)."""
+    text = text.strip()
+    return bool(text) and not any(c.isspace() for c in text) and ("." in text or "://" in text)
+
+
+def _benchmark(count):
+    import time
+    import tempfile
+
+    from main.database import PasswordDatabase
+    from main.encryption import Encryptor
+
+    sites = ["github.com", "accounts.google.com", "mail.google.com", "shop.example.co.uk",
+             "bank.ru", "gitlab.com", "portal.example.com.au", "192.168.1.1:8080"]
+    with tempfile.TemporaryDirectory() as data_dir:
+        encryptor = Encryptor.from_data_key(os.urandom(32))
+        db = PasswordDatabase(os.path.join(data_dir, "bench.db"), encryptor)
+        token = encryptor.encrypt("password")
+        db.cursor.executemany(
+            "INSERT INTO passwords (title, username, password, url, category, notes, date_created, date_modified) "
+            "VALUES (?, '', ?, ?, '', '', datetime('now'), datetime('now'))",
+            [(f"entry {i}", token,
+              f"https://site{i}.example.org/login" if i % 100 else f"https://{sites[i // 100 % len(sites)]}/")
+             for i in range(count)]
+        )
+        start = time.perf_counter()
+        rebuild(db.cursor)
+        db.conn.commit()
+        print(f"Построение индекса: {time.perf_counter() - start:.2f} s на {count} записей")
+
+        rounds = 200
+        start = time.perf_counter()
+        for _ in range(rounds):
+            db.cursor.execute("SELECT id FROM passwords WHERE url LIKE ?", ("%google.com%",))
+            db.cursor.fetchall()
+        like_time = (time.perf_counter() - start) / rounds
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            matches = db.find_by_url("https://mail.google.com/mail/u/0")
+        index_time = (time.perf_counter() - start) / rounds
+
+        print(f"LIKE '%google.com%': {like_time * 1000:8.3f} ms")
+        print(f"find_by_url:         {index_time * 1000:8.3f} ms ({len(matches)} совпадений)")
+        db.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Бенчмарк индекса адресов")
+    parser.add_argument("--count", type=int, default=100000)
+    args = parser.parse_args()
+    _benchmark(args.count)
@@ -0,0 +1,134 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import paths
+from main.encryption import Encryptor, InvalidToken
+from main.database import PasswordDatabase
+
+
+VERIFICATION_TEXT = "EVOLS_VERIFICATION_TOKEN_2024"
+
+
+def read_salt():
+    """Читает соль хранилища."""
+    with open(paths.salt_path(), "rb") as f:
+        return f.read()
+
+
+def verify_encryptor(encryptor):
+    """
+    Проверяет ключ по контрольному токену.
+
+    Работает даже если база данных пустая. При неверном пароле
+    выбрасывает InvalidToken.
+    """
+    with open(paths.verification_path(), "r", encoding="utf-8") as f:
+        verification_token = f.read()
+
+    if encryptor.decrypt(verification_token) != VERIFICATION_TEXT:
+        raise InvalidToken()
+
+
+def unlock_encryptor(master_password, db_path=None):
+    """
+    Открывает ключ хранилища мастер-паролем и проверяет его.
+
+    Хранилище старого формата (ключ выводится прямо из пароля)
+    при первом входе переводится на случайный ключ данных со слотами.
+    """
+    from main.keyslots import KeySlots, has_keyslots
+    from main.rekey import complete_pending_rekey
+
+    # Смена пароля могла оборваться между переключением базы и заменой файлов
+    complete_pending_rekey(db_path)
+
+    if has_keyslots():
+        encryptor = KeySlots.load().unlock_password(master_password)
+        verify_encryptor(encryptor)
+        return encryptor
+
+    encryptor = Encryptor(master_password, read_salt())
+    verify_encryptor(encryptor)
+    return migrate_to_keyslots(encryptor, master_password, db_path)
+
+
+def unlock_keyfile(keyfile_path, db_path=None):
+    """Открывает ключ хранилища ключевым файлом и проверяет его."""
+    from main.keyslots import KeySlots
+    from main.rekey import complete_pending_rekey
+
+    complete_pending_rekey(db_path)
+    encryptor = KeySlots.load().unlock_keyfile(keyfile_path)
+    verify_encryptor(encryptor)
+    return encryptor
+
+
+def migrate_to_keyslots(encryptor, master_password, db_path=None):
+    """
+    Переводит хранилище старого формата на ключ данных за один проход.
+
+    При ошибке остаётся старый формат (вход не блокируется), следующий
+    вход продолжит перевод с последней контрольной точки.
+    """
+    from main.rekey import RekeyJob
+
+    db_path = db_path or paths.db_path()
+    print("🔑 Перевод хранилища на ключ данных со слотами...")
+    job = RekeyJob(db_path, encryptor, master_password)
+    try:
+        return job.run()
+    except Exception as e:
+        print(f"Хранилище осталось в старом формате: {e}")
+        return encryptor
+
+
+class StagedLogin:
+    """
+    Поэтапный вход в хранилище.
+
+    Вывод ключа (секунды PBKDF2) идёт в фоновом потоке, а вызывающий
+    поток тем временем открывает базу, выполняет миграции и читает
+    строки для первого экрана - для этого ключ не нужен. Соединение
+    SQLite создаётся и используется только в вызывающем потоке.
+    """
+
+    def __init__(self, master_password, db_path=None, keyfile_path=None):
+        self.db_path = db_path or paths.db_path()
+        self.db = None
+        self.initial_rows = None
+
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="evols-kdf")
+        if keyfile_path:
+            self._key_future = executor.submit(unlock_keyfile, keyfile_path, self.db_path)
+        else:
+            self._key_future = executor.submit(unlock_encryptor, master_password, self.db_path)
+        executor.shutdown(wait=False)
+
+    def prepare_database(self):
+        """Открывает БД и читает строки списка, пока выводится ключ."""
+        self.db = PasswordDatabase(self.db_path, None)
+        self.initial_rows = self.db.get_all_passwords()
+
+    def key_ready(self):
+        return self._key_future.done()
+
+    def finish(self):
+        """
+        Дожидается ключа и подключает его к уже открытой базе.
+
+        Returns:
+            (encryptor, db, initial_rows)
+        """
+        encryptor = self._key_future.result()
+        if self.db is None:
+            self.prepare_database()
+        self.db.attach_encryptor(encryptor)
+        return encryptor, self.db, self.initial_rows
+
+    def cancel(self):
+        """Закрывает базу, если вход не удался."""
+        if self.db:
+            try:
+                self.db.close()
+            except Exception:
+                pass
+            self.db = None
@@ -0,0 +1,471 @@
+"""
+Несколько хранилищ: реестр и одновременно открытые сессии.
+
+Реестр (vaults.json в общем каталоге) перечисляет хранилища: основное
+лежит прямо в каталоге данных, как и раньше, дополнительные - каждое в
+своём каталоге (по умолчанию vaults/<id>) со своими passwords.db,
+vault.keys, verify.token и файлами 2FA. Настройки, индекс утечек и
+кэши остаются общими.
+
+Хранилище, выбранное при входе, становится текущим для процесса
+(paths.set_active_vault). Остальные можно открыть дополнительно:
+VaultSession держит собственный ключ и соединение SQLite в отдельном
+потоке, за которым закреплён каталог хранилища (paths.pin_vault_dir),
+поэтому слоты ключей, проверка пароля и миграции работают с файлами
+именно этого хранилища. VaultManager.search() опрашивает все открытые
+хранилища параллельно и сливает результаты в один ранжированный список.
+
+Бенчмарк: python -m main.vaults --vaults 4 --count 20000
+"""
+import os
+import json
+import uuid
+import threading
+
+import paths
+from main.durable import write_durable, write_json
+
+
+DEFAULT_VAULT_ID = "default"
+DEFAULT_VAULT_NAME = "Основное"
+REGISTRY_VERSION = 1
+
+# Баллы поиска по тексту (адреса ранжирует url_index)
+SCORE_TITLE_EXACT = 100
+SCORE_TITLE_PREFIX = 80
+SCORE_WORD_PREFIX = 60
+SCORE_TITLE_SUBSTRING = 40
+SCORE_URL = 30
+SCORE_CATEGORY = 20
+
+
+class VaultError(Exception):
+    """Ошибка реестра или открытия хранилища"""
+    pass
+
+
+# === РЕЕСТР ===
+
+class VaultInfo:
+    """Запись реестра: идентификатор, имя и каталог хранилища."""
+
+    def __init__(self, id, name, path):
+        self.id = id
+        self.name = name
+        self.path = path
+
+    @property
+    def is_default(self):
+        return self.id == DEFAULT_VAULT_ID
+
+    def exists(self):
+        """Создано ли хранилище (есть база)."""
+        return os.path.exists(os.path.join(self.path, "passwords.db"))
+
+    def to_dict(self):
+        return {"id": self.id, "name": self.name, "path": self.path}
+
+
+class VaultRegistry:
+    """Список хранилищ и выбранное при последнем входе."""
+
+    def __init__(self, path=None):
+        self.path = path or paths.vault_registry_path()
+        self._lock = threading.Lock()
+        self._vaults = []
+        self.active_id = DEFAULT_VAULT_ID
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"Ошибка чтения реестра хранилищ: {e}")
+            return
+
+        for item in data.get("vaults", []):
+            if item.get("id") and item.get("name") and item.get("path"):
+                self._vaults.append(VaultInfo(item["id"], item["name"], item["path"]))
+        if self._find_id(data.get("active")):
+            self.active_id = data["active"]
+
+    def save(self):
+        """Атомарно записывает реестр."""
+        payload = {
+            "version": REGISTRY_VERSION,
+            "active": self.active_id,
+            "vaults": [info.to_dict() for info in self._vaults],
+        }
+        with self._lock:
+            write_json(self.path, payload)
+
+    def default(self):
+        return VaultInfo(DEFAULT_VAULT_ID, DEFAULT_VAULT_NAME, os.path.dirname(self.path))
+
+    def list(self):
+        """Все хранилища, основное - первым."""
+        return [self.default()] + list(self._vaults)
+
+    def _find_id(self, vault_id):
+        if vault_id == DEFAULT_VAULT_ID:
+            return self.default()
+        return next((info for info in self._vaults if info.id == vault_id), None)
+
+    def get(self, key):
+        """Хранилище по id или имени (без учёта регистра)."""
+        info = self._find_id(key)
+        if info:
+            return info
+        name = (key or "").casefold()
+        info = next((info for info in self.list() if info.name.casefold() == name), None)
+        if info is None:
+            raise VaultError(f"Хранилище не найдено: {key}")
+        return info
+
+    @property
+    def active(self):
+        return self._find_id(self.active_id) or self.default()
+
+    def set_active(self, key):
+        """Выбирает хранилище процесса и запоминает выбор."""
+        info = self.get(key)
+        self.active_id = info.id
+        paths.set_active_vault(None if info.is_default else info.path)
+        self.save()
+        return info
+
+    def add(self, name, path=None):
+        """
+        Регистрирует хранилище: новое (каталог создаётся) или уже
+        существующее по пути (например, общая папка).
+        """
+        name = (name or "").strip()
+        if not name:
+            raise VaultError("Имя хранилища не может быть пустым")
+        if any(info.name.casefold() == name.casefold() for info in self.list()):
+            raise VaultError(f"Хранилище с именем «{name}» уже есть")
+
+        vault_id = uuid.uuid4().hex[:12]
+        path = os.path.abspath(path) if path else os.path.join(paths.vaults_dir(), vault_id)
+        if any(os.path.abspath(info.path) == path for info in self.list()):
+            raise VaultError(f"Каталог уже зарегистрирован: {path}")
+        os.makedirs(path, exist_ok=True)
+
+        info = VaultInfo(vault_id, name, path)
+        self._vaults.append(info)
+        self.save()
+        return info
+
+    def remove(self, key):
+        """Убирает хранилище из реестра (файлы не удаляются)."""
+        info = self.get(key)
+        if info.is_default:
+            raise VaultError("Основное хранилище нельзя убрать из списка")
+        self._vaults = [other for other in self._vaults if other.id != info.id]
+        if self.active_id == info.id:
+            self.active_id = DEFAULT_VAULT_ID
+        self.save()
+        return info
+
+
+_registry = None
+
+
+def get_registry():
+    """Общий реестр (перечитывается, если сменился каталог данных)."""
+    global _registry
+    if _registry is None or _registry.path != paths.vault_registry_path():
+        _registry = VaultRegistry()
+    return _registry
+
+
+def restore_active_vault():
+    """Делает текущим хранилище, выбранное при прошлом входе."""
+    info = get_registry().active
+    paths.set_active_vault(None if info.is_default else info.path)
+    return info
+
+
+def initialize_vault(master_password):
+    """
+    Создаёт ключи и базу хранилища в текущем каталоге (paths.get_data_dir).
+
+    Returns:
+        Encryptor нового хранилища
+    """
+    from main.keyslots import create_keyslots
+    from main.database import PasswordDatabase
+    from main.vault import VERIFICATION_TEXT
+
+    if os.path.exists(paths.db_path()) or os.path.exists(paths.keyslots_path()):
+        raise VaultError(f"Хранилище уже создано: {paths.get_data_dir()}")
+    encryptor, keyslots = create_keyslots(master_password)
+    keyslots.save()
+    write_durable(paths.verification_path(), encryptor.encrypt(VERIFICATION_TEXT).encode("utf-8"))
+    PasswordDatabase(paths.db_path(), encryptor).close()
+    return encryptor
+
+
+# === ПОИСК ===
+
+def rank(query, title, url, category):
+    """Балл записи для текстового запроса (0 - не подходит)."""
+    query = query.casefold().strip()
+    if not query:
+        return 0
+    title = (title or "").casefold()
+    if title == query:
+        return SCORE_TITLE_EXACT
+    if title.startswith(query):
+        return SCORE_TITLE_PREFIX
+    if any(word.startswith(query) for word in title.split()):
+        return SCORE_WORD_PREFIX
+    if query in title:
+        return SCORE_TITLE_SUBSTRING
+    if query in (url or "").casefold():
+        return SCORE_URL
+    if query in (category or "").casefold():
+        return SCORE_CATEGORY
+    return 0
+
+
+def search_database(db, query, limit=None):
+    """
+    Ранжированный поиск в одной базе.
+
+    Запрос-адрес ищется по индексу адресов, остальные - по названию,
+    адресу и категории.
+
+    Returns:
+        Список словарей (id, title, category, url, folder, score), лучшие первыми
+    """
+    from main import url_index
+
+    if url_index.looks_like_url(query):
+        return [
+            {key: match[key] for key in ("id", "title", "category", "url", "folder", "score")}
+            for match in db.find_by_url(query, limit)
+        ]
+
+    results = []
+    for id, title, category, url, folder in db.search_passwords(query):
+        score = rank(query, title, url, category)
+        if score:
+            results.append({"id": id, "title": title, "category": category, "url": url,
+                            "folder": folder, "score": score})
+    results.sort(key=lambda item: (-item["score"], item["title"].casefold()))
+    return results[:limit] if limit else results
+
+
+# === СЕССИИ ===
+
+class VaultSession:
+    """
+    Открытое хранилище: ключ и соединение в собственном потоке.
+
+    Соединение SQLite можно использовать только из создавшего его
+    потока, поэтому вся работа с базой идёт через call().
+    """
+
+    def __init__(self, info):
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.info = info
+        self.db = None
+        self.encryptor = None
+        self._owns_encryptor = True
+        self._executor = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix=f"evols-vault-{info.id}",
+            initializer=paths.pin_vault_dir,
+            initargs=(info.path,)
+        )
+
+    @property
+    def is_open(self):
+        return self.db is not None
+
+    def call(self, function, *args, **kwargs):
+        """Выполняет function(db, ...) в потоке хранилища; возвращает Future."""
+        return self._executor.submit(self._call, function, args, kwargs)
+
+    def _call(self, function, args, kwargs):
+        if self.db is None:
+            raise VaultError(f"Хранилище «{self.info.name}» заблокировано")
+        return function(self.db, *args, **kwargs)
+
+    def unlock(self, master_password=None, keyfile_path=None, encryptor=None):
+        """
+        Открывает хранилище (блокирует до проверки ключа).
+
+        Args:
+            encryptor: уже открытый ключ (хранилище, в которое выполнен
+                вход в интерфейсе) - вывод ключа не повторяется
+        """
+        self._executor.submit(self._open, master_password, keyfile_path, encryptor).result()
+        return self
+
+    def _open(self, master_password, keyfile_path, encryptor):
+        from main import vault
+        from main.database import PasswordDatabase
+
+        db_path = paths.db_path()
+        if not os.path.exists(db_path):
+            raise VaultError(f"Хранилище «{self.info.name}» ещё не создано")
+        if encryptor is not None:
+            self._owns_encryptor = False
+        elif keyfile_path:
+            encryptor = vault.unlock_keyfile(keyfile_path, db_path)
+        else:
+            encryptor = vault.unlock_encryptor(master_password, db_path)
+        self.encryptor = encryptor
+        self.db = PasswordDatabase(db_path, encryptor)
+
+    def search(self, query, limit=None):
+        return self.call(search_database, query, limit)
+
+    def lock(self):
+        """Закрывает соединение, затирает ключ и останавливает поток."""
+        try:
+            self._executor.submit(self._close).result()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def _close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+        if self.encryptor is not None and self._owns_encryptor:
+            self.encryptor.clear()
+        self.encryptor = None
+
+
+class VaultManager:
+    """Открытые хранилища процесса и поиск по всем сразу."""
+
+    def __init__(self, registry=None):
+        self.registry = registry or get_registry()
+        self._sessions = {}
+
+    def unlock(self, key, master_password=None, keyfile_path=None, encryptor=None):
+        """Открывает хранилище (по id или имени); уже открытое возвращается как есть."""
+        info = self.registry.get(key)
+        session = self._sessions.get(info.id)
+        if session is not None:
+            return session
+        session = VaultSession(info)
+        try:
+            session.unlock(master_password, keyfile_path, encryptor)
+        except Exception:
+            session.lock()
+            raise
+        self._sessions[info.id] = session
+        return session
+
+    def lock(self, key):
+        session = self._sessions.pop(self.registry.get(key).id, None)
+        if session is not None:
+            session.lock()
+
+    def lock_all(self):
+        for vault_id in list(self._sessions):
+            self._sessions.pop(vault_id).lock()
+
+    def session(self, key):
+        return self._sessions.get(self.registry.get(key).id)
+
+    def unlocked(self):
+        return [session.info for session in self._sessions.values()]
+
+    def search(self, query, limit=None):
+        """
+        Поиск во всех открытых хранилищах параллельно.
+
+        Returns:
+            Общий список словарей с полями search_database и vault,
+            vault_name; лучшие первыми
+        """
+        from concurrent.futures import as_completed
+
+        futures = {session.search(query, limit): session.info for session in self._sessions.values()}
+        results = []
+        for future in as_completed(futures):
+            info = futures[future]
+            try:
+                matches = future.result()
+            except Exception as e:
+                print(f"Ошибка поиска в хранилище «{info.name}»: {e}")
+                continue
+            for match in matches:
+                match["vault"] = info.id
+                match["vault_name"] = info.name
+            results.extend(matches)
+        results.sort(key=lambda item: (-item["score"], item["title"].casefold(), item["vault_name"]))
+        return results[:limit] if limit else results
+
+
+def _benchmark(vault_count, count):
+    import time
+    import tempfile
+
+    from main.database import PasswordDatabase
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.environ["EVOLS_DATA_DIR"] = data_dir
+        registry = VaultRegistry()
+        manager = VaultManager(registry)
+        for number in range(vault_count):
+            info = registry.add(f"vault {number}")
+            paths.pin_vault_dir(info.path)
+            try:
+                encryptor = initialize_vault(f"password {number}")
+                db = PasswordDatabase(paths.db_path(), encryptor)
+                db.insert_records([
+                    {"title": f"{['mail', 'bank', 'shop', 'forum'][i % 4]} {number}-{i}", "username": "",
+                     "password": f"p{i}", "url": f"https://site{i}.example.com", "category": "",
+                     "notes": "", "folder": None}
+                    for i in range(count)
+                ])
+                db.close()
+            finally:
+                paths.pin_vault_dir(None)
+
+        start = time.perf_counter()
+        for number in range(vault_count):
+            manager.unlock(f"vault {number}", f"password {number}")
+        unlock_time = time.perf_counter() - start
+
+        queries = ["mail", "bank 1-1", "shop 2-19", "https://site42.example.com/login"]
+        rounds = 5
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for query in queries:
+                merged = manager.search(query, limit=20)
+        parallel = (time.perf_counter() - start) / (rounds * len(queries))
+
+        # Для сравнения - те же запросы по очереди
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for query in queries:
+                for info in manager.unlocked():
+                    manager.session(info.id).search(query, 20).result()
+        sequential = (time.perf_counter() - start) / (rounds * len(queries))
+
+        assert merged and merged[0]["score"] >= merged[-1]["score"]
+        manager.lock_all()
+        print(f"{vault_count} хранилищ по {count} записей: вход во все {unlock_time:5.2f} s, "
+              f"поиск параллельно {parallel * 1000:6.1f} ms, по очереди {sequential * 1000:6.1f} ms "
+              f"(CPU: {os.cpu_count()})")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Бенчмарк поиска по нескольким хранилищам")
+    parser.add_argument("--vaults", type=int, default=4)
+    parser.add_argument("--count", type=int, default=20000)
+    args = parser.parse_args()
+    _benchmark(args.vaults, args.count)
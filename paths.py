@@ -1,8 +1,15 @@
-
 import os
+import threading
 
 
-def get_data_dir() -> str:
+# Каталог хранилища: закреплённый за потоком (сессии дополнительных
+# хранилищ, main.vaults) важнее выбранного для процесса (вход, --vault)
+_thread_vault = threading.local()
+_active_vault_dir = None
+
+
+def base_dir() -> str:
+    """Общий каталог приложения: настройки, реестр хранилищ, кэши."""
     base = os.environ.get("EVOLS_DATA_DIR")
     if not base:
         home = os.path.expanduser("~")
@@ -11,6 +18,26 @@ def get_data_dir() -> str:
     return base
 
 
+def get_data_dir() -> str:
+    """Каталог текущего хранилища (основное хранилище лежит прямо в base_dir)."""
+    path = getattr(_thread_vault, "path", None) or _active_vault_dir
+    if not path:
+        return base_dir()
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def set_active_vault(path):
+    """Выбирает хранилище процесса (None - основное)."""
+    global _active_vault_dir
+    _active_vault_dir = path
+
+
+def pin_vault_dir(path):
+    """Закрепляет каталог хранилища за текущим потоком (None - снять)."""
+    _thread_vault.path = path
+
+
 def db_path() -> str:
     return os.path.join(get_data_dir(), "passwords.db")
 
@@ -21,3 +48,46 @@ def salt_path() -> str:
 
 def twofa_path() -> str:
     return os.path.join(get_data_dir(), "2fa_secret.key")
+
+
+def settings_path() -> str:
+    return os.path.join(base_dir(), "app_settings.json")
+
+
+def verification_path() -> str:
+    return os.path.join(get_data_dir(), "verify.token")
+
+
+def snapshot_path() -> str:
+    return os.path.join(get_data_dir(), "first_screen.snapshot")
+
+
+def breach_index_path() -> str:
+    return os.path.join(base_dir(), "breach.idx")
+
+
+def strength_cache_path() -> str:
+    return os.path.join(base_dir(), "strength_dictionaries.cache")
+
+
+def rotation_reports_dir() -> str:
+    path = os.path.join(get_data_dir(), "rotation_reports")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def keyslots_path() -> str:
+    return os.path.join(get_data_dir(), "vault.keys")
+
+
+def agent_socket_path() -> str:
+    return os.environ.get("EVOLS_AGENT_SOCK") or os.path.join(get_data_dir(), "agent.sock")
+
+
+def vault_registry_path() -> str:
+    return os.path.join(base_dir(), "vaults.json")
+
+
+def vaults_dir() -> str:
+    """Каталог дополнительных хранилищ, созданных приложением."""
+    return os.path.join(base_dir(), "vaults")
@@ -0,0 +1,376 @@
+# utils/breach_index.py
+"""
+Офлайн-проверка паролей по базе утечек.
+
+Индекс строится один раз из локального списка хешей (формат Have I Been
+Pwned "SHA1:count", просто SHA-1 или пароли открытым текстом) и хранится
+в data-каталоге (paths.breach_index_path()). Формат файла:
+
+    заголовок   MAGIC, версия, длина префикса, число записей
+    fan-out     65537 смещений (uint64, little-endian) по первым 2 байтам
+    записи      отсортированные первые 8 байт SHA-1 (big-endian)
+
+Файл открывается через mmap, поэтому в памяти находятся только реально
+прочитанные страницы. Поиск: переход по fan-out к корзине и двоичный
+поиск внутри неё - O(log n). Вероятность ложного срабатывания для
+миллиарда записей около 5e-11.
+
+Построение (внешняя сортировка, память ограничена --chunk-size):
+
+    python -m utils.breach_index build pwned-passwords-sha1.txt
+
+Проверка и бенчмарк:
+
+    python -m utils.breach_index check
+    python -m utils.breach_index bench --count 1000000
+"""
+import os
+import mmap
+import heapq
+import struct
+import hashlib
+import tempfile
+import threading
+
+import paths
+
+
+MAGIC = b"EVOLSBRX"
+VERSION = 1
+PREFIX_BYTES = 8
+FANOUT_BITS = 16
+
+_HEADER = struct.Struct("<8sIIQ")
+_FANOUT_SIZE = (1 << FANOUT_BITS) + 1
+_FANOUT_ENTRY = struct.Struct("<Q")
+_FANOUT_PAIR = struct.Struct("<QQ")
+_RECORDS_OFFSET = _HEADER.size + _FANOUT_SIZE * _FANOUT_ENTRY.size
+_FANOUT_SHIFT = (PREFIX_BYTES * 8) - FANOUT_BITS
+
+DEFAULT_CHUNK_SIZE = 2_000_000
+_HEX_DIGITS = frozenset("0123456789abcdefABCDEF")
+
+
+class BreachIndexError(Exception):
+    """Повреждённый или несовместимый файл индекса."""
+
+
+def password_prefix(password):
+    """Первые 8 байт SHA-1 пароля (UTF-8) - ключ записи индекса."""
+    return hashlib.sha1(password.encode("utf-8")).digest()[:PREFIX_BYTES]
+
+
+# === ПОСТРОЕНИЕ ===
+
+def _looks_like_hash(line):
+    head = line[:40]
+    return len(head) == 40 and set(head) <= _HEX_DIGITS and (len(line) == 40 or line[40] == ":")
+
+
+def _iter_prefixes(source_path, source_format="auto"):
+    """
+    Читает исходный файл и выдаёт префиксы как int.
+
+    source_format: "sha1" (строки "HEX" или "HEX:count"), "plain"
+    (пароль в строке) или "auto" (по первой непустой строке).
+    """
+    with open(source_path, "r", encoding="utf-8", errors="surrogateescape") as f:
+        for line in f:
+            line = line.rstrip("\r\n")
+            if not line or line.startswith("#"):
+                continue
+            if source_format == "auto":
+                source_format = "sha1" if _looks_like_hash(line) else "plain"
+            if source_format == "sha1":
+                try:
+                    yield int(line[:PREFIX_BYTES * 2], 16)
+                except ValueError:
+                    continue
+            else:
+                try:
+                    yield int.from_bytes(password_prefix(line), "big")
+                except UnicodeEncodeError:
+                    continue
+
+
+def _write_run(values, directory):
+    """Сохраняет отсортированную пачку во временный файл."""
+    values.sort()
+    fd, run_path = tempfile.mkstemp(prefix="breach-run-", dir=directory)
+    with os.fdopen(fd, "wb") as f:
+        previous = None
+        buffer = bytearray()
+        for value in values:
+            if value != previous:
+                buffer += value.to_bytes(PREFIX_BYTES, "big")
+                previous = value
+            if len(buffer) >= 1 << 20:
+                f.write(buffer)
+                buffer.clear()
+        f.write(buffer)
+    return run_path
+
+
+def _read_run(run_path, block_size=1 << 16):
+    with open(run_path, "rb") as f:
+        while True:
+            block = f.read(block_size * PREFIX_BYTES)
+            if not block:
+                break
+            for offset in range(0, len(block), PREFIX_BYTES):
+                yield block[offset:offset + PREFIX_BYTES]
+
+
+def build_index(source_paths, output_path=None, source_format="auto",
+                chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """
+    Строит файл индекса из одного или нескольких списков.
+
+    Данные сортируются пачками по chunk_size записей во временные файлы,
+    затем сливаются (heapq.merge) с удалением дублей. Итоговый файл
+    записывается во временный и атомарно заменяет старый.
+
+    Returns:
+        Количество уникальных записей
+    """
+    if isinstance(source_paths, str):
+        source_paths = [source_paths]
+    output_path = output_path or paths.breach_index_path()
+    work_dir = os.path.dirname(os.path.abspath(output_path))
+
+    runs = []
+    try:
+        chunk = []
+        read = 0
+        for source_path in source_paths:
+            for value in _iter_prefixes(source_path, source_format):
+                chunk.append(value)
+                read += 1
+                if len(chunk) >= chunk_size:
+                    runs.append(_write_run(chunk, work_dir))
+                    chunk = []
+                    if progress:
+                        progress(read)
+        if chunk or not runs:
+            runs.append(_write_run(chunk, work_dir))
+        chunk = None
+
+        fanout = [0] * _FANOUT_SIZE
+        count = 0
+        tmp_path = f"{output_path}.tmp"
+        with open(tmp_path, "wb") as out:
+            out.write(bytes(_RECORDS_OFFSET))
+            previous = None
+            buffer = bytearray()
+            for record in heapq.merge(*(_read_run(run) for run in runs)):
+                if record == previous:
+                    continue
+                previous = record
+                fanout[(record[0] << 8 | record[1]) + 1] += 1
+                buffer += record
+                count += 1
+                if len(buffer) >= 1 << 20:
+                    out.write(buffer)
+                    buffer.clear()
+            out.write(buffer)
+
+            # Накопленные смещения корзин (в записях)
+            for i in range(1, _FANOUT_SIZE):
+                fanout[i] += fanout[i - 1]
+
+            out.seek(0)
+            out.write(_HEADER.pack(MAGIC, VERSION, PREFIX_BYTES, count))
+            out.write(struct.pack(f"<{_FANOUT_SIZE}Q", *fanout))
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, output_path)
+        return count
+    finally:
+        for run_path in runs:
+            try:
+                os.remove(run_path)
+            except OSError:
+                pass
+
+
+# === ПОИСК ===
+
+class BreachIndex:
+    """Отображённый в память индекс утечек."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise BreachIndexError("Пустой файл индекса")
+
+        if len(self._mm) < _RECORDS_OFFSET:
+            self.close()
+            raise BreachIndexError("Файл индекса повреждён")
+        magic, version, prefix_bytes, count = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION or prefix_bytes != PREFIX_BYTES:
+            self.close()
+            raise BreachIndexError("Неизвестный формат индекса")
+        if len(self._mm) != _RECORDS_OFFSET + count * PREFIX_BYTES:
+            self.close()
+            raise BreachIndexError("Файл индекса повреждён")
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def contains_prefix(self, prefix):
+        """Ищет 8-байтный префикс SHA-1."""
+        mm = self._mm
+        bucket = prefix[0] << 8 | prefix[1]
+        lo, hi = _FANOUT_PAIR.unpack_from(mm, _HEADER.size + bucket * _FANOUT_ENTRY.size)
+        while lo < hi:
+            mid = (lo + hi) >> 1
+            offset = _RECORDS_OFFSET + mid * PREFIX_BYTES
+            record = mm[offset:offset + PREFIX_BYTES]
+            if record < prefix:
+                lo = mid + 1
+            elif record > prefix:
+                hi = mid
+            else:
+                return True
+        return False
+
+    def contains(self, password):
+        """True, если пароль встречается в базе утечек."""
+        if not password:
+            return False
+        try:
+            return self.contains_prefix(password_prefix(password))
+        except UnicodeEncodeError:
+            return False
+
+    def contains_sha1(self, sha1_hex):
+        return self.contains_prefix(bytes.fromhex(sha1_hex[:PREFIX_BYTES * 2]))
+
+    __contains__ = contains
+
+    def close(self):
+        mm, self._mm = getattr(self, "_mm", None), None
+        if mm is not None:
+            mm.close()
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+_default_index = None
+_default_index_path = None
+_default_index_mtime = None
+_default_index_lock = threading.Lock()
+
+
+def get_breach_index():
+    """
+    Общий индекс из каталога данных.
+
+    Индекс открывается заново, если файл появился или был перестроен
+    после предыдущего вызова (сравнивается время изменения).
+
+    Returns:
+        BreachIndex или None, если индекс ещё не построен
+    """
+    global _default_index, _default_index_path, _default_index_mtime
+    path = paths.breach_index_path()
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        mtime = None
+    with _default_index_lock:
+        if _default_index_path != path or _default_index_mtime != mtime:
+            if _default_index is not None and _default_index_path != path:
+                _default_index.close()
+            # При перестроении старый индекс не закрывается явно: он может
+            # ещё использоваться движком, отображение освободит сборщик мусора
+            _default_index = None
+            _default_index_path = path
+            _default_index_mtime = mtime
+            if mtime is not None:
+                try:
+                    _default_index = BreachIndex(path)
+                except (OSError, BreachIndexError) as e:
+                    print(f"Ошибка открытия индекса утечек: {e}")
+        return _default_index
+
+
+# === КОМАНДНАЯ СТРОКА ===
+
+def _benchmark(count, lookups):
+    import time
+    import secrets
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        source = os.path.join(work_dir, "source.txt")
+        known = []
+        with open(source, "w", encoding="utf-8") as f:
+            for i in range(count):
+                password = secrets.token_urlsafe(9)
+                if i < lookups:
+                    known.append(password)
+                f.write(hashlib.sha1(password.encode()).hexdigest().upper() + f":{i % 50 + 1}\n")
+
+        output = os.path.join(work_dir, "breach.idx")
+        start = time.perf_counter()
+        built = build_index(source, output)
+        build_time = time.perf_counter() - start
+
+        index = BreachIndex(output)
+        missing = [secrets.token_urlsafe(9) for _ in range(lookups)]
+
+        start = time.perf_counter()
+        hits = sum(1 for password in known if index.contains(password))
+        hit_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        false_hits = sum(1 for password in missing if index.contains(password))
+        miss_time = time.perf_counter() - start
+        index.close()
+
+        size_mb = os.path.getsize(output) / (1 << 20)
+        print(f"Построение: {built} записей за {build_time:.2f} s, файл {size_mb:.1f} MB")
+        print(f"Найденные: {hits}/{len(known)}, {hit_time / len(known) * 1e6:.1f} µs на поиск")
+        print(f"Отсутствующие: ложных {false_hits}/{len(missing)}, "
+              f"{miss_time / len(missing) * 1e6:.1f} µs на поиск")
+
+
+if __name__ == "__main__":
+    import argparse
+    import getpass
+
+    parser = argparse.ArgumentParser(description="Офлайн-индекс утечек паролей")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build_cmd = commands.add_parser("build", help="построить индекс из списков")
+    build_cmd.add_argument("sources", nargs="+")
+    build_cmd.add_argument("--output", default=None)
+    build_cmd.add_argument("--format", choices=("auto", "sha1", "plain"), default="auto")
+    build_cmd.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+
+    check_cmd = commands.add_parser("check", help="проверить пароль (ввод скрыт)")
+    check_cmd.add_argument("--index", default=None)
+
+    bench_cmd = commands.add_parser("bench", help="бенчмарк построения и поиска")
+    bench_cmd.add_argument("--count", type=int, default=1_000_000)
+    bench_cmd.add_argument("--lookups", type=int, default=100_000)
+
+    args = parser.parse_args()
+    if args.command == "build":
+        total = build_index(
+            args.sources, args.output, args.format, args.chunk_size,
+            progress=lambda read: print(f"  прочитано {read:,}")
+        )
+        print(f"Готово: {total:,} записей -> {args.output or paths.breach_index_path()}")
+    elif args.command == "check":
+        index = BreachIndex(args.index or paths.breach_index_path())
+        found = index.contains(getpass.getpass("Пароль: "))
+        print("⚠️ Найден в базе утечек" if found else "✅ В базе утечек не найден")
+    else:
+        _benchmark(args.count, min(args.lookups, args.count))
@@ -1,30 +1,343 @@
-import random
+# utils/password_generator.py
+"""
+Генератор паролей на криптографически стойком ГСЧ.
+
+Случайные байты берутся из os.urandom большими блоками, а выбор символа
+делается отбраковкой (rejection sampling) без смещения по модулю. Для
+набора символов отбраковка и отображение байтов в символы выполняются
+одним вызовом bytes.translate на весь блок, поэтому generate_many()
+выдаёт сотни тысяч паролей в секунду.
+
+Политики: длина, классы символов, исключения, произносимые пароли и
+парольные фразы из встроенного списка слов (data/wordlists/diceware.txt).
+
+Бенчмарк: python -m utils.password_generator --count 100000
+"""
+import os
+import math
 import string
+import threading
+
+
+DEFAULT_SPECIAL = "!@#$%^&*()-_=+[]{};:,.?"
+AMBIGUOUS = "Il1O0o"
+
+MODE_RANDOM = "random"
+MODE_PRONOUNCEABLE = "pronounceable"
+MODE_PASSPHRASE = "passphrase"
+
+_CONSONANTS = "bcdfghjklmnprstvz"
+_VOWELS = "aeiou"
+
+DEFAULT_WORDLIST = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "data", "wordlists", "diceware.txt"
+)
+
+_BLOCK_SIZE = 4096
+
+
+class PasswordPolicy:
+    """
+    Правила генерации.
+
+    mode: MODE_RANDOM (символы из набора), MODE_PRONOUNCEABLE (слоги
+    согласная-гласная) или MODE_PASSPHRASE (слова из списка).
+    """
+
+    def __init__(self, length=16, lowercase=True, uppercase=True, digits=True, special=True,
+                 special_chars=DEFAULT_SPECIAL, exclude="", exclude_ambiguous=False,
+                 require_each=True, mode=MODE_RANDOM, words=6, separator="-", capitalize=False):
+        self.length = length
+        self.lowercase = lowercase
+        self.uppercase = uppercase
+        self.digits = digits
+        self.special = special
+        self.special_chars = special_chars
+        self.exclude = exclude + (AMBIGUOUS if exclude_ambiguous else "")
+        self.require_each = require_each
+        self.mode = mode
+        self.words = words
+        self.separator = separator
+        self.capitalize = capitalize
+        self._validate()
+
+    def _validate(self):
+        if self.mode not in (MODE_RANDOM, MODE_PRONOUNCEABLE, MODE_PASSPHRASE):
+            raise ValueError(f"Неизвестный режим генерации: {self.mode}")
+        if self.mode == MODE_PASSPHRASE:
+            if self.words < 1:
+                raise ValueError("Фраза должна содержать хотя бы одно слово")
+            return
+        classes = self.classes()
+        if not classes:
+            raise ValueError("Не выбран ни один набор символов")
+        minimum = len(classes) if self.require_each else 1
+        if self.length < minimum:
+            raise ValueError(f"Длина пароля должна быть не меньше {minimum}")
+
+    def _filter(self, chars):
+        return "".join(c for c in dict.fromkeys(chars) if c not in self.exclude)
+
+    def classes(self):
+        """Включённые наборы символов (после исключений)."""
+        classes = []
+        for enabled, chars in ((self.lowercase, string.ascii_lowercase),
+                               (self.uppercase, string.ascii_uppercase),
+                               (self.digits, string.digits),
+                               (self.special, self.special_chars)):
+            if enabled:
+                chars = self._filter(chars)
+                if chars:
+                    classes.append(chars)
+        return classes
+
+    def charset(self):
+        return "".join(self.classes())
+
+    def entropy_bits(self, wordlist_size=None):
+        """Энтропия одного пароля по этой политике (в битах)."""
+        if self.mode == MODE_PASSPHRASE:
+            size = wordlist_size or len(load_wordlist())
+            bits = self.words * math.log2(size)
+            if self.digits:
+                bits += math.log2(10 * self.words)
+            return bits
+        if self.mode == MODE_PRONOUNCEABLE:
+            consonants = len(self._filter(_CONSONANTS)) or 1
+            vowels = len(self._filter(_VOWELS)) or 1
+            return self.length / 2 * (math.log2(consonants) + math.log2(vowels))
+        return self.length * math.log2(len(self.charset()))
+
+
+class RandomSource:
+    """Буферизованный os.urandom с выбором без смещения."""
+
+    def __init__(self, block_size=_BLOCK_SIZE):
+        self.block_size = block_size
+        self._buffer = b""
+        self._position = 0
+        self._lock = threading.Lock()
+
+    def read(self, size):
+        """Возвращает size случайных байтов (из буфера или напрямую)."""
+        if size >= self.block_size:
+            return os.urandom(size)
+        with self._lock:
+            if self._position + size > len(self._buffer):
+                self._buffer = os.urandom(self.block_size)
+                self._position = 0
+            chunk = self._buffer[self._position:self._position + size]
+            self._position += size
+            return chunk
+
+    def below(self, n):
+        """Равномерное целое в [0, n) - отбраковка лишнего диапазона."""
+        if n <= 0:
+            raise ValueError("n должно быть положительным")
+        width = max(1, (n - 1).bit_length() + 7 >> 3)
+        space = 1 << (8 * width)
+        limit = space - space % n
+        while True:
+            value = int.from_bytes(self.read(width), "big")
+            if value < limit:
+                return value % n
+
+    def choice(self, sequence):
+        return sequence[self.below(len(sequence))]
+
+
+_wordlist_cache = {}
+
+
+def load_wordlist(path=DEFAULT_WORDLIST):
+    """Загружает список слов для парольных фраз (один раз на путь)."""
+    words = _wordlist_cache.get(path)
+    if words is None:
+        with open(path, "r", encoding="utf-8") as f:
+            words = tuple(dict.fromkeys(
+                line.strip() for line in f if line.strip() and not line.startswith("#")
+            ))
+        if len(words) < 2:
+            raise ValueError(f"Список слов слишком мал: {path}")
+        _wordlist_cache[path] = words
+    return words
+
+
+class PasswordGenerator:
+    """Генерация паролей по политике."""
+
+    def __init__(self, policy=None, source=None, wordlist_path=DEFAULT_WORDLIST):
+        self.policy = policy or PasswordPolicy()
+        self.source = source or RandomSource()
+        self.wordlist_path = wordlist_path
+
+    def generate(self, policy=None):
+        return self.generate_many(1, policy)[0]
+
+    def generate_many(self, count, policy=None):
+        """
+        Генерирует count паролей по одной политике.
+
+        Returns:
+            Список строк
+        """
+        policy = policy or self.policy
+        if count <= 0:
+            return []
+        if policy.mode == MODE_PASSPHRASE:
+            return [self._passphrase(policy) for _ in range(count)]
+        if policy.mode == MODE_PRONOUNCEABLE:
+            return [self._pronounceable(policy) for _ in range(count)]
+        return self._random_many(count, policy)
+
+    # === НАБОР СИМВОЛОВ ===
+
+    @staticmethod
+    def _translation(charset):
+        """
+        Таблица для bytes.translate: байт -> символ набора.
+
+        Байты выше наибольшего кратного len(charset) удаляются -
+        это и есть отбраковка без смещения по модулю.
+        """
+        size = len(charset)
+        limit = 256 - 256 % size
+        table = bytes(ord(charset[b % size]) if b < limit else 0 for b in range(256))
+        return table, bytes(range(limit, 256)), limit
+
+    def _random_many(self, count, policy):
+        charset = policy.charset()
+        if len(charset) > 256 or any(ord(c) > 127 for c in charset):
+            return [self._random_slow(policy, charset) for _ in range(count)]
+
+        table, rejected, limit = self._translation(charset)
+        length = policy.length
+        required = [frozenset(chars) for chars in policy.classes()] if policy.require_each else []
+
+        results = []
+        pool = ""
+        while len(results) < count:
+            missing = (count - len(results)) * length
+            if len(pool) < missing:
+                raw_size = int((missing - len(pool)) * 256 / limit * 1.05) + 64
+                pool += self.source.read(raw_size).translate(table, rejected).decode("ascii")
+                continue
+
+            for offset in range(0, missing, length):
+                password = pool[offset:offset + length]
+                # Пароль без одного из обязательных классов отбрасывается целиком
+                if all(not chars.isdisjoint(password) for chars in required):
+                    results.append(password)
+            pool = pool[missing:]
+        return results
+
+    def _random_slow(self, policy, charset):
+        required = [frozenset(chars) for chars in policy.classes()] if policy.require_each else []
+        while True:
+            password = "".join(self.source.choice(charset) for _ in range(policy.length))
+            if all(not chars.isdisjoint(password) for chars in required):
+                return password
+
+    # === ПРОИЗНОСИМЫЕ ===
+
+    def _pronounceable(self, policy):
+        choice = self.source.choice
+        consonants = policy._filter(_CONSONANTS) or _CONSONANTS
+        vowels = policy._filter(_VOWELS) or _VOWELS
+        digits = policy._filter(string.digits) if policy.digits else ""
+        special = policy._filter(policy.special_chars) if policy.special else ""
+
+        extras = [choice(digits) for _ in range(2 if digits else 0)]
+        if special:
+            extras.append(choice(special))
+        letters_length = max(1, policy.length - len(extras))
+
+        letters = []
+        while len(letters) < letters_length:
+            letters.append(choice(consonants))
+            letters.append(choice(vowels))
+        letters = letters[:letters_length]
+
+        if policy.uppercase:
+            # Заглавной становится случайная согласная (позиции 0, 2, 4...)
+            position = self.source.below((len(letters) + 1) // 2) * 2
+            letters[position] = letters[position].upper()
+
+        # Цифры и спецсимволы вставляются между слогами в случайные места
+        for extra in extras:
+            slot = self.source.below(len(letters) // 2 + 1) * 2
+            letters.insert(slot, extra)
+        return "".join(letters)
+
+    # === ПАРОЛЬНЫЕ ФРАЗЫ ===
+
+    def _passphrase(self, policy):
+        words = load_wordlist(self.wordlist_path)
+        chosen = [self.source.choice(words) for _ in range(policy.words)]
+        if policy.capitalize or policy.uppercase:
+            chosen = [word.capitalize() for word in chosen]
+        if policy.digits:
+            index = self.source.below(len(chosen))
+            chosen[index] += str(self.source.below(10))
+        return policy.separator.join(chosen)
+
+
+_default_generator = None
+
+
+def get_generator():
+    """Общий генератор с политикой по умолчанию."""
+    global _default_generator
+    if _default_generator is None:
+        _default_generator = PasswordGenerator()
+    return _default_generator
+
+
+def generate_many(count, policy=None):
+    return get_generator().generate_many(count, policy)
 
 
 def generate_password(length=16, include_uppercase=True, include_digits=True, include_special=True):
-    chars = string.ascii_lowercase
-    if include_uppercase:
-        chars += string.ascii_uppercase
-    if include_digits:
-        chars += string.digits
-    if include_special:
-        chars += string.punctuation
-
-    # Убедимся, что пароль содержит хотя бы по одному символу из каждой группы
-    password = []
-    if include_uppercase:
-        password.append(random.choice(string.ascii_uppercase))
-    if include_digits:
-        password.append(random.choice(string.digits))
-    if include_special:
-        password.append(random.choice(string.punctuation))
-
-    # Добавляем остальные символы
-    remaining_length = length - len(password)
-    password.extend(random.choice(chars) for _ in range(remaining_length))
-
-    # Перемешиваем пароль
-    random.shuffle(password)
-
-    return ''.join(password)
+    policy = PasswordPolicy(
+        length=length,
+        uppercase=include_uppercase,
+        digits=include_digits,
+        special=include_special
+    )
+    return get_generator().generate(policy)
+
+
+def generate_passphrase(words=6, separator="-", capitalize=False, include_digit=False):
+    policy = PasswordPolicy(
+        mode=MODE_PASSPHRASE, words=words, separator=separator,
+        capitalize=capitalize, uppercase=False, digits=include_digit
+    )
+    return get_generator().generate(policy)
+
+
+def _benchmark(count):
+    import time
+
+    generator = PasswordGenerator()
+    policies = (
+        ("16 символов, все классы", PasswordPolicy()),
+        ("24 символа без неоднозначных", PasswordPolicy(length=24, exclude_ambiguous=True)),
+        ("произносимый, 14", PasswordPolicy(length=14, mode=MODE_PRONOUNCEABLE)),
+        ("фраза из 6 слов", PasswordPolicy(mode=MODE_PASSPHRASE, uppercase=False, digits=False)),
+    )
+    for name, policy in policies:
+        start = time.perf_counter()
+        passwords = generator.generate_many(count, policy)
+        elapsed = time.perf_counter() - start
+        print(f"{name:30} {count / elapsed:>12,.0f} паролей/с "
+              f"({policy.entropy_bits():.0f} бит)  пример: {passwords[0]}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Бенчмарк генератора паролей")
+    parser.add_argument("--count", type=int, default=100000)
+    args = parser.parse_args()
+    _benchmark(args.count)
@@ -0,0 +1,149 @@
+"""
+Замеры холодного старта приложения.
+
+Во время работы приложение отмечает этапы запуска через mark().
+При EVOLS_STARTUP_PROFILE=1 этапы печатаются в консоль, а при
+EVOLS_STARTUP_BENCH=1 приложение закрывается сразу после отрисовки
+экрана входа и печатает итоговое время.
+
+Регрессионный бенчмарк (нужен дисплей для Tk):
+
+    python -m utils.startup_timing --budget-ms 1500
+
+Он запускает main.py в отдельном процессе с -X importtime, выводит
+самые тяжёлые импорты и завершается с кодом 1, если время до экрана
+входа превысило бюджет.
+"""
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+
+DEFAULT_BUDGET_MS = 1500
+BENCH_MARKER = "EVOLS_STARTUP_MS="
+
+_t0 = time.perf_counter()
+_marks = []
+
+
+def reset(start=None):
+    """Задаёт точку отсчёта (по умолчанию - текущий момент)."""
+    global _t0
+    _t0 = start if start is not None else time.perf_counter()
+    _marks.clear()
+
+
+def mark(stage):
+    """Отмечает завершение этапа запуска, возвращает миллисекунды от старта."""
+    elapsed_ms = (time.perf_counter() - _t0) * 1000
+    _marks.append((stage, elapsed_ms))
+    if os.environ.get("EVOLS_STARTUP_PROFILE"):
+        print(f"[startup] {elapsed_ms:8.1f} ms  {stage}", file=sys.stderr)
+    return elapsed_ms
+
+
+def marks():
+    return list(_marks)
+
+
+def is_bench_run():
+    return bool(os.environ.get("EVOLS_STARTUP_BENCH"))
+
+
+def report_login_screen(root):
+    """
+    Вызывается, когда экран входа построен.
+
+    В режиме бенчмарка дожидается отрисовки, печатает время и
+    закрывает приложение.
+    """
+    if not is_bench_run():
+        mark("login screen")
+        return
+
+    def finish():
+        elapsed_ms = mark("login screen")
+        print(f"{BENCH_MARKER}{elapsed_ms:.1f}", flush=True)
+        root.destroy()
+
+    root.update_idletasks()
+    root.after_idle(finish)
+
+
+def parse_importtime(stderr_text):
+    """
+    Разбирает вывод -X importtime.
+
+    Returns:
+        Список (cumulative_us, module) по убыванию времени
+    """
+    rows = []
+    for line in stderr_text.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        try:
+            self_us, cumulative_us, module = line.split(":", 1)[1].split("|")
+            rows.append((int(cumulative_us), module.rstrip()))
+        except ValueError:
+            continue
+    rows.sort(reverse=True)
+    return rows
+
+
+def run_benchmark(budget_ms=DEFAULT_BUDGET_MS, runs=3, top=15):
+    """
+    Запускает приложение несколько раз и сравнивает лучшее время до
+    экрана входа с бюджетом.
+
+    Returns:
+        True, если бюджет соблюдён
+    """
+    project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    timings = []
+    imports = []
+    # Отдельный каталог данных: иначе запущенный EVOLS принял бы дочерний
+    # процесс за второй экземпляр, а бенчмарк трогал бы рабочее хранилище
+    with tempfile.TemporaryDirectory(prefix="evols-bench-") as data_dir:
+        env = dict(os.environ, EVOLS_STARTUP_BENCH="1", EVOLS_DATA_DIR=data_dir)
+        for i in range(runs):
+            result = subprocess.run(
+                [sys.executable, "-X", "importtime", os.path.join(project_dir, "main.py")],
+                cwd=project_dir,
+                env=env,
+                capture_output=True,
+                text=True,
+                timeout=60
+            )
+            value = None
+            for line in result.stdout.splitlines():
+                if line.startswith(BENCH_MARKER):
+                    value = float(line[len(BENCH_MARKER):])
+            if value is None:
+                print(result.stderr[-2000:], file=sys.stderr)
+                raise RuntimeError("Приложение не сообщило время запуска")
+            timings.append(value)
+            if i == 0:
+                imports = parse_importtime(result.stderr)
+
+    print("Самые тяжёлые импорты (cumulative):")
+    for cumulative_us, module in imports[:top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {module.strip()}")
+
+    best = min(timings)
+    print(f"Время до экрана входа: {', '.join(f'{t:.0f}' for t in timings)} ms "
+          f"(лучшее {best:.0f} ms, бюджет {budget_ms} ms)")
+    return best <= budget_ms
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Бенчмарк холодного старта EVOLS")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    sys.exit(0 if run_benchmark(args.budget_ms, args.runs) else 1)
@@ -0,0 +1,1182 @@
+# utils/strength_estimator.py
+"""
+Реалистичная оценка стойкости пароля (по мотивам zxcvbn).
+
+Пароль разбирается на шаблоны: словарные слова (в том числе с l33t-
+заменами и задом наперёд), ряды клавиатуры, повторы, последовательности,
+даты и годы. Для каждого шаблона оценивается число попыток подбора, а
+затем динамическим программированием выбирается самое "дешёвое" для
+атакующего разбиение. Результат - число попыток (guesses), оценка 0-4
+и подсказки.
+
+Словари из data/dictionaries компилируются при первом использовании в
+общую таблицу "слово -> ранги по словарям" и кэшируются на диске
+(paths.strength_cache_path()), поэтому повторный запуск читает готовую
+таблицу через marshal. Оценка при каждом нажатии клавиши занимает
+доли миллисекунды; шаблоны ищутся только в первых MAX_MATCH_LENGTH
+символах, а остаток считается перебором, так что длинная фраза не
+тормозит окно.
+
+Бенчмарк: python -m utils.strength_estimator --runs 2000
+"""
+import os
+import re
+import math
+import marshal
+import datetime
+import threading
+from bisect import bisect_right
+from itertools import compress, product
+from operator import add
+
+import paths
+
+
+FORMAT_VERSION = 1
+
+DATA_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data"
+)
+DICTIONARY_DIR = os.path.join(DATA_DIR, "dictionaries")
+
+# Словарь -> исходные файлы (порядок строк = ранг)
+DICTIONARY_SOURCES = (
+    ("passwords", (os.path.join(DATA_DIR, "common-passwords.txt"),
+                   os.path.join(DICTIONARY_DIR, "passwords.txt"))),
+    ("english", (os.path.join(DICTIONARY_DIR, "english.txt"),)),
+    ("names", (os.path.join(DICTIONARY_DIR, "names.txt"),)),
+    ("russian", (os.path.join(DICTIONARY_DIR, "russian.txt"),)),
+)
+
+# === ПАРАМЕТРЫ МОДЕЛИ (как в zxcvbn) ===
+BRUTEFORCE_CARDINALITY = 10
+MIN_GUESSES_BEFORE_GROWING_SEQUENCE = 10000
+MIN_SUBMATCH_GUESSES_SINGLE_CHAR = 10
+MIN_SUBMATCH_GUESSES_MULTI_CHAR = 50
+MIN_YEAR_SPACE = 20
+REFERENCE_YEAR = datetime.date.today().year
+MAX_SEQUENCE_DELTA = 5
+# Шаблоны ищутся в первых MAX_MATCH_LENGTH символах, остаток считается
+# перебором (как в zxcvbn): разбор растёт быстрее чем линейно с длиной
+MAX_MATCH_LENGTH = 100
+MAX_L33T_VARIANTS = 16
+
+# Границы оценок 0-4 по числу попыток
+SCORE_THRESHOLDS = (1e3, 1e6, 1e8, 1e10)
+SCORE_DELTA = 5
+
+# Скорость подбора при офлайн-атаке на медленный хеш
+GUESSES_PER_SECOND = 1e4
+
+LEVELS = ("Очень слабый", "Слабый", "Средний", "Сильный", "Очень сильный")
+
+L33T_TABLE = {
+    "a": "4@",
+    "b": "8",
+    "c": "({[<",
+    "e": "3",
+    "g": "69",
+    "i": "1!|",
+    "l": "1|7",
+    "o": "0",
+    "s": "$5",
+    "t": "+7",
+    "x": "%",
+    "z": "2",
+}
+
+# Раскладки: ряды из пар "обычный символ + с Shift"
+_QWERTY_ROWS = (
+    "`~ 1! 2@ 3# 4$ 5% 6^ 7& 8* 9( 0) -_ =+",
+    "qQ wW eE rR tT yY uU iI oO pP [{ ]} \\|",
+    "aA sS dD fF gG hH jJ kK lL ;: '\"",
+    "zZ xX cC vV bB nN mM ,< .> /?",
+)
+_JCUKEN_ROWS = (
+    "ёЁ 1! 2\" 3№ 4; 5% 6: 7? 8* 9( 0) -_ =+",
+    "йЙ цЦ уУ кК еЕ нН гГ шШ щЩ зЗ хХ ъЪ",
+    "фФ ыЫ вВ аА пП рР оО лЛ дД жЖ эЭ",
+    "яЯ чЧ сС мМ иИ тТ ьЬ бБ юЮ .,",
+)
+_KEYPAD_ROWS = (
+    "  / * -",
+    "7 8 9 +",
+    "4 5 6",
+    "1 2 3",
+    "  0 .",
+)
+
+DATE_SPLITS = {
+    4: ((1, 2), (2, 3)),
+    5: ((1, 3), (2, 3)),
+    6: ((1, 2), (2, 4), (4, 5)),
+    7: ((1, 3), (2, 3), (4, 5), (4, 6)),
+    8: ((2, 4), (4, 6)),
+}
+
+_RECENT_YEAR_RE = re.compile(r"19\d\d|20[0-4]\d")
+_DATE_WITH_SEPARATOR_RE = re.compile(r"^(\d{1,4})([\s/\\_.-])(\d{1,2})\2(\d{1,4})$")
+# Без этого в пароле нет ни одной даты: 4 цифры подряд или цифры вокруг разделителя
+_DATE_HINT_RE = re.compile(r"\d{4}|\d[\s/\\_.-]\d")
+_DIGITS_RE = re.compile(r"^\d+$")
+_GREEDY_REPEAT_RE = re.compile(r"(.+)\1+", re.S)
+_LAZY_REPEAT_RE = re.compile(r"(.+?)\1+", re.S)
+_LAZY_ANCHORED_REPEAT_RE = re.compile(r"^(.+?)\1+$", re.S)
+
+
+# === КЛАВИАТУРНЫЕ ГРАФЫ ===
+
+def _build_graph(rows, slanted):
+    """
+    Строит граф соседства клавиш: символ -> соседние клавиши по направлениям.
+
+    У "косых" клавиатур ряды сдвинуты на полклавиши (6 соседей), у
+    цифрового блока - выровнены (8 соседей).
+    """
+    positions = {}
+    for y, row in enumerate(rows):
+        tokens = row.split(" ")
+        offset = 1 if slanted and y > 0 else 0
+        for x, token in enumerate(tokens):
+            if token:
+                positions[(x + offset, y)] = token
+
+    if slanted:
+        directions = ((-1, 0), (0, -1), (1, -1), (1, 0), (0, 1), (-1, 1))
+    else:
+        directions = ((-1, 0), (-1, -1), (0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1))
+
+    graph = {}
+    for (x, y), token in positions.items():
+        neighbors = tuple(positions.get((x + dx, y + dy)) for dx, dy in directions)
+        for char in token:
+            graph[char] = neighbors
+    return graph
+
+
+def _graph_steps(graph):
+    """Пара символов -> (направление, второй символ с Shift) для соседних клавиш."""
+    steps = {}
+    for char, neighbors in graph.items():
+        for direction, neighbor in enumerate(neighbors):
+            if neighbor:
+                for index, other in enumerate(neighbor):
+                    steps.setdefault(char + other, (direction, index == 1))
+    return steps
+
+
+def _graph_stats(graph):
+    """(число стартовых позиций, средняя степень вершины)"""
+    keys = len(graph)
+    degree = sum(sum(1 for n in neighbors if n) for neighbors in graph.values()) / keys
+    return keys, degree
+
+
+GRAPHS = {
+    "qwerty": _build_graph(_QWERTY_ROWS, slanted=True),
+    "jcuken": _build_graph(_JCUKEN_ROWS, slanted=True),
+    "keypad": _build_graph(_KEYPAD_ROWS, slanted=False),
+}
+_GRAPH_STATS = {name: _graph_stats(graph) for name, graph in GRAPHS.items()}
+_GRAPH_STEPS = {name: _graph_steps(graph) for name, graph in GRAPHS.items()}
+_SHIFTED_CHARS = {
+    name: frozenset(token[1] for row in rows for token in row.split(" ") if len(token) == 2)
+    for name, rows in (("qwerty", _QWERTY_ROWS), ("jcuken", _JCUKEN_ROWS))
+}
+
+
+# === СЛОВАРИ ===
+
+def _source_signature():
+    signature = [FORMAT_VERSION]
+    for name, files in DICTIONARY_SOURCES:
+        for file_path in files:
+            try:
+                stat = os.stat(file_path)
+                signature.append((name, os.path.basename(file_path), stat.st_size, stat.st_mtime_ns))
+            except OSError:
+                signature.append((name, os.path.basename(file_path), -1, -1))
+    return signature
+
+
+def compile_dictionaries():
+    """
+    Компилирует словари в общую таблицу.
+
+    Returns:
+        {слово: ((словарь, ранг), ...)}
+    """
+    table = {}
+    for name, files in DICTIONARY_SOURCES:
+        rank = 0
+        seen = set()
+        for file_path in files:
+            if not os.path.exists(file_path):
+                continue
+            with open(file_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    word = line.strip().lower()
+                    if not word or word.startswith("#") or word in seen:
+                        continue
+                    seen.add(word)
+                    rank += 1
+                    table[word] = table.get(word, ()) + ((name, rank),)
+    return table
+
+
+def load_dictionaries(cache_path=None):
+    """Читает таблицу словарей из кэша или компилирует и сохраняет её."""
+    cache_path = cache_path or paths.strength_cache_path()
+    signature = _source_signature()
+
+    try:
+        with open(cache_path, "rb") as f:
+            cached = marshal.load(f)
+        if cached.get("signature") == signature:
+            return cached["table"]
+    except (OSError, EOFError, ValueError, TypeError, AttributeError):
+        pass
+
+    table = compile_dictionaries()
+    tmp_path = f"{cache_path}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            marshal.dump({"signature": signature, "table": table}, f)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"Ошибка сохранения кэша словарей: {e}")
+    return table
+
+
+# === ПОИСК ШАБЛОНОВ ===
+
+def _match(pattern, i, j, token, **data):
+    data.update(pattern=pattern, i=i, j=j, token=token)
+    return data
+
+
+class StrengthEstimator:
+    """Оценщик стойкости с разбором на шаблоны."""
+
+    def __init__(self, table=None):
+        self.table = table if table is not None else load_dictionaries()
+        self.max_word_length = max((len(word) for word in self.table), default=0)
+        # Все префиксы слов: перебор подстрок с позиции i обрывается на первой,
+        # с которой не начинается ни одно слово
+        self.prefixes = {word[:k] for word in self.table for k in range(1, len(word) + 1)}
+        self._screen = None
+
+    # --- словари ---
+
+    def _dictionary_matches(self, password, user_inputs=None):
+        matches = []
+        lowered = password.lower()
+        n = len(password)
+        table = self.table
+        prefixes = self.prefixes
+        max_length = self.max_word_length
+        if user_inputs:
+            max_length = max(max_length, max(len(word) for word in user_inputs))
+            prefixes = prefixes | {word[:k] for word in user_inputs for k in range(1, len(word) + 1)}
+
+        for i in range(n):
+            for j in range(i, min(n, i + max_length)):
+                word = lowered[i:j + 1]
+                if word not in prefixes:
+                    break
+                entries = table.get(word, ())
+                if user_inputs and word in user_inputs:
+                    entries = entries + (("user_inputs", user_inputs[word]),)
+                for dictionary, rank in entries:
+                    matches.append(_match(
+                        "dictionary", i, j, password[i:j + 1],
+                        matched_word=word, rank=rank, dictionary=dictionary,
+                        reversed=False, l33t=False
+                    ))
+        return matches
+
+    def _reverse_dictionary_matches(self, password, user_inputs=None):
+        n = len(password)
+        matches = self._dictionary_matches(password[::-1], user_inputs)
+        for match in matches:
+            match["token"] = match["token"][::-1]
+            match["reversed"] = True
+            match["i"], match["j"] = n - 1 - match["j"], n - 1 - match["i"]
+        return matches
+
+    def _l33t_matches(self, password, user_inputs=None):
+        # Какие символы пароля могут быть заменами и каких букв
+        candidates = {}
+        for letter, subs in L33T_TABLE.items():
+            for sub in subs:
+                if sub in password:
+                    candidates.setdefault(sub, []).append(letter)
+        if not candidates:
+            return []
+
+        subs = sorted(candidates)
+        matches = []
+        seen = set()
+        variants = product(*(candidates[sub] for sub in subs))
+        for variant_index, letters in enumerate(variants):
+            if variant_index >= MAX_L33T_VARIANTS:
+                break
+            sub_map = dict(zip(subs, letters))
+            subbed = password.translate(str.maketrans(sub_map))
+            for match in self._dictionary_matches(subbed, user_inputs):
+                token = password[match["i"]:match["j"] + 1]
+                if token.lower() == match["matched_word"] or len(token) < 2:
+                    continue
+                used = {sub: letter for sub, letter in sub_map.items() if sub in token}
+                key = (match["i"], match["j"], match["dictionary"], match["matched_word"])
+                if key in seen:
+                    continue
+                seen.add(key)
+                match.update(token=token, l33t=True, sub=used)
+                matches.append(match)
+        return matches
+
+    # --- клавиатура ---
+
+    @staticmethod
+    def _spatial_matches(password):
+        matches = []
+        n = len(password)
+        for graph_name, steps in _GRAPH_STEPS.items():
+            shifted_chars = _SHIFTED_CHARS.get(graph_name, ())
+            i = 0
+            while i < n - 1:
+                j = i + 1
+                last_direction = None
+                turns = 0
+                shifted_count = 1 if password[i] in shifted_chars else 0
+
+                while j < n:
+                    step = steps.get(password[j - 1:j + 1])
+                    if step is None:
+                        break
+                    direction, shifted = step
+                    if shifted:
+                        shifted_count += 1
+                    if last_direction != direction:
+                        turns += 1
+                        last_direction = direction
+                    j += 1
+
+                if j - i > 2:
+                    matches.append(_match(
+                        "spatial", i, j - 1, password[i:j],
+                        graph=graph_name, turns=turns, shifted_count=shifted_count
+                    ))
+                i = j
+        return matches
+
+    # --- повторы и последовательности ---
+
+    def _repeat_matches(self, password, user_inputs=None):
+        matches = []
+        last_index = 0
+        n = len(password)
+        while last_index < n:
+            greedy = _GREEDY_REPEAT_RE.search(password, last_index)
+            lazy = _LAZY_REPEAT_RE.search(password, last_index)
+            if not greedy:
+                break
+            if len(greedy.group(0)) > len(lazy.group(0)):
+                match = greedy
+                base_token = _LAZY_ANCHORED_REPEAT_RE.match(match.group(0)).group(1)
+            else:
+                match = lazy
+                base_token = match.group(1)
+            i, j = match.start(), match.end() - 1
+            base = self._most_guessable(base_token, self._omnimatch(base_token, user_inputs))
+            matches.append(_match(
+                "repeat", i, j, match.group(0),
+                base_token=base_token, base_guesses=base["guesses"],
+                repeat_count=len(match.group(0)) / len(base_token)
+            ))
+            last_index = j + 1
+        return matches
+
+    @staticmethod
+    def _sequence_matches(password):
+        n = len(password)
+        if n <= 1:
+            return []
+        matches = []
+
+        def add(i, j, delta):
+            if (j - i > 1 or abs(delta) == 1) and 0 < abs(delta) <= MAX_SEQUENCE_DELTA:
+                token = password[i:j + 1]
+                matches.append(_match(
+                    "sequence", i, j, token,
+                    sequence_space=10 if token.isdigit() else 26, ascending=delta > 0
+                ))
+
+        i = 0
+        last_delta = None
+        for k in range(1, n):
+            delta = ord(password[k]) - ord(password[k - 1])
+            if last_delta is None:
+                last_delta = delta
+            if delta == last_delta:
+                continue
+            j = k - 1
+            add(i, j, last_delta)
+            i = j
+            last_delta = delta
+        add(i, n - 1, last_delta)
+        return matches
+
+    # --- даты и годы ---
+
+    @staticmethod
+    def _regex_matches(password):
+        return [
+            _match("regex", m.start(), m.end() - 1, m.group(0), regex_name="recent_year")
+            for m in _RECENT_YEAR_RE.finditer(password)
+        ]
+
+    @staticmethod
+    def _date_matches(password):
+        if not _DATE_HINT_RE.search(password):
+            return []
+        matches = []
+        n = len(password)
+
+        # Без разделителей: 4-8 цифр подряд
+        for i in range(n - 3):
+            for j in range(i + 3, min(n, i + 8)):
+                token = password[i:j + 1]
+                if not _DIGITS_RE.match(token):
+                    break
+                candidates = []
+                for k, l in DATE_SPLITS.get(len(token), ()):
+                    dmy = _map_ints_to_dmy((int(token[:k]), int(token[k:l]), int(token[l:])))
+                    if dmy:
+                        candidates.append(dmy)
+                if not candidates:
+                    continue
+                # Выбираем год, ближайший к текущему
+                year = min(candidates, key=lambda c: abs(c[2] - REFERENCE_YEAR))[2]
+                matches.append(_match("date", i, j, token, separator="", year=year))
+
+        # С разделителями: 1.1.91, 11-12-1991 и т.п.
+        for i in range(n - 5):
+            for j in range(i + 5, min(n, i + 10)):
+                token = password[i:j + 1]
+                rx = _DATE_WITH_SEPARATOR_RE.match(token)
+                if not rx:
+                    continue
+                dmy = _map_ints_to_dmy((int(rx.group(1)), int(rx.group(3)), int(rx.group(4))))
+                if dmy:
+                    matches.append(_match("date", i, j, token, separator=rx.group(2), year=dmy[2]))
+
+        # Убираем даты, целиком входящие в другие даты
+        return [
+            m for m in matches
+            if not any(o is not m and o["i"] <= m["i"] and o["j"] >= m["j"] for o in matches)
+        ]
+
+    # --- сборка ---
+
+    def _omnimatch(self, password, user_inputs=None):
+        matches = []
+        matches += self._dictionary_matches(password, user_inputs)
+        matches += self._reverse_dictionary_matches(password, user_inputs)
+        matches += self._l33t_matches(password, user_inputs)
+        matches += self._spatial_matches(password)
+        matches += self._repeat_matches(password, user_inputs)
+        matches += self._sequence_matches(password)
+        matches += self._regex_matches(password)
+        matches += self._date_matches(password)
+        return matches
+
+    # === ПОДСЧЁТ ПОПЫТОК ===
+
+    @staticmethod
+    def _estimate_guesses(match, password_length):
+        if "guesses" in match:
+            return match["guesses"]
+
+        length = len(match["token"])
+        if length < password_length:
+            min_guesses = (MIN_SUBMATCH_GUESSES_SINGLE_CHAR if length == 1
+                           else MIN_SUBMATCH_GUESSES_MULTI_CHAR)
+        else:
+            min_guesses = 1
+
+        pattern = match["pattern"]
+        if pattern == "bruteforce":
+            guesses = BRUTEFORCE_CARDINALITY ** length
+            guesses = max(guesses, MIN_SUBMATCH_GUESSES_SINGLE_CHAR + 1 if length == 1
+                          else MIN_SUBMATCH_GUESSES_MULTI_CHAR + 1)
+        elif pattern == "dictionary":
+            guesses = match["rank"] * _uppercase_variations(match["token"])
+            if match["l33t"]:
+                guesses *= _l33t_variations(match["token"], match["sub"])
+            if match["reversed"]:
+                guesses *= 2
+        elif pattern == "spatial":
+            guesses = _spatial_guesses(match)
+        elif pattern == "repeat":
+            guesses = match["base_guesses"] * match["repeat_count"]
+        elif pattern == "sequence":
+            first = match["token"][0]
+            if first in "aAzZ019":
+                base = 4
+            elif first.isdigit():
+                base = 10
+            else:
+                base = match["sequence_space"]
+            if not match["ascending"]:
+                base *= 2
+            guesses = base * length
+        elif pattern == "regex":
+            guesses = max(abs(int(match["token"]) - REFERENCE_YEAR), MIN_YEAR_SPACE)
+        elif pattern == "date":
+            guesses = max(abs(match["year"] - REFERENCE_YEAR), MIN_YEAR_SPACE) * 365
+            if match["separator"]:
+                guesses *= 4
+        else:
+            guesses = BRUTEFORCE_CARDINALITY ** length
+
+        match["guesses"] = max(guesses, min_guesses)
+        return match["guesses"]
+
+    def _most_guessable(self, password, matches):
+        """
+        Находит разбиение пароля на шаблоны с минимальным числом попыток.
+
+        optimal_*[k][l] - лучшая последовательность из l шаблонов,
+        заканчивающаяся в позиции k.
+        """
+        n = len(password)
+        if not n:
+            return {"guesses": 1, "sequence": []}
+
+        # Шаблоны по позиции конца, с числом попыток (считается один раз)
+        by_end = [[] for _ in range(n)]
+        for match in sorted(matches, key=lambda m: m["i"]):
+            by_end[match["j"]].append((match["i"], match, self._estimate_guesses(match, n)))
+
+        optimal_m = [{} for _ in range(n)]
+        optimal_pi = [{} for _ in range(n)]
+        optimal_g = [{} for _ in range(n)]
+        factorial = math.factorial
+        # Попытки перебора t символов - как _estimate_guesses для bruteforce
+        bruteforce_guesses = [0, MIN_SUBMATCH_GUESSES_SINGLE_CHAR + 1] + [
+            BRUTEFORCE_CARDINALITY ** t for t in range(2, n + 1)
+        ]
+
+        def bruteforce(i, k):
+            return _match("bruteforce", i, k, password[i:k + 1])
+
+        # Число попыток какого-нибудь полного разбиения (сначала - перебор
+        # целиком). Продолжения последовательности только увеличивают
+        # length! * pi и рост 10000^(length - 1), поэтому последовательность,
+        # у которой любое из них уже больше bound, не может стать лучшей
+        bound = [bruteforce_guesses[n] + 1]
+
+        def update(i, k, guesses, match, length):
+            """match=None - перебор символов i..k (создаётся, только если сохраняется)."""
+            pi = guesses
+            if length > 1:
+                pi *= optimal_pi[i - 1][length - 1]
+            weighted = factorial(length) * pi
+            growth = MIN_GUESSES_BEFORE_GROWING_SEQUENCE ** (length - 1)
+            if weighted > bound[0] or growth > bound[0]:
+                return
+            g = weighted + growth
+            for competing_length, competing_g in optimal_g[k].items():
+                if competing_length <= length and competing_g <= g:
+                    return
+            optimal_g[k][length] = g
+            optimal_m[k][length] = match or bruteforce(i, k)
+            optimal_pi[k][length] = pi
+
+        def tighten(k, lengths):
+            """Уточняет bound: последовательности в k с шаблоном в конце, дополненные перебором."""
+            if k == n - 1:
+                bound[0] = min([bound[0], *optimal_g[k].values()])
+                return
+            if not lengths:
+                return
+            tail = bruteforce_guesses[n - 1 - k]
+            for length in lengths:
+                # Тот же порядок операций, что в update (repeat даёт float)
+                g = (factorial(length + 1) * (tail * optimal_pi[k][length])
+                     + MIN_GUESSES_BEFORE_GROWING_SEQUENCE ** length)
+                bound[0] = min(bound[0], g)
+
+        # Позиции, где заканчиваются последовательности с шаблоном в конце,
+        # и их длины: только после них может начинаться перебор
+        pattern_ends = []
+        for k in range(n):
+            for i, match, guesses in by_end[k]:
+                if i > 0:
+                    for length in list(optimal_m[i - 1]):
+                        update(i, k, guesses, match, length + 1)
+                else:
+                    update(i, k, guesses, match, 1)
+
+            # Перебор не может следовать за перебором - такие отрезки
+            # выгоднее объединить, поэтому проверяем только стыки с шаблонами
+            update(0, k, bruteforce_guesses[k + 1], None, 1)
+            for end, lengths in pattern_ends:
+                guesses = bruteforce_guesses[k - end]
+                for length in lengths:
+                    update(end + 1, k, guesses, None, length + 1)
+
+            lengths = [length for length, last in optimal_m[k].items()
+                       if last["pattern"] != "bruteforce"]
+            if lengths:
+                pattern_ends.append((k, lengths))
+            tighten(k, lengths)
+
+        length = min(optimal_g[n - 1], key=optimal_g[n - 1].get)
+        guesses = optimal_g[n - 1][length]
+        sequence = []
+        k = n - 1
+        while k >= 0:
+            match = optimal_m[k][length]
+            sequence.append(match)
+            k = match["i"] - 1
+            length -= 1
+        sequence.reverse()
+        return {"guesses": guesses, "sequence": sequence}
+
+    # === ПУБЛИЧНЫЙ ИНТЕРФЕЙС ===
+
+    def estimate(self, password, user_inputs=()):
+        """
+        Оценивает пароль.
+
+        Args:
+            password: Пароль
+            user_inputs: Слова, связанные с записью (название, логин) -
+                пароль на их основе подбирается быстрее
+
+        Returns:
+            Estimate
+        """
+        ranked_inputs = {}
+        for word in user_inputs:
+            word = (word or "").strip().lower()
+            if word and word not in ranked_inputs:
+                ranked_inputs[word] = len(ranked_inputs) + 1
+
+        head = password[:MAX_MATCH_LENGTH]
+        result = self._most_guessable(head, self._omnimatch(head, ranked_inputs))
+        guesses, sequence = result["guesses"], result["sequence"]
+        tail = len(password) - len(head)
+        if tail:
+            tail_guesses = BRUTEFORCE_CARDINALITY ** tail
+            sequence = sequence + [_match("bruteforce", len(head), len(password) - 1,
+                                          password[len(head):], guesses=tail_guesses)]
+            guesses *= tail_guesses
+        return Estimate(guesses, sequence, len(password))
+
+    def estimate_many(self, passwords):
+        """
+        Оценивает пакет паролей - то же, что estimate() для каждого.
+
+        Пароли, для которых перебор целиком заведомо лучше любого
+        разбиения (см. _BruteforceScreen), оцениваются без разбора.
+
+        Returns:
+            list[Estimate]
+        """
+        passwords = list(passwords)
+        if len(passwords) < SCREEN_MIN_BATCH:
+            return [self.estimate(password) for password in passwords]
+        if self._screen is None:
+            self._screen = _BruteforceScreen(self.table)
+        settled = self._screen.bruteforce_only(passwords)
+        return [Estimate.bruteforce(password) if i in settled else self.estimate(password)
+                for i, password in enumerate(passwords)]
+
+
+class Estimate:
+    """Результат оценки: число попыток, оценка 0-4, время подбора и подсказки."""
+
+    __slots__ = ("guesses", "guesses_log10", "score", "sequence", "warning", "suggestions")
+
+    def __init__(self, guesses, sequence, password_length):
+        self.guesses = guesses
+        self.guesses_log10 = math.log10(guesses) if guesses > 0 else 0.0
+        self.score = _guesses_to_score(guesses)
+        self.sequence = sequence
+        self.warning, self.suggestions = _feedback(self.score, sequence, password_length)
+
+    @classmethod
+    def bruteforce(cls, password):
+        """Оценка пароля, лучшее разбиение которого - перебор целиком."""
+        n = len(password)
+        guesses = BRUTEFORCE_CARDINALITY ** n
+        sequence = [_match("bruteforce", 0, n - 1, password, guesses=guesses)]
+        return cls(guesses + 1, sequence, n)
+
+    @property
+    def level(self):
+        return LEVELS[self.score]
+
+    @property
+    def bits(self):
+        """Эквивалентная энтропия в битах (log2 числа попыток)."""
+        return math.log2(self.guesses) if self.guesses > 0 else 0.0
+
+    @property
+    def crack_time_seconds(self):
+        return self.guesses / GUESSES_PER_SECOND
+
+    def crack_time_display(self):
+        return _display_time(self.crack_time_seconds)
+
+    def patterns(self):
+        return [match["pattern"] for match in self.sequence]
+
+
+# === ВСПОМОГАТЕЛЬНЫЕ РАСЧЁТЫ ===
+
+def _n_ck(n, k):
+    return math.comb(n, k) if 0 <= k <= n else 0
+
+
+def _uppercase_variations(token):
+    if token.lower() == token:
+        return 1
+    if token[0].isupper() and token[1:].lower() == token[1:]:
+        return 2
+    if token[-1].isupper() and token[:-1].lower() == token[:-1]:
+        return 2
+    if token.upper() == token:
+        return 2
+    upper = sum(1 for c in token if c.isupper())
+    lower = sum(1 for c in token if c.islower())
+    return sum(_n_ck(upper + lower, i) for i in range(1, min(upper, lower) + 1))
+
+
+def _l33t_variations(token, sub):
+    variations = 1
+    lowered = token.lower()
+    for subbed, letter in sub.items():
+        s = lowered.count(subbed)
+        u = lowered.count(letter)
+        if s == 0 or u == 0:
+            variations *= 2
+        else:
+            variations *= sum(_n_ck(s + u, i) for i in range(1, min(s, u) + 1))
+    return variations
+
+
+def _spatial_guesses(match):
+    starts, degree = _GRAPH_STATS[match["graph"]]
+    length = len(match["token"])
+    turns = match["turns"]
+    guesses = 0
+    for i in range(2, length + 1):
+        for j in range(1, min(turns, i - 1) + 1):
+            guesses += _n_ck(i - 1, j - 1) * starts * degree ** j
+
+    shifted = match["shifted_count"]
+    if shifted:
+        unshifted = length - shifted
+        if unshifted == 0:
+            guesses *= 2
+        else:
+            guesses *= sum(_n_ck(shifted + unshifted, i) for i in range(1, min(shifted, unshifted) + 1))
+    return guesses
+
+
+def _map_ints_to_dmy(ints):
+    """(день, месяц, год) или None, если числа не похожи на дату."""
+    if ints[1] > 31 or ints[1] <= 0:
+        return None
+    over_12 = over_31 = under_1 = 0
+    for value in ints:
+        if 99 < value < 1000 or value > 2050:
+            return None
+        if value > 31:
+            over_31 += 1
+        if value > 12:
+            over_12 += 1
+        if value <= 0:
+            under_1 += 1
+    if over_31 >= 2 or over_12 == 3 or under_1 >= 2:
+        return None
+
+    for year, rest in ((ints[2], ints[:2]), (ints[0], ints[1:])):
+        if 1000 <= year <= 2050:
+            dm = _map_day_month(rest)
+            return (dm[0], dm[1], year) if dm else None
+
+    for year, rest in ((ints[2], ints[:2]), (ints[0], ints[1:])):
+        dm = _map_day_month(rest)
+        if dm:
+            year = year + 1900 if year > 50 else year + 2000
+            return dm[0], dm[1], year
+    return None
+
+
+def _map_day_month(pair):
+    for day, month in (pair, pair[::-1]):
+        if 1 <= day <= 31 and 1 <= month <= 12:
+            return day, month
+    return None
+
+
+def _guesses_to_score(guesses):
+    for score, threshold in enumerate(SCORE_THRESHOLDS):
+        if guesses < threshold + SCORE_DELTA:
+            return score
+    return len(SCORE_THRESHOLDS)
+
+
+def _display_time(seconds):
+    minute = 60
+    hour = minute * 60
+    day = hour * 24
+    month = day * 31
+    year = month * 12
+    century = year * 100
+    if seconds < 1:
+        return "меньше секунды"
+    for unit, name in ((century, None), (year, "лет"), (month, "мес."), (day, "дн."),
+                       (hour, "ч"), (minute, "мин"), (1, "с")):
+        if seconds >= unit:
+            if name is None:
+                return "века"
+            return f"{round(seconds / unit)} {name}"
+    return "меньше секунды"
+
+
+def _feedback(score, sequence, password_length):
+    """(предупреждение, [советы]) по самому длинному шаблону."""
+    if not password_length:
+        return "", ["Используйте несколько слов, избегайте распространённых фраз"]
+    if score > 2:
+        return "", []
+
+    suggestions = ["Добавьте ещё одно-два слова, лучше необычных"]
+    longest = max(sequence, key=lambda m: len(m["token"]))
+    pattern = longest["pattern"]
+    warning = ""
+
+    if pattern == "dictionary":
+        dictionary = longest["dictionary"]
+        if dictionary == "passwords":
+            if len(sequence) == 1 and not longest["l33t"] and not longest["reversed"]:
+                warning = ("Это один из самых распространённых паролей"
+                           if longest["rank"] <= 100 else "Это очень распространённый пароль")
+            else:
+                warning = "Пароль похож на распространённый"
+        elif dictionary == "user_inputs":
+            warning = "Пароль содержит название или логин записи"
+        elif dictionary == "names":
+            warning = "Имена и фамилии легко подобрать"
+        elif len(sequence) == 1:
+            warning = "Одно слово легко подобрать"
+        token = longest["token"]
+        if token[:1].isupper():
+            suggestions.append("Заглавная первая буква почти не помогает")
+        elif token.isupper() and token.lower() != token:
+            suggestions.append("Пароль целиком заглавными подбирается почти так же легко")
+        if longest["reversed"] and len(token) >= 4:
+            suggestions.append("Слово задом наперёд подбирается легко")
+        if longest["l33t"]:
+            suggestions.append("Замены вроде '@' вместо 'a' почти не помогают")
+    elif pattern == "spatial":
+        warning = ("Ряды клавиш легко подобрать" if longest["turns"] == 1
+                   else "Короткие узоры на клавиатуре легко подобрать")
+        suggestions.append("Используйте более длинный узор с поворотами")
+    elif pattern == "repeat":
+        warning = ("Повторы вроде 'aaa' легко подобрать" if len(longest["base_token"]) == 1
+                   else "Повторы вроде 'abcabc' лишь немного сложнее 'abc'")
+        suggestions.append("Избегайте повторяющихся слов и символов")
+    elif pattern == "sequence":
+        warning = "Последовательности вроде abc или 6543 легко подобрать"
+        suggestions.append("Избегайте последовательностей")
+    elif pattern == "regex":
+        warning = "Недавние годы легко подобрать"
+        suggestions.append("Избегайте недавних лет и лет, связанных с вами")
+    elif pattern == "date":
+        warning = "Даты часто легко подобрать"
+        suggestions.append("Избегайте дат и лет, связанных с вами")
+
+    return warning, suggestions
+
+
+# === ПАКЕТНАЯ ОЦЕНКА ===
+
+# Меньшие пакеты разбираются целиком: сборка шаблонов дороже выигрыша
+SCREEN_MIN_BATCH = 200
+
+
+class _BruteforceScreen:
+    """
+    Отбор паролей, у которых лучшее разбиение - перебор целиком.
+
+    Шаблон длиной t выигрывает у перебора тех же символов в
+    r = 10^t / (его попытки) раз, шаблоны с r <= 1 не улучшают ни одно
+    разбиение. Разбиение из l частей стоит не меньше
+    l! * 10^n / П r + 10^(4(l - 1)), и l >= s + 1, если s шаблонов не
+    покрывают пароль целиком. У двухсимвольных шаблонов r <= 2 (попыток
+    не меньше MIN_SUBMATCH_GUESSES_MULTI_CHAR), поэтому l! их покрывает.
+    Значит, если "опасные" (r > 1) пары и слова из 3 букв не покрывают
+    пароль, произведение r слов из 3 букв меньше 2, а других опасных
+    шаблонов нет, оценка - ровно 10^n + 1 попыток.
+
+    Проверка пакетная: пароли склеиваются через '\n', каждая пара
+    соседних символов кодируется одним символом (разность кодов и
+    соседство клавиш в любой раскладке), и признаки ищутся по всему
+    пакету сразу - регулярными выражениями из классов символов и
+    поиском n-грамм во множествах (map/compress без цикла Python).
+    Признаки - надмножества того, что находят matcher'ы оценщика:
+    начала опасных слов (с l33t-заменами), последовательности, повторы,
+    даты и годы; слова из 3 букв ищутся точно, с числом попыток, а ряды
+    клавиш проверяются matcher'ом у немногих отобранных паролей. Пароли
+    не из ASCII и длиннее MAX_MATCH_LENGTH сюда не попадают.
+    """
+
+    # Код пары: разность -5..5 (иначе NO_DELTA) * 2 + соседство клавиш
+    NO_DELTA = 2 * MAX_SEQUENCE_DELTA + 1
+
+    def __init__(self, table):
+        long_words = set()
+        pair_words = set()
+        triple_ranks = {}
+        for word, entries in table.items():
+            if not word.isascii():
+                continue
+            rank = min(rank for _, rank in entries)
+            if len(word) > 3 and rank < BRUTEFORCE_CARDINALITY ** len(word):
+                long_words.update((word, word[::-1]))
+            elif len(word) == 3 and rank < BRUTEFORCE_CARDINALITY ** 3:
+                # Обращённое слово стоит вдвое дороже
+                triple_ranks[word] = min(triple_ranks.get(word, rank), rank)
+                reversed_word = word[::-1]
+                triple_ranks[reversed_word] = min(triple_ranks.get(reversed_word, 2 * rank), 2 * rank)
+            elif len(word) == 2 and rank < BRUTEFORCE_CARDINALITY ** 2:
+                pair_words.update((word, word[::-1]))
+
+        # Начала опасных слов и опасные пары - с любыми l33t-заменами букв
+        variants = {letter: letter + subs for letter, subs in L33T_TABLE.items()}
+
+        def expand(chunks):
+            return {"".join(chars) for chunk in chunks
+                    for chars in product(*(variants.get(char, char) for char in chunk))}
+
+        # Слова длиннее 3 букв - по первым четырём (без учёта регистра)
+        self.word_starts = expand(word[:4] for word in long_words)
+        # Слова из 3 букв - точные токены (регистр, l33t), которые оценщик
+        # оценит дешевле перебора, с наименьшим числом попыток
+        self.word_triples = {}
+        threshold = BRUTEFORCE_CARDINALITY ** 3
+        for word, rank in triple_ranks.items():
+            options = [{char, char.upper(), *L33T_TABLE.get(char, "")} for char in word]
+            for chars in product(*options):
+                token = "".join(chars)
+                sub = {char: letter for char, letter in zip(token, word)
+                       if char.lower() != letter}
+                guesses = rank * _uppercase_variations(token)
+                if sub:
+                    guesses *= _l33t_variations(token, sub)
+                if guesses < min(threshold, self.word_triples.get(token, threshold)):
+                    self.word_triples[token] = guesses
+        self.word_pairs = expand(pair_words)
+
+        adjacent = set()
+        for graph in GRAPHS.values():
+            for char, neighbors in graph.items():
+                adjacent.update(char + other for neighbor in neighbors if neighbor for other in neighbor)
+
+        # Ряд клавиш, где направление меняется на каждом шаге (turns = длина - 1),
+        # дороже перебора, пока он короче zigzag символов. Более дешёвый ряд
+        # содержит два шага подряд в одном направлении или длиннее zigzag
+        self.spatial_triples = set()
+        self.zigzag = MAX_MATCH_LENGTH
+        for graph_name, steps in _GRAPH_STEPS.items():
+            zigzag = 3
+            while zigzag < MAX_MATCH_LENGTH and _spatial_guesses(_match(
+                    "spatial", 0, zigzag - 1, " " * zigzag, graph=graph_name,
+                    turns=zigzag - 1, shifted_count=0)) >= BRUTEFORCE_CARDINALITY ** zigzag:
+                zigzag += 1
+            following = {}
+            for pair, (direction, _) in steps.items():
+                following.setdefault(pair[0], []).append((pair[1], direction))
+            for pair, (direction, _) in steps.items():
+                for char, next_direction in following.get(pair[1], ()):
+                    if zigzag == 3 or next_direction == direction:
+                        self.spatial_triples.add(pair + char)
+            if zigzag > 3:
+                self.zigzag = min(self.zigzag, zigzag)
+
+        def code(delta, is_adjacent):
+            return chr(ord("A") + 2 * delta + is_adjacent)
+
+        self.pair_codes = {}
+        for first in map(chr, range(128)):
+            for second in map(chr, range(128)):
+                delta = ord(second) - ord(first)
+                if "\n" in (first, second):
+                    value = code(self.NO_DELTA, 0)
+                else:
+                    value = code(delta + MAX_SEQUENCE_DELTA if abs(delta) <= MAX_SEQUENCE_DELTA
+                                 else self.NO_DELTA, first + second in adjacent)
+                self.pair_codes[first + second] = value
+
+        def codes(deltas, adjacency=(0, 1)):
+            return "[" + re.escape("".join(code(d + MAX_SEQUENCE_DELTA, a)
+                                           for d in deltas for a in adjacency)) + "]"
+
+        adjacent_codes = "[" + re.escape("".join(code(d, 1) for d in range(self.NO_DELTA + 1))) + "]"
+        # По кодам пар: последовательность и повтор от 3 символов
+        # (первый символ проверяется заранее - почти все пары без разности)
+        deltas = range(-MAX_SEQUENCE_DELTA, MAX_SEQUENCE_DELTA + 1)
+        runs = "|".join(codes((delta,)) + "{2}" for delta in deltas)
+        self.long_pairs_re = re.compile(f"(?={codes(deltas)})(?:{runs})")
+        # Длинный ряд соседних клавиш - такие пароли проверяются matcher'ом рядов
+        self.long_adjacent_re = re.compile(adjacent_codes + f"{{{self.zigzag - 1}}}")
+        # Опасные пары: повтор "xx" и последовательность с шагом 1
+        self.pairs_re = re.compile(codes((-1, 0, 1)))
+
+        separator = r"(?:[^\S\n]|[/\\_.-])"
+        self.long_text_re = re.compile(
+            r"([^\n]{2,})\1|\d{4}|" + rf"\d{{1,4}}{separator}\d{{1,2}}{separator}\d{{1,4}}"
+        )
+
+    def bruteforce_only(self, passwords):
+        """Индексы паролей пакета, оценка которых - перебор целиком."""
+        candidates = [i for i, password in enumerate(passwords)
+                      if 3 <= len(password) <= MAX_MATCH_LENGTH
+                      and password.isascii() and "\n" not in password]
+        if not candidates:
+            return set()
+
+        batch = [passwords[i] for i in candidates]
+        offsets = []
+        position = 0
+        for password in batch:
+            offsets.append(position)
+            position += len(password) + 1
+        text = "\n".join(batch)
+        lowered = text.lower()
+
+        def owners(starts):
+            return {bisect_right(offsets, start) - 1 for start in starts}
+
+        bigrams = list(map(add, text, text[1:]))
+        pair_text = "".join(map(self.pair_codes.__getitem__, bigrams))
+        lowered_pairs = list(map(add, lowered, lowered[1:]))
+        positions = range(len(text))
+
+        rejected = owners(m.start() for m in self.long_pairs_re.finditer(pair_text))
+        rejected |= owners(m.start() for m in self.long_text_re.finditer(text))
+        # Слова из 3 букв: их суммарная длина и произведение попыток
+        triples = list(map(add, bigrams, text[2:]))
+        covered = [0] * len(batch)
+        triple_guesses = [1] * len(batch)
+        for start in compress(positions, map(self.word_triples.__contains__, triples)):
+            k = bisect_right(offsets, start) - 1
+            covered[k] += 3
+            triple_guesses[k] *= self.word_triples[triples[start]]
+        rejected |= owners(compress(positions, map(self.word_starts.__contains__,
+                                                    map(add, lowered_pairs, lowered_pairs[2:]))))
+
+        pairs = [0] * len(batch)
+        pair_starts = {m.start() for m in self.pairs_re.finditer(pair_text)}
+        pair_starts.update(compress(positions, map(self.word_pairs.__contains__, lowered_pairs)))
+        for start in pair_starts:
+            pairs[bisect_right(offsets, start) - 1] += 1
+
+        # Слова из 3 букв вместе выигрывают не больше чем вдвое, и все
+        # опасные шаблоны не покрывают пароль целиком
+        settled = {
+            k for k, password in enumerate(batch)
+            if k not in rejected and 2 * pairs[k] + covered[k] < len(password)
+            and BRUTEFORCE_CARDINALITY ** covered[k] < 2 * triple_guesses[k]
+        }
+
+        # Ряд клавиш опасен, только если он дешевле перебора тех же символов
+        spatial = owners(compress(positions, map(self.spatial_triples.__contains__, triples)))
+        spatial |= owners(m.start() for m in self.long_adjacent_re.finditer(pair_text))
+        for k in spatial & settled:
+            for match in StrengthEstimator._spatial_matches(batch[k]):
+                if _spatial_guesses(match) < BRUTEFORCE_CARDINALITY ** len(match["token"]):
+                    settled.discard(k)
+                    break
+        return {candidates[k] for k in settled}
+
+
+_default_estimator = None
+_default_estimator_lock = threading.Lock()
+
+
+def get_estimator():
+    """Общий оценщик (словари загружаются при первом вызове)."""
+    global _default_estimator
+    with _default_estimator_lock:
+        if _default_estimator is None:
+            _default_estimator = StrengthEstimator()
+        return _default_estimator
+
+
+def _benchmark(runs):
+    import time
+
+    start = time.perf_counter()
+    table = compile_dictionaries()
+    compile_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    load_dictionaries()
+    load_ms = (time.perf_counter() - start) * 1000
+
+    estimator = StrengthEstimator(table)
+    samples = ["password", "P@ssw0rd1", "qwerty123", "correcthorsebatterystaple",
+               "Tr0ub4dor&3", "zxcvbnm,./", "01.05.1991", "abcabcabc",
+               "ghbdtn2024", "x7#Kp!m2Qz9L", "michael1985", "asdfghjkl;'"]
+
+    print(f"Компиляция словарей: {compile_ms:.1f} ms, загрузка из кэша: {load_ms:.1f} ms")
+    for password in samples:
+        estimate = estimator.estimate(password)
+        print(f"  {password:28} {estimate.level:14} 10^{estimate.guesses_log10:5.2f} "
+              f"{'+'.join(estimate.patterns()):30} {estimate.warning}")
+
+    # Набор пароля по одному символу - как в окне добавления пароля
+    keystrokes = [p[:k] for p in samples for k in range(1, len(p) + 1)]
+    start = time.perf_counter()
+    for _ in range(max(1, runs // len(keystrokes))):
+        for text in keystrokes:
+            estimator.estimate(text)
+    total = max(1, runs // len(keystrokes)) * len(keystrokes)
+    per_call_ms = (time.perf_counter() - start) * 1000 / total
+
+    worst = max(keystrokes, key=len)
+    start = time.perf_counter()
+    for _ in range(100):
+        estimator.estimate(worst)
+    worst_ms = (time.perf_counter() - start) * 10
+
+    print(f"Нажатие клавиши: в среднем {per_call_ms:.3f} ms, "
+          f"самый длинный пароль ({len(worst)} симв.) {worst_ms:.3f} ms")
+
+    # Длинные фразы: время перестаёт расти после MAX_MATCH_LENGTH символов
+    phrase = "correct horse battery staple " * 10
+    timings = []
+    for length in (50, MAX_MATCH_LENGTH, 2 * MAX_MATCH_LENGTH):
+        start = time.perf_counter()
+        for _ in range(20):
+            estimator.estimate(phrase[:length])
+        timings.append(f"{length} симв. {(time.perf_counter() - start) * 50:.2f} ms")
+    print(f"Длинная фраза: {', '.join(timings)}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Бенчмарк оценки стойкости паролей")
+    parser.add_argument("--runs", type=int, default=2000)
+    args = parser.parse_args()
+    _benchmark(args.runs)